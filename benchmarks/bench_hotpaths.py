@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热点函数微基准测试：消息处理路径上每条消息都会调用的函数的单次耗时，
+结果保存为 JSON 基线，之后运行时与基线对比，标记变慢的函数
+
+仓库中不附带基线（耗时与机器相关），对比前需先在同一台机器上生成基线：
+    python benchmarks/bench_hotpaths.py run --save benchmarks/baselines/hotpaths.json
+
+用法:
+    python benchmarks/bench_hotpaths.py run --compare benchmarks/baselines/hotpaths.json
+    python benchmarks/bench_hotpaths.py run --filter memory --samples 30
+    python benchmarks/bench_hotpaths.py compare old.json new.json --threshold 0.15
+    python benchmarks/bench_hotpaths.py list
+
+测量方式（与 pyperf 相同的思路）：先校准循环次数，使每个样本的耗时不少于 --min-time，
+预热后采集 --samples 个样本，报告单次调用耗时的中位数、均值、标准差和最小值。
+对比时中位数变慢超过 --threshold 且超出两次运行的噪声（标准差）记为退化，退出码为 1。
+
+测试数据：
+- benchmarks/fixtures/chat_corpus.txt：群聊消息
+- benchmarks/fixtures/terraria_wiki/pages：保存的 Wiki 页面（回复截断使用页面正文）；
+  *_full_page 只使用其中最大的页面（100KB 以上的完整页面），单独反映大页面上的耗时
+- 对话记忆使用临时目录中预先写入的长会话（--history 条消息）
+
+日志默认保留 INFO 级别（与线上一致，输出丢弃），--log-level 可调整。
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 添加项目根目录到 Python 路径
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import nonebot
+
+nonebot.init()
+
+FIXTURES_DIR = os.path.join(ROOT_DIR, "benchmarks", "fixtures")
+
+# 名称 -> 构建函数（返回 (单次操作, 每个样本前的重置函数)）
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """注册基准测试"""
+    def decorator(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+
+# ========== 测试数据 ==========
+
+def load_corpus():
+    """群聊消息"""
+    with open(os.path.join(FIXTURES_DIR, "chat_corpus.txt"), "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_pages():
+    """保存的 Wiki 页面（页面名 -> HTML）"""
+    from plugins.openclaw_chat.retrieval_eval import load_fixture
+
+    pages, _ = load_fixture(os.path.join(FIXTURES_DIR, "terraria_wiki"))
+    return pages
+
+
+def make_history(corpus, size: int):
+    """由群聊消息构造长会话（用户和助手交替）"""
+    now = time.time() - size
+    history = []
+    for index in range(size):
+        role = "user" if index % 2 == 0 else "assistant"
+        content = corpus[index % len(corpus)]
+        if role == "assistant":
+            content = f"关于「{content}」：" + "这是一条比较长的助手回复，包含若干说明。" * 3
+        history.append({
+            "role": role,
+            "content": content,
+            "timestamp": now + index,
+            "datetime": datetime.fromtimestamp(now + index).isoformat(),
+            "metadata": {"user_id": str(200000 + index % 30), "group_id": "100001"} if role == "user" else {"model": "mock"}
+        })
+    return history
+
+
+# ========== 基准测试 ==========
+
+@benchmark("trigger.check_trigger")
+def bench_check_trigger(ctx):
+    from config import config
+    from plugins.openclaw_chat.intelligent_trigger import IntelligentTrigger
+
+    trigger = IntelligentTrigger(config.intelligent_trigger_patterns)
+    messages = itertools.cycle(ctx["corpus"])
+    return lambda: trigger.check_trigger(next(messages)), None
+
+
+@benchmark("ai.should_use_concise_mode")
+def bench_concise_mode(ctx):
+    from config import config
+    from plugins.openclaw_chat.ai_processor import _should_use_concise_mode
+
+    patterns = config.concise_mode_patterns
+    messages = itertools.cycle(ctx["corpus"])
+    return lambda: _should_use_concise_mode(next(messages), "normal", patterns), None
+
+
+@benchmark("ai.truncate_reply")
+def bench_truncate_reply(ctx):
+    from plugins.openclaw_chat.ai_processor import _truncate_reply
+    from plugins.openclaw_chat.wiki_parser import WikiParser
+
+    parser = WikiParser()
+    replies = itertools.cycle([parser._clean_html(html) for html in ctx["pages"].values()])
+    return lambda: _truncate_reply(next(replies), 200), None
+
+
+@benchmark("ai.truncate_reply_full_page")
+def bench_truncate_reply_full_page(ctx):
+    from plugins.openclaw_chat.ai_processor import _truncate_reply
+    from plugins.openclaw_chat.wiki_parser import WikiParser
+
+    reply = WikiParser()._clean_html(ctx["full_page"])
+    return lambda: _truncate_reply(reply, 200), None
+
+
+@benchmark("ai.build_system_prompt")
+def bench_build_system_prompt(ctx):
+    from plugins.openclaw_chat.ai_processor import _build_system_prompt
+
+    users = itertools.cycle([(str(200000 + index), str(100000 + index % 20)) for index in range(100)])
+
+    def op():
+        user_id, group_id = next(users)
+        return _build_system_prompt(user_id, "qq_group", group_id, "normal")
+
+    return op, None
+
+
+def _memory_fixture(ctx, session_id: str):
+    """写入长会话的记忆目录，返回 (记忆管理器, 重置函数)"""
+    from plugins.openclaw_chat.conversation_memory import ConversationMemory
+
+    directory = tempfile.mkdtemp(prefix="bench_memory_", dir=ctx["workdir"])
+    path = os.path.join(directory, f"{session_id}.json")
+    backup = path + ".orig"
+    with open(backup, "w", encoding="utf-8") as f:
+        json.dump(ctx["history"], f, ensure_ascii=False, indent=2)
+    shutil.copyfile(backup, path)
+
+    memory = ConversationMemory(memory_dir=directory, short_term_length=ctx["args"].short_term, auto_clean=False)
+
+    def reset():
+        shutil.copyfile(backup, path)
+        memory._short_term_memory.pop(session_id, None)
+
+    return memory, reset
+
+
+@benchmark("memory.add_message")
+def bench_add_message(ctx):
+    memory, reset = _memory_fixture(ctx, "group_100001")
+    messages = itertools.cycle(ctx["corpus"])
+
+    def op():
+        memory.add_message("group_100001", "user", next(messages), {"user_id": "200001", "group_id": "100001"})
+
+    return op, reset
+
+
+@benchmark("memory.get_conversation_context")
+def bench_get_context(ctx):
+    memory, reset = _memory_fixture(ctx, "group_100001")
+
+    def warm_reset():
+        reset()
+        memory.get_conversation_history("group_100001")
+
+    return lambda: memory.get_conversation_context("group_100001", max_tokens=2000), warm_reset
+
+
+@benchmark("memory.get_conversation_context_cold")
+def bench_get_context_cold(ctx):
+    memory, reset = _memory_fixture(ctx, "group_100001")
+
+    def op():
+        # 清空短期记忆，每次都从长期记忆文件加载
+        memory._short_term_memory.pop("group_100001", None)
+        return memory.get_conversation_context("group_100001", max_tokens=2000)
+
+    return op, reset
+
+
+def _filled_retriever(ctx):
+    """缓存已满的检索管理器和已缓存的查询"""
+    from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever
+
+    size = ctx["args"].cache_size
+    retriever = KnowledgeBaseRetriever(cache_size=size)
+    results = [
+        {"chunk_id": f"page_chunk_{index}", "text": "文本块内容" * 40, "metadata": {"page_name": "page"}, "score": 0.5}
+        for index in range(3)
+    ]
+    queries = [f"{ctx['corpus'][index % len(ctx['corpus'])]}#{index}" for index in range(size)]
+    for query in queries:
+        retriever._add_to_cache(query=query, kb_id="game", results=results, top_k=3)
+    return retriever, queries, results
+
+
+@benchmark("retriever.get_from_cache")
+def bench_get_from_cache(ctx):
+    retriever, queries, _ = _filled_retriever(ctx)
+    lookups = itertools.cycle(queries)
+    return lambda: retriever._get_from_cache(query=next(lookups), kb_id="game", top_k=3), None
+
+
+@benchmark("retriever.add_to_cache_evict_lru")
+def bench_evict_lru(ctx):
+    # 缓存已满时每次添加都会触发一次 _evict_lru，缓存大小保持不变
+    retriever, _, results = _filled_retriever(ctx)
+    counter = itertools.count()
+    return lambda: retriever._add_to_cache(query=f"new#{next(counter)}", kb_id="game", results=results, top_k=3), None
+
+
+@benchmark("wiki.clean_html")
+def bench_clean_html(ctx):
+    from plugins.openclaw_chat.wiki_parser import WikiParser
+
+    parser = WikiParser()
+    pages = itertools.cycle(ctx["pages"].values())
+    return lambda: parser._clean_html(next(pages)), None
+
+
+@benchmark("wiki.split_into_chunks")
+def bench_split_into_chunks(ctx):
+    from plugins.openclaw_chat.wiki_parser import WikiParser
+
+    parser = WikiParser()
+    texts = itertools.cycle([parser._clean_html(html) for html in ctx["pages"].values()])
+    return lambda: parser.split_into_chunks(next(texts)), None
+
+
+@benchmark("wiki.clean_html_full_page")
+def bench_clean_html_full_page(ctx):
+    from plugins.openclaw_chat.wiki_parser import WikiParser
+
+    parser = WikiParser()
+    html = ctx["full_page"]
+    return lambda: parser._clean_html(html), None
+
+
+@benchmark("wiki.split_into_chunks_full_page")
+def bench_split_into_chunks_full_page(ctx):
+    from plugins.openclaw_chat.wiki_parser import WikiParser
+
+    parser = WikiParser()
+    text = parser._clean_html(ctx["full_page"])
+    return lambda: parser.split_into_chunks(text), None
+
+
+# ========== 测量 ==========
+
+def time_loops(op, loops: int) -> float:
+    """执行 loops 次，返回总耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(loops):
+        op()
+    return time.perf_counter() - start
+
+
+def measure(op, reset, min_time: float, samples: int, warmup: int):
+    """校准循环次数后采集样本，返回单次耗时统计（微秒）"""
+    reset = reset or (lambda: None)
+
+    # 校准：循环次数翻倍直到单个样本耗时达到 min_time
+    loops = 1
+    while True:
+        reset()
+        if time_loops(op, loops) >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+
+    for _ in range(warmup):
+        reset()
+        time_loops(op, loops)
+
+    values = []
+    for _ in range(samples):
+        reset()
+        values.append(time_loops(op, loops) / loops * 1e6)
+
+    return {
+        "median_us": statistics.median(values),
+        "mean_us": statistics.mean(values),
+        "stdev_us": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "min_us": min(values),
+        "loops": loops,
+        "samples": values
+    }
+
+
+def git_revision() -> str:
+    """当前提交（不是 git 仓库时返回空字符串）"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return ""
+
+
+def run(args) -> dict:
+    """运行基准测试"""
+    from nonebot.log import logger
+
+    # 日志照常格式化，但不输出到终端
+    logger.remove()
+    logger.add(lambda _: None, level=args.log_level)
+
+    selected = [name for name in BENCHMARKS if not args.filter or re.search(args.filter, name)]
+    if not selected:
+        print(f"⚠️  没有匹配的基准测试: {args.filter}")
+        return {}
+
+    print("=" * 60)
+    print(f"🧪 热点函数微基准测试（{len(selected)} 项，{args.samples} 个样本，每个样本 ≥ {args.min_time * 1000:.0f}ms）")
+    print("=" * 60)
+
+    workdir = tempfile.mkdtemp(prefix="bench_hotpaths_")
+    corpus = load_corpus()
+    pages = load_pages()
+    ctx = {
+        "args": args,
+        "workdir": workdir,
+        "corpus": corpus,
+        "pages": pages,
+        "full_page": max(pages.values(), key=lambda html: len(html.encode("utf-8"))),
+        "history": make_history(corpus, args.history)
+    }
+
+    results = {}
+    try:
+        for name in selected:
+            op, reset = BENCHMARKS[name](ctx)
+            results[name] = measure(op, reset, args.min_time, args.samples, args.warmup)
+            stats = results[name]
+            print(
+                f"📦 {name:<40} {stats['median_us']:>10.2f}µs "
+                f"(±{stats['stdev_us']:.2f}, min {stats['min_us']:.2f}, loops {stats['loops']})"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "log_level": args.log_level,
+            "history": args.history,
+            "cache_size": args.cache_size
+        },
+        "benchmarks": results
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """
+    对比两次结果，输出每项的变化
+
+    Returns:
+        bool: 是否有退化
+    """
+    base_benchmarks = baseline.get("benchmarks", {})
+    current_benchmarks = current.get("benchmarks", {})
+    regressed = False
+
+    base_meta = baseline.get("meta", {})
+    print(f"\n📊 对比基线（{base_meta.get('date', '?')}，{base_meta.get('revision') or '未知提交'}），阈值 {threshold:.0%}")
+
+    for name, stats in current_benchmarks.items():
+        base = base_benchmarks.get(name)
+        if base is None:
+            print(f"   🆕 {name:<40} {stats['median_us']:>10.2f}µs（基线中没有）")
+            continue
+
+        ratio = stats["median_us"] / base["median_us"] if base["median_us"] else float("inf")
+        noise = 2 * max(base.get("stdev_us", 0.0), stats.get("stdev_us", 0.0))
+        delta = stats["median_us"] - base["median_us"]
+
+        if ratio > 1 + threshold and delta > noise:
+            icon = "❌"
+            regressed = True
+        elif ratio < 1 - threshold and -delta > noise:
+            icon = "🚀"
+        else:
+            icon = "✅"
+
+        print(
+            f"   {icon} {name:<40} {base['median_us']:>10.2f}µs -> {stats['median_us']:>10.2f}µs（{ratio:.2f}x）"
+        )
+
+    for name in base_benchmarks:
+        if name not in current_benchmarks:
+            print(f"   ⚪ {name:<40}（本次未运行）")
+
+    print("\n❌ 存在性能退化" if regressed else "\n✅ 没有性能退化")
+    return regressed
+
+
+def load_result(path: str) -> dict:
+    """读取 JSON 结果"""
+    if not os.path.exists(path):
+        print(f"❌ 基线不存在: {path}")
+        print(f"   请先生成基线: python benchmarks/bench_hotpaths.py run --save {path}")
+        sys.exit(2)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_result(result: dict, path: str):
+    """保存 JSON 结果"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 结果已保存: {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="热点函数微基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="运行基准测试")
+    run_parser.add_argument("--filter", default="", help="只运行名称匹配该正则的基准测试")
+    run_parser.add_argument("--samples", type=int, default=15, help="样本数")
+    run_parser.add_argument("--warmup", type=int, default=1, help="预热样本数")
+    run_parser.add_argument("--min-time", type=float, default=0.02, help="每个样本的最短耗时（秒）")
+    run_parser.add_argument("--history", type=int, default=500, help="长会话的消息数")
+    run_parser.add_argument("--short-term", type=int, default=10, help="短期记忆长度")
+    run_parser.add_argument("--cache-size", type=int, default=1000, help="检索缓存大小")
+    run_parser.add_argument("--log-level", default="INFO", help="日志级别（日志照常格式化但不输出）")
+    run_parser.add_argument("--save", default="", help="保存结果（JSON 基线）的路径")
+    run_parser.add_argument("--compare", default="", help="与该 JSON 基线对比")
+    run_parser.add_argument("--threshold", type=float, default=0.10, help="中位数变慢超过该比例记为退化")
+
+    compare_parser = subparsers.add_parser("compare", help="对比两次结果")
+    compare_parser.add_argument("baseline", help="基线 JSON")
+    compare_parser.add_argument("current", help="本次结果 JSON")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="中位数变慢超过该比例记为退化")
+
+    subparsers.add_parser("list", help="列出基准测试")
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name in BENCHMARKS:
+            print(name)
+    elif args.command == "compare":
+        sys.exit(1 if compare(load_result(args.baseline), load_result(args.current), args.threshold) else 0)
+    else:
+        # 基线不存在时在运行前退出，而不是跑完所有基准测试才报错
+        baseline = load_result(args.compare) if args.compare else None
+        result = run(args)
+        if result and args.save:
+            save_result(result, args.save)
+        if result and args.compare:
+            sys.exit(1 if compare(baseline, result, args.threshold) else 0)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片预处理基准测试：对比预处理前后的上传体积与耗时
+
+用法:
+    python benchmarks/bench_image_preprocess.py [--provider openai] [--bandwidth-mbps 8]
+
+上传耗时按给定上行带宽估算（Base64 编码后体积 / 带宽），不发起真实请求。
+"""
+
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nonebot
+
+nonebot.init()
+
+
+def make_photo(width: int, height: int) -> bytes:
+    """生成类似照片的图片（平滑渐变 + 噪点，高质量 JPEG，带 EXIF）"""
+    from PIL import Image
+
+    image = Image.effect_noise((width, height), 40).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (gradient, image.getchannel("G"), gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+
+    exif = Image.Exif()
+    exif[0x010F] = "BenchmarkCamera"
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=98, exif=exif)
+    return buffer.getvalue()
+
+
+def make_screenshot(width: int, height: int) -> bytes:
+    """生成类似聊天截图的图片（纯色块 + 文字行，PNG）"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    for y in range(20, height - 40, 60):
+        draw.rectangle((20, y, width * 2 // 3, y + 40), fill=(255, 255, 255))
+        draw.text((30, y + 12), "这是一条测试消息 benchmark message " * 2, fill=(30, 30, 30))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def run(provider: str, bandwidth_mbps: float, rounds: int) -> None:
+    """运行基准测试"""
+    from plugins.openclaw_chat.image_preprocessor import (
+        preprocess_image, get_max_edge, PIL_AVAILABLE
+    )
+
+    print("=" * 60)
+    print(f"🧪 图片预处理基准测试（供应商: {provider}，上行带宽: {bandwidth_mbps} Mbps）")
+    print("=" * 60)
+
+    if not PIL_AVAILABLE:
+        print("❌ 未安装 Pillow，无法生成测试图片（pip install Pillow）")
+        return
+
+    max_edge = get_max_edge(provider)
+    bytes_per_second = bandwidth_mbps * 1024 * 1024 / 8
+
+    samples = {
+        "手机照片 4032x3024": make_photo(4032, 3024),
+        "长截图 1080x2400": make_screenshot(1080, 2400),
+        "小表情 240x240": make_photo(240, 240),
+    }
+
+    for name, data in samples.items():
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            prepared = preprocess_image(data, max_edge=max_edge)
+            timings.append(time.perf_counter() - start)
+
+        before = len(base64.b64encode(data))
+        after = len(prepared.to_base64())
+        upload_before = before / bytes_per_second
+        upload_after = after / bytes_per_second
+        preprocess_time = sorted(timings)[len(timings) // 2]
+
+        print(f"\n📷 {name}")
+        print(f"   体积: {before / 1024:.0f}KB → {after / 1024:.0f}KB ({after / before:.0%})")
+        print(f"   尺寸: {prepared.width}x{prepared.height} {prepared.mime_type}（重新编码: {prepared.reencoded}）")
+        print(f"   预处理耗时（中位数）: {preprocess_time * 1000:.1f}ms")
+        print(f"   估算上传耗时: {upload_before * 1000:.0f}ms → {upload_after * 1000:.0f}ms")
+        print(f"   总耗时: {upload_before * 1000:.0f}ms → {(preprocess_time + upload_after) * 1000:.0f}ms")
+
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="图片预处理基准测试")
+    parser.add_argument("--provider", default="openai", help="Vision 供应商（决定最长边）")
+    parser.add_argument("--bandwidth-mbps", type=float, default=8.0, help="估算上传耗时使用的上行带宽")
+    parser.add_argument("--rounds", type=int, default=5, help="每张图片的预处理次数")
+    args = parser.parse_args()
+
+    run(args.provider, args.bandwidth_mbps, args.rounds)
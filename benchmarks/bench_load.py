@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端压力测试：模拟多个活跃群聊，向机器人发送 OneBot v11 群消息事件，
+大模型请求由本地模拟的 OpenAI 兼容服务响应（可配置延迟分布和错误率），全程离线
+
+用法:
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --groups 50 --rate 20 --duration 60
+    python benchmarks/bench_load.py --rate 50 --llm-latency lognormal:1.2,0.6 --llm-error-rate 0.05 --output load.json
+
+事件按泊松过程到达（开环，不等待上一条回复），经过 OneBot 适配器的事件解析、
+@ 检测和 NoneBot 的事件分发，进入插件的消息处理器。机器人的 API 调用（发送消息等）
+由本地的 FakeBot 记录，不连接 QQ。
+
+输出：
+- 吞吐：事件数 / 回复数 / 模型请求数（每秒）
+- 回复延迟：事件分发到发送回复的耗时（p50/p95/p99）
+- 事件循环延迟：监测协程的调度延迟（p50/p99/最大）
+- 内存：RSS 增长和峰值
+- 文件 I/O：进程的磁盘读写字节数（/proc/self/io）和数据目录的大小增长
+
+对话记忆、群组配置写到临时目录（--workdir 可指定），知识库默认关闭（--with-kb 保留 .env 的设置）。
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SELF_ID = 10000
+
+# 模拟的群消息（问题会触发智能回复，闲聊只经过触发检测）
+QUESTIONS = [
+    "泰拉棱镜怎么获得？",
+    "光之女皇怎么召唤",
+    "有人知道天顶剑怎么合成吗",
+    "血肉墙打不过怎么办？",
+    "为什么我的生命水晶用不了",
+    "求推荐一个召唤师的配装",
+    "世纪之花在哪里？",
+    "叶绿锭怎么挖",
+]
+CHATTER = [
+    "哈哈哈哈",
+    "今天终于打过克苏鲁之眼了",
+    "晚上一起开黑",
+    "我去吃饭了",
+    "这个版本好玩",
+    "+1",
+]
+
+# 当前事件的记录（在消息处理器中发送回复时读取）
+_current_event: contextvars.ContextVar[dict] = contextvars.ContextVar("bench_event")
+
+
+def percentile(values, q):
+    """分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def parse_latency(spec: str):
+    """
+    解析延迟分布（秒）
+
+    fixed:0.5 / uniform:0.2,1.5 / lognormal:中位数,sigma
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        import math
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+
+    raise ValueError(f"不支持的延迟分布: {spec}（可选: fixed:秒 / uniform:最小,最大 / lognormal:中位数,sigma）")
+
+
+def read_rss_mb() -> float:
+    """当前 RSS（MB，无法读取 /proc 时返回 0）"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def peak_rss_mb() -> float:
+    """RSS 峰值（MB，Linux 上 ru_maxrss 单位为 KB，macOS 为字节）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def read_io_counters() -> dict:
+    """进程 I/O 计数（/proc/self/io，不可用时返回空字典）"""
+    try:
+        with open("/proc/self/io", "r") as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f)}
+    except OSError:
+        return {}
+
+
+def dir_size(path: str) -> int:
+    """目录大小（字节）"""
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+# ========== 模拟的大模型服务 ==========
+
+class MockLLMServer:
+    """本地 OpenAI 兼容服务（同时支持 Ollama 的 /api/chat）"""
+
+    def __init__(self, latency, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.base_url = ""
+        self._runner = None
+
+    async def _respond(self, request):
+        """按延迟分布等待后返回回复"""
+        from aiohttp import web
+
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            body = await request.json()
+            await asyncio.sleep(max(0.0, self.latency()))
+
+            if random.random() < self.error_rate:
+                self.errors += 1
+                return None, web.json_response(
+                    {"error": {"code": "server_error", "message": "mock error"}}, status=500
+                )
+
+            question = next(
+                (message["content"] for message in reversed(body.get("messages", [])) if message.get("role") == "user"),
+                ""
+            )
+            return f"收到～关于「{question[:20]}」，星野的回答是：这是模拟回复。", None
+        finally:
+            self.in_flight -= 1
+
+    async def handle_openai(self, request):
+        """POST /{provider}/v1/chat/completions"""
+        from aiohttp import web
+
+        reply, error = await self._respond(request)
+        if error is not None:
+            return error
+
+        return web.json_response({
+            "id": "mock",
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 30, "total_tokens": 130}
+        })
+
+    async def handle_ollama(self, request):
+        """POST /{provider}/api/chat"""
+        from aiohttp import web
+
+        reply, error = await self._respond(request)
+        if error is not None:
+            return error
+
+        return web.json_response({"message": {"role": "assistant", "content": reply}, "done": True})
+
+    async def start(self):
+        """启动服务（随机端口）"""
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post("/{provider}/v1/chat/completions", self.handle_openai)
+        app.router.add_post("/{provider}/api/chat", self.handle_ollama)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+    async def stop(self):
+        """停止服务"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+# ========== 模拟的 OneBot 连接 ==========
+
+def create_fake_bot():
+    """创建记录 API 调用的 Bot（不连接 QQ）"""
+    import nonebot
+    from nonebot.adapters.onebot.v11 import Adapter, Bot
+
+    class FakeBot(Bot):
+        """拦截 API 调用：发送消息时记录回复延迟"""
+
+        def __init__(self, adapter, self_id):
+            super().__init__(adapter, self_id)
+            self.api_calls = {}
+            self.replies = []
+            self._message_id = 0
+
+        async def call_api(self, api: str, **data):
+            self.api_calls[api] = self.api_calls.get(api, 0) + 1
+
+            if api.startswith("send_"):
+                record = _current_event.get(None)
+                if record is not None and record["replied_at"] is None:
+                    record["replied_at"] = time.perf_counter()
+                    self.replies.append(record["replied_at"] - record["start"])
+                self._message_id += 1
+                return {"message_id": self._message_id}
+
+            return {}
+
+    adapter = nonebot.get_adapter(Adapter)
+    return FakeBot(adapter, str(SELF_ID))
+
+
+def make_group_event(message_id: int, group_id: int, user_id: int, text: str, mention: bool) -> dict:
+    """构造 OneBot v11 群消息事件"""
+    segments = []
+    raw_message = text
+    if mention:
+        segments.append({"type": "at", "data": {"qq": str(SELF_ID)}})
+        segments.append({"type": "text", "data": {"text": " " + text}})
+        raw_message = f"[CQ:at,qq={SELF_ID}] {text}"
+    else:
+        segments.append({"type": "text", "data": {"text": text}})
+
+    return {
+        "time": int(time.time()),
+        "self_id": SELF_ID,
+        "post_type": "message",
+        "message_type": "group",
+        "sub_type": "normal",
+        "message_id": message_id,
+        "group_id": group_id,
+        "user_id": user_id,
+        "anonymous": None,
+        "message": segments,
+        "raw_message": raw_message,
+        "font": 0,
+        "sender": {"user_id": user_id, "nickname": f"用户{user_id}", "card": "", "role": "member"}
+    }
+
+
+async def monitor_loop_lag(interval: float, samples: list, stop: asyncio.Event):
+    """定时唤醒，记录实际唤醒时间比预期晚多少（事件循环延迟）"""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - expected))
+
+
+# ========== 压测 ==========
+
+def setup_environment(args, workdir: str):
+    """配置环境变量（必须在导入 config 之前）"""
+    os.environ["MEMORY_DIR"] = os.path.join(workdir, "conversations")
+    os.environ["GROUP_CONFIG_FILE"] = os.path.join(workdir, "group_configs.json")
+    os.environ["TRACE_FILE"] = ""
+    if not args.with_kb:
+        os.environ["KNOWLEDGE_BASE_ENABLED"] = "false"
+    if args.provider:
+        os.environ["AI_MODEL"] = args.provider
+
+    # 本地服务不走代理
+    no_proxy = os.environ.get("NO_PROXY", "")
+    os.environ["NO_PROXY"] = ",".join(filter(None, [no_proxy, "127.0.0.1", "localhost"]))
+
+
+def point_providers_to_mock(base_url: str):
+    """把所有供应商的接口地址指向模拟服务（每个供应商使用独立路径，保证指标标签正确）"""
+    from config import config
+    from plugins.openclaw_chat.ai_processor import MODEL_CONFIGS
+
+    for provider, model_config in MODEL_CONFIGS.items():
+        if provider == "ollama":
+            model_config["api_url"] = f"{base_url}/{provider}/api/chat"
+        else:
+            model_config["api_url"] = f"{base_url}/{provider}/v1/chat/completions"
+            if hasattr(config, f"{provider}_api_key"):
+                setattr(config, f"{provider}_api_key", "mock-key")
+
+
+async def run(args, workdir: str) -> dict:
+    """运行压测"""
+    from nonebot.adapters.onebot.v11 import Adapter
+    from config import config
+    from plugins.openclaw_chat.conversation_memory import init_memory_manager
+
+    server = MockLLMServer(parse_latency(args.llm_latency), error_rate=args.llm_error_rate)
+    await server.start()
+    point_providers_to_mock(server.base_url)
+
+    if config.memory_enabled:
+        init_memory_manager(
+            memory_dir=config.memory_dir,
+            short_term_length=config.memory_short_term_length,
+            long_term_expire_days=config.memory_long_term_expire_days,
+            auto_clean=config.memory_auto_clean
+        )
+
+    bot = create_fake_bot()
+    rng = random.Random(args.seed)
+
+    print("=" * 60)
+    print(
+        f"🧪 端到端压测（{args.groups} 个群，{args.rate} 条/秒，{args.duration}s，"
+        f"@机器人 {args.mention_ratio:.0%}，问题 {args.question_ratio:.0%}）"
+    )
+    print(f"   模型: {config.ai_model}，模拟延迟: {args.llm_latency}，错误率: {args.llm_error_rate:.0%}")
+    print("=" * 60)
+
+    records = []
+    errors = []
+    tasks = set()
+
+    async def dispatch(payload: dict):
+        record = {"start": time.perf_counter(), "replied_at": None, "finished_at": None}
+        records.append(record)
+        _current_event.set(record)
+        try:
+            event = Adapter.json_to_event(payload)
+            await bot.handle_event(event)
+        except Exception as e:
+            errors.append(repr(e))
+        finally:
+            record["finished_at"] = time.perf_counter()
+
+    lag_samples = []
+    stop_monitor = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(args.lag_interval, lag_samples, stop_monitor))
+
+    rss_before = read_rss_mb()
+    io_before = read_io_counters()
+    size_before = dir_size(workdir)
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    next_at = start
+    message_id = 0
+
+    # 开环到达：按泊松过程发送事件，不等待回复
+    while True:
+        next_at += rng.expovariate(args.rate)
+        if next_at >= deadline:
+            break
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+        message_id += 1
+        mention = rng.random() < args.mention_ratio
+        text = rng.choice(QUESTIONS if mention or rng.random() < args.question_ratio else CHATTER)
+        payload = make_group_event(
+            message_id,
+            group_id=100000 + rng.randrange(args.groups),
+            user_id=200000 + rng.randrange(args.users_per_group * args.groups),
+            text=text,
+            mention=mention
+        )
+
+        task = asyncio.create_task(dispatch(payload))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    sent_seconds = time.perf_counter() - start
+
+    # 等待处理中的事件
+    if tasks:
+        await asyncio.wait(set(tasks), timeout=args.drain_timeout)
+    elapsed = time.perf_counter() - start
+
+    stop_monitor.set()
+    await monitor
+
+    rss_after = read_rss_mb()
+    io_after = read_io_counters()
+    size_after = dir_size(workdir)
+
+    await server.stop()
+
+    finished = [record for record in records if record["finished_at"] is not None]
+    handle_latencies = [record["finished_at"] - record["start"] for record in finished]
+
+    return {
+        "config": {
+            "groups": args.groups,
+            "rate": args.rate,
+            "duration": args.duration,
+            "mention_ratio": args.mention_ratio,
+            "question_ratio": args.question_ratio,
+            "llm_latency": args.llm_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "provider": config.ai_model
+        },
+        "events": len(records),
+        "unfinished": len(records) - len(finished),
+        "errors": len(errors),
+        "replies": len(bot.replies),
+        "llm_requests": server.requests,
+        "llm_errors": server.errors,
+        "llm_max_in_flight": server.max_in_flight,
+        "api_calls": bot.api_calls,
+        "send_seconds": sent_seconds,
+        "elapsed_seconds": elapsed,
+        "events_per_second": len(records) / sent_seconds if sent_seconds else 0.0,
+        "replies_per_second": len(bot.replies) / elapsed if elapsed else 0.0,
+        "reply_latency_ms": {
+            "p50": percentile(bot.replies, 0.5) * 1000,
+            "p95": percentile(bot.replies, 0.95) * 1000,
+            "p99": percentile(bot.replies, 0.99) * 1000,
+            "max": max(bot.replies, default=0.0) * 1000
+        },
+        "handle_latency_ms": {
+            "p50": percentile(handle_latencies, 0.5) * 1000,
+            "p99": percentile(handle_latencies, 0.99) * 1000
+        },
+        "loop_lag_ms": {
+            "p50": percentile(lag_samples, 0.5) * 1000,
+            "p99": percentile(lag_samples, 0.99) * 1000,
+            "max": max(lag_samples, default=0.0) * 1000
+        },
+        "memory_mb": {
+            "rss_before": rss_before,
+            "rss_after": rss_after,
+            "rss_growth": rss_after - rss_before,
+            "rss_peak": peak_rss_mb()
+        },
+        "file_io": {
+            "read_bytes": io_after.get("read_bytes", 0) - io_before.get("read_bytes", 0),
+            "write_bytes": io_after.get("write_bytes", 0) - io_before.get("write_bytes", 0),
+            "data_dir_growth_bytes": size_after - size_before,
+            "available": bool(io_before)
+        },
+        "sample_errors": errors[:5]
+    }
+
+
+def print_report(result: dict):
+    """输出压测结果"""
+    reply = result["reply_latency_ms"]
+    lag = result["loop_lag_ms"]
+    memory = result["memory_mb"]
+    file_io = result["file_io"]
+
+    print(f"\n📨 事件: {result['events']}（{result['events_per_second']:.1f}/s），未完成: {result['unfinished']}，异常: {result['errors']}")
+    print(f"💬 回复: {result['replies']}（{result['replies_per_second']:.1f}/s）")
+    print(f"🤖 模型请求: {result['llm_requests']}（错误 {result['llm_errors']}，最大并发 {result['llm_max_in_flight']}）")
+    print(f"⏱️  回复延迟: p50 {reply['p50']:.0f}ms / p95 {reply['p95']:.0f}ms / p99 {reply['p99']:.0f}ms / 最大 {reply['max']:.0f}ms")
+    print(f"🔁 事件循环延迟: p50 {lag['p50']:.2f}ms / p99 {lag['p99']:.2f}ms / 最大 {lag['max']:.2f}ms")
+    print(f"🧠 内存: RSS {memory['rss_before']:.1f}MB -> {memory['rss_after']:.1f}MB（+{memory['rss_growth']:.1f}MB），峰值 {memory['rss_peak']:.1f}MB")
+    if file_io["available"]:
+        print(
+            f"💾 文件 I/O: 读 {file_io['read_bytes'] / 1024:.1f}KB / 写 {file_io['write_bytes'] / 1024:.1f}KB，"
+            f"数据目录 +{file_io['data_dir_growth_bytes'] / 1024:.1f}KB"
+        )
+    else:
+        print(f"💾 文件 I/O: 无法读取 /proc/self/io，数据目录 +{file_io['data_dir_growth_bytes'] / 1024:.1f}KB")
+
+    for error in result["sample_errors"]:
+        print(f"   ❌ {error}")
+
+
+def main(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_load_")
+    os.makedirs(workdir, exist_ok=True)
+    setup_environment(args, workdir)
+
+    import nonebot
+    from nonebot.adapters.onebot.v11 import Adapter
+
+    nonebot.init(log_level=args.log_level)
+    nonebot.get_driver().register_adapter(Adapter)
+    nonebot.load_plugin("plugins.openclaw_chat")
+
+    try:
+        result = asyncio.run(run(args, workdir))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.output}")
+
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="端到端压力测试（离线）")
+    parser.add_argument("--groups", type=int, default=20, help="群数量")
+    parser.add_argument("--users-per-group", type=int, default=30, help="每个群的用户数")
+    parser.add_argument("--rate", type=float, default=10, help="总消息速率（条/秒）")
+    parser.add_argument("--duration", type=float, default=20, help="发送时长（秒）")
+    parser.add_argument("--mention-ratio", type=float, default=0.3, help="@机器人的消息比例")
+    parser.add_argument("--question-ratio", type=float, default=0.3, help="未@的消息中问题（触发智能回复）的比例")
+    parser.add_argument("--provider", default="", help="模型供应商（默认使用 AI_MODEL）")
+    parser.add_argument("--llm-latency", default="lognormal:0.8,0.5", help="模拟模型延迟分布（fixed:秒 / uniform:最小,最大 / lognormal:中位数,sigma）")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="模拟模型返回 500 的比例")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="事件循环延迟的采样间隔（秒）")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="发送结束后等待处理中事件的最长时间（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--with-kb", action="store_true", help="保留 .env 中的知识库设置（默认关闭知识库）")
+    parser.add_argument("--workdir", default="", help="数据目录（默认使用临时目录，结束后删除）")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别")
+    parser.add_argument("--output", default="", help="保存 JSON 结果的路径")
+    main(parser.parse_args())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识库检索评测：在保存的 Wiki 页面上构建本地知识库，用标注的查询评估
+recall@k、MRR、nDCG 和检索延迟（p50/p95）、内存峰值
+
+用法:
+    python benchmarks/bench_retrieval.py
+    python benchmarks/bench_retrieval.py --chunk-sizes 200,500 --top-k 3,5 --rerankers none,lexical
+    python benchmarks/bench_retrieval.py --embedding onnx --model-dir data/models/bge-small-zh --output result.json
+    python benchmarks/bench_retrieval.py --log-level INFO
+
+每种配置（分块大小 × top_k × 重排方式 × 近似重复阈值）单独构建知识库并评测，
+修改分块、排序、重排等检索逻辑后运行，对比指标变化。
+评测数据见 benchmarks/fixtures/terraria_wiki（pages/*.html 为完整保存的页面，包含与标注页面
+词汇重叠的干扰页面；queries.json 为标注，每条标注用 contains 指定到具体段落）。
+默认只输出 WARNING 以上的日志，需要查看分块、检索过程的日志时用 --log-level INFO。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "terraria_wiki")
+
+
+def parse_list(value: str, cast=str):
+    """解析逗号分隔的参数"""
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def create_provider(args):
+    """创建嵌入后端"""
+    from plugins.openclaw_chat.embeddings import HashingEmbeddingProvider, OnnxEmbeddingProvider
+
+    if args.embedding == "onnx":
+        return OnnxEmbeddingProvider(args.model_dir, threads=args.threads)
+    return HashingEmbeddingProvider(dimension=args.dimension)
+
+
+async def run_config(args, provider, pages, queries, chunk_size, top_k, reranker_name, dedup, workdir):
+    """构建知识库并评测一种配置"""
+    from plugins.openclaw_chat.vector_database_manager import VectorDatabaseManager
+    from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever
+    from plugins.openclaw_chat.reranker import create_reranker
+    from plugins.openclaw_chat.retrieval_eval import build_chunks, evaluate
+
+    kb_id = f"eval_{chunk_size}"
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    chunks = build_chunks(kb_id, pages, chunk_size=chunk_size, chunk_overlap=args.chunk_overlap)
+    vector_db = VectorDatabaseManager(
+        kb_dir=os.path.join(workdir, f"{chunk_size}_{top_k}_{reranker_name}_{dedup}"),
+        embedding_provider=provider,
+        backend="numpy",
+        kb_backends={}
+    )
+    vector_db.add_documents(kb_id, chunks)
+    build_seconds = time.perf_counter() - start
+
+    retriever = KnowledgeBaseRetriever(
+        reranker=create_reranker(reranker_name, model_dir=args.reranker_model_dir),
+        near_duplicate_threshold=dedup
+    )
+    result = await evaluate(retriever, vector_db, kb_id, queries, top_k=top_k, repeat=args.repeat)
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result["config"] = {
+        "chunk_size": chunk_size,
+        "chunk_overlap": args.chunk_overlap,
+        "top_k": top_k,
+        "reranker": reranker_name,
+        "near_duplicate_threshold": dedup,
+        "embedding": provider.model_id
+    }
+    result["summary"].update({
+        "chunks": len(chunks),
+        "build_s": build_seconds,
+        "peak_mb": peak / 1024 / 1024
+    })
+    return result
+
+
+def print_result(result):
+    """输出一种配置的指标"""
+    config = result["config"]
+    summary = result["summary"]
+    top_k = config["top_k"]
+
+    print(
+        f"\n📦 分块 {config['chunk_size']} | top_k {top_k} | 重排 {config['reranker']} | "
+        f"去重 {config['near_duplicate_threshold']}"
+    )
+    print(f"   文本块: {summary['chunks']}，构建: {summary['build_s']:.2f}s，内存峰值: {summary['peak_mb']:.1f}MB")
+    print(
+        f"   recall@{top_k}: {summary[f'recall@{top_k}']:.3f} | MRR: {summary['mrr']:.3f} | "
+        f"nDCG@{top_k}: {summary[f'ndcg@{top_k}']:.3f}"
+    )
+    print(f"   延迟: p50 {summary['p50_ms']:.2f}ms / p95 {summary['p95_ms']:.2f}ms")
+
+
+async def run(args) -> None:
+    """运行评测"""
+    from plugins.openclaw_chat.retrieval_eval import load_fixture
+
+    pages, queries = load_fixture(args.fixture)
+    provider = create_provider(args)
+
+    print("=" * 60)
+    print(f"🧪 知识库检索评测（{len(pages)} 个页面，{len(queries)} 个查询，嵌入 {provider.model_id}）")
+    print("=" * 60)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for chunk_size in parse_list(args.chunk_sizes, int):
+            for top_k in parse_list(args.top_k, int):
+                for reranker_name in parse_list(args.rerankers):
+                    for dedup in parse_list(args.dedup, float):
+                        result = await run_config(
+                            args, provider, pages, queries, chunk_size, top_k, reranker_name, dedup, workdir
+                        )
+                        print_result(result)
+                        results.append(result)
+
+    if args.verbose:
+        for result in results:
+            print(f"\n🔎 {result['config']}")
+            for item in result["queries"]:
+                print(f"   RR {item['mrr']:.2f} | {item['query']} -> {', '.join(item['results'])}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.output}")
+
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="知识库检索离线评测")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="评测数据目录（pages/*.html + queries.json）")
+    parser.add_argument("--chunk-sizes", default="500", help="分块大小，逗号分隔")
+    parser.add_argument("--chunk-overlap", type=int, default=50, help="块之间重叠字符数")
+    parser.add_argument("--top-k", default="3,5", help="返回结果数量，逗号分隔")
+    parser.add_argument("--rerankers", default="none,lexical", help="重排方式（none/lexical/cross_encoder），逗号分隔")
+    parser.add_argument("--reranker-model-dir", default="", help="交叉编码器模型目录")
+    parser.add_argument("--dedup", default="0", help="近似重复过滤的 Jaccard 阈值，逗号分隔（0 只去除完全相同的文本）")
+    parser.add_argument("--embedding", choices=["hashing", "onnx"], default="hashing", help="嵌入后端")
+    parser.add_argument("--model-dir", default="", help="ONNX 嵌入模型目录")
+    parser.add_argument("--dimension", type=int, default=384, help="哈希嵌入维度")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX 推理线程数（0 为自动）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个查询重复次数（用于延迟统计）")
+    parser.add_argument("--output", default="", help="保存 JSON 结果的路径")
+    parser.add_argument("--verbose", action="store_true", help="输出每个查询的结果")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别")
+    args = parser.parse_args()
+
+    import nonebot
+
+    nonebot.init(log_level=args.log_level)
+    asyncio.run(run(args))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量存储基准测试：NumPy（暴力检索 / IVF）与 Chroma 的召回率（recall@k）和查询延迟（p50/p99）
+
+用法:
+    python benchmarks/bench_vector_store.py --size 20000
+    python benchmarks/bench_vector_store.py --size 50000 --nprobe 16 --dimension 384
+
+召回率以精确的暴力检索结果为基准；未安装 chromadb 时跳过 Chroma。
+向量为带聚类结构的随机向量（模拟句向量的分布），与嵌入模型无关。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nonebot
+import numpy as np
+
+nonebot.init()
+
+
+def make_vectors(size: int, dimension: int, clusters: int, noise: float, seed: int) -> np.ndarray:
+    """生成带聚类结构的归一化向量"""
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(0).normal(size=(clusters, dimension))
+    labels = rng.integers(0, clusters, size=size)
+    vectors = centers[labels] + noise * rng.normal(size=(size, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def percentile(values, q):
+    """分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def dir_size(path: str) -> int:
+    """目录大小（字节）"""
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def measure(label, search, queries, truth, top_k, build_seconds, size_bytes):
+    """执行查询并输出召回率和延迟"""
+    latencies = []
+    recalls = []
+
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids = search(query)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(ids) & expected) / top_k)
+
+    print(f"\n📦 {label}")
+    print(f"   构建: {build_seconds:.2f}s，磁盘: {size_bytes / 1024 / 1024:.1f}MB")
+    print(f"   recall@{top_k}: {np.mean(recalls):.3f}")
+    print(f"   延迟: p50 {percentile(latencies, 0.5) * 1000:.2f}ms / p99 {percentile(latencies, 0.99) * 1000:.2f}ms")
+
+
+def run(args) -> None:
+    """运行基准测试"""
+    from plugins.openclaw_chat.numpy_vector_store import NumpyCollection
+
+    vectors = make_vectors(args.size, args.dimension, args.clusters, args.noise, seed=1)
+    queries = make_vectors(args.queries, args.dimension, args.clusters, args.noise, seed=2)
+    ids = [f"chunk_{i}" for i in range(args.size)]
+    documents = [""] * args.size
+
+    print("=" * 60)
+    print(f"🧪 向量存储基准测试（{args.size} 条，维度 {args.dimension}，top_k {args.top_k}）")
+    print("=" * 60)
+
+    # 精确结果（召回率基准）
+    truth = []
+    for query in queries:
+        scores = vectors @ query
+        top = np.argpartition(-scores, args.top_k - 1)[:args.top_k]
+        truth.append({ids[i] for i in top})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configs = [("NumPy 暴力检索", 0), (f"NumPy IVF（nprobe {args.nprobe}）", 1)]
+
+        for label, ivf_threshold in configs:
+            directory = os.path.join(tmp, f"numpy_{ivf_threshold}")
+            start = time.perf_counter()
+            collection = NumpyCollection(directory, "bench", ivf_threshold=ivf_threshold, ivf_nprobe=args.nprobe)
+            collection.add(ids=ids, documents=documents, embeddings=vectors)
+            build_seconds = time.perf_counter() - start
+
+            def search(query, collection=collection):
+                return [ids[row] for row, _ in collection.search_vector(query, args.top_k)]
+
+            measure(label, search, queries, truth, args.top_k, build_seconds, dir_size(directory))
+
+        # Chroma（HNSW）
+        try:
+            import chromadb
+            from chromadb.config import Settings
+        except ImportError:
+            print("\n⚠️  未安装 chromadb，跳过 Chroma 对比")
+        else:
+            directory = os.path.join(tmp, "chroma")
+            start = time.perf_counter()
+            client = chromadb.PersistentClient(path=directory, settings=Settings(anonymized_telemetry=False))
+            collection = client.create_collection("bench", metadata={"hnsw:space": "ip"})
+            for offset in range(0, args.size, 5000):
+                collection.add(
+                    ids=ids[offset:offset + 5000],
+                    embeddings=vectors[offset:offset + 5000].tolist(),
+                    documents=documents[offset:offset + 5000]
+                )
+            build_seconds = time.perf_counter() - start
+
+            def search(query):
+                return collection.query(query_embeddings=[query.tolist()], n_results=args.top_k)["ids"][0]
+
+            measure("Chroma（HNSW）", search, queries, truth, args.top_k, build_seconds, dir_size(directory))
+
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="向量存储基准测试")
+    parser.add_argument("--size", type=int, default=20000, help="文本块数量")
+    parser.add_argument("--dimension", type=int, default=384, help="向量维度")
+    parser.add_argument("--clusters", type=int, default=200, help="模拟数据的主题数量")
+    parser.add_argument("--noise", type=float, default=1.5, help="模拟数据的主题内离散程度（越大越难检索）")
+    parser.add_argument("--queries", type=int, default=200, help="查询数")
+    parser.add_argument("--top-k", type=int, default=5, help="每次返回结果数")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF 探测聚类数")
+    run(parser.parse_args())
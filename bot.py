@@ -59,6 +59,15 @@ if config.memory_enabled:
 else:
     logger.info("⚠️  对话记忆已禁用")
 
+# ========== 初始化请求追踪导出 ==========
+if config.trace_file:
+    try:
+        from plugins.openclaw_chat.tracing import init_trace_exporter
+
+        init_trace_exporter(config.trace_file)
+    except Exception as e:
+        logger.error(f"❌ 请求追踪导出初始化失败: {e}")
+
 # 启动机器人
 if __name__ == "__main__":
     logger.info("正在启动 QQ Bot - OpenClaw...")
@@ -36,6 +36,7 @@ class KnowledgeBaseConfig(BaseModel):
     """知识库配置"""
     enabled: Optional[bool] = None  # 是否启用知识库（None 表示使用全局默认）
     kb_id: Optional[str] = None  # 知识库 ID（None 表示使用全局默认）
+    kb_ids: Optional[List[str]] = None  # 联合检索的知识库 ID 列表（绑定多个知识库时使用，kb_id 为第一个）
     top_k: Optional[int] = None  # 检索结果数量（None 表示使用全局默认）
 
 
@@ -79,6 +80,21 @@ class Config(BaseModel):
     vision_model: str = os.getenv("VISION_MODEL", "gpt-4o-mini")  # Vision 模型名称
     vision_api_key: str = ""  # Vision API Key（动态从供应商的配置中获取）
     vision_base_url: str = os.getenv("VISION_BASE_URL", "")  # Vision API 基础 URL（可选）
+    vision_image_cache_mb: int = int(os.getenv("VISION_IMAGE_CACHE_MB", "32"))  # 已下载图片的内存缓存大小（MB）
+    vision_cache_enabled: bool = os.getenv("VISION_CACHE_ENABLED", "true").lower() == "true"  # 是否缓存图片识别结果
+    vision_cache_max_distance: int = int(os.getenv("VISION_CACHE_MAX_DISTANCE", "4"))  # 视为同一图片的最大汉明距离（0~64）
+    vision_cache_ttl_hours: float = float(os.getenv("VISION_CACHE_TTL_HOURS", "24"))  # 识别结果缓存有效期（小时）
+    vision_cache_max_entries: int = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "2000"))  # 识别结果缓存最大条目数
+    vision_cache_file: str = os.getenv("VISION_CACHE_FILE", "data/vision_cache.json")  # 识别结果缓存文件（留空则不持久化）
+    vision_cache_flush_interval: float = float(os.getenv("VISION_CACHE_FLUSH_INTERVAL", "30"))  # 识别结果写入后延迟多久保存到磁盘（秒，期间的写入合并为一次）
+    vision_preprocess: bool = os.getenv("VISION_PREPROCESS", "true").lower() == "true"  # 上传前缩小并重新编码图片
+    vision_max_edge: int = int(os.getenv("VISION_MAX_EDGE", "0"))  # 图片最长边（像素，0 表示使用供应商推荐值）
+    vision_jpeg_quality: int = int(os.getenv("VISION_JPEG_QUALITY", "85"))  # 重新编码的 JPEG 质量（1~95）
+    vision_max_images: int = int(os.getenv("VISION_MAX_IMAGES", "4"))  # 每条消息最多识别的图片数（多张图片在同一个请求中发送）
+    image_max_download_mb: int = int(os.getenv("IMAGE_MAX_DOWNLOAD_MB", "10"))  # 单张图片的下载大小上限（MB，超过后中止）
+    image_temp_dir: str = os.getenv("IMAGE_TEMP_DIR", "temp/images")  # 下载图片的临时目录
+    image_temp_max_mb: int = int(os.getenv("IMAGE_TEMP_MAX_MB", "200"))  # 临时目录大小上限（MB，超出时删除最久未使用的图片）
+    image_temp_ttl_hours: float = float(os.getenv("IMAGE_TEMP_TTL_HOURS", "24"))  # 临时图片保留时间（小时）
 
     # ========== 知识库配置 ==========
     knowledge_base_enabled: bool = os.getenv("KNOWLEDGE_BASE_ENABLED", "false").lower() == "true"  # 是否启用知识库
@@ -86,6 +102,38 @@ class Config(BaseModel):
     knowledge_base_default_kb_id: str = os.getenv("KNOWLEDGE_BASE_DEFAULT_KB_ID", "game_terraria")  # 默认知识库 ID
     knowledge_base_top_k: int = int(os.getenv("KNOWLEDGE_BASE_TOP_K", "3"))  # 检索结果数量
     knowledge_base_cache_ttl: int = int(os.getenv("KNOWLEDGE_BASE_CACHE_TTL", "300"))  # 缓存过期时间（秒）
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "chroma").lower()  # 嵌入后端：chroma（Chroma 默认）/ onnx / hashing
+    embedding_model_dir: str = os.getenv("EMBEDDING_MODEL_DIR", "data/models/multilingual-minilm-int8")  # ONNX 嵌入模型目录
+    embedding_threads: int = int(os.getenv("EMBEDDING_THREADS", "0"))  # ONNX 推理线程数（0 表示自动）
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))  # 并发查询嵌入的最大批大小
+    embedding_batch_wait_ms: float = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))  # 凑批最长等待时间（毫秒）
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))  # 嵌入 LRU 缓存条目数（0 表示不缓存）
+    embedding_cache_dir: str = os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache")  # 持久化嵌入缓存目录（留空则不缓存）
+    embedding_cache_dtype: str = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")  # 持久化嵌入的存储类型（float16/float32）
+    vector_store_backend: str = os.getenv("VECTOR_STORE_BACKEND", "chroma").lower()  # 默认向量存储后端：chroma / numpy
+    vector_store_backends: str = os.getenv("VECTOR_STORE_BACKENDS", "")  # 按知识库指定向量存储后端（kb_id:backend，逗号分隔）
+    vector_store_ivf_threshold: int = int(os.getenv("VECTOR_STORE_IVF_THRESHOLD", "20000"))  # NumPy 存储文本块达到多少时构建 IVF 索引（0 表示始终暴力检索）
+    vector_store_ivf_nprobe: int = int(os.getenv("VECTOR_STORE_IVF_NPROBE", "8"))  # IVF 检索探测的聚类数量
+    kb_reranker: str = os.getenv("KB_RERANKER", "none").lower()  # 检索重排：none / lexical（词法重排）/ cross_encoder（本地交叉编码器）
+    kb_rerank_model_dir: str = os.getenv("KB_RERANK_MODEL_DIR", "data/models/bge-reranker-base-int8")  # 交叉编码器 ONNX 模型目录
+    kb_rerank_candidates: int = int(os.getenv("KB_RERANK_CANDIDATES", "12"))  # 重排前取回的候选数量
+    kb_rerank_budget_ms: float = float(os.getenv("KB_RERANK_BUDGET_MS", "50"))  # 重排时间预算（毫秒）
+    kb_rerank_weight: float = float(os.getenv("KB_RERANK_WEIGHT", "0.5"))  # 词法重排中词法分数的权重（0~1）
+    kb_dedup_threshold: float = float(os.getenv("KB_DEDUP_THRESHOLD", "0.8"))  # 检索结果近似重复过滤的 Jaccard 阈值（0 表示只去除完全相同的文本）
+    kb_ingest_dedup_threshold: float = float(os.getenv("KB_INGEST_DEDUP_THRESHOLD", "0"))  # 构建知识库时丢弃近似重复文本块的 Jaccard 阈值（0 表示不丢弃）
+    kb_router_enabled: bool = os.getenv("KB_ROUTER_ENABLED", "true").lower() == "true"  # 绑定多个知识库时按质心相似度跳过不相关的知识库
+    kb_router_margin: float = float(os.getenv("KB_ROUTER_MARGIN", "0.15"))  # 质心相似度比最相似知识库低多少时跳过
+    kb_router_max_kbs: int = int(os.getenv("KB_ROUTER_MAX_KBS", "3"))  # 联合检索最多查询的知识库数量（0 表示不限制）
+    query_rewrite_mode: str = os.getenv("QUERY_REWRITE_MODE", "heuristic").lower()  # 检索查询改写：off / heuristic（本地规则）/ llm（模型改写，失败退回本地规则）
+    query_rewrite_history: int = int(os.getenv("QUERY_REWRITE_HISTORY", "6"))  # 改写时参考的最近消息数
+    query_rewrite_timeout: float = float(os.getenv("QUERY_REWRITE_TIMEOUT", "0.8"))  # LLM 改写超时（秒）
+    query_rewrite_cache_size: int = int(os.getenv("QUERY_REWRITE_CACHE_SIZE", "1024"))  # 改写结果缓存条目数
+    faq_enabled: bool = os.getenv("FAQ_ENABLED", "false").lower() == "true"  # 是否启用 FAQ 直接回复（命中已审核问答对时不调用模型）
+    faq_dir: str = os.getenv("FAQ_DIR", "data/faq")  # FAQ 索引目录
+    faq_threshold: float = float(os.getenv("FAQ_THRESHOLD", "0.9"))  # 直接回复的最低问题相似度（余弦）
+    faq_min_count: int = int(os.getenv("FAQ_MIN_COUNT", "3"))  # 对话记录中的问题至少出现多少次才生成问答对
+    faq_answer_max_tokens: int = int(os.getenv("FAQ_ANSWER_MAX_TOKENS", "200"))  # 由知识库文本块生成的答案 Token 上限
+    faq_auto_approve: bool = os.getenv("FAQ_AUTO_APPROVE", "false").lower() == "true"  # 新生成的问答对是否无需审核直接生效
 
     # API 配置（已废弃，但保留兼容）
     openclaw_api_url: str = os.getenv("OPENCLAW_API_URL", "http://localhost:8000/api/openclaw/chat")
@@ -131,6 +179,33 @@ class Config(BaseModel):
     memory_long_term_expire_days: int = int(os.getenv("MEMORY_LONG_TERM_EXPIRE_DAYS", "30"))  # 长期记忆过期时间（天）
     memory_auto_clean: bool = os.getenv("MEMORY_AUTO_CLEAN", "true").lower() == "true"  # 是否自动清理过期记忆
     memory_max_context_tokens: int = int(os.getenv("MEMORY_MAX_CONTEXT_TOKENS", "2000"))  # 最大上下文 Token 数
+    prompt_max_tokens: int = int(os.getenv("PROMPT_MAX_TOKENS", "6000"))  # 提示词总 Token 预算（超出时从最早的对话记忆开始裁剪，0 表示不限制）
+    kb_context_max_tokens: int = int(os.getenv("KB_CONTEXT_MAX_TOKENS", "1200"))  # 知识库上下文 Token 预算（超出时只保留与问题相关的句子，0 表示不限制）
+
+    # ========== 性能配置 ==========
+    memory_load_timeout: float = float(os.getenv("MEMORY_LOAD_TIMEOUT", "1.0"))  # 对话记忆加载超时（秒，0 表示不限制）
+    kb_retrieve_timeout: float = float(os.getenv("KB_RETRIEVE_TIMEOUT", "2.0"))  # 知识库检索超时（秒，超时则不带知识库上下文回复）
+    knowledge_base_warmup: bool = os.getenv("KNOWLEDGE_BASE_WARMUP", "true").lower() == "true"  # 启动时预热知识库集合和嵌入模型
+    trace_file: str = os.getenv("TRACE_FILE", "")  # 请求追踪 JSONL 文件路径（留空则不导出）
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"  # 是否开启 /metrics 运行指标
+    metrics_path: str = os.getenv("METRICS_PATH", "/metrics")  # 运行指标路由路径
+    loop_monitor_enabled: bool = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"  # 启动时开启事件循环阻塞监控（可用 /loop_monitor 随时开关）
+    loop_monitor_threshold_ms: float = float(os.getenv("LOOP_MONITOR_THRESHOLD_MS", "100"))  # 事件循环被阻塞超过多少毫秒时采样调用栈
+    loop_monitor_interval_ms: float = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "20"))  # 事件循环心跳间隔（毫秒）
+    loop_monitor_top: int = int(os.getenv("LOOP_MONITOR_TOP", "10"))  # 报告中列出的阻塞位置数量
+
+    # ========== 供应商故障转移配置 ==========
+    provider_failover_enabled: bool = os.getenv("PROVIDER_FAILOVER_ENABLED", "false").lower() == "true"  # 是否启用供应商故障转移
+    provider_fallback_chain: str = os.getenv("PROVIDER_FALLBACK_CHAIN", "")  # 备用供应商顺序（逗号分隔，留空则按已配置 Key 的供应商顺序）
+    provider_breaker_failures: int = int(os.getenv("PROVIDER_BREAKER_FAILURES", "3"))  # 连续失败多少次后熔断
+    provider_breaker_reset: float = float(os.getenv("PROVIDER_BREAKER_RESET", "30"))  # 熔断后多久允许试探请求（秒）
+    provider_hedge_enabled: bool = os.getenv("PROVIDER_HEDGE_ENABLED", "false").lower() == "true"  # 是否启用对冲请求
+    provider_hedge_min_samples: int = int(os.getenv("PROVIDER_HEDGE_MIN_SAMPLES", "10"))  # 启用对冲所需的最少延迟样本数
+
+    # ========== 模型路由配置 ==========
+    model_router_enabled: bool = os.getenv("MODEL_ROUTER_ENABLED", "false").lower() == "true"  # 是否按请求自动选择模型
+    model_router_candidates: str = os.getenv("MODEL_ROUTER_CANDIDATES", "")  # 路由候选（provider:model[:fast|large]，逗号分隔）
+    model_router_long_message: int = int(os.getenv("MODEL_ROUTER_LONG_MESSAGE", "200"))  # 长问题阈值（字符数，超过则偏向大模型）
 
     # 群组配置（运行时加载）
     _group_configs: Dict[str, GroupConfig] = {}
@@ -236,6 +311,18 @@ class Config(BaseModel):
 
         return None
 
+    def get_group_kb_ids(self, group_id: str) -> List[str]:
+        """获取群组绑定的全部知识库 ID（如果未配置或未启用则返回空列表）"""
+        kb_config = self.get_group_kb_config(group_id)
+
+        if not kb_config.enabled:
+            return []
+
+        if kb_config.kb_ids:
+            return list(kb_config.kb_ids)
+
+        return [kb_config.kb_id] if kb_config.kb_id else []
+
     def get_group_kb_top_k(self, group_id: str) -> int:
         """获取群组的知识库检索结果数量"""
         kb_config = self.get_group_kb_config(group_id)
@@ -265,19 +352,21 @@ class Config(BaseModel):
     @property
     def current_api_key(self) -> Optional[str]:
         """获取当前模型的 API Key"""
-        if self.ai_model == "zhipu":
-            return self.zhipu_api_key
-        elif self.ai_model == "deepseek":
-            return self.deepseek_api_key
-        elif self.ai_model == "siliconflow":
-            return self.siliconflow_api_key
-        elif self.ai_model == "moonshot":
-            return self.moonshot_api_key
-        elif self.ai_model == "ohmygpt":
-            return self.ohmygpt_api_key
-        elif self.ai_model == "ollama":
+        return self.get_api_key(self.ai_model)
+
+    def get_api_key(self, provider: str) -> Optional[str]:
+        """
+        获取指定供应商的 API Key
+
+        Args:
+            provider: 供应商（zhipu/deepseek/siliconflow/ollama/moonshot/ohmygpt）
+
+        Returns:
+            API Key（Ollama 或未知供应商返回 None）
+        """
+        if provider == "ollama":
             return None  # Ollama 不需要 API Key
-        return None
+        return getattr(self, f"{provider}_api_key", None)
     
     def get_vision_api_key(self) -> str:
         """获取 Vision API Key（根据 provider 自动选择）"""
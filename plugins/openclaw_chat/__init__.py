@@ -8,3 +8,38 @@ from .chat import *
 
 # 导入知识库管理员命令
 from . import kb_admin_commands
+
+# 导入 FAQ 管理员命令
+from . import faq_admin_commands
+
+# 挂载运行指标（/metrics）
+from config import config
+from .metrics import setup_metrics
+
+if config.metrics_enabled:
+    setup_metrics(config.metrics_path)
+
+# 关闭时释放共享 HTTP 连接池
+from nonebot import get_driver
+from .http_client import close_http_client
+
+get_driver().on_shutdown(close_http_client)
+
+# 启动时在线程池中加载 Vision 识别结果缓存，关闭时保存未写盘的识别结果
+from .vision_cache import load_vision_cache, close_vision_cache
+
+get_driver().on_startup(load_vision_cache)
+get_driver().on_shutdown(close_vision_cache)
+
+# 启动时预热知识库（加载集合索引和嵌入模型）
+from .ai_processor import warm_up_knowledge_base
+
+if config.knowledge_base_warmup:
+    get_driver().on_startup(warm_up_knowledge_base)
+
+# 事件循环阻塞监控（也可用 /loop_monitor on 随时开启）
+from .loop_monitor import start_loop_monitor, stop_loop_monitor
+
+if config.loop_monitor_enabled:
+    get_driver().on_startup(start_loop_monitor)
+get_driver().on_shutdown(stop_loop_monitor)
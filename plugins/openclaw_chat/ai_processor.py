@@ -5,19 +5,35 @@ OpenClaw AI 处理模块（支持多模型 + 对话记忆 + 知识库检索）
 支持：智谱 AI、DeepSeek、硅基流动、Ollama 本地模型等
 """
 
+import asyncio
+import functools
 import httpx
 import json
 import os
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List
 from nonebot.log import logger
 
 # 导入对话记忆模块
 from .conversation_memory import get_memory_manager, init_memory_manager
 
+# 导入请求追踪模块
+from .tracing import RequestTrace, get_current_trace, start_trace, finish_trace, span, run_in_thread
+
+# 导入运行指标模块
+from .metrics import record_llm_call as _record_llm_metrics, extract_cached_tokens, FAQ_ANSWERS
+
+# 导入供应商池（故障转移 + 熔断 + 对冲）
+from .provider_pool import ProviderError, get_provider_pool
+
+# 导入模型路由
+from .model_router import get_model_router
+from .context_packer import pack_kb_context, fit_history_to_budget
+
 # 导入知识库模块
 try:
     from .knowledge_base_manager import KnowledgeBaseManager
-    from .vector_database_manager import VectorDatabaseManager
+    from .vector_database_manager import VectorDatabaseManager, get_vector_db_manager
     from .knowledge_base_retriever import KnowledgeBaseRetriever, SearchContext
     KNOWLEDGE_BASE_AVAILABLE = True
 except ImportError:
@@ -145,17 +161,36 @@ _retriever: Optional[KnowledgeBaseRetriever] = None
 
 
 def init_knowledge_base(kb_dir: str = "data/knowledge_bases"):
-    """初始化知识库"""
+    """初始化知识库（已初始化时直接返回，向量数据库在进程内共享）"""
     global _kb_manager, _vdb_manager, _retriever
 
     if not KNOWLEDGE_BASE_AVAILABLE:
         logger.warning("⚠️  知识库模块未可用，跳过初始化")
         return
 
+    if _kb_manager is not None:
+        return
+
     try:
         _kb_manager = KnowledgeBaseManager(kb_dir=kb_dir)
-        _vdb_manager = VectorDatabaseManager(kb_dir=kb_dir)
-        _retriever = KnowledgeBaseRetriever(cache_ttl=300, cache_size=1000)
+        _vdb_manager = get_vector_db_manager(kb_dir)
+        from config import config
+        from .reranker import get_reranker
+        from .kb_router import CentroidRouter
+
+        router = None
+        if config.kb_router_enabled:
+            router = CentroidRouter(margin=config.kb_router_margin, max_kbs=config.kb_router_max_kbs)
+
+        _retriever = KnowledgeBaseRetriever(
+            cache_ttl=300,
+            cache_size=1000,
+            reranker=get_reranker(),
+            rerank_candidates=config.kb_rerank_candidates,
+            rerank_budget_ms=config.kb_rerank_budget_ms,
+            near_duplicate_threshold=config.kb_dedup_threshold,
+            router=router
+        )
 
         logger.info("✅ 知识库初始化成功")
     except Exception as e:
@@ -165,6 +200,41 @@ def init_knowledge_base(kb_dir: str = "data/knowledge_bases"):
         _retriever = None
 
 
+async def warm_up_knowledge_base() -> None:
+    """
+    预热知识库（驱动器启动时调用）
+
+    初始化知识库，并在线程池中加载所有就绪知识库的集合和嵌入模型、执行预热查询，
+    避免第一条知识库回复承担数秒的加载耗时。
+    """
+    from config import config
+
+    if not (config.knowledge_base_enabled and KNOWLEDGE_BASE_AVAILABLE):
+        return
+
+    init_knowledge_base(kb_dir=config.knowledge_base_dir)
+
+    if _kb_manager is None or _vdb_manager is None:
+        return
+
+    kb_ids = [kb_info.kb_id for kb_info in _kb_manager.list_knowledge_bases() if kb_info.status == "ready"]
+    if not kb_ids:
+        logger.info("ℹ️  没有就绪的知识库，跳过预热")
+        return
+
+    start = time.perf_counter()
+    timings = await run_in_thread(_vdb_manager.warm_up, kb_ids)
+
+    # 重排模型同样在第一次使用时加载，提前加载避免第一次重排超出时间预算
+    if _retriever is not None and _retriever.reranker is not None:
+        try:
+            await run_in_thread(_retriever.reranker.score, "warmup", [{"text": "warmup"}])
+        except Exception as e:
+            logger.warning(f"⚠️  重排模型预热失败: {e}")
+
+    logger.info(f"🔥 知识库预热完成: {len(timings)}/{len(kb_ids)} 个，耗时 {time.perf_counter() - start:.2f}s")
+
+
 def get_knowledge_base() -> tuple:
     """
     获取知识库管理器
@@ -179,7 +249,9 @@ async def retrieve_from_knowledge_base(
     query: str,
     kb_id: str,
     top_k: int = 3,
-    use_cache: bool = True
+    use_cache: bool = True,
+    max_tokens: int = 0,
+    kb_ids: Optional[List[str]] = None
 ) -> Optional[str]:
     """
     从知识库检索相关内容
@@ -189,6 +261,8 @@ async def retrieve_from_knowledge_base(
         kb_id: 知识库 ID
         top_k: 返回结果数量
         use_cache: 是否使用缓存
+        max_tokens: 知识库上下文的 Token 预算（0 表示不限制）
+        kb_ids: 联合检索的知识库 ID 列表（可选，不可用的知识库会被跳过）
 
     Returns:
         str: 检索结果（失败则返回 None）
@@ -200,37 +274,43 @@ async def retrieve_from_knowledge_base(
         return None
 
     try:
-        # 检查知识库是否存在
-        if not _kb_manager.exists(kb_id):
-            logger.warning(f"⚠️  知识库不存在: {kb_id}")
-            return None
+        available_kb_ids = []
+        for candidate in (kb_ids or [kb_id]):
+            # 检查知识库是否存在
+            if not _kb_manager.exists(candidate):
+                logger.warning(f"⚠️  知识库不存在: {candidate}")
+                continue
+
+            # 检查知识库是否准备就绪
+            if not _kb_manager.is_ready(candidate):
+                logger.warning(f"⚠️  知识库未准备就绪: {candidate}")
+                continue
+
+            available_kb_ids.append(candidate)
 
-        # 检查知识库是否准备就绪
-        if not _kb_manager.is_ready(kb_id):
-            logger.warning(f"⚠️  知识库未准备就绪: {kb_id}")
+        if not available_kb_ids:
             return None
 
         # 创建检索上下文
         context = SearchContext(
             query=query,
-            kb_id=kb_id,
+            kb_id=available_kb_ids[0],
             top_k=top_k,
             sort_by="score",
-            use_cache=use_cache
+            use_cache=use_cache,
+            kb_ids=available_kb_ids if len(available_kb_ids) > 1 else None
         )
 
         # 执行检索
-        results = await _retriever.retrieve(_vdb_manager, context)
+        with span("kb_search"):
+            results = await _retriever.retrieve(_vdb_manager, context)
 
         if not results:
             logger.info(f"ℹ️  知识库检索无结果: {kb_id}")
             return None
 
-        # 格式化检索结果
-        context_text = "\n\n".join([
-            f"【{i + 1}】{result['text']}\n来源: {result['metadata'].get('source', 'N/A')}"
-            for i, result in enumerate(results)
-        ])
+        # 格式化检索结果（按预算压缩文本块，合并重复的来源）
+        context_text = pack_kb_context(query, results, max_tokens=max_tokens)
 
         logger.info(f"✅ 知识库检索成功: {kb_id}, 结果数: {len(results)}")
 
@@ -304,26 +384,22 @@ async def process_message_with_ai(
     if not api_key and model_config["env_key"]:
         api_key = os.getenv(model_config["env_key"], "")
 
-    # ========== 对话记忆功能 ==========
-    conversation_history = []
+    # ========== 对话记忆 + 知识库检索 + 提示词构建（并发） ==========
     session_id = f"user_{user_id}" if not group_id else f"group_{group_id}"
+    trace_attributes = {
+        "user_id": user_id,
+        "group_id": group_id,
+        "model": model,
+        "selected_model": selected_model
+    }
 
-    if config.memory_enabled:
-        try:
-            # 获取记忆管理器
-            memory_manager = get_memory_manager()
-
-            # 从记忆中加载对话上下文
-            conversation_history = memory_manager.get_conversation_context(
-                session_id,
-                max_tokens=config.memory_max_context_tokens
-            )
-
-            logger.info(f"📚 已加载对话记忆: session={session_id}, messages={len(conversation_history)}")
-        except RuntimeError as e:
-            logger.warning(f"⚠️  记忆管理器未初始化: {e}")
-        except Exception as e:
-            logger.error(f"❌ 加载对话记忆失败: {e}")
+    # 复用调用方（消息处理器）开启的追踪，没有则自行开启
+    trace = get_current_trace()
+    owns_trace = trace is None
+    if owns_trace:
+        trace = start_trace("process_message", trace_attributes)
+    else:
+        trace.attributes.update(trace_attributes)
 
     # 判断是否使用简洁模式
     if concise_patterns is None:
@@ -335,56 +411,107 @@ async def process_message_with_ai(
     if use_concise:
         logger.info("📝 使用简洁回复模式")
 
-    # ========== 知识库检索功能 ==========
-    kb_context = None
-
-    if config.knowledge_base_enabled and KNOWLEDGE_BASE_AVAILABLE:
-        try:
-            # 获取群组的知识库 ID
-            kb_id = config.get_group_kb_id(group_id) if group_id else None
-
-            if kb_id:
-                # 获取群组的 top_k 配置
-                top_k = config.get_group_kb_top_k(group_id)
+    effective_reply_mode = "concise" if use_concise else reply_mode
 
-                logger.info(f"🔍 正在检索知识库: {kb_id}, top_k={top_k}")
+    # ========== FAQ 直接回复（命中已审核的常见问题时不检索、不调用模型） ==========
+    if config.faq_enabled and group_id:
+        faq_reply = await _run_stage(
+            trace, "faq_match",
+            _match_faq(message, group_id, config),
+            timeout=config.kb_retrieve_timeout,
+            default=None
+        )
 
-                # 从知识库检索
-                kb_context = await retrieve_from_knowledge_base(
-                    query=message,
-                    kb_id=kb_id,
-                    top_k=top_k,
-                    use_cache=True
+        if faq_reply:
+            if config.memory_enabled:
+                _save_conversation(
+                    trace, session_id, message, faq_reply,
+                    user_metadata={"user_id": user_id, "group_id": group_id, "context": context},
+                    reply_metadata={"model": "faq", "reply_mode": reply_mode}
                 )
 
-                if kb_context:
-                    logger.info(f"✅ 知识库检索成功，上下文长度: {len(kb_context)}")
-                else:
-                    logger.info(f"ℹ️  知识库检索无结果: {kb_id}")
-            else:
-                logger.debug("ℹ️  未配置知识库，跳过检索")
-
-        except Exception as e:
-            logger.error(f"❌ 知识库检索失败: {e}")
+            if owns_trace:
+                finish_trace(trace)
+            return faq_reply
+
+    # 记忆加载和知识库检索互不依赖，并发执行（两者的 I/O 都在线程池中进行）
+    conversation_history, kb_context, system_prompt = await asyncio.gather(
+        _run_stage(
+            trace, "memory_load",
+            _load_conversation_history(session_id, config),
+            timeout=config.memory_load_timeout,
+            default=[]
+        ),
+        _run_stage(
+            trace, "kb_retrieve",
+            _retrieve_kb_context(
+                message, group_id, config,
+                session_id=session_id,
+                user_id=user_id,
+                llm_rewrite=functools.partial(_rewrite_query_with_llm, model, selected_model, api_key)
+            ),
+            timeout=config.kb_retrieve_timeout,
+            default=None
+        ),
+        _run_stage(
+            trace, "prompt_build",
+            _build_system_prompt_async(effective_reply_mode),
+            timeout=0
+        )
+    )
+
+    # 提示词总预算：扣除人设、知识库、环境说明和用户消息后，从最早的对话记忆开始裁剪
+    conversation_history = fit_history_to_budget(
+        conversation_history,
+        config.prompt_max_tokens,
+        reserved=[system_prompt, kb_context, _build_environment_prompt(user_id, context, group_id), message]
+    )
+
+    # ========== 模型路由 ==========
+    if config.model_router_enabled:
+        decision = get_model_router().route(
+            message, context, effective_reply_mode,
+            has_kb=bool(kb_context),
+            default=(model, selected_model)
+        )
+        if decision is not None and (decision.provider, decision.model) != (model, selected_model):
+            if decision.provider != model:
+                api_key = config.get_api_key(decision.provider)
+            model = decision.provider
+            model_config = MODEL_CONFIGS[model]
+            selected_model = decision.model
+        if decision is not None:
+            trace.attributes["route"] = decision.to_dict()
 
     # 调用对应的 AI 模型
     try:
-        if model == "ollama":
-            reply = await _call_ollama(
-                message, user_id, context, group_id,
-                model_config, selected_model,
-                reply_mode="concise" if use_concise else reply_mode,
-                conversation_history=conversation_history,
-                kb_context=kb_context
-            )
-        else:
-            reply = await _call_openai_compatible(
-                message, user_id, context, group_id,
-                model_config, selected_model, api_key,
-                reply_mode="concise" if use_concise else reply_mode,
-                conversation_history=conversation_history,
-                kb_context=kb_context
-            )
+        with trace.stage("llm_call"):
+            if config.provider_failover_enabled:
+                reply = await _call_with_failover(
+                    message, user_id, context, group_id,
+                    model, selected_model, api_key,
+                    system_prompt=system_prompt,
+                    conversation_history=conversation_history,
+                    kb_context=kb_context
+                )
+            elif model == "ollama":
+                reply = await _call_ollama(
+                    message, user_id, context, group_id,
+                    model_config, selected_model,
+                    reply_mode=effective_reply_mode,
+                    conversation_history=conversation_history,
+                    kb_context=kb_context,
+                    system_prompt=system_prompt
+                )
+            else:
+                reply = await _call_openai_compatible(
+                    message, user_id, context, group_id,
+                    model_config, selected_model, api_key,
+                    reply_mode=effective_reply_mode,
+                    conversation_history=conversation_history,
+                    kb_context=kb_context,
+                    system_prompt=system_prompt
+                )
 
         if reply and not reply.startswith("抱歉"):
             # 如果是简洁模式，截断过长的回复
@@ -393,85 +520,386 @@ async def process_message_with_ai(
 
             # ========== 保存到对话记忆 ==========
             if config.memory_enabled:
-                try:
-                    memory_manager = get_memory_manager()
-
-                    # 保存用户消息
-                    memory_manager.add_message(
-                        session_id=session_id,
-                        role="user",
-                        content=message,
-                        metadata={
-                            "user_id": user_id,
-                            "group_id": group_id,
-                            "context": context
-                        }
-                    )
-
-                    # 保存 AI 回复
-                    memory_manager.add_message(
-                        session_id=session_id,
-                        role="assistant",
-                        content=reply,
-                        metadata={
-                            "model": model,
-                            "selected_model": selected_model,
-                            "reply_mode": reply_mode
-                        }
-                    )
-
-                    logger.info(f"💾 已保存对话到记忆: session={session_id}")
-                except Exception as e:
-                    logger.error(f"❌ 保存对话记忆失败: {e}")
+                _save_conversation(
+                    trace, session_id, message, reply,
+                    user_metadata={
+                        "user_id": user_id,
+                        "group_id": group_id,
+                        "context": context
+                    },
+                    reply_metadata={
+                        "model": model,
+                        "selected_model": selected_model,
+                        "reply_mode": reply_mode
+                    }
+                )
 
+            if owns_trace:
+                finish_trace(trace)
             return reply
     except Exception as e:
         logger.error(f"❌ AI 调用失败: {e}")
 
+    if owns_trace:
+        finish_trace(trace)
+
     # 回退到简单回复
     return generate_fallback_reply(message)
 
 
-async def _call_openai_compatible(
+def _save_conversation(
+    trace: RequestTrace,
+    session_id: str,
     message: str,
-    user_id: str,
-    context: str,
-    group_id: Optional[str],
-    model_config: Dict[str, Any],
+    reply: str,
+    user_metadata: Dict[str, Any],
+    reply_metadata: Dict[str, Any]
+) -> None:
+    """
+    保存一轮对话到记忆
+
+    Args:
+        trace: 请求追踪
+        session_id: 会话 ID
+        message: 用户消息
+        reply: 回复
+        user_metadata: 用户消息元数据
+        reply_metadata: 回复元数据
+    """
+    try:
+        memory_manager = get_memory_manager()
+        save_start = time.perf_counter()
+
+        # 保存用户消息
+        memory_manager.add_message(
+            session_id=session_id,
+            role="user",
+            content=message,
+            metadata=user_metadata
+        )
+
+        # 保存 AI 回复
+        memory_manager.add_message(
+            session_id=session_id,
+            role="assistant",
+            content=reply,
+            metadata=reply_metadata
+        )
+
+        trace.record("memory_save", time.perf_counter() - save_start)
+        logger.info(f"💾 已保存对话到记忆: session={session_id}")
+    except Exception as e:
+        logger.error(f"❌ 保存对话记忆失败: {e}")
+
+
+async def _match_faq(message: str, group_id: str, config) -> Optional[str]:
+    """
+    在群组绑定的知识库的 FAQ 索引中查找标准答案
+
+    Args:
+        message: 用户消息
+        group_id: 群号
+        config: 全局配置
+
+    Returns:
+        str: 标准答案（没有命中则返回 None）
+    """
+    from .faq_index import get_faq_index
+    from .query_rewriter import needs_rewrite
+
+    kb_ids = config.get_group_kb_ids(group_id) if config.knowledge_base_enabled else []
+
+    # 依赖上文的追问不走 FAQ（答案取决于上一轮对话）
+    if not kb_ids or needs_rewrite(message):
+        return None
+
+    hit = await get_faq_index().match(kb_ids, message)
+    if hit is None:
+        return None
+
+    entry, similarity = hit
+    FAQ_ANSWERS.inc(kb_id=entry.kb_id)
+    logger.info(f"📌 FAQ 命中: {entry.question} (相似度: {similarity:.3f}, kb_id: {entry.kb_id})")
+
+    return entry.answer
+
+
+async def _run_stage(
+    trace: RequestTrace,
+    stage: str,
+    coro,
+    timeout: float,
+    default: Any = None
+) -> Any:
+    """
+    执行一个带超时的处理阶段，超时或失败时降级为默认值
+
+    Args:
+        trace: 请求追踪
+        stage: 阶段名称
+        coro: 阶段协程
+        timeout: 超时时间（秒，0 表示不限制）
+        default: 超时或失败时的返回值
+
+    Returns:
+        阶段结果（或默认值）
+    """
+    start = time.perf_counter()
+
+    try:
+        result = await asyncio.wait_for(coro, timeout=timeout if timeout > 0 else None)
+        trace.record(stage, time.perf_counter() - start)
+        return result if result is not None else default
+    except asyncio.TimeoutError:
+        trace.record(stage, time.perf_counter() - start, "timeout")
+        logger.warning(f"⚠️  {stage} 超时（{timeout}s），已降级跳过")
+        return default
+    except Exception as e:
+        trace.record(stage, time.perf_counter() - start, "error")
+        logger.error(f"❌ {stage} 失败: {e}")
+        return default
+
+
+async def _build_system_prompt_async(reply_mode: str) -> str:
+    """获取人设系统提示词（协程形式，便于与 I/O 阶段一起 gather）"""
+    return _get_persona_prompt(reply_mode)
+
+
+async def _load_conversation_history(session_id: str, config) -> list:
+    """
+    加载对话记忆（在线程池中读取文件，避免阻塞事件循环）
+
+    Args:
+        session_id: 会话 ID
+        config: 全局配置
+
+    Returns:
+        list: 对话上下文消息列表
+    """
+    if not config.memory_enabled:
+        return []
+
+    try:
+        # 获取记忆管理器
+        memory_manager = get_memory_manager()
+    except RuntimeError as e:
+        logger.warning(f"⚠️  记忆管理器未初始化: {e}")
+        return []
+
+    conversation_history = await run_in_thread(
+        memory_manager.get_conversation_context,
+        session_id,
+        max_tokens=config.memory_max_context_tokens
+    )
+
+    logger.info(f"📚 已加载对话记忆: session={session_id}, messages={len(conversation_history)}")
+
+    return conversation_history
+
+
+async def _rewrite_query_with_llm(
+    provider: str,
     selected_model: str,
-    api_key: str,
-    reply_mode: str = "normal",
-    conversation_history: Optional[list] = None,
-    kb_context: Optional[str] = None
+    api_key: Optional[str],
+    query: str,
+    history: List[Dict[str, Any]]
 ) -> str:
     """
-    调用 OpenAI 兼容的 API（智谱/DeepSeek/硅基流动/Moonshot/OhMyGPT）
+    调用模型改写检索查询
+
+    Args:
+        provider: 供应商
+        selected_model: 模型
+        api_key: API Key
+        query: 最新消息
+        history: 对话历史
+
+    Returns:
+        str: 模型输出
+    """
+    from .query_rewriter import build_rewrite_messages
+
+    return await _request_provider(provider, selected_model, api_key, build_rewrite_messages(query, history))
+
+
+async def _rewrite_kb_query(
+    message: str,
+    session_id: str,
+    user_id: Optional[str],
+    config,
+    llm_rewrite=None
+) -> str:
+    """
+    根据最近的对话改写检索查询（补全追问中的指代）
 
     Args:
         message: 用户消息
-        user_id: 用户 ID
-        context: 上下文
-        group_id: 群组 ID
+        session_id: 会话 ID
+        user_id: 用户 QQ 号
+        config: 全局配置
+        llm_rewrite: LLM 改写函数（QUERY_REWRITE_MODE=llm 时使用）
+
+    Returns:
+        str: 检索查询
+    """
+    from .query_rewriter import get_query_rewriter, needs_rewrite
+
+    rewriter = get_query_rewriter()
+    if rewriter.mode == "off" or not config.memory_enabled or not needs_rewrite(message):
+        return message
+
+    try:
+        memory_manager = get_memory_manager()
+    except RuntimeError:
+        return message
+
+    history = await run_in_thread(
+        memory_manager.get_conversation_history,
+        session_id,
+        limit=config.query_rewrite_history
+    )
+
+    with span("query_rewrite"):
+        return await rewriter.rewrite(session_id, message, history, user_id=user_id, llm=llm_rewrite)
+
+
+async def _retrieve_kb_context(
+    message: str,
+    group_id: Optional[str],
+    config,
+    session_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    llm_rewrite=None
+) -> Optional[str]:
+    """
+    检索群组配置的知识库
+
+    Args:
+        message: 用户消息
+        group_id: 群号
+        config: 全局配置
+        session_id: 会话 ID（提供时根据对话记忆改写追问）
+        user_id: 用户 QQ 号
+        llm_rewrite: LLM 改写函数（可选）
+
+    Returns:
+        str: 知识库上下文（未配置或无结果则返回 None）
+    """
+    if not (config.knowledge_base_enabled and KNOWLEDGE_BASE_AVAILABLE):
+        return None
+
+    # 获取群组的知识库 ID（可绑定多个，联合检索）
+    kb_ids = config.get_group_kb_ids(group_id) if group_id else []
+
+    if not kb_ids:
+        logger.debug("ℹ️  未配置知识库，跳过检索")
+        return None
+
+    kb_id = ",".join(kb_ids)
+
+    # 获取群组的 top_k 配置
+    top_k = config.get_group_kb_top_k(group_id)
+
+    # 追问补全指代（"那它掉落什么？" -> "泰拉棱镜掉落什么？"）
+    query = message
+    if session_id:
+        try:
+            query = await _rewrite_kb_query(message, session_id, user_id, config, llm_rewrite)
+        except Exception as e:
+            logger.warning(f"⚠️  查询改写失败，使用原消息检索: {e}")
+
+    logger.info(f"🔍 正在检索知识库: {kb_id}, top_k={top_k}")
+
+    # 从知识库检索
+    kb_context = await retrieve_from_knowledge_base(
+        query=query,
+        kb_id=kb_ids[0],
+        top_k=top_k,
+        use_cache=True,
+        max_tokens=config.kb_context_max_tokens,
+        kb_ids=kb_ids
+    )
+
+    if kb_context:
+        logger.info(f"✅ 知识库检索成功，上下文长度: {len(kb_context)}")
+    else:
+        logger.info(f"ℹ️  知识库检索无结果: {kb_id}")
+
+    return kb_context
+
+
+def _provider_key(model_config: Dict[str, Any]) -> str:
+    """
+    根据模型配置反查供应商标识（用于指标标签）
+
+    Args:
         model_config: 模型配置
-        selected_model: 选中的模型
-        api_key: API Key
-        reply_mode: 回复模式（normal/concise/detailed）
-        conversation_history: 对话历史（记忆）
-        kb_context: 知识库上下文（可选）
+
+    Returns:
+        str: 供应商标识（例如 deepseek）
     """
+    for provider, provider_config in MODEL_CONFIGS.items():
+        if provider_config is model_config or provider_config["api_url"] == model_config.get("api_url"):
+            return provider
+    return model_config.get("name", "unknown")
+
+
+def _record_llm_call(
+    provider: str,
+    model_name: str,
+    duration: float,
+    status: str = "ok",
+    error_code: Optional[Any] = None,
+    usage: Optional[Dict] = None
+) -> None:
+    """
+    记录一次模型调用（运行指标 + 模型路由统计）
 
-    url = model_config["api_url"]
+    Args:
+        provider: 供应商
+        model_name: 模型
+        duration: 耗时（秒）
+        status: 状态（ok/error/timeout）
+        error_code: 错误码
+        usage: 供应商返回的 usage 字段
+    """
+    _record_llm_metrics(provider, model_name, duration, status=status, error_code=error_code, usage=usage)
+    get_model_router().observe(provider, model_name, duration, success=status == "ok")
 
-    # 系统提示词
-    system_prompt = _build_system_prompt(user_id, context, group_id, reply_mode)
 
-    # 构建消息列表（包含对话历史）
+def _build_chat_messages(
+    message: str,
+    system_prompt: str,
+    conversation_history: Optional[list] = None,
+    kb_context: Optional[str] = None,
+    environment_prompt: Optional[str] = None
+) -> list:
+    """
+    构建发送给模型的消息列表
+
+    顺序为：人设 → 对话历史 → 当前环境 → 用户消息。人设和对话历史在同一会话内保持不变，
+    随用户变化的环境说明放在末尾，供应商侧的提示词缓存可以复用前面的前缀。
+
+    Args:
+        message: 用户消息
+        system_prompt: 系统提示词（人设）
+        conversation_history: 对话历史（记忆）
+        kb_context: 知识库上下文（可选）
+        environment_prompt: 当前环境说明（可选）
+
+    Returns:
+        list: 消息列表
+    """
     messages = [{"role": "system", "content": system_prompt}]
 
     # 添加对话历史
     if conversation_history:
         messages.extend(conversation_history)
 
+    # 添加当前环境（用户/群信息）
+    if environment_prompt:
+        messages.append({"role": "system", "content": environment_prompt})
+
     # 添加知识库上下文（如果有）
     if kb_context:
         # 将知识库上下文添加到用户消息之前
@@ -480,6 +908,30 @@ async def _call_openai_compatible(
     else:
         messages.append({"role": "user", "content": message})
 
+    return messages
+
+
+async def _request_openai_compatible(
+    provider: str,
+    selected_model: str,
+    api_key: str,
+    messages: list
+) -> str:
+    """
+    请求 OpenAI 兼容的 API（失败时抛出 ProviderError）
+
+    Args:
+        provider: 供应商
+        selected_model: 模型
+        api_key: API Key
+        messages: 消息列表
+
+    Returns:
+        str: 回复
+    """
+    model_config = MODEL_CONFIGS[provider]
+    url = model_config["api_url"]
+
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -492,60 +944,238 @@ async def _call_openai_compatible(
         "max_tokens": 1000
     }
 
+    start = time.perf_counter()
+
     try:
         async with httpx.AsyncClient(timeout=30.0) as client:
             response = await client.post(url, headers=headers, json=data)
-
-            if response.status_code == 200:
-                result = response.json()
-                reply = result["choices"][0]["message"]["content"]
-                logger.info(f"✅ {model_config['name']} 回复成功: {reply[:50]}...")
-                return reply
-            else:
-                try:
-                    error_data = response.json()
-                    if isinstance(error_data, dict):
-                        error_code = error_data.get("error", {}).get("code", "unknown") if isinstance(error_data.get("error"), dict) else "unknown"
-                        error_msg = error_data.get("error", {}).get("message", response.text) if isinstance(error_data.get("error"), dict) else str(error_data)
-                    else:
-                        error_code = "unknown"
-                        error_msg = str(error_data)
-                except Exception:
-                    error_code = "unknown"
-                    error_msg = response.text
-
-                logger.error(f"❌ {model_config['name']} API 错误: {response.status_code} - {error_msg}")
-
-                # 根据错误类型返回不同提示
-                if error_code == "1113" or "余额不足" in error_msg:
-                    return f"抱歉，{model_config['name']} 余额不足，请充值后使用。\n\n" + generate_fallback_reply(message)
-                elif response.status_code == 401:
-                    return f"抱歉，{model_config['name']} API Key 无效，请检查配置。\n\n" + generate_fallback_reply(message)
-                else:
-                    return f"抱歉，{model_config['name']} 服务暂时不可用（错误: {response.status_code}）\n\n" + generate_fallback_reply(message)
-
     except httpx.TimeoutException:
         logger.error(f"❌ {model_config['name']} API 超时")
-        return f"抱歉，{model_config['name']} 响应超时，请稍后再试。\n\n" + generate_fallback_reply(message)
-
+        _record_llm_call(provider, selected_model, time.perf_counter() - start, status="timeout", error_code="timeout")
+        raise ProviderError(provider, "timeout", code="timeout")
     except Exception as e:
         logger.error(f"❌ {model_config['name']} API 异常: {e}")
+        _record_llm_call(provider, selected_model, time.perf_counter() - start, status="error", error_code=type(e).__name__)
+        raise ProviderError(provider, str(e), code=type(e).__name__)
+
+    if response.status_code == 200:
+        try:
+            result = response.json()
+            reply = result["choices"][0]["message"]["content"]
+        except Exception as e:
+            logger.error(f"❌ {model_config['name']} API 响应解析失败: {e}")
+            _record_llm_call(provider, selected_model, time.perf_counter() - start, status="error", error_code="bad_response")
+            raise ProviderError(provider, str(e), code="bad_response")
+
+        logger.info(f"✅ {model_config['name']} 回复成功: {reply[:50]}...")
+
+        usage = result.get("usage")
+        cached_tokens = extract_cached_tokens(usage)
+        if cached_tokens:
+            logger.info(f"💾 提示词缓存命中: {cached_tokens}/{usage.get('prompt_tokens', '?')} tokens")
+
+        _record_llm_call(
+            provider, selected_model, time.perf_counter() - start,
+            usage=usage
+        )
+        return reply
+
+    try:
+        error_data = response.json()
+        if isinstance(error_data, dict):
+            error_code = error_data.get("error", {}).get("code", "unknown") if isinstance(error_data.get("error"), dict) else "unknown"
+            error_msg = error_data.get("error", {}).get("message", response.text) if isinstance(error_data.get("error"), dict) else str(error_data)
+        else:
+            error_code = "unknown"
+            error_msg = str(error_data)
+    except Exception:
+        error_code = "unknown"
+        error_msg = response.text
+
+    logger.error(f"❌ {model_config['name']} API 错误: {response.status_code} - {error_msg}")
+    _record_llm_call(
+        provider, selected_model, time.perf_counter() - start,
+        status="error",
+        error_code=error_code if error_code != "unknown" else response.status_code
+    )
+
+    raise ProviderError(provider, error_msg, status_code=response.status_code, code=str(error_code))
+
+
+async def _request_ollama(selected_model: str, messages: list) -> str:
+    """
+    请求 Ollama 本地模型（失败时抛出 ProviderError）
+
+    Args:
+        selected_model: 模型
+        messages: 消息列表
+
+    Returns:
+        str: 回复
+    """
+    url = MODEL_CONFIGS["ollama"]["api_url"]
+
+    data = {
+        "model": selected_model,
+        "messages": messages,
+        "stream": False
+    }
+
+    start = time.perf_counter()
+
+    try:
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            response = await client.post(url, json=data)
+    except httpx.ConnectError:
+        logger.error("❌ 无法连接到 Ollama，请确保 Ollama 正在运行")
+        _record_llm_call("ollama", selected_model, time.perf_counter() - start, status="error", error_code="connect_error")
+        raise ProviderError("ollama", "connect_error", code="connect_error")
+    except Exception as e:
+        logger.error(f"❌ Ollama 异常: {e}")
+        _record_llm_call("ollama", selected_model, time.perf_counter() - start, status="error", error_code=type(e).__name__)
+        raise ProviderError("ollama", str(e), code=type(e).__name__)
+
+    if response.status_code == 200:
+        result = response.json()
+        reply = result["message"]["content"]
+        logger.info(f"✅ Ollama 回复成功: {reply[:50]}...")
+        # Ollama 的 token 统计字段与 OpenAI 不同
+        _record_llm_call(
+            "ollama", selected_model, time.perf_counter() - start,
+            usage={
+                "prompt_tokens": result.get("prompt_eval_count"),
+                "completion_tokens": result.get("eval_count")
+            }
+        )
+        return reply
+
+    logger.error(f"❌ Ollama 错误: {response.status_code}")
+    _record_llm_call(
+        "ollama", selected_model, time.perf_counter() - start,
+        status="error", error_code=response.status_code
+    )
+    raise ProviderError("ollama", response.text, status_code=response.status_code)
+
+
+async def _request_provider(
+    provider: str,
+    selected_model: str,
+    api_key: Optional[str],
+    messages: list
+) -> str:
+    """
+    请求指定供应商（失败时抛出 ProviderError）
+
+    Args:
+        provider: 供应商
+        selected_model: 模型
+        api_key: API Key（Ollama 不需要）
+        messages: 消息列表
+
+    Returns:
+        str: 回复
+    """
+    if provider == "ollama":
+        return await _request_ollama(selected_model, messages)
+    return await _request_openai_compatible(provider, selected_model, api_key, messages)
+
+
+def _provider_error_reply(error: ProviderError, message: str) -> str:
+    """
+    将供应商错误转换为给用户的提示（附带备用回复）
+
+    Args:
+        error: 供应商错误
+        message: 用户消息
+
+    Returns:
+        str: 提示文本
+    """
+    name = MODEL_CONFIGS.get(error.provider, {}).get("name", error.provider)
+
+    if error.provider == "ollama":
+        if error.code == "connect_error":
+            return f"抱歉，无法连接到 Ollama 本地模型。\n请确保已安装并运行 Ollama：ollama serve\n\n" + generate_fallback_reply(message)
+        if error.status_code is not None:
+            return f"抱歉，Ollama 本地模型响应失败。\n\n" + generate_fallback_reply(message)
+        return f"抱歉，发生了错误。\n\n" + generate_fallback_reply(message)
+
+    if error.code == "timeout":
+        return f"抱歉，{name} 响应超时，请稍后再试。\n\n" + generate_fallback_reply(message)
+    if error.status_code is None:
         return f"抱歉，发生了错误。\n\n" + generate_fallback_reply(message)
 
+    # 根据错误类型返回不同提示
+    if error.insufficient_balance:
+        return f"抱歉，{name} 余额不足，请充值后使用。\n\n" + generate_fallback_reply(message)
+    elif error.status_code == 401:
+        return f"抱歉，{name} API Key 无效，请检查配置。\n\n" + generate_fallback_reply(message)
+    else:
+        return f"抱歉，{name} 服务暂时不可用（错误: {error.status_code}）\n\n" + generate_fallback_reply(message)
 
-async def _call_ollama(
+
+async def _call_with_failover(
+    message: str,
+    user_id: str,
+    context: str,
+    group_id: Optional[str],
+    model: str,
+    selected_model: str,
+    api_key: Optional[str],
+    system_prompt: str,
+    conversation_history: Optional[list] = None,
+    kb_context: Optional[str] = None
+) -> str:
+    """
+    按故障转移链调用模型（熔断 + 可选对冲请求）
+
+    Args:
+        message: 用户消息
+        user_id: 用户 ID
+        context: 上下文
+        group_id: 群组 ID
+        model: 首选供应商
+        selected_model: 首选模型
+        api_key: 首选供应商的 API Key
+        system_prompt: 系统提示词
+        conversation_history: 对话历史（记忆）
+        kb_context: 知识库上下文（可选）
+
+    Returns:
+        str: AI 的回复（全部失败时返回错误提示）
+    """
+    from config import config
+
+    messages = _build_chat_messages(
+        message, system_prompt, conversation_history, kb_context,
+        environment_prompt=_build_environment_prompt(user_id, context, group_id)
+    )
+
+    async def request(provider: str, model_name: str) -> str:
+        provider_key = api_key if provider == model else config.get_api_key(provider)
+        return await _request_provider(provider, model_name, provider_key, messages)
+
+    try:
+        return await get_provider_pool().call(model, selected_model, request)
+    except ProviderError as e:
+        return _provider_error_reply(e, message)
+
+
+async def _call_openai_compatible(
     message: str,
     user_id: str,
     context: str,
     group_id: Optional[str],
     model_config: Dict[str, Any],
     selected_model: str,
+    api_key: str,
     reply_mode: str = "normal",
     conversation_history: Optional[list] = None,
-    kb_context: Optional[str] = None
+    kb_context: Optional[str] = None,
+    system_prompt: Optional[str] = None
 ) -> str:
     """
-    调用 Ollama 本地模型
+    调用 OpenAI 兼容的 API（智谱/DeepSeek/硅基流动/Moonshot/OhMyGPT）
 
     Args:
         message: 用户消息
@@ -554,57 +1184,71 @@ async def _call_ollama(
         group_id: 群组 ID
         model_config: 模型配置
         selected_model: 选中的模型
+        api_key: API Key
         reply_mode: 回复模式（normal/concise/detailed）
         conversation_history: 对话历史（记忆）
         kb_context: 知识库上下文（可选）
+        system_prompt: 预先构建的人设系统提示词（可选，未提供则按回复模式获取）
     """
 
-    url = model_config["api_url"]
-
-    # 系统提示词
-    system_prompt = _build_system_prompt(user_id, context, group_id, reply_mode)
+    # 系统提示词（人设）
+    if system_prompt is None:
+        system_prompt = _get_persona_prompt(reply_mode)
 
     # 构建消息列表（包含对话历史）
-    messages = [{"role": "system", "content": system_prompt}]
+    messages = _build_chat_messages(
+        message, system_prompt, conversation_history, kb_context,
+        environment_prompt=_build_environment_prompt(user_id, context, group_id)
+    )
 
-    # 添加对话历史
-    if conversation_history:
-        messages.extend(conversation_history)
+    try:
+        return await _request_openai_compatible(_provider_key(model_config), selected_model, api_key, messages)
+    except ProviderError as e:
+        return _provider_error_reply(e, message)
 
-    # 添加知识库上下文（如果有）
-    if kb_context:
-        # 将知识库上下文添加到用户消息之前
-        enhanced_message = f"参考以下信息来回答用户的问题：\n\n{kb_context}\n\n用户的问题：{message}"
-        messages.append({"role": "user", "content": enhanced_message})
-    else:
-        messages.append({"role": "user", "content": message})
 
-    data = {
-        "model": selected_model,
-        "messages": messages,
-        "stream": False
-    }
+async def _call_ollama(
+    message: str,
+    user_id: str,
+    context: str,
+    group_id: Optional[str],
+    model_config: Dict[str, Any],
+    selected_model: str,
+    reply_mode: str = "normal",
+    conversation_history: Optional[list] = None,
+    kb_context: Optional[str] = None,
+    system_prompt: Optional[str] = None
+) -> str:
+    """
+    调用 Ollama 本地模型
 
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, json=data)
+    Args:
+        message: 用户消息
+        user_id: 用户 ID
+        context: 上下文
+        group_id: 群组 ID
+        model_config: 模型配置
+        selected_model: 选中的模型
+        reply_mode: 回复模式（normal/concise/detailed）
+        conversation_history: 对话历史（记忆）
+        kb_context: 知识库上下文（可选）
+        system_prompt: 预先构建的人设系统提示词（可选，未提供则按回复模式获取）
+    """
 
-            if response.status_code == 200:
-                result = response.json()
-                reply = result["message"]["content"]
-                logger.info(f"✅ Ollama 回复成功: {reply[:50]}...")
-                return reply
-            else:
-                logger.error(f"❌ Ollama 错误: {response.status_code}")
-                return f"抱歉，Ollama 本地模型响应失败。\n\n" + generate_fallback_reply(message)
+    # 系统提示词（人设）
+    if system_prompt is None:
+        system_prompt = _get_persona_prompt(reply_mode)
 
-    except httpx.ConnectError:
-        logger.error("❌ 无法连接到 Ollama，请确保 Ollama 正在运行")
-        return f"抱歉，无法连接到 Ollama 本地模型。\n请确保已安装并运行 Ollama：ollama serve\n\n" + generate_fallback_reply(message)
+    # 构建消息列表（包含对话历史）
+    messages = _build_chat_messages(
+        message, system_prompt, conversation_history, kb_context,
+        environment_prompt=_build_environment_prompt(user_id, context, group_id)
+    )
 
-    except Exception as e:
-        logger.error(f"❌ Ollama 异常: {e}")
-        return f"抱歉，发生了错误。\n\n" + generate_fallback_reply(message)
+    try:
+        return await _request_ollama(selected_model, messages)
+    except ProviderError as e:
+        return _provider_error_reply(e, message)
 
 
 def _build_system_prompt(
@@ -614,7 +1258,7 @@ def _build_system_prompt(
     reply_mode: str = "normal"
 ) -> str:
     """
-    构建系统提示词（星际少女风格）
+    构建完整的系统提示词（人设 + 当前环境，用于只支持单条系统提示词的场景，例如 Vision AI）
 
     Args:
         user_id: 用户 ID
@@ -625,19 +1269,57 @@ def _build_system_prompt(
     Returns:
         系统提示词
     """
+    # 人设在前、环境在后，保证前缀在不同用户之间一致
+    return f"{_get_persona_prompt(reply_mode)}\n\n{_build_environment_prompt(user_id, context, group_id)}"
+
+
+@functools.lru_cache(maxsize=None)
+def _get_persona_prompt(reply_mode: str = "normal") -> str:
+    """
+    获取人设系统提示词（按回复模式缓存，不含任何用户/群信息）
+
+    同一回复模式下所有请求的系统提示词逐字节相同，供应商侧的提示词缓存（上下文缓存）才能命中。
 
+    Args:
+        reply_mode: 回复模式（normal/concise/detailed）
+
+    Returns:
+        人设系统提示词
+    """
     # 根据回复模式选择不同的系统提示词
     if reply_mode == "concise":
-        return _build_concise_system_prompt(user_id, context, group_id)
+        return _build_concise_system_prompt()
     else:
-        return _build_normal_system_prompt(user_id, context, group_id)
+        return _build_normal_system_prompt()
+
 
+def _build_environment_prompt(user_id: str, context: str, group_id: Optional[str]) -> str:
+    """
+    构建当前环境说明（随用户/群变化，放在消息列表末尾，避免破坏可缓存的前缀）
+
+    Args:
+        user_id: 用户 ID
+        context: 上下文（qq_group/qq_private/qq_group_intelligent）
+        group_id: 群组 ID（如果是群聊）
 
-def _build_normal_system_prompt(user_id: str, context: str, group_id: Optional[str]) -> str:
+    Returns:
+        当前环境说明
+    """
+    lines = [
+        "【当前环境】",
+        f"- 平台: QQ {'群聊' if context == 'qq_group' else '私聊'}",
+        f"- 用户 ID: {user_id}"
+    ]
+    if group_id:
+        lines.append(f"- 群号: {group_id}")
+    return "\n".join(lines)
+
+
+def _build_normal_system_prompt() -> str:
     """
-    构建正常模式的系统提示词（星际少女风格）
+    构建正常模式的系统提示词（星际少女风格，不含用户/群信息）
     """
-    return f"""你是 星野（Hoshino），一位来自未来的星际少女 AI 助手！
+    return """你是 星野（Hoshino），一位来自未来的星际少女 AI 助手！
 
 【角色形象】（详细外貌）
 - 名字：星野（Hoshino）
@@ -712,11 +1394,6 @@ def _build_normal_system_prompt(user_id: str, context: str, group_id: Optional[s
   * "宇宙知识" - 分享有趣的知识
   * "乖巧陪伴" - 陪伴主人每一天
 
-【当前环境】
-- 平台: QQ {"群聊" if context == "qq_group" else "私聊"}
-- 用户 ID: {user_id}
-{f"- 群号: {group_id}" if group_id else ""}
-
 【回复原则】
 1. 保持温柔乖巧的语气
 2. 适当使用星空主题表情（1-3个，不过度）
@@ -805,11 +1482,11 @@ def _truncate_reply(reply: str, max_length: int) -> str:
     return truncated
 
 
-def _build_concise_system_prompt(user_id: str, context: str, group_id: Optional[str]) -> str:
+def _build_concise_system_prompt() -> str:
     """
-    构建简洁模式的系统提示词（星际少女风格 + 简洁回复）
+    构建简洁模式的系统提示词（星际少女风格 + 简洁回复，不含用户/群信息）
     """
-    return f"""你是 星野（Hoshino），一位来自未来的星际少女 AI 助手！
+    return """你是 星野（Hoshino），一位来自未来的星际少女 AI 助手！
 
 【基本身份】
 - 名字：星野（Hoshino）
@@ -839,11 +1516,6 @@ def _build_concise_system_prompt(user_id: str, context: str, group_id: Optional[
 问：怎么用 Git？
 答：`git add .` 然后 `git commit -m "msg"` 最后 `git push`
 
-【当前环境】
-- 平台: QQ {"群聊" if context == "qq_group" else "私聊"}
-- 用户 ID: {user_id}
-{f"- 群号: {group_id}" if group_id else ""}
-
 【简洁模式】
 现在处于简洁回复模式，请简短高效地回答问题。
 
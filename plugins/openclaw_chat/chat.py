@@ -21,6 +21,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspa
 from config import config
 from .ai_processor import process_message_with_ai
 from .intelligent_trigger import create_trigger_from_config, IntelligentTrigger
+from .tracing import start_trace, finish_trace, span
+from .metrics import MESSAGES_RECEIVED, TRIGGERS_FIRED
 
 
 # 创建消息处理器（响应 @机器人）
@@ -39,6 +41,8 @@ async def handle_chat(bot: Bot, event: Event):
     """
     处理 @机器人 的消息
     """
+    MESSAGES_RECEIVED.inc(handler="handle_chat")
+    trace = start_trace("handle_chat")
     try:
         # 获取消息内容
         message = str(event.get_message()).strip()
@@ -61,14 +65,15 @@ async def handle_chat(bot: Bot, event: Event):
         
         # ========== 图片识别功能 ==========
         # 检测消息中是否有图片
-        from .image_processor import extract_image_from_message
-        from .vision_client import VisionAIClient
+        from .image_processor import extract_images_from_message
+        from .vision_client import get_vision_client
         
-        image_data = await extract_image_from_message(bot, event)
+        with span("image_extract"):
+            images = await extract_images_from_message(bot, event, max_images=config.vision_max_images)
         
-        if image_data and image_data.has_data():
+        if images:
             # 有图片，使用 Vision AI 识别
-            logger.info("📸 检测到图片，启动 Vision AI 识别...")
+            logger.info(f"📸 检测到 {len(images)} 张图片，启动 Vision AI 识别...")
 
             # 检查 Vision AI 是否启用
             if not config.vision_enabled:
@@ -96,18 +101,19 @@ async def handle_chat(bot: Bot, event: Event):
 
             logger.info(f"🎨 Vision AI 配置: {vision_provider} - {vision_model}")
 
-            # 创建 Vision AI 客户端
-            vision_client = VisionAIClient(
+            # 获取 Vision AI 客户端（按配置复用，共享连接池）
+            vision_client = get_vision_client(
                 api_key=vision_api_key,
                 provider=vision_provider,
                 base_url=config.vision_base_url or None
             )
 
             # 识别图片（明确要求用中文回复）
+            target = "这张图片" if len(images) == 1 else f"这 {len(images)} 张图片"
             if message:
-                prompt = f"请用中文识别这张图片，并结合用户的问题回答：{message}\n\n重要：请务必用中文回复，不要用英文。"
+                prompt = f"请用中文识别{target}，并结合用户的问题回答：{message}\n\n重要：请务必用中文回复，不要用英文。"
             else:
-                prompt = "请用中文描述这张图片的内容。\n\n重要：请务必用中文回复，不要用英文。"
+                prompt = f"请用中文描述{target}的内容。\n\n重要：请务必用中文回复，不要用英文。"
 
             logger.info(f"🎨 Vision AI 提示词: {prompt}")
 
@@ -124,15 +130,16 @@ async def handle_chat(bot: Bot, event: Event):
 
             logger.info(f"🎨 Vision AI 系统提示词: {system_prompt[:100]}...")
 
-            reply = await vision_client.recognize_image(
-                image_data=image_data,
+            reply = await vision_client.recognize_images(
+                images=images,
                 prompt=prompt,
                 model=vision_model,
                 system_prompt=system_prompt  # 传递系统提示词
             )
 
             # 发送回复
-            await chat.send(reply)
+            with span("send"):
+                await chat.send(reply)
             return
 
         # ========== 普通文本对话 ==========
@@ -151,11 +158,14 @@ async def handle_chat(bot: Bot, event: Event):
         )
         
         # 发送回复
-        await chat.send(reply)
+        with span("send"):
+            await chat.send(reply)
         
     except Exception as e:
         logger.error(f"处理消息失败: {e}")
         await chat.send("抱歉，处理消息时发生错误")
+    finally:
+        finish_trace(trace)
 
 
 @chat_cmd.handle()
@@ -163,6 +173,8 @@ async def handle_chat_cmd(bot: Bot, event: Event, args: Message = CommandArg()):
     """
     处理 /chat 命令
     """
+    MESSAGES_RECEIVED.inc(handler="handle_chat_cmd")
+    trace = start_trace("handle_chat_cmd")
     try:
         # 获取消息内容
         message = str(args).strip()
@@ -198,11 +210,14 @@ async def handle_chat_cmd(bot: Bot, event: Event, args: Message = CommandArg()):
         )
         
         # 发送回复
-        await chat_cmd.send(reply)
+        with span("send"):
+            await chat_cmd.send(reply)
         
     except Exception as e:
         logger.error(f"处理命令失败: {e}")
         await chat_cmd.send("抱歉，处理命令时发生错误")
+    finally:
+        finish_trace(trace)
 
 
 # 欢迎消息处理器
@@ -352,6 +367,84 @@ async def handle_status():
     await status_cmd.send(status_text)
 
 
+# 阶段耗时统计命令
+trace_stats_cmd = on_command("trace_stats", aliases={"耗时统计"}, priority=1, permission=SUPERUSER)
+
+
+@trace_stats_cmd.handle()
+async def handle_trace_stats():
+    """显示消息处理各阶段的耗时统计（仅超级管理员）"""
+    from .tracing import print_stage_stats
+
+    await trace_stats_cmd.send(print_stage_stats())
+
+
+# 事件循环阻塞监控命令
+loop_monitor_cmd = on_command("loop_monitor", aliases={"事件循环监控", "阻塞监控"}, priority=1, permission=SUPERUSER)
+
+
+@loop_monitor_cmd.handle()
+async def handle_loop_monitor(args: Message = CommandArg()):
+    """查看、开启或关闭事件循环阻塞监控（仅超级管理员）"""
+    from .loop_monitor import get_loop_monitor
+
+    monitor = get_loop_monitor()
+    action = args.extract_plain_text().strip().lower()
+
+    if action in ("on", "开启"):
+        monitor.start()
+        await loop_monitor_cmd.send(f"✅ 事件循环阻塞监控已开启（阈值 {monitor.threshold * 1000:.0f}ms）")
+    elif action in ("off", "关闭"):
+        if monitor.running:
+            await monitor.stop()
+        await loop_monitor_cmd.send("⏹️ 事件循环阻塞监控已关闭\n\n" + monitor.format_report())
+    elif action in ("reset", "重置"):
+        monitor.reset()
+        await loop_monitor_cmd.send("✅ 事件循环阻塞统计已清空")
+    elif action in ("", "status", "状态"):
+        await loop_monitor_cmd.send(monitor.format_report())
+    else:
+        await loop_monitor_cmd.send("💡 使用方法: /loop_monitor [on|off|status|reset]")
+
+
+# 模型路由状态命令
+route_status_cmd = on_command("route_status", aliases={"路由状态"}, priority=1, permission=SUPERUSER)
+
+
+@route_status_cmd.handle()
+async def handle_route_status():
+    """显示模型路由候选、实时延迟与最近的路由决策（仅超级管理员）"""
+    from .model_router import get_model_router
+
+    status = get_model_router().get_status()
+
+    lines = [
+        "🧭 模型路由状态",
+        "=" * 30,
+        f"路由：{'✅ 已启用' if config.model_router_enabled else '❌ 未启用'}",
+        "",
+        "【候选模型】"
+    ]
+
+    if not status["candidates"]:
+        lines.append("暂无可用候选（请检查 API Key 或 MODEL_ROUTER_CANDIDATES）")
+
+    for item in status["candidates"]:
+        latency = f"{item['ewma_latency']:.2f}s" if item["ewma_latency"] is not None else "N/A"
+        lines.append(
+            f"• {item['provider']}/{item['model']} [{item['tier']}] "
+            f"延迟 {latency}, 错误率 {item['error_rate']:.0%}, 已路由 {item['routed']} 次"
+        )
+
+    if status["recent"]:
+        lines.append("")
+        lines.append("【最近路由】")
+        for decision in status["recent"][-5:]:
+            lines.append(f"• {decision['provider']}/{decision['model']}（{decision['reason']}）")
+
+    await route_status_cmd.send("\n".join(lines))
+
+
 # 切换模型命令
 switch_model_cmd = on_command("switch", aliases={"切换模型"}, priority=1, permission=SUPERUSER)
 
@@ -450,6 +543,9 @@ async def handle_admin_help():
 
 【系统管理】
 • /status 或 /状态 - 查看系统状态
+• /trace_stats 或 /耗时统计 - 查看各阶段耗时统计
+• /route_status 或 /路由状态 - 查看模型路由状态
+• /loop_monitor 或 /事件循环监控 [on|off|reset] - 查看事件循环阻塞位置（可随时开关）
 • /restart 或 /重启 - 重启机器人
 
 【模型管理】
@@ -663,6 +759,7 @@ async def handle_intelligent_chat(bot: Bot, event: Event):
     """
     处理群消息的智能触发（自动检测疑问和求助）
     """
+    trace = None
     try:
         # 只处理群聊消息
         if not hasattr(event, "group_id"):
@@ -672,6 +769,8 @@ async def handle_intelligent_chat(bot: Bot, event: Event):
         message = str(event.get_message()).strip()
         user_id = event.get_user_id()
 
+        MESSAGES_RECEIVED.inc(handler="handle_intelligent_chat")
+
         # 过滤空消息和命令
         if not message or message.startswith(('/', '.', '。', '！', '!')):
             return
@@ -737,16 +836,22 @@ async def handle_intelligent_chat(bot: Bot, event: Event):
 
         # 记录日志
         logger.info(f"🎯 智能触发 (群: {group_id}, 用户: {user_id}): {message[:50]}")
+        # 按触发原因计数（不使用群号作为标签：群号数量不受限，且 /metrics 无需认证）
+        TRIGGERS_FIRED.inc(reason="mention" if has_at_bot else "keyword")
+
+        # 触发后才开始追踪（未触发的群消息不计入）
+        trace = start_trace("handle_intelligent_chat")
         
         # 检查是否有图片
-        from .image_processor import extract_image_from_message
-        from .vision_client import VisionAIClient
+        from .image_processor import extract_images_from_message
+        from .vision_client import get_vision_client
         
-        image_data = await extract_image_from_message(bot, event)
+        with span("image_extract"):
+            images = await extract_images_from_message(bot, event, max_images=config.vision_max_images)
         
-        if image_data and image_data.has_data():
+        if images:
             # 有图片，使用 Vision AI 识别
-            logger.info("📸 检测到图片，启动 Vision AI 识别...")
+            logger.info(f"📸 检测到 {len(images)} 张图片，启动 Vision AI 识别...")
 
             # 检查 Vision AI 是否启用
             if not config.vision_enabled:
@@ -770,17 +875,18 @@ async def handle_intelligent_chat(bot: Bot, event: Event):
 
             logger.info(f"🎨 Vision AI 配置: {vision_provider} - {vision_model}")
 
-            vision_client = VisionAIClient(
+            vision_client = get_vision_client(
                 api_key=vision_api_key,
                 provider=vision_provider,
                 base_url=config.vision_base_url or None
             )
 
             # 识别图片（明确要求用中文回复）
+            target = "这张图片" if len(images) == 1 else f"这 {len(images)} 张图片"
             if message:
-                prompt = f"请用中文识别这张图片，并结合用户的问题回答：{message}\n\n重要：请务必用中文回复，不要用英文。"
+                prompt = f"请用中文识别{target}，并结合用户的问题回答：{message}\n\n重要：请务必用中文回复，不要用英文。"
             else:
-                prompt = "请用中文描述这张图片的内容。\n\n重要：请务必用中文回复，不要用英文。"
+                prompt = f"请用中文描述{target}的内容。\n\n重要：请务必用中文回复，不要用英文。"
 
             logger.info(f"🎨 Vision AI 提示词: {prompt}")
 
@@ -797,14 +903,15 @@ async def handle_intelligent_chat(bot: Bot, event: Event):
 
             logger.info(f"🎨 Vision AI 系统提示词: {system_prompt[:100]}...")
 
-            reply = await vision_client.recognize_image(
-                image_data=image_data,
+            reply = await vision_client.recognize_images(
+                images=images,
                 prompt=prompt,
                 model=vision_model,
                 system_prompt=system_prompt  # 传递系统提示词
             )
 
-            await intelligent_chat.send(reply)
+            with span("send"):
+                await intelligent_chat.send(reply)
             return
 
         # 普通文本对话
@@ -822,10 +929,14 @@ async def handle_intelligent_chat(bot: Bot, event: Event):
         )
         
         # 发送回复
-        await intelligent_chat.send(reply)
+        with span("send"):
+            await intelligent_chat.send(reply)
         
     except Exception as e:
         logger.error(f"智能触发处理失败: {e}")
+    finally:
+        if trace is not None:
+            finish_trace(trace)
 
 
 # ========== 智能触发管理命令 ==========
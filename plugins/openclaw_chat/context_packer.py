@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提示词上下文打包模块
+按 Token 预算组装知识库上下文和对话记忆，保证提示词长度可控（首 Token 延迟可预期）
+
+- 知识库：预算内按排名均分，超出的文本块只保留与问题最相关的句子，重复的来源 URL 合并到末尾
+- 对话记忆：总预算扣除人设、知识库、用户消息后，从最早的消息开始裁剪
+"""
+
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from nonebot.log import logger
+
+from .embeddings import HashingEmbeddingProvider
+
+
+MIN_CHUNK_TOKENS = 24  # 每个文本块至少保留的 Token 数（不足则丢弃排名靠后的文本块）
+
+# CJK 文字和全角标点约 1 Token/字，其他字符约 4 字符/Token
+_CJK_CHAR_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;\n]+[。！？!?；;]?")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本 Token 数
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: Token 数（估算）
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_CHAR_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    按 Token 预算截断文本
+
+    Args:
+        text: 文本
+        max_tokens: Token 预算
+
+    Returns:
+        str: 截断后的文本
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # 二分查找能放下的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) + 1 <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+
+    return text[:low] + "…"
+
+
+def compress_text(query: str, text: str, max_tokens: int) -> str:
+    """
+    压缩文本：只保留与问题最相关的句子（保持原文顺序）
+
+    Args:
+        query: 查询文本
+        text: 文本
+        max_tokens: Token 预算
+
+    Returns:
+        str: 压缩后的文本
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    sentences = [sentence.strip() for sentence in _SENTENCE_PATTERN.findall(text) if sentence.strip()]
+    query_tokens = set(HashingEmbeddingProvider.tokenize(query))
+
+    def overlap(index: int) -> int:
+        return len(query_tokens & set(HashingEmbeddingProvider.tokenize(sentences[index])))
+
+    # 相关度高的句子优先，相同时靠前的句子优先
+    ranked = sorted(range(len(sentences)), key=lambda i: (-overlap(i), i))
+
+    chosen = []
+    used = 0
+    for index in ranked:
+        tokens = estimate_tokens(sentences[index]) + 1
+        if used + tokens <= max_tokens:
+            chosen.append(index)
+            used += tokens
+
+    if not chosen:
+        return truncate_to_tokens(sentences[ranked[0]] if sentences else text, max_tokens)
+
+    # 原文顺序拼接，不相邻的句子之间用省略号
+    chosen.sort()
+    parts = [sentences[chosen[0]]]
+    for previous, index in zip(chosen, chosen[1:]):
+        parts.append(sentences[index] if index == previous + 1 else "…" + sentences[index])
+
+    return "".join(parts)
+
+
+def _allocate(sizes: List[int], budget: int) -> List[int]:
+    """
+    均分预算：需要少的文本块按需分配，剩余预算由其他文本块均分
+
+    Args:
+        sizes: 每个文本块需要的 Token 数
+        budget: 总预算
+
+    Returns:
+        List[int]: 每个文本块分到的 Token 数
+    """
+    allocation = [0] * len(sizes)
+    remaining = budget
+
+    for position, index in enumerate(sorted(range(len(sizes)), key=sizes.__getitem__)):
+        share = remaining // (len(sizes) - position)
+        allocation[index] = min(sizes[index], share)
+        remaining -= allocation[index]
+
+    return allocation
+
+
+def _result_source(result: Dict[str, Any]) -> str:
+    """检索结果的来源"""
+    return (result.get("metadata") or {}).get("source") or "N/A"
+
+
+def _format_sources(sources: "OrderedDict[str, List[int]]") -> str:
+    """来源列表（同一来源的多个文本块合并为一行）"""
+    lines = ["来源:"]
+    for source, numbers in sources.items():
+        lines.append("".join(f"[{number}]" for number in numbers) + f" {source}")
+    return "\n".join(lines)
+
+
+def pack_kb_context(query: str, results: List[Dict[str, Any]], max_tokens: int = 0) -> str:
+    """
+    将检索结果打包为知识库上下文
+
+    Args:
+        query: 查询文本
+        results: 检索结果（按相关性排序）
+        max_tokens: Token 预算（0 表示不限制）
+
+    Returns:
+        str: 知识库上下文
+    """
+    results = [result for result in results if result.get("text", "").strip()]
+    if not results:
+        return ""
+
+    while True:
+        sources: "OrderedDict[str, List[int]]" = OrderedDict()
+        for number, result in enumerate(results, 1):
+            sources.setdefault(_result_source(result), []).append(number)
+
+        footer = _format_sources(sources)
+        texts = [result["text"].strip() for result in results]
+
+        if max_tokens <= 0:
+            break
+
+        # 预算扣除编号和来源列表
+        overhead = estimate_tokens(footer) + sum(estimate_tokens(f"【{n}】\n") for n in range(1, len(results) + 1))
+        budget = max_tokens - overhead
+
+        # 平均每块不足最小值时，丢弃排名最后的文本块
+        if len(results) > 1 and budget < MIN_CHUNK_TOKENS * len(results):
+            results = results[:-1]
+            continue
+
+        allocation = _allocate([estimate_tokens(text) for text in texts], max(budget, MIN_CHUNK_TOKENS))
+        texts = [compress_text(query, text, tokens) for text, tokens in zip(texts, allocation)]
+        break
+
+    blocks = [f"【{number}】{text}" for number, text in enumerate(texts, 1)]
+    context = "\n\n".join(blocks) + "\n\n" + footer
+
+    logger.debug(f"📦 知识库上下文: {len(results)} 个文本块，约 {estimate_tokens(context)} Token")
+
+    return context
+
+
+def fit_history_to_budget(
+    history: List[Dict[str, str]],
+    max_tokens: int,
+    reserved: Optional[List[str]] = None
+) -> List[Dict[str, str]]:
+    """
+    裁剪对话记忆，使整个提示词不超过总预算（从最早的消息开始丢弃）
+
+    Args:
+        history: 对话记忆（从旧到新）
+        max_tokens: 提示词总预算（0 表示不限制）
+        reserved: 必须保留的其他提示词（人设、知识库、环境说明、用户消息）
+
+    Returns:
+        List[Dict[str, str]]: 裁剪后的对话记忆
+    """
+    if max_tokens <= 0 or not history:
+        return history
+
+    budget = max_tokens - sum(estimate_tokens(text) for text in (reserved or []) if text)
+
+    kept: List[Dict[str, str]] = []
+    used = 0
+    for message in reversed(history):
+        tokens = estimate_tokens(message.get("content", "")) + 4  # 每条消息的角色标记约 4 Token
+        if used + tokens > budget:
+            break
+        kept.insert(0, message)
+        used += tokens
+
+    # 保持 user / assistant 成对，不以助手消息开头
+    while kept and kept[0].get("role") == "assistant":
+        kept.pop(0)
+
+    if len(kept) < len(history):
+        logger.info(f"✂️  提示词超出预算，对话记忆裁剪: {len(history)} -> {len(kept)} 条")
+
+    return kept
@@ -12,6 +12,8 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
 from pathlib import Path
 from nonebot.log import logger
+from .tracing import span
+from .metrics import MEMORY_FLUSH_LATENCY
 
 
 class ConversationMemory:
@@ -66,6 +68,17 @@ class ConversationMemory:
             content: 消息内容
             metadata: 元数据（可选）
         """
+        with span("memory_add"):
+            self._add_message(session_id, role, content, metadata)
+
+    def _add_message(
+        self,
+        session_id: str,
+        role: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """添加消息到对话记忆（add_message 的实现）"""
         timestamp = time.time()
 
         # 创建消息对象
@@ -138,6 +151,15 @@ class ConversationMemory:
         Returns:
             上下文消息列表（只包含 role 和 content）
         """
+        with span("memory_get_context"):
+            return self._get_conversation_context(session_id, max_tokens)
+
+    def _get_conversation_context(
+        self,
+        session_id: str,
+        max_tokens: int = 2000
+    ) -> List[Dict[str, str]]:
+        """获取对话上下文（get_conversation_context 的实现）"""
         history = self.get_conversation_history(session_id)
 
         # 按时间排序（从旧到新）
@@ -231,6 +253,7 @@ class ConversationMemory:
             message: 消息对象
         """
         long_term_file = self.memory_dir / f"{session_id}.json"
+        flush_start = time.perf_counter()
 
         # 读取现有历史
         if long_term_file.exists():
@@ -253,6 +276,8 @@ class ConversationMemory:
         except Exception as e:
             logger.error(f"❌ 保存长期记忆失败: {e}")
 
+        MEMORY_FLUSH_LATENCY.observe(time.perf_counter() - flush_start)
+
     def _load_from_long_term_memory(self, session_id: str) -> List[Dict[str, Any]]:
         """
         从长期记忆加载对话历史
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化嵌入缓存模块
+以 (模型 ID, sha256(文本)) 为键保存文本向量，构建/重建知识库时跳过已嵌入过的文本块
+
+每个模型对应三个文件：
+- <model>.vectors：向量数组（float16/float32，按行追加，读取时内存映射）
+- <model>.keys：与向量行一一对应的 32 字节 sha256 摘要
+- <model>.meta.json：模型 ID、维度、数据类型
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from nonebot.log import logger
+
+
+DIGEST_SIZE = 32
+
+
+def text_digest(text: str) -> bytes:
+    """计算文本摘要"""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class PersistentEmbeddingCache:
+    """内存映射的持久化嵌入缓存（只追加写入）"""
+
+    def __init__(self, cache_dir: str, model_id: str, dimension: int, dtype: str = "float16"):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            model_id: 模型 ID（不同模型的向量分开保存）
+            dimension: 向量维度
+            dtype: 存储类型（float16 体积减半，float32 无精度损失）
+        """
+        self.cache_dir = cache_dir
+        self.model_id = model_id
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_id)
+        base = os.path.join(cache_dir, safe_name)
+        self.vectors_file = f"{base}.vectors"
+        self.keys_file = f"{base}.keys"
+        self.meta_file = f"{base}.meta.json"
+
+        # 摘要 → 行号
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        """加载摘要索引（元数据不匹配时清空重建）"""
+        meta = {"model_id": self.model_id, "dimension": self.dimension, "dtype": self.dtype.name}
+
+        if os.path.exists(self.meta_file):
+            try:
+                with open(self.meta_file, "r", encoding="utf-8") as f:
+                    stored_meta = json.load(f)
+            except Exception:
+                stored_meta = None
+
+            if stored_meta != meta:
+                logger.warning(f"⚠️  嵌入缓存元数据不匹配，重建缓存: {self.model_id}")
+                self._reset_files()
+        else:
+            self._reset_files()
+
+        with open(self.meta_file, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        if not os.path.exists(self.keys_file):
+            return
+
+        with open(self.keys_file, "rb") as f:
+            keys = f.read()
+
+        row_size = self.dimension * self.dtype.itemsize
+        vector_rows = os.path.getsize(self.vectors_file) // row_size if os.path.exists(self.vectors_file) else 0
+
+        # 意外中断时两个文件的行数可能不一致，只保留完整的行
+        rows = min(len(keys) // DIGEST_SIZE, vector_rows)
+        for row in range(rows):
+            self._index[keys[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE]] = row
+        self._rows = rows
+
+        self._truncate(rows)
+
+        logger.info(f"✅ 已加载嵌入缓存: {self.model_id} ({rows} 条)")
+
+    def _reset_files(self) -> None:
+        """删除缓存文件"""
+        for path in (self.vectors_file, self.keys_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _truncate(self, rows: int) -> None:
+        """截断到完整的行数"""
+        for path, row_size in ((self.keys_file, DIGEST_SIZE), (self.vectors_file, self.dimension * self.dtype.itemsize)):
+            if os.path.exists(path) and os.path.getsize(path) != rows * row_size:
+                with open(path, "r+b") as f:
+                    f.truncate(rows * row_size)
+
+    def _get_vectors(self) -> np.memmap:
+        """获取向量数组的内存映射（追加写入后重新映射）"""
+        if self._vectors is None or self._vectors.shape[0] != self._rows:
+            self._vectors = np.memmap(self.vectors_file, dtype=self.dtype, mode="r", shape=(self._rows, self.dimension))
+        return self._vectors
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        批量查找向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            List[Optional[List[float]]]: 向量列表（未缓存的位置为 None）
+        """
+        digests = [text_digest(text) for text in texts]
+
+        with self._lock:
+            rows = [self._index.get(digest) for digest in digests]
+            hit_rows = [row for row in rows if row is not None]
+            vectors = self._get_vectors()[hit_rows].astype(np.float32) if hit_rows else None
+
+        results: List[Optional[List[float]]] = []
+        hit_index = 0
+        for row in rows:
+            if row is None:
+                results.append(None)
+            else:
+                results.append(vectors[hit_index].tolist())
+                hit_index += 1
+
+        self._stats["hits"] += len(hit_rows)
+        self._stats["misses"] += len(rows) - len(hit_rows)
+
+        return results
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]) -> int:
+        """
+        批量写入向量（已存在的文本跳过）
+
+        Args:
+            texts: 文本列表
+            vectors: 向量列表
+
+        Returns:
+            int: 新写入的条数
+        """
+        with self._lock:
+            new_digests = []
+            new_vectors = []
+            seen = set()
+            for text, vector in zip(texts, vectors):
+                digest = text_digest(text)
+                if digest in self._index or digest in seen:
+                    continue
+                seen.add(digest)
+                new_digests.append(digest)
+                new_vectors.append(vector)
+
+            if not new_digests:
+                return 0
+
+            matrix = np.asarray(new_vectors, dtype=self.dtype)
+            if matrix.shape[1] != self.dimension:
+                raise ValueError(f"向量维度不匹配: {matrix.shape[1]} != {self.dimension}")
+
+            # 先写向量再写摘要，中断时加载会丢弃不完整的行
+            with open(self.vectors_file, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self.keys_file, "ab") as f:
+                f.write(b"".join(new_digests))
+
+            for digest in new_digests:
+                self._index[digest] = self._rows
+                self._rows += 1
+
+            return len(new_digests)
+
+    def get_or_embed(self, texts: List[str], embed: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """
+        获取向量（只对未缓存的文本调用嵌入函数）
+
+        Args:
+            texts: 文本列表
+            embed: 嵌入函数
+
+        Returns:
+            List[List[float]]: 向量列表
+        """
+        results = self.get_many(texts)
+        missing = [index for index, vector in enumerate(results) if vector is None]
+
+        if missing:
+            missing_texts = list(dict.fromkeys(texts[index] for index in missing))
+            embedded = dict(zip(missing_texts, embed(missing_texts)))
+            self.put_many(missing_texts, [embedded[text] for text in missing_texts])
+            for index in missing:
+                results[index] = [float(value) for value in embedded[texts[index]]]
+
+        logger.debug(f"💾 嵌入缓存: 命中 {len(texts) - len(missing)} / {len(texts)}")
+
+        return results
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        获取缓存统计
+
+        Returns:
+            Dict[str, int]: 条目数、命中、未命中、文件大小
+        """
+        size = os.path.getsize(self.vectors_file) if os.path.exists(self.vectors_file) else 0
+        return {
+            "entries": self._rows,
+            "hits": self._stats["hits"],
+            "misses": self._stats["misses"],
+            "bytes": size
+        }
+
+
+# (缓存目录, 模型 ID) → 缓存
+_caches: Dict[tuple, PersistentEmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_persistent_embedding_cache(model_id: str, dimension: int) -> Optional[PersistentEmbeddingCache]:
+    """
+    获取模型的持久化嵌入缓存（EMBEDDING_CACHE_DIR 为空时返回 None）
+
+    Args:
+        model_id: 模型 ID
+        dimension: 向量维度
+
+    Returns:
+        PersistentEmbeddingCache: 嵌入缓存
+    """
+    from config import config
+
+    if not config.embedding_cache_dir:
+        return None
+
+    key = (config.embedding_cache_dir, model_id)
+
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None or cache.dimension != dimension:
+            cache = PersistentEmbeddingCache(
+                cache_dir=config.embedding_cache_dir,
+                model_id=model_id,
+                dimension=dimension,
+                dtype=config.embedding_cache_dtype
+            )
+            _caches[key] = cache
+
+    return cache
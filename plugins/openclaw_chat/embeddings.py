@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文本嵌入模块
+提供可替换的嵌入后端（ONNX Runtime 本地模型 / 特征哈希），
+以及嵌入 LRU 缓存和并发查询的动态批处理
+"""
+
+import abc
+import asyncio
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from nonebot.log import logger
+
+from .tracing import run_in_thread
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+# ONNX 模型文件候选（优先使用 int8 量化模型）
+ONNX_MODEL_FILES = (
+    "model_quantized.onnx",
+    "model_int8.onnx",
+    "onnx/model_quantized.onnx",
+    "onnx/model_int8.onnx",
+    "model.onnx",
+    "onnx/model.onnx",
+)
+
+# 特征哈希分词：CJK 字符取单字和相邻双字，其他取单词
+_CJK_PATTERN = re.compile(r"[\u4e00-\u9fff\u3400-\u4dbf]+")
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class EmbeddingProvider(abc.ABC):
+    """嵌入后端接口"""
+
+    name = "base"
+    dimension = 0
+
+    @property
+    def model_id(self) -> str:
+        """模型 ID（用于区分不同模型的持久化嵌入缓存）"""
+        return self.name
+
+    @abc.abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        计算文本嵌入（同步，CPU 密集，调用方负责放到线程池）
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            List[List[float]]: 归一化后的向量列表
+        """
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2 归一化（矩阵按行，一维数组按整个向量；零向量保持为零）
+
+    Args:
+        vectors: 向量或矩阵
+
+    Returns:
+        np.ndarray: 归一化后的向量或矩阵
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """特征哈希嵌入（无需模型文件，适合测试、基准和无法安装 ONNX Runtime 的环境）"""
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = 384):
+        """
+        初始化
+
+        Args:
+            dimension: 向量维度
+        """
+        self.dimension = dimension
+
+    @property
+    def model_id(self) -> str:
+        return f"hashing-{self.dimension}"
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """分词：CJK 单字 + 双字，其他为小写单词"""
+        text = text.lower()
+        tokens = []
+
+        for run in _CJK_PATTERN.findall(text):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+        tokens.extend(_WORD_PATTERN.findall(text))
+
+        return tokens
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """计算特征哈希向量"""
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            for token in self.tokenize(text):
+                # crc32 跨进程稳定（内置 hash() 会随机加盐）
+                value = zlib.crc32(token.encode("utf-8"))
+                matrix[row, value % self.dimension] += 1.0 if value & 0x80000000 else -1.0
+
+        return normalize(matrix).tolist()
+
+
+class OnnxEmbeddingProvider(EmbeddingProvider):
+    """ONNX Runtime 本地嵌入模型（CPU 推理，支持 int8 量化模型）"""
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str, threads: int = 0, max_length: int = 256):
+        """
+        初始化（模型在第一次使用时加载）
+
+        Args:
+            model_dir: 模型目录（包含 *.onnx 和 tokenizer.json）
+            threads: 推理线程数（intra-op，0 表示由 ONNX Runtime 自动决定）
+            max_length: 最大 token 数（超出截断）
+        """
+        if not ONNX_AVAILABLE:
+            raise ImportError(
+                "ONNX Runtime 未安装，请安装：pip install onnxruntime tokenizers\n"
+                "或使用 EMBEDDING_BACKEND=chroma（Chroma 默认嵌入）"
+            )
+
+        self.model_dir = model_dir
+        self.threads = threads
+        self.max_length = max_length
+        self.dimension = 0
+
+        self._session = None
+        self._tokenizer = None
+        self._input_names: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        return f"onnx-{os.path.basename(os.path.normpath(self.model_dir))}"
+
+    def _find_model_file(self) -> str:
+        """查找模型文件（优先量化模型）"""
+        for filename in ONNX_MODEL_FILES:
+            path = os.path.join(self.model_dir, filename)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f"未找到 ONNX 模型文件: {self.model_dir}")
+
+    def _load(self) -> None:
+        """加载模型和分词器"""
+        with self._lock:
+            if self._session is not None:
+                return
+
+            model_file = self._find_model_file()
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            options.inter_op_num_threads = 1
+            if self.threads > 0:
+                options.intra_op_num_threads = self.threads
+
+            session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.enable_padding()
+
+            self._input_names = [model_input.name for model_input in session.get_inputs()]
+            self._tokenizer = tokenizer
+            self._session = session
+
+            logger.info(f"✅ ONNX 嵌入模型已加载: {model_file} (线程: {self.threads or 'auto'})")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """计算嵌入（均值池化 + L2 归一化）"""
+        if not texts:
+            return []
+
+        if self._session is None:
+            self._load()
+
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        output = self._session.run(None, {name: feeds[name] for name in self._input_names if name in feeds})[0]
+
+        if output.ndim == 3:
+            # last_hidden_state → 按 attention mask 均值池化
+            mask = attention_mask[:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        self.dimension = output.shape[1]
+
+        return normalize(output.astype(np.float32)).tolist()
+
+
+def quantize_onnx_model(model_file: str, output_file: str) -> str:
+    """
+    将 ONNX 模型动态量化为 int8（CPU 推理更快、模型更小）
+
+    Args:
+        model_file: 原始模型文件
+        output_file: 量化后的模型文件
+
+    Returns:
+        str: 量化后的模型文件
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(model_file, output_file, weight_type=QuantType.QInt8)
+    logger.info(f"✅ 模型已量化: {model_file} → {output_file}")
+
+    return output_file
+
+
+class CachedEmbeddingProvider(EmbeddingProvider):
+    """带 LRU 缓存的嵌入后端（相同文本只计算一次）"""
+
+    def __init__(self, provider: EmbeddingProvider, max_size: int = 2048):
+        """
+        初始化
+
+        Args:
+            provider: 实际的嵌入后端
+            max_size: 缓存条目数上限
+        """
+        self.provider = provider
+        self.max_size = max_size
+        self.name = provider.name
+
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @property
+    def dimension(self) -> int:
+        return self.provider.dimension
+
+    @property
+    def model_id(self) -> str:
+        return self.provider.model_id
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """计算嵌入（只计算未缓存的文本，批内重复文本只计算一次）"""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for index, text in enumerate(texts):
+                vector = self._cache.get(text)
+                if vector is not None:
+                    self._cache.move_to_end(text)
+                    results[index] = vector
+                    self._stats["hits"] += 1
+                else:
+                    missing.setdefault(text, []).append(index)
+                    self._stats["misses"] += 1
+
+        if missing:
+            missing_texts = list(missing)
+            vectors = self.provider.embed(missing_texts)
+
+            with self._lock:
+                for text, vector in zip(missing_texts, vectors):
+                    for index in missing[text]:
+                        results[index] = vector
+                    self._cache[text] = vector
+                    self._cache.move_to_end(text)
+
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+
+        return results
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            Dict[str, Any]: 条目数、命中、未命中、命中率
+        """
+        total = self._stats["hits"] + self._stats["misses"]
+        return {
+            "size": len(self._cache),
+            "hits": self._stats["hits"],
+            "misses": self._stats["misses"],
+            "hit_rate": self._stats["hits"] / total if total else 0.0
+        }
+
+
+class EmbeddingBatcher:
+    """查询嵌入动态批处理：短时间窗口内的并发查询合并为一次推理"""
+
+    def __init__(self, provider: EmbeddingProvider, max_batch_size: int = 32, max_wait: float = 0.005):
+        """
+        初始化
+
+        Args:
+            provider: 嵌入后端
+            max_batch_size: 单批最大文本数（攒满立即执行）
+            max_wait: 最长等待时间（秒，第一条请求到达后开始计时）
+        """
+        self.provider = provider
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending: List[Tuple[str, "asyncio.Future[List[float]]"]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._stats = {"batches": 0, "texts": 0}
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        计算单条查询的嵌入（与同一时间窗口内的其他查询合并推理）
+
+        Args:
+            text: 查询文本
+
+        Returns:
+            List[float]: 向量
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """取出待处理的查询并提交推理"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[str, "asyncio.Future[List[float]]"]]) -> None:
+        """在线程池中执行一批推理"""
+        self._stats["batches"] += 1
+        self._stats["texts"] += len(batch)
+
+        try:
+            vectors = await run_in_thread(self.provider.embed, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取批处理统计
+
+        Returns:
+            Dict[str, Any]: 批次数、文本数、平均批大小
+        """
+        batches = self._stats["batches"]
+        return {
+            "batches": batches,
+            "texts": self._stats["texts"],
+            "avg_batch_size": self._stats["texts"] / batches if batches else 0.0
+        }
+
+
+class ChromaEmbeddingFunction:
+    """将嵌入后端适配为 Chroma 的 embedding_function"""
+
+    def __init__(self, provider: EmbeddingProvider):
+        self.provider = provider
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self.provider.embed(list(input))
+
+    def embed_documents(self, input: List[str]) -> List[List[float]]:
+        return self(input)
+
+    def embed_query(self, input: List[str]) -> List[List[float]]:
+        return self(input)
+
+    def name(self) -> str:
+        return f"openclaw_{self.provider.name}"
+
+
+def create_embedding_provider(
+    backend: str,
+    model_dir: str = "",
+    threads: int = 0,
+    cache_size: int = 2048
+) -> Optional[EmbeddingProvider]:
+    """
+    按配置创建嵌入后端
+
+    Args:
+        backend: chroma（使用 Chroma 默认嵌入）/ onnx / hashing
+        model_dir: ONNX 模型目录
+        threads: 推理线程数
+        cache_size: 嵌入缓存条目数（0 表示不缓存）
+
+    Returns:
+        EmbeddingProvider: 嵌入后端（chroma 时返回 None）
+    """
+    if backend == "onnx":
+        provider: EmbeddingProvider = OnnxEmbeddingProvider(model_dir=model_dir, threads=threads)
+    elif backend == "hashing":
+        provider = HashingEmbeddingProvider()
+    else:
+        return None
+
+    if cache_size > 0:
+        provider = CachedEmbeddingProvider(provider, max_size=cache_size)
+
+    return provider
+
+
+_embedding_provider: Optional[EmbeddingProvider] = None
+_embedding_batcher: Optional[EmbeddingBatcher] = None
+_embedding_initialized = False
+
+
+def get_embedding_provider() -> Optional[EmbeddingProvider]:
+    """
+    获取全局嵌入后端（EMBEDDING_BACKEND=chroma 或创建失败时返回 None，使用 Chroma 默认嵌入）
+
+    Returns:
+        EmbeddingProvider: 嵌入后端
+    """
+    global _embedding_provider, _embedding_initialized
+
+    if not _embedding_initialized:
+        from config import config
+
+        _embedding_initialized = True
+        try:
+            _embedding_provider = create_embedding_provider(
+                backend=config.embedding_backend,
+                model_dir=config.embedding_model_dir,
+                threads=config.embedding_threads,
+                cache_size=config.embedding_cache_size
+            )
+        except Exception as e:
+            logger.error(f"❌ 嵌入后端初始化失败，使用 Chroma 默认嵌入: {e}")
+            _embedding_provider = None
+
+    return _embedding_provider
+
+
+def get_embedding_batcher() -> Optional[EmbeddingBatcher]:
+    """
+    获取全局查询嵌入批处理器（未配置嵌入后端时返回 None）
+
+    Returns:
+        EmbeddingBatcher: 批处理器
+    """
+    global _embedding_batcher
+
+    provider = get_embedding_provider()
+    if provider is None:
+        return None
+
+    if _embedding_batcher is None:
+        from config import config
+
+        _embedding_batcher = EmbeddingBatcher(
+            provider,
+            max_batch_size=config.embedding_batch_size,
+            max_wait=config.embedding_batch_wait_ms / 1000
+        )
+
+    return _embedding_batcher
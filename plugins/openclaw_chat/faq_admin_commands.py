@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FAQ 管理员命令
+生成、审核和编辑 FAQ 问答对
+"""
+
+from nonebot import on_command
+from nonebot.adapters.onebot.v11 import Message
+from nonebot.params import CommandArg
+from nonebot.rule import to_me
+from nonebot.permission import SUPERUSER
+from nonebot.log import logger
+from nonebot.exception import FinishedException
+
+# 导入配置
+from config import config
+
+from .faq_index import get_faq_index, load_group_sessions, refresh_faq_index
+from .tracing import run_in_thread
+
+
+def _format_entry(entry, max_answer_chars: int = 60) -> str:
+    """问答对摘要"""
+    status_icon = "✅" if entry.status == "approved" else "⏳"
+    answer = entry.answer if len(entry.answer) <= max_answer_chars else entry.answer[:max_answer_chars] + "…"
+    return (
+        f"{status_icon} [{entry.faq_id}] {entry.question}\n"
+        f"   来源: {entry.source} | 出现: {entry.frequency} | 命中: {entry.hits}\n"
+        f"   答案: {answer}"
+    )
+
+
+# ========== 命令：生成 / 刷新 FAQ（仅超级管理员） ==========
+
+faq_refresh = on_command(
+    "faq_refresh",
+    aliases={"刷新FAQ", "faq刷新"},
+    priority=5,
+    block=True,
+    rule=to_me(),
+    permission=SUPERUSER
+)
+
+
+@faq_refresh.handle()
+async def handle_faq_refresh(args: Message = CommandArg()):
+    """从知识库文本块和对话记录生成 FAQ 问答对"""
+    kb_id = args.extract_plain_text().strip()
+
+    if not kb_id:
+        await faq_refresh.finish("⚠️  请提供知识库 ID\n\n💡 使用方法: /faq_refresh <知识库ID>")
+
+    from .ai_processor import init_knowledge_base, get_knowledge_base
+
+    init_knowledge_base(kb_dir=config.knowledge_base_dir)
+    kb_manager, vdb_manager, _ = get_knowledge_base()
+
+    if kb_manager is None or vdb_manager is None:
+        await faq_refresh.finish("⚠️  知识库功能未启用或初始化失败")
+
+    try:
+        if not kb_manager.exists(kb_id):
+            await faq_refresh.finish(f"⚠️  知识库不存在: {kb_id}")
+
+        await faq_refresh.send(f"⏳ 正在生成 FAQ: {kb_id}\n\n请稍候...")
+
+        def refresh():
+            # 只挖掘绑定了该知识库的群的对话记录
+            sessions = load_group_sessions(config.memory_dir, lambda group_id: kb_id in config.get_group_kb_ids(group_id))
+            return refresh_faq_index(
+                get_faq_index(), kb_id,
+                chunks=vdb_manager.iter_chunks(kb_id),
+                sessions=sessions,
+                min_count=config.faq_min_count,
+                max_answer_tokens=config.faq_answer_max_tokens,
+                auto_approve=config.faq_auto_approve
+            )
+
+        stats = await run_in_thread(refresh)
+        pending = len(get_faq_index().list_entries(kb_id, status="pending"))
+
+        await faq_refresh.finish(
+            f"✅ FAQ 已更新: {kb_id}\n\n"
+            f"• 新增: {stats['added']}\n"
+            f"• 更新: {stats['updated']}\n"
+            f"• 未变化: {stats['unchanged']}\n"
+            f"• 待审核: {pending}\n\n"
+            f"💡 使用 /faq_list {kb_id} pending 查看待审核的问答对"
+        )
+
+    except FinishedException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ 生成 FAQ 失败: {e}")
+        await faq_refresh.finish(f"❌ 生成 FAQ 失败: {e}")
+
+
+# ========== 命令：查看 FAQ（仅超级管理员） ==========
+
+faq_list = on_command(
+    "faq_list",
+    aliases={"FAQ列表", "faq列表"},
+    priority=5,
+    block=True,
+    permission=SUPERUSER
+)
+
+
+@faq_list.handle()
+async def handle_faq_list(args: Message = CommandArg()):
+    """查看 FAQ 问答对"""
+    parts = args.extract_plain_text().strip().split()
+
+    if not parts:
+        await faq_list.finish("⚠️  请提供知识库 ID\n\n💡 使用方法: /faq_list <知识库ID> [pending|approved]")
+
+    kb_id = parts[0]
+    status = parts[1] if len(parts) > 1 else None
+
+    try:
+        entries = await run_in_thread(get_faq_index().list_entries, kb_id, status)
+
+        if not entries:
+            await faq_list.finish(f"📋 没有问答对: {kb_id}\n\n💡 使用 /faq_refresh {kb_id} 生成")
+
+        reply_lines = [f"📋 FAQ 列表: {kb_id}（共 {len(entries)} 条，显示前 20 条）\n"]
+        reply_lines.extend(_format_entry(entry) for entry in entries[:20])
+
+        await faq_list.finish("\n".join(reply_lines))
+
+    except FinishedException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ 查看 FAQ 失败: {e}")
+        await faq_list.finish(f"❌ 查看 FAQ 失败: {e}")
+
+
+# ========== 命令：审核 FAQ（仅超级管理员） ==========
+
+faq_approve = on_command(
+    "faq_approve",
+    aliases={"审核FAQ", "faq通过"},
+    priority=5,
+    block=True,
+    permission=SUPERUSER
+)
+
+
+@faq_approve.handle()
+async def handle_faq_approve(args: Message = CommandArg()):
+    """审核通过问答对（可一次提供多个 ID）"""
+    faq_ids = args.extract_plain_text().strip().split()
+
+    if not faq_ids:
+        await faq_approve.finish("⚠️  请提供问答对 ID\n\n💡 使用方法: /faq_approve <ID> [ID...]")
+
+    try:
+        approved = []
+        for faq_id in faq_ids:
+            entry = await run_in_thread(get_faq_index().update_entry, faq_id, status="approved")
+            if entry is not None:
+                approved.append(entry.question)
+
+        missing = len(faq_ids) - len(approved)
+        await faq_approve.finish(
+            f"✅ 已审核通过 {len(approved)} 条" + (f"，{missing} 条不存在" if missing else "")
+        )
+
+    except FinishedException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ 审核 FAQ 失败: {e}")
+        await faq_approve.finish(f"❌ 审核 FAQ 失败: {e}")
+
+
+faq_reject = on_command(
+    "faq_reject",
+    aliases={"停用FAQ", "faq停用"},
+    priority=5,
+    block=True,
+    permission=SUPERUSER
+)
+
+
+@faq_reject.handle()
+async def handle_faq_reject(args: Message = CommandArg()):
+    """停用问答对（恢复为待审核，不再直接回复）"""
+    faq_id = args.extract_plain_text().strip()
+
+    if not faq_id:
+        await faq_reject.finish("⚠️  请提供问答对 ID\n\n💡 使用方法: /faq_reject <ID>")
+
+    try:
+        entry = await run_in_thread(get_faq_index().update_entry, faq_id, status="pending")
+
+        if entry is None:
+            await faq_reject.finish(f"⚠️  问答对不存在: {faq_id}")
+
+        await faq_reject.finish(f"✅ 已停用: {entry.question}")
+
+    except FinishedException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ 停用 FAQ 失败: {e}")
+        await faq_reject.finish(f"❌ 停用 FAQ 失败: {e}")
+
+
+# ========== 命令：编辑 FAQ 答案（仅超级管理员） ==========
+
+faq_edit = on_command(
+    "faq_edit",
+    aliases={"编辑FAQ", "faq编辑"},
+    priority=5,
+    block=True,
+    permission=SUPERUSER
+)
+
+
+@faq_edit.handle()
+async def handle_faq_edit(args: Message = CommandArg()):
+    """编辑问答对的答案（编辑后直接生效，刷新时保留）"""
+    parts = args.extract_plain_text().strip().split(maxsplit=1)
+
+    if len(parts) < 2:
+        await faq_edit.finish("⚠️  参数不正确\n\n💡 使用方法: /faq_edit <ID> <新答案>")
+
+    faq_id, answer = parts
+
+    try:
+        entry = await run_in_thread(get_faq_index().update_entry, faq_id, answer=answer.strip())
+
+        if entry is None:
+            await faq_edit.finish(f"⚠️  问答对不存在: {faq_id}")
+
+        await faq_edit.finish(f"✅ 答案已更新并生效\n\n{_format_entry(entry)}")
+
+    except FinishedException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ 编辑 FAQ 失败: {e}")
+        await faq_edit.finish(f"❌ 编辑 FAQ 失败: {e}")
@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FAQ 答案索引
+游戏知识库的大部分提问集中在几百个常见问题上。FAQ 索引离线生成问答对并保存问题向量，
+新消息与某个已审核的问题足够相似时直接返回标准答案，不再检索知识库、调用模型。
+
+问答对来源：
+- kb：知识库文本块（每个页面的首个文本块作为"X 是什么"的答案）
+- log：对话记忆中反复出现的问题（近似重复的问题合并计数，取最近一次的回复作为答案）
+- manual：管理员编辑过的答案（刷新时保留）
+
+只有审核通过（approved）的问答对会直接回复；刷新时答案发生变化的问答对重新进入待审核状态。
+
+每个知识库对应两个文件：{kb_id}.json（问答对 + 嵌入模型标识）和 {kb_id}.npy（归一化的问题向量）。
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from nonebot.log import logger
+
+from .context_packer import compress_text
+from .embeddings import EmbeddingProvider, HashingEmbeddingProvider, normalize
+from .near_dedup import NearDuplicateIndex, minhash
+from .tracing import run_in_thread
+
+
+FAQ_STATUSES = ("pending", "approved")
+
+_QUESTION_PATTERN = re.compile(r"[？?]|什么|怎么|如何|哪里|哪儿|哪个|多少|为什么|吗$|呢$")
+_NORMALIZE_PATTERN = re.compile(r"[\W_]+")
+_TRAILING_PARTICLE_PATTERN = re.compile(r"(?:啊|呀|呢|吗|吧|哦)+$")
+
+
+def normalize_question(text: str) -> str:
+    """
+    规范化问题（去掉标点、空白和句末语气词，用于生成 ID 和合并相同问题）
+
+    Args:
+        text: 问题
+
+    Returns:
+        str: 规范化后的问题
+    """
+    return _TRAILING_PARTICLE_PATTERN.sub("", _NORMALIZE_PATTERN.sub("", text.lower()))
+
+
+def make_faq_id(kb_id: str, question: str) -> str:
+    """生成问答对 ID（同一知识库中相同的问题 ID 相同）"""
+    return hashlib.sha1(f"{kb_id}:{normalize_question(question)}".encode("utf-8")).hexdigest()[:10]
+
+
+@dataclass
+class FAQEntry:
+    """FAQ 问答对"""
+
+    faq_id: str  # 问答对 ID
+    kb_id: str  # 知识库 ID
+    question: str  # 标准问题
+    answer: str  # 标准答案
+    source: str = "manual"  # 来源（kb / log / manual）
+    status: str = "pending"  # 审核状态（pending / approved）
+    frequency: int = 0  # 对话记忆中出现的次数
+    hits: int = 0  # 直接回复的次数
+    updated_at: float = field(default_factory=time.time)  # 最后更新时间
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FAQEntry":
+        """从字典创建"""
+        return cls(**{key: value for key, value in data.items() if key in cls.__dataclass_fields__})
+
+
+# ========== 候选问答对 ==========
+
+def _chunk_metadata(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """文本块的页面元数据（兼容 DocumentChunk.to_dict 嵌套的 metadata）"""
+    metadata = chunk.get("metadata") or {}
+    return metadata.get("metadata") if isinstance(metadata.get("metadata"), dict) else metadata
+
+
+def candidates_from_chunks(kb_id: str, chunks: Iterable[Dict[str, Any]], max_answer_tokens: int = 200) -> List[FAQEntry]:
+    """
+    从知识库文本块生成候选问答对（每个页面取首个文本块）
+
+    Args:
+        kb_id: 知识库 ID
+        chunks: 文本块（chunk_id / text / metadata）
+        max_answer_tokens: 答案的 Token 上限
+
+    Returns:
+        List[FAQEntry]: 候选问答对
+    """
+    first_chunks: Dict[str, Tuple[int, str]] = {}
+
+    for chunk in chunks:
+        metadata = _chunk_metadata(chunk)
+        page_name = metadata.get("page_title") or metadata.get("page_name")
+        text = (chunk.get("text") or "").strip()
+        if not page_name or not text:
+            continue
+
+        index = metadata.get("chunk_index", 0)
+        if page_name not in first_chunks or index < first_chunks[page_name][0]:
+            first_chunks[page_name] = (index, text)
+
+    entries = []
+    for page_name, (_, text) in first_chunks.items():
+        question = f"{page_name}是什么"
+        entries.append(FAQEntry(
+            faq_id=make_faq_id(kb_id, question),
+            kb_id=kb_id,
+            question=question,
+            answer=compress_text(page_name, text, max_answer_tokens),
+            source="kb"
+        ))
+
+    return entries
+
+
+def _is_question(text: str) -> bool:
+    """判断消息是否像一个独立的问题"""
+    return 4 <= len(text) <= 80 and bool(_QUESTION_PATTERN.search(text))
+
+
+def mine_frequent_questions(
+    kb_id: str,
+    sessions: Iterable[List[Dict[str, Any]]],
+    min_count: int = 3,
+    similarity: float = 0.7
+) -> List[FAQEntry]:
+    """
+    从对话记录中挖掘高频问题（近似重复的问题合并计数）
+
+    Args:
+        kb_id: 知识库 ID
+        sessions: 会话消息列表（每个会话从旧到新）
+        min_count: 最少出现次数
+        similarity: 合并问题的 Jaccard 阈值
+
+    Returns:
+        List[FAQEntry]: 候选问答对（按出现次数降序）
+    """
+    index = NearDuplicateIndex(similarity)
+    clusters: List[Dict[str, Any]] = []
+
+    for messages in sessions:
+        for message, reply in zip(messages, messages[1:]):
+            if message.get("role") != "user" or reply.get("role") != "assistant":
+                continue
+
+            question = (message.get("content") or "").strip()
+            answer = (reply.get("content") or "").strip()
+            if not _is_question(question) or not answer or answer.startswith("抱歉"):
+                continue
+
+            position = len(clusters)
+            duplicate = index.add(position, minhash(normalize_question(question)))
+            if duplicate is None:
+                clusters.append({"variants": {}, "count": 0, "answer": answer, "timestamp": 0.0})
+                cluster = clusters[position]
+            else:
+                cluster = clusters[duplicate]
+
+            cluster["count"] += 1
+            cluster["variants"][question] = cluster["variants"].get(question, 0) + 1
+
+            timestamp = reply.get("timestamp", 0.0)
+            if timestamp >= cluster["timestamp"]:
+                cluster["answer"] = answer
+                cluster["timestamp"] = timestamp
+
+    entries = []
+    for cluster in clusters:
+        if cluster["count"] < min_count:
+            continue
+
+        # 出现次数最多的问法作为标准问题
+        question = max(cluster["variants"].items(), key=lambda item: item[1])[0]
+        entries.append(FAQEntry(
+            faq_id=make_faq_id(kb_id, question),
+            kb_id=kb_id,
+            question=question,
+            answer=cluster["answer"],
+            source="log",
+            frequency=cluster["count"]
+        ))
+
+    entries.sort(key=lambda entry: -entry.frequency)
+    return entries
+
+
+def load_group_sessions(memory_dir: str, group_filter: Callable[[str], bool]) -> List[List[Dict[str, Any]]]:
+    """
+    读取群聊的对话记录
+
+    Args:
+        memory_dir: 对话记忆目录
+        group_filter: 群号过滤（返回 True 的群参与挖掘）
+
+    Returns:
+        List[List[Dict[str, Any]]]: 会话消息列表
+    """
+    sessions = []
+
+    for path in sorted(Path(memory_dir).glob("group_*.json")):
+        group_id = path.stem[len("group_"):]
+        if not group_filter(group_id):
+            continue
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                messages = json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️  读取对话记录失败: {path}: {e}")
+            continue
+
+        sessions.append(sorted(messages, key=lambda message: message.get("timestamp", 0.0)))
+
+    return sessions
+
+
+# ========== 索引 ==========
+
+class FAQIndex:
+    """FAQ 答案索引"""
+
+    def __init__(
+        self,
+        directory: str = "data/faq",
+        embedding_provider: Optional[EmbeddingProvider] = None,
+        threshold: float = 0.9,
+        embedding_batcher=None
+    ):
+        """
+        初始化索引
+
+        Args:
+            directory: 索引目录
+            embedding_provider: 嵌入模型（默认使用本地哈希嵌入）
+            threshold: 直接回复的最低余弦相似度
+            embedding_batcher: 查询嵌入批处理器（可选，与 embedding_provider 对应）
+        """
+        self.directory = directory
+        self.provider = embedding_provider or HashingEmbeddingProvider()
+        self.threshold = threshold
+        self.embedding_batcher = embedding_batcher
+
+        # kb_id -> {"entries": List[FAQEntry], "embeddings": np.ndarray}
+        self._indexes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, kb_id: str) -> Tuple[str, str]:
+        """索引文件路径"""
+        safe_name = re.sub(r"[^\w\-]", "_", kb_id)
+        return os.path.join(self.directory, f"{safe_name}.json"), os.path.join(self.directory, f"{safe_name}.npy")
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """计算归一化的问题向量"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        return normalize(np.asarray(self.provider.embed(texts), dtype=np.float32))
+
+    def _load(self, kb_id: str) -> Dict[str, Any]:
+        """加载知识库的索引（嵌入模型变化或文件不完整时重新计算问题向量）"""
+        with self._lock:
+            if kb_id in self._indexes:
+                return self._indexes[kb_id]
+
+            entries_file, embeddings_file = self._paths(kb_id)
+            entries: List[FAQEntry] = []
+            embeddings = None
+            model_id = None
+
+            if os.path.exists(entries_file):
+                with open(entries_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                entries = [FAQEntry.from_dict(item) for item in data.get("entries", [])]
+                model_id = data.get("model_id")
+
+                if os.path.exists(embeddings_file):
+                    embeddings = np.load(embeddings_file)
+
+            index = {"entries": entries, "embeddings": embeddings}
+            self._indexes[kb_id] = index
+
+            if entries and (model_id != self.provider.model_id or embeddings is None or len(embeddings) != len(entries)):
+                logger.info(f"🔄 FAQ 问题向量需要重新计算: {kb_id}")
+                self._save(kb_id)
+
+            return index
+
+    def _save(self, kb_id: str) -> None:
+        """重新计算问题向量并保存索引（先写临时文件再替换）"""
+        with self._lock:
+            index = self._indexes[kb_id]
+            entries: List[FAQEntry] = index["entries"]
+            index["embeddings"] = self._embed([entry.question for entry in entries])
+
+            entries_file, embeddings_file = self._paths(kb_id)
+
+            with open(f"{embeddings_file}.tmp", "wb") as f:
+                np.save(f, index["embeddings"])
+            with open(f"{entries_file}.tmp", "w", encoding="utf-8") as f:
+                json.dump({
+                    "kb_id": kb_id,
+                    "model_id": self.provider.model_id,
+                    "entries": [entry.to_dict() for entry in entries]
+                }, f, ensure_ascii=False, indent=2)
+
+            os.replace(f"{embeddings_file}.tmp", embeddings_file)
+            os.replace(f"{entries_file}.tmp", entries_file)
+
+    def list_kb_ids(self) -> List[str]:
+        """已有索引的知识库 ID"""
+        kb_ids = set(self._indexes)
+        for path in Path(self.directory).glob("*.json"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    kb_ids.add(json.load(f).get("kb_id", path.stem))
+            except Exception:
+                continue
+        return sorted(kb_ids)
+
+    def list_entries(self, kb_id: str, status: Optional[str] = None) -> List[FAQEntry]:
+        """
+        列出问答对（按出现次数和命中次数降序）
+
+        Args:
+            kb_id: 知识库 ID
+            status: 只列出指定审核状态（None 表示全部）
+
+        Returns:
+            List[FAQEntry]: 问答对
+        """
+        entries = [entry for entry in self._load(kb_id)["entries"] if status is None or entry.status == status]
+        return sorted(entries, key=lambda entry: (-entry.frequency, -entry.hits, entry.question))
+
+    def find(self, faq_id: str) -> Optional[FAQEntry]:
+        """按 ID 查找问答对"""
+        for kb_id in self.list_kb_ids():
+            for entry in self._load(kb_id)["entries"]:
+                if entry.faq_id == faq_id:
+                    return entry
+        return None
+
+    def merge(self, kb_id: str, candidates: List[FAQEntry], auto_approve: bool = False) -> Dict[str, int]:
+        """
+        合并候选问答对（管理员编辑过的答案保留；答案变化的问答对重新待审核）
+
+        Args:
+            kb_id: 知识库 ID
+            candidates: 候选问答对
+            auto_approve: 新问答对是否直接审核通过
+
+        Returns:
+            Dict[str, int]: added / updated / unchanged 数量
+        """
+        stats = {"added": 0, "updated": 0, "unchanged": 0}
+
+        with self._lock:
+            index = self._load(kb_id)
+            existing = {entry.faq_id: entry for entry in index["entries"]}
+
+            for candidate in candidates:
+                entry = existing.get(candidate.faq_id)
+
+                if entry is None:
+                    candidate.status = "approved" if auto_approve else "pending"
+                    existing[candidate.faq_id] = candidate
+                    stats["added"] += 1
+                    continue
+
+                entry.frequency = max(entry.frequency, candidate.frequency)
+                if entry.source == "manual" or entry.answer == candidate.answer:
+                    stats["unchanged"] += 1
+                    continue
+
+                entry.answer = candidate.answer
+                entry.source = candidate.source
+                entry.status = "approved" if auto_approve else "pending"
+                entry.updated_at = time.time()
+                stats["updated"] += 1
+
+            index["entries"] = list(existing.values())
+            self._save(kb_id)
+
+        logger.info(f"✅ FAQ 索引已更新: {kb_id} (新增 {stats['added']}，更新 {stats['updated']})")
+        return stats
+
+    def update_entry(
+        self,
+        faq_id: str,
+        status: Optional[str] = None,
+        answer: Optional[str] = None
+    ) -> Optional[FAQEntry]:
+        """
+        修改问答对（编辑答案视为人工审核通过）
+
+        Args:
+            faq_id: 问答对 ID
+            status: 审核状态
+            answer: 新答案
+
+        Returns:
+            FAQEntry: 修改后的问答对（不存在时返回 None）
+        """
+        if status is not None and status not in FAQ_STATUSES:
+            raise ValueError(f"不支持的审核状态: {status}")
+
+        with self._lock:
+            entry = self.find(faq_id)
+            if entry is None:
+                return None
+
+            if answer is not None:
+                entry.answer = answer
+                entry.source = "manual"
+                entry.status = "approved"
+            if status is not None:
+                entry.status = status
+            entry.updated_at = time.time()
+
+            self._save(entry.kb_id)
+            return entry
+
+    def remove(self, faq_id: str) -> bool:
+        """
+        删除问答对
+
+        Args:
+            faq_id: 问答对 ID
+
+        Returns:
+            bool: 是否删除成功
+        """
+        with self._lock:
+            entry = self.find(faq_id)
+            if entry is None:
+                return False
+
+            index = self._load(entry.kb_id)
+            index["entries"] = [item for item in index["entries"] if item.faq_id != faq_id]
+            self._save(entry.kb_id)
+            return True
+
+    def match_embedding(self, kb_ids: List[str], embedding: List[float]) -> Optional[Tuple[FAQEntry, float]]:
+        """
+        查找与查询向量最相似的已审核问答对
+
+        Args:
+            kb_ids: 知识库 ID 列表
+            embedding: 查询向量
+
+        Returns:
+            Tuple[FAQEntry, float]: 问答对和相似度（低于阈值时返回 None）
+        """
+        query = normalize(np.asarray(embedding, dtype=np.float32))
+        if not query.any():
+            return None
+
+        best: Optional[Tuple[FAQEntry, float]] = None
+
+        for kb_id in kb_ids:
+            index = self._load(kb_id)
+            embeddings = index["embeddings"]
+            if embeddings is None or not len(embeddings) or embeddings.shape[1] != query.shape[0]:
+                continue
+
+            similarities = embeddings @ query
+            for row in np.argsort(-similarities):
+                if similarities[row] < self.threshold:
+                    break
+                entry = index["entries"][row]
+                if entry.status == "approved":
+                    if best is None or similarities[row] > best[1]:
+                        best = (entry, float(similarities[row]))
+                    break
+
+        return best
+
+    async def match(self, kb_ids: List[str], query: str) -> Optional[Tuple[FAQEntry, float]]:
+        """
+        查找与消息匹配的已审核问答对（命中时累计命中次数）
+
+        Args:
+            kb_ids: 知识库 ID 列表
+            query: 用户消息
+
+        Returns:
+            Tuple[FAQEntry, float]: 问答对和相似度（没有匹配时返回 None）
+        """
+        if self.embedding_batcher is not None:
+            embedding = await self.embedding_batcher.embed(query)
+        else:
+            embedding = (await run_in_thread(self.provider.embed, [query]))[0]
+
+        hit = await run_in_thread(self.match_embedding, kb_ids, embedding)
+        if hit is not None:
+            # 命中次数只在内存中累计，随下一次保存写入文件
+            hit[0].hits += 1
+
+        return hit
+
+
+def refresh_faq_index(
+    index: FAQIndex,
+    kb_id: str,
+    chunks: Iterable[Dict[str, Any]],
+    sessions: Iterable[List[Dict[str, Any]]],
+    min_count: int = 3,
+    max_answer_tokens: int = 200,
+    auto_approve: bool = False
+) -> Dict[str, int]:
+    """
+    从知识库文本块和对话记录重新生成候选问答对并合并到索引
+
+    Args:
+        index: FAQ 索引
+        kb_id: 知识库 ID
+        chunks: 知识库文本块
+        sessions: 绑定该知识库的群聊对话记录
+        min_count: 高频问题的最少出现次数
+        max_answer_tokens: 知识库答案的 Token 上限
+        auto_approve: 新问答对是否直接审核通过
+
+    Returns:
+        Dict[str, int]: added / updated / unchanged 数量
+    """
+    candidates = candidates_from_chunks(kb_id, chunks, max_answer_tokens)
+    candidates.extend(mine_frequent_questions(kb_id, sessions, min_count=min_count))
+    return index.merge(kb_id, candidates, auto_approve=auto_approve)
+
+
+# ========== 全局实例 ==========
+
+_faq_index: Optional[FAQIndex] = None
+
+
+def get_faq_index() -> FAQIndex:
+    """
+    获取全局 FAQ 索引（配置了嵌入后端时使用同一嵌入模型，否则使用本地哈希嵌入）
+
+    Returns:
+        FAQIndex: FAQ 索引
+    """
+    global _faq_index
+
+    if _faq_index is None:
+        from config import config
+        from .embeddings import get_embedding_provider, get_embedding_batcher
+
+        provider = get_embedding_provider()
+        _faq_index = FAQIndex(
+            directory=config.faq_dir,
+            embedding_provider=provider,
+            threshold=config.faq_threshold,
+            embedding_batcher=get_embedding_batcher() if provider is not None else None
+        )
+
+    return _faq_index
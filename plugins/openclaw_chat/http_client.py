@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享 HTTP 客户端模块
+提供进程内共享的 httpx 连接池，以及带内容寻址 LRU 缓存的图片下载器
+（流式下载、超出大小上限提前中止、同一 URL 的并发请求合并为一次下载）
+"""
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import httpx
+from nonebot.log import logger
+
+
+# 连接池配置
+DEFAULT_TIMEOUT = 30.0
+POOL_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    获取共享的 httpx 客户端（复用连接池，避免每次请求都重新建立 TCP/TLS 连接）
+
+    客户端绑定到创建时的事件循环，事件循环变化时（例如测试中）会重新创建。
+
+    Returns:
+        httpx.AsyncClient: 共享客户端
+    """
+    global _client, _client_loop
+
+    loop = asyncio.get_running_loop()
+
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=POOL_LIMITS, follow_redirects=True)
+        _client_loop = loop
+
+    return _client
+
+
+async def close_http_client() -> None:
+    """关闭共享的 httpx 客户端（驱动器关闭时调用）"""
+    global _client, _client_loop
+
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+
+    _client = None
+    _client_loop = None
+
+
+class ImageTooLargeError(Exception):
+    """图片超过大小上限"""
+
+    def __init__(self, url: str, limit: int):
+        self.url = url
+        self.limit = limit
+        super().__init__(f"图片超过大小上限（{limit // 1024}KB）: {url}")
+
+
+class ImageDownloader:
+    """图片下载器（内容寻址 LRU 缓存：URL → 内容摘要 → 图片字节）"""
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        timeout: float = 10.0,
+        max_image_bytes: int = 10 * 1024 * 1024
+    ):
+        """
+        初始化下载器
+
+        Args:
+            max_bytes: 缓存的最大字节数
+            timeout: 下载超时（秒）
+            max_image_bytes: 单张图片的大小上限（超过后中止下载）
+        """
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_image_bytes = max_image_bytes
+
+        # 内容摘要 → (图片字节, Content-Type)，按最近使用排序
+        self._blobs: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        # URL → 内容摘要（不同 URL 指向同一内容时只保存一份）
+        self._url_index: Dict[str, str] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+        # URL → 正在进行的下载任务（并发请求同一 URL 时共享）
+        self._inflight: Dict[str, "asyncio.Future[Tuple[bytes, str]]"] = {}
+
+        self._stats = {"hits": 0, "misses": 0, "joined": 0, "too_large": 0}
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """计算内容摘要"""
+        return hashlib.sha256(data).hexdigest()
+
+    def _get_cached(self, url: str) -> Optional[Tuple[bytes, str]]:
+        """从缓存获取（命中则移到最近使用）"""
+        with self._lock:
+            digest = self._url_index.get(url)
+            if digest is None or digest not in self._blobs:
+                return None
+            self._blobs.move_to_end(digest)
+            return self._blobs[digest]
+
+    def _put(self, url: str, data: bytes, content_type: str) -> str:
+        """写入缓存（超出容量时淘汰最久未使用的内容）"""
+        digest = self.digest(data)
+
+        if len(data) > self.max_bytes:
+            return digest
+
+        with self._lock:
+            if digest not in self._blobs:
+                self._blobs[digest] = (data, content_type)
+                self._size += len(data)
+            else:
+                self._blobs.move_to_end(digest)
+            self._url_index[url] = digest
+
+            while self._size > self.max_bytes and self._blobs:
+                old_digest, (old_data, _) = self._blobs.popitem(last=False)
+                self._size -= len(old_data)
+                # 清理指向已淘汰内容的 URL
+                for stale_url in [u for u, d in self._url_index.items() if d == old_digest]:
+                    del self._url_index[stale_url]
+
+        return digest
+
+    async def fetch(self, url: str) -> Tuple[bytes, str]:
+        """
+        下载图片（同一 URL 只下载一次，并发请求共享同一次下载）
+
+        Args:
+            url: 图片 URL
+
+        Returns:
+            Tuple[bytes, str]: (图片字节, Content-Type)
+
+        Raises:
+            httpx.HTTPError: 下载失败
+            ImageTooLargeError: 图片超过大小上限
+        """
+        cached = self._get_cached(url)
+        if cached is not None:
+            self._stats["hits"] += 1
+            return cached
+
+        task = self._inflight.get(url)
+        if task is None:
+            self._stats["misses"] += 1
+            task = asyncio.ensure_future(self._download(url))
+            self._inflight[url] = task
+
+            def forget(done_task):
+                if self._inflight.get(url) is done_task:
+                    del self._inflight[url]
+
+            task.add_done_callback(forget)
+        else:
+            self._stats["joined"] += 1
+
+        # shield：某个调用方被取消时不影响其他等待同一下载的调用方
+        return await asyncio.shield(task)
+
+    async def _download(self, url: str) -> Tuple[bytes, str]:
+        """流式下载图片（超过大小上限时提前中止）"""
+        async with get_http_client().stream("GET", url, timeout=self.timeout) as response:
+            response.raise_for_status()
+
+            declared_length = response.headers.get("content-length", "")
+            if declared_length.isdigit() and int(declared_length) > self.max_image_bytes:
+                self._stats["too_large"] += 1
+                raise ImageTooLargeError(url, self.max_image_bytes)
+
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > self.max_image_bytes:
+                    self._stats["too_large"] += 1
+                    raise ImageTooLargeError(url, self.max_image_bytes)
+                chunks.append(chunk)
+
+            content_type = response.headers.get("content-type", "image/jpeg").split(";")[0].strip()
+
+        data = b"".join(chunks)
+        self._put(url, data, content_type)
+
+        logger.debug(f"📥 图片已下载: {len(data)} bytes ({content_type})")
+
+        return data, content_type
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """
+        获取缓存统计
+
+        Returns:
+            Dict[str, int]: 命中、未命中、合并的并发请求、超限中止、条目数、占用字节数
+        """
+        return {
+            "hits": self._stats["hits"],
+            "misses": self._stats["misses"],
+            "joined": self._stats["joined"],
+            "too_large": self._stats["too_large"],
+            "entries": len(self._blobs),
+            "bytes": self._size
+        }
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._blobs.clear()
+            self._url_index.clear()
+            self._size = 0
+
+
+_downloader: Optional[ImageDownloader] = None
+
+
+def get_image_downloader() -> ImageDownloader:
+    """
+    获取共享的图片下载器
+
+    Returns:
+        ImageDownloader: 图片下载器
+    """
+    global _downloader
+
+    if _downloader is None:
+        from config import config
+        _downloader = ImageDownloader(
+            max_bytes=config.vision_image_cache_mb * 1024 * 1024,
+            max_image_bytes=config.image_max_download_mb * 1024 * 1024
+        )
+
+    return _downloader
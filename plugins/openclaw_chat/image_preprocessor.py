@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片预处理模块
+在上传给 Vision AI 之前识别真实格式、按供应商限制缩小尺寸、重新编码并去除元数据
+（缩放/编码在线程池中执行，不阻塞事件循环；未安装 Pillow 时只识别格式）
+"""
+
+import base64
+import io
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from nonebot.log import logger
+
+from .tracing import run_in_thread
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# 各供应商推荐的最长边（像素）：超过后供应商会在服务端缩小，上传原图只会浪费带宽和 token
+PROVIDER_MAX_EDGE = {
+    "openai": 2048,
+    "ohmygpt": 2048,
+    "anthropic": 1568,
+    "google": 3072,
+    "zhipu": 2048,
+    "siliconflow": 1536
+}
+DEFAULT_MAX_EDGE = 1536
+
+# 小于该大小且尺寸、格式都合适、不带元数据的图片不重新编码
+SKIP_REENCODE_BYTES = 200 * 1024
+
+# Pillow 解析出的元数据字段（EXIF、ICC、XMP、Photoshop/IPTC、注释）
+_METADATA_KEYS = ("exif", "icc_profile", "xmp", "XML:com.adobe.xmp", "photoshop", "comment")
+
+# 魔数 → MIME 类型
+_MAGIC_NUMBERS = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def sniff_image_format(data: bytes) -> Optional[str]:
+    """
+    根据文件头识别图片的真实格式
+
+    Args:
+        data: 图片字节
+
+    Returns:
+        str: MIME 类型（无法识别返回 None）
+    """
+    if len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+
+    for magic, mime_type in _MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return mime_type
+
+    return None
+
+
+@dataclass
+class PreparedImage:
+    """预处理后的图片"""
+    data: bytes
+    mime_type: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    original_size: int = 0
+    reencoded: bool = False
+
+    def to_base64(self) -> str:
+        """Base64 编码"""
+        return base64.b64encode(self.data).decode("utf-8")
+
+    def to_data_url(self) -> str:
+        """转换为 data URL"""
+        return f"data:{self.mime_type};base64,{self.to_base64()}"
+
+
+def has_metadata(image) -> bool:
+    """
+    图片是否带有元数据（可能包含拍摄设备、GPS 位置等隐私信息）
+
+    Args:
+        image: Pillow 图片
+
+    Returns:
+        bool: 是否带有元数据
+    """
+    if any(key in image.info for key in _METADATA_KEYS):
+        return True
+    return bool(getattr(image, "text", None))
+
+
+def get_max_edge(provider: str, override: int = 0) -> int:
+    """
+    获取供应商的最长边限制
+
+    Args:
+        provider: 供应商
+        override: 配置覆盖值（0 表示使用供应商默认值）
+
+    Returns:
+        int: 最长边（像素）
+    """
+    if override > 0:
+        return override
+    return PROVIDER_MAX_EDGE.get(provider, DEFAULT_MAX_EDGE)
+
+
+def preprocess_image(data: bytes, max_edge: int = DEFAULT_MAX_EDGE, quality: int = 85) -> PreparedImage:
+    """
+    预处理图片（同步，CPU 密集，请通过 preprocess_image_async 在线程池中调用）
+
+    - 识别真实格式（不再一律标记为 image/jpeg）
+    - 最长边超过 max_edge 时等比缩小
+    - 重新编码为 JPEG（有透明通道时为 PNG），丢弃 EXIF、ICC、XMP 等元数据
+    - 带元数据的原图不会原样返回（即使重新编码后更大）
+    - 动图只保留第一帧
+
+    Args:
+        data: 图片字节
+        max_edge: 最长边（像素）
+        quality: JPEG 质量（1~95）
+
+    Returns:
+        PreparedImage: 预处理结果（无法处理时返回原图）
+    """
+    mime_type = sniff_image_format(data) or "image/jpeg"
+    original = PreparedImage(data=data, mime_type=mime_type, original_size=len(data))
+
+    if not PIL_AVAILABLE:
+        return original
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            original.width, original.height = width, height
+
+            needs_resize = max(width, height) > max_edge
+            metadata = has_metadata(image)
+            if not needs_resize and not metadata and mime_type == "image/jpeg" and len(data) <= SKIP_REENCODE_BYTES:
+                return original
+
+            # 按 EXIF 方向旋正（之后元数据会被丢弃）
+            image = ImageOps.exif_transpose(image)
+
+            if needs_resize:
+                image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+            converted = image.convert("RGBA" if has_alpha else "RGB")
+            # convert() 会复制 info，PNG 保存时会写回其中的 ICC 等字段
+            converted.info = {}
+
+            buffer = io.BytesIO()
+            if has_alpha:
+                converted.save(buffer, format="PNG", optimize=True)
+                new_mime = "image/png"
+            else:
+                converted.save(buffer, format="JPEG", quality=quality, optimize=True)
+                new_mime = "image/jpeg"
+
+            encoded = buffer.getvalue()
+
+            # 重新编码反而更大时保留原图（例如大色块截图，PNG 比 JPEG 更小；供应商会在服务端缩放），
+            # 原图带元数据时仍使用去除元数据后的结果
+            if len(encoded) >= len(data) and not metadata:
+                return original
+
+            return PreparedImage(
+                data=encoded,
+                mime_type=new_mime,
+                width=image.width,
+                height=image.height,
+                original_size=len(data),
+                reencoded=True
+            )
+
+    except Exception as e:
+        logger.warning(f"⚠️  图片预处理失败，使用原图: {e}")
+        return original
+
+
+async def preprocess_image_async(data: bytes, max_edge: int = DEFAULT_MAX_EDGE, quality: int = 85) -> PreparedImage:
+    """
+    在线程池中预处理图片
+
+    Args:
+        data: 图片字节
+        max_edge: 最长边（像素）
+        quality: JPEG 质量
+
+    Returns:
+        PreparedImage: 预处理结果
+    """
+    prepared = await run_in_thread(preprocess_image, data, max_edge, quality)
+
+    if prepared.reencoded:
+        logger.info(
+            f"🖼️  图片已压缩: {prepared.original_size // 1024}KB → {len(prepared.data) // 1024}KB "
+            f"({prepared.width}x{prepared.height}, {prepared.mime_type})"
+        )
+
+    return prepared
+
+
+def parse_data_url(data_url: str) -> Tuple[str, str]:
+    """
+    解析 data URL
+
+    Args:
+        data_url: data:<mime>;base64,<data>
+
+    Returns:
+        Tuple[str, str]: (MIME 类型, Base64 数据)
+    """
+    header, _, payload = data_url.partition(",")
+    mime_type = header[5:].split(";")[0] or "image/jpeg"
+    return mime_type, payload
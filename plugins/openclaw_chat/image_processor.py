@@ -5,6 +5,7 @@
 处理 QQ 消息中的图片，并调用支持视觉的 AI 模型识别
 """
 
+import asyncio
 import base64
 import re
 import os
@@ -74,86 +75,204 @@ class ImageData:
         }
 
 
-async def extract_image_from_message(bot: Bot, event: Event) -> Optional[ImageData]:
+async def _resolve_image_segment(bot: Bot, image_data: Dict[str, Any]) -> Optional[ImageData]:
     """
-    从 QQ 消息中提取图片数据
+    解析单个图片消息段
     
     Args:
         bot: Bot 实例
-        event: Event 事件
+        image_data: 图片消息段数据
     
     Returns:
-        ImageData: 图片数据，如果没有图片则返回 None
+        ImageData: 图片数据，无法获取则返回 None
     """
-    message = event.get_message()
+    # 方式1：URL 链接
+    if "url" in image_data and image_data["url"]:
+        logger.info(f"✨ 提取到图片 URL: {image_data['url']}")
+        return ImageData(url=image_data["url"])
     
-    for seg in message:
-        if seg.type == "image":
-            image_data = seg.data
-            
-            # 方式1：URL 链接
-            if "url" in image_data and image_data["url"]:
-                logger.info(f"✨ 提取到图片 URL: {image_data['url']}")
-                return ImageData(url=image_data["url"])
+    # 方式2：Base64 编码
+    if "file" in image_data:
+        file = image_data["file"]
+        
+        # 检查 base64:// 前缀
+        if file.startswith("base64://"):
+            base64_data = file.replace("base64://", "")
+            logger.info(f"✨ 提取到 Base64 图片数据")
+            return ImageData(base64=base64_data)
+        
+        # 检查是否已经是 base64 格式（较长且有 == 结尾）
+        if len(file) > 100 and re.search(r"==={0,2}$", file):
+            logger.info(f"✨ 检测到 Base64 图片数据")
+            return ImageData(base64=file)
+        
+        # 方式3：本地文件（尝试通过 OneBot API 获取）
+        logger.info(f"📄 检测到本地图片文件，尝试通过 API 获取 URL...")
+        try:
+            # 调用 OneBot API 获取图片信息
+            image_info = await bot.call_api("get_image", file=file)
             
-            # 方式2：Base64 编码
-            if "file" in image_data:
-                file = image_data["file"]
+            if image_info and "url" in image_info:
+                logger.info(f"✅ 成功获取图片 URL: {image_info['url']}")
+                return ImageData(url=image_info["url"])
+            else:
+                logger.warning(f"⚠️ 无法获取图片 URL: {image_info}")
+                return None
                 
-                # 检查 base64:// 前缀
-                if file.startswith("base64://"):
-                    base64_data = file.replace("base64://", "")
-                    logger.info(f"✨ 提取到 Base64 图片数据")
-                    return ImageData(base64=base64_data)
-                
-                # 检查是否已经是 base64 格式（较长且有 == 结尾）
-                if len(file) > 100 and re.search(r"==={0,2}$", file):
-                    logger.info(f"✨ 检测到 Base64 图片数据")
-                    return ImageData(base64=file)
-                
-                # 方式3：本地文件（尝试通过 OneBot API 获取）
-                logger.info(f"📄 检测到本地图片文件，尝试通过 API 获取 URL...")
-                try:
-                    # 调用 OneBot API 获取图片信息
-                    image_info = await bot.call_api("get_image", file=file)
-                    
-                    if image_info and "url" in image_info:
-                        logger.info(f"✅ 成功获取图片 URL: {image_info['url']}")
-                        return ImageData(url=image_info["url"])
-                    else:
-                        logger.warning(f"⚠️ 无法获取图片 URL: {image_info}")
-                        return None
-                        
-                except Exception as e:
-                    logger.error(f"❌ 获取图片 URL 失败: {e}")
-                    return None
+        except Exception as e:
+            logger.error(f"❌ 获取图片 URL 失败: {e}")
+            return None
     
-    logger.info("ℹ️ 消息中没有图片")
     return None
 
 
-def get_base64_from_url(image_url: str) -> str:
+async def extract_images_from_message(bot: Bot, event: Event, max_images: Optional[int] = None) -> List[ImageData]:
+    """
+    从 QQ 消息中提取所有图片数据（并行解析各图片消息段）
+    
+    Args:
+        bot: Bot 实例
+        event: Event 事件
+        max_images: 最多提取的图片数（None 表示不限制）
+    
+    Returns:
+        List[ImageData]: 图片数据列表（按消息中的顺序，无法获取的图片会被跳过）
+    """
+    segments = [seg.data for seg in event.get_message() if seg.type == "image"]
+    
+    if not segments:
+        logger.info("ℹ️ 消息中没有图片")
+        return []
+    
+    if max_images is not None and len(segments) > max_images:
+        logger.info(f"ℹ️ 消息中有 {len(segments)} 张图片，只识别前 {max_images} 张")
+        segments = segments[:max_images]
+    
+    results = await asyncio.gather(*[_resolve_image_segment(bot, data) for data in segments])
+    
+    return [image for image in results if image is not None]
+
+
+async def extract_image_from_message(bot: Bot, event: Event) -> Optional[ImageData]:
+    """
+    从 QQ 消息中提取图片数据（只取第一张）
+    
+    Args:
+        bot: Bot 实例
+        event: Event 事件
+    
+    Returns:
+        ImageData: 图片数据，如果没有图片则返回 None
+    """
+    images = await extract_images_from_message(bot, event, max_images=1)
+    return images[0] if images else None
+
+
+async def create_vision_message(prompt: str, image_data: ImageData) -> Dict[str, Any]:
+    """
+    创建 Vision API 的消息格式（本地文件在线程池中读取；与 VisionAIClient 一样，
+    Base64 和本地文件在上传前缩小尺寸、去除元数据）
+    
+    Args:
+        prompt: 用户提示词
+        image_data: 图片数据
+    
+    Returns:
+        Dict: API 消息格式
+    """
+    from .tracing import run_in_thread
+
+    # 构建消息
+    content = [
+        {"type": "text", "text": prompt}
+    ]
+    
+    # 添加图片
+    if image_data.url:
+        # URL 格式
+        content.append({
+            "type": "image_url",
+            "image_url": {"url": image_data.url}
+        })
+    elif image_data.base64:
+        # Base64 格式（解码后预处理）
+        content.append({
+            "type": "image_url",
+            "image_url": {"url": await _prepare_data_url(base64.b64decode(image_data.base64))}
+        })
+    elif image_data.file_path:
+        # 本地文件格式（在线程池中读取，不阻塞事件循环）
+        def read_file() -> bytes:
+            with open(image_data.file_path, "rb") as f:
+                return f.read()
+
+        try:
+            image_bytes = await run_in_thread(read_file)
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": await _prepare_data_url(image_bytes)}
+            })
+        except Exception as e:
+            logger.error(f"❌ 读取本地图片失败: {e}")
+    
+    return {
+        "role": "user",
+        "content": content
+    }
+
+
+async def _prepare_data_url(image_bytes: bytes) -> str:
+    """
+    把图片字节转换为 data URL（启用预处理时在线程池中缩小尺寸、重新编码并去除元数据，失败时使用原图）
+
+    Args:
+        image_bytes: 图片字节
+
+    Returns:
+        str: data URL
+    """
+    from config import config
+    from .image_preprocessor import get_max_edge, preprocess_image_async, sniff_image_format
+
+    if config.vision_preprocess:
+        try:
+            prepared = await preprocess_image_async(
+                image_bytes,
+                max_edge=get_max_edge(config.vision_provider, config.vision_max_edge),
+                quality=config.vision_jpeg_quality
+            )
+            return prepared.to_data_url()
+        except Exception as e:
+            logger.warning(f"⚠️  图片预处理失败，使用原图: {e}")
+
+    # 按文件头识别真实格式
+    mime_type = sniff_image_format(image_bytes) or "image/jpeg"
+    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+    return f"data:{mime_type};base64,{image_base64}"
+
+
+async def get_base64_from_url(image_url: str) -> str:
     """
-    将图片 URL 转换为 Base64 编码
+    将图片 URL 转换为 Base64 编码（通过共享连接池异步下载，不阻塞事件循环）
     
     Args:
         image_url: 图片 URL
     
     Returns:
-        str: Base64 编码的图片数据
+        str: Base64 编码的图片数据（data URL）
     """
-    import requests
+    from .http_client import get_image_downloader
+    from .image_preprocessor import sniff_image_format
     
     try:
-        # 下载图片
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
+        # 下载图片（同一 URL 只下载一次）
+        image_bytes, content_type = await get_image_downloader().fetch(image_url)
         
         # 转换为 base64
-        image_base64 = base64.b64encode(response.content).decode('utf-8')
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
         
-        # 检测图片类型
-        content_type = response.headers.get('content-type', 'image/jpeg')
+        # 检测图片类型（优先使用文件头）
+        content_type = sniff_image_format(image_bytes) or content_type
         
         return f"data:{content_type};base64,{image_base64}"
         
@@ -194,87 +313,32 @@ def get_vision_models() -> List[str]:
     return models
 
 
-async def download_image(image_url: str, save_dir: str = "temp/images") -> Optional[str]:
+async def download_image(image_url: str, save_dir: Optional[str] = None) -> Optional[str]:
     """
-    下载图片并保存到本地
+    下载图片并保存到本地（文件以内容摘要命名，相同图片只保存一份）
     
     Args:
         image_url: 图片 URL
-        save_dir: 保存目录
+        save_dir: 保存目录（为空时使用配置的临时目录）
     
     Returns:
         str: 保存的文件路径，失败返回 None
     """
-    import aiohttp
-    import time
+    from .http_client import get_image_downloader
+    from .image_store import get_image_store
+    from .image_preprocessor import sniff_image_format
     
     try:
-        # 创建保存目录
-        os.makedirs(save_dir, exist_ok=True)
+        # 下载图片（流式下载，超过大小上限提前中止）
+        image_bytes, content_type = await get_image_downloader().fetch(image_url)
         
-        # 生成文件名
-        filename = f"{int(time.time())}.jpg"
-        filepath = os.path.join(save_dir, filename)
+        # 保存到内容寻址的临时目录
+        mime_type = sniff_image_format(image_bytes) or content_type
+        filepath = await get_image_store(save_dir).save_async(image_bytes, mime_type)
         
-        # 下载图片
-        async with aiohttp.ClientSession() as session:
-            async with session.get(image_url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    with open(filepath, "wb") as f:
-                        f.write(await resp.read())
-                    logger.info(f"✅ 图片已下载: {filepath}")
-                    return filepath
-                else:
-                    logger.error(f"❌ 下载图片失败: HTTP {resp.status}")
-                    return None
+        logger.info(f"✅ 图片已下载: {filepath}")
+        return filepath
                     
     except Exception as e:
         logger.error(f"❌ 下载图片异常: {e}")
         return None
-
-
-def create_vision_message(prompt: str, image_data: ImageData) -> Dict[str, Any]:
-    """
-    创建 Vision API 的消息格式
-    
-    Args:
-        prompt: 用户提示词
-        image_data: 图片数据
-    
-    Returns:
-        Dict: API 消息格式
-    """
-    # 构建消息
-    content = [
-        {"type": "text", "text": prompt}
-    ]
-    
-    # 添加图片
-    if image_data.url:
-        # URL 格式
-        content.append({
-            "type": "image_url",
-            "image_url": {"url": image_data.url}
-        })
-    elif image_data.base64:
-        # Base64 格式
-        content.append({
-            "type": "image_url",
-            "image_url": {"url": f"data:image/jpeg;base64,{image_data.base64}"}
-        })
-    elif image_data.file_path:
-        # 本地文件格式（需要先读取）
-        try:
-            with open(image_data.file_path, "rb") as f:
-                image_base64 = base64.b64encode(f.read()).decode('utf-8')
-                content.append({
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}
-                })
-        except Exception as e:
-            logger.error(f"❌ 读取本地图片失败: {e}")
-    
-    return {
-        "role": "user",
-        "content": content
-    }
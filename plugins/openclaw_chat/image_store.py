@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片临时文件存储模块
+以内容摘要命名文件（相同图片只保存一份，并发写入不会互相覆盖），按 TTL 和总大小（LRU）清理旧文件
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+from nonebot.log import logger
+
+from .tracing import run_in_thread
+
+
+# MIME 类型 → 扩展名
+_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/bmp": ".bmp"
+}
+
+
+class ImageFileStore:
+    """内容寻址的图片临时文件存储"""
+
+    def __init__(
+        self,
+        directory: str = "temp/images",
+        max_bytes: int = 200 * 1024 * 1024,
+        ttl: float = 24 * 3600,
+        cleanup_interval: float = 600
+    ):
+        """
+        初始化存储
+
+        Args:
+            directory: 保存目录
+            max_bytes: 目录总大小上限（超出时删除最久未使用的文件）
+            ttl: 文件有效期（秒）
+            cleanup_interval: 两次自动清理的最小间隔（秒）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """计算内容摘要"""
+        return hashlib.sha256(data).hexdigest()
+
+    def path_for(self, digest: str, mime_type: Optional[str] = None) -> str:
+        """
+        获取内容对应的文件路径
+
+        Args:
+            digest: 内容摘要
+            mime_type: MIME 类型（决定扩展名）
+
+        Returns:
+            str: 文件路径
+        """
+        return os.path.join(self.directory, f"{digest}{_EXTENSIONS.get(mime_type, '.jpg')}")
+
+    def save(self, data: bytes, mime_type: Optional[str] = None) -> str:
+        """
+        保存图片（同步，请通过 save_async 在线程池中调用）
+
+        已存在相同内容时只刷新访问时间（用于 LRU 清理）。
+
+        Args:
+            data: 图片字节
+            mime_type: MIME 类型（为空时按文件头识别）
+
+        Returns:
+            str: 文件路径
+        """
+        if mime_type is None:
+            from .image_preprocessor import sniff_image_format
+            mime_type = sniff_image_format(data)
+
+        filepath = self.path_for(self.digest(data), mime_type)
+
+        if os.path.exists(filepath):
+            os.utime(filepath, None)
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            # 先写临时文件再原子替换，并发保存同一内容时不会读到半个文件
+            temp_file = f"{filepath}.{threading.get_ident()}.tmp"
+            with open(temp_file, "wb") as f:
+                f.write(data)
+            os.replace(temp_file, filepath)
+
+        if time.time() - self._last_cleanup >= self.cleanup_interval:
+            self.cleanup()
+
+        return filepath
+
+    async def save_async(self, data: bytes, mime_type: Optional[str] = None) -> str:
+        """
+        在线程池中保存图片
+
+        Args:
+            data: 图片字节
+            mime_type: MIME 类型
+
+        Returns:
+            str: 文件路径
+        """
+        return await run_in_thread(self.save, data, mime_type)
+
+    def cleanup(self) -> int:
+        """
+        清理过期文件，并在总大小超限时按最近使用时间删除最旧的文件
+
+        Returns:
+            int: 删除的文件数
+        """
+        with self._lock:
+            self._last_cleanup = time.time()
+
+            if not os.path.isdir(self.directory):
+                return 0
+
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+
+            now = time.time()
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            removed = 0
+
+            for mtime, size, path in files:
+                if now - mtime <= self.ttl and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"⚠️  删除临时图片失败: {path} - {e}")
+
+            if removed:
+                logger.info(f"🧹 已清理临时图片: {removed} 个")
+
+            return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取存储统计
+
+        Returns:
+            Dict[str, Any]: 文件数、占用字节数
+        """
+        if not os.path.isdir(self.directory):
+            return {"files": 0, "bytes": 0}
+
+        sizes = [entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file()]
+        return {"files": len(sizes), "bytes": sum(sizes)}
+
+
+_image_stores: Dict[str, ImageFileStore] = {}
+
+
+def get_image_store(directory: Optional[str] = None) -> ImageFileStore:
+    """
+    获取图片临时文件存储（同一目录复用同一实例）
+
+    Args:
+        directory: 保存目录（为空时使用配置的目录）
+
+    Returns:
+        ImageFileStore: 图片存储
+    """
+    from config import config
+
+    directory = directory or config.image_temp_dir
+
+    store = _image_stores.get(directory)
+    if store is None:
+        store = ImageFileStore(
+            directory=directory,
+            max_bytes=config.image_temp_max_mb * 1024 * 1024,
+            ttl=config.image_temp_ttl_hours * 3600
+        )
+        _image_stores[directory] = store
+
+    return store
@@ -22,7 +22,7 @@ try:
     from .vector_database_manager import VectorDatabaseManager
     from .knowledge_base_retriever import KnowledgeBaseRetriever
     from .knowledge_base_builder import KnowledgeBaseBuilder
-    from .ai_processor import init_knowledge_base, retrieve_from_knowledge_base
+    from .ai_processor import init_knowledge_base, get_knowledge_base, retrieve_from_knowledge_base
     KNOWLEDGE_BASE_AVAILABLE = True
 except ImportError:
     KNOWLEDGE_BASE_AVAILABLE = False
@@ -47,9 +47,12 @@ def _init_kb_if_needed():
         try:
             init_knowledge_base(kb_dir=config.knowledge_base_dir)
 
-            _kb_manager = KnowledgeBaseManager(kb_dir=config.knowledge_base_dir)
-            _vdb_manager = VectorDatabaseManager(kb_dir=config.knowledge_base_dir)
-            _builder = KnowledgeBaseBuilder(kb_dir=config.knowledge_base_dir)
+            # 与对话检索共享同一个知识库管理器和向量数据库（同一目录只打开一个 Chroma 客户端）
+            _kb_manager, _vdb_manager, _ = get_knowledge_base()
+            if _kb_manager is None:
+                raise RuntimeError("知识库初始化失败")
+
+            _builder = KnowledgeBaseBuilder(kb_dir=config.knowledge_base_dir, kb_manager=_kb_manager)
 
             logger.info("✅ 知识库管理器初始化成功")
         except Exception as e:
@@ -348,18 +351,20 @@ async def handle_kb_group_set(args: Message = CommandArg(), event: GroupMessageE
     if len(parts) < 2:
         await kb_group_set.finish(
             "⚠️  参数不正确\n\n"
-            "💡 使用方法: /kb_group_set <群号> <知识库ID> [top_k]\n"
-            "   例如: /kb_group_set 123456789 game_terraria 3"
+            "💡 使用方法: /kb_group_set <群号> <知识库ID[,知识库ID...]> [top_k]\n"
+            "   例如: /kb_group_set 123456789 game_terraria 3\n"
+            "   多个知识库联合检索: /kb_group_set 123456789 game_terraria,game_faq 3"
         )
 
     group_id = parts[0]
-    kb_id = parts[1]
+    kb_ids = list(dict.fromkeys(item.strip() for item in parts[1].split(",") if item.strip()))
     top_k = int(parts[2]) if len(parts) > 2 else 3
 
     try:
         # 检查知识库是否存在
-        if kb_manager and not kb_manager.exists(kb_id):
-            await kb_group_set.finish(f"⚠️  知识库不存在: {kb_id}\n\n💡 使用 /kb_list 查看可用知识库")
+        for kb_id in kb_ids:
+            if kb_manager and not kb_manager.exists(kb_id):
+                await kb_group_set.finish(f"⚠️  知识库不存在: {kb_id}\n\n💡 使用 /kb_list 查看可用知识库")
 
         # 设置群知识库配置
         from config import KnowledgeBaseConfig
@@ -368,7 +373,8 @@ async def handle_kb_group_set(args: Message = CommandArg(), event: GroupMessageE
             group_id=group_id,
             kb_config=KnowledgeBaseConfig(
                 enabled=True,
-                kb_id=kb_id,
+                kb_id=kb_ids[0],
+                kb_ids=kb_ids if len(kb_ids) > 1 else None,
                 top_k=top_k
             )
         )
@@ -376,7 +382,7 @@ async def handle_kb_group_set(args: Message = CommandArg(), event: GroupMessageE
         await kb_group_set.finish(
             f"✅ 群知识库配置已设置\n\n"
             f"• 群号: {group_id}\n"
-            f"• 知识库: {kb_id}\n"
+            f"• 知识库: {', '.join(kb_ids)}\n"
             f"• 检索数量: {top_k}"
         )
 
@@ -408,10 +414,10 @@ async def handle_kb_group_status(event: GroupMessageEvent = None):
 
     try:
         # 获取群知识库配置
-        kb_id = config.get_group_kb_id(group_id)
+        kb_ids = config.get_group_kb_ids(group_id)
         top_k = config.get_group_kb_top_k(group_id)
 
-        if not kb_id:
+        if not kb_ids:
             await kb_group_status.finish(
                 f"⏳ 当前群未配置知识库\n\n"
                 f"💡 使用 /kb_group_set {group_id} <知识库ID> 来配置"
@@ -420,24 +426,26 @@ async def handle_kb_group_status(event: GroupMessageEvent = None):
         # 初始化知识库
         kb_manager, _, _ = _init_kb_if_needed()
 
-        # 获取知识库状态
-        kb_info = None
-        if kb_manager and kb_manager.exists(kb_id):
-            kb_info = kb_manager.get_status(kb_id)
-
         # 构建回复
         reply_lines = [
             f"📊 群知识库状态\n\n",
             f"• 群号: {group_id}",
-            f"• 知识库 ID: {kb_id}",
+            f"• 知识库 ID: {', '.join(kb_ids)}",
             f"• 检索数量: {top_k}",
         ]
 
-        if kb_info:
-            reply_lines.append(f"• 知识库名称: {kb_info.kb_name}")
-            reply_lines.append(f"• 状态: {'✅ 已就绪' if kb_info.status == 'ready' else '⏳ 构建中'}")
-        else:
-            reply_lines.append(f"• 状态: ⚠️  知识库不存在")
+        for kb_id in kb_ids:
+            # 获取知识库状态
+            kb_info = None
+            if kb_manager and kb_manager.exists(kb_id):
+                kb_info = kb_manager.get_status(kb_id)
+
+            prefix = f"[{kb_id}] " if len(kb_ids) > 1 else ""
+            if kb_info:
+                reply_lines.append(f"• {prefix}知识库名称: {kb_info.kb_name}")
+                reply_lines.append(f"• {prefix}状态: {'✅ 已就绪' if kb_info.status == 'ready' else '⏳ 构建中'}")
+            else:
+                reply_lines.append(f"• {prefix}状态: ⚠️  知识库不存在")
 
         await kb_group_status.finish("\n".join(reply_lines))
 
@@ -473,12 +481,12 @@ async def handle_kb_test(args: Message = CommandArg(), event: GroupMessageEvent
 
         # 如果是私聊，使用默认知识库
         if not group_id:
-            kb_id = config.knowledge_base_default_kb_id
+            kb_ids = [config.knowledge_base_default_kb_id]
         else:
             # 获取群知识库配置
-            kb_id = config.get_group_kb_id(group_id)
+            kb_ids = config.get_group_kb_ids(group_id)
 
-        if not kb_id:
+        if not kb_ids:
             await kb_test.finish(
                 "⚠️  当前群未配置知识库\n\n"
                 "💡 超级管理员可以使用 /kb_group_set 来配置"
@@ -490,9 +498,10 @@ async def handle_kb_test(args: Message = CommandArg(), event: GroupMessageEvent
         # 检索知识库
         result = await retrieve_from_knowledge_base(
             query=query,
-            kb_id=kb_id,
+            kb_id=kb_ids[0],
             top_k=top_k,
-            use_cache=False  # 测试时不使用缓存
+            use_cache=False,  # 测试时不使用缓存
+            kb_ids=kb_ids
         )
 
         if not result:
@@ -502,7 +511,7 @@ async def handle_kb_test(args: Message = CommandArg(), event: GroupMessageEvent
         reply_lines = [
             f"🔍 知识库检索结果\n\n",
             f"• 查询: {query}",
-            f"• 知识库: {kb_id}",
+            f"• 知识库: {', '.join(kb_ids)}",
             f"\n📄 检索结果:\n",
         ]
 
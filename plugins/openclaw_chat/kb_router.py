@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多知识库路由
+群组绑定多个知识库时，根据查询向量与各知识库平均向量（质心）的相似度，
+跳过明显不相关的知识库，减少联合检索的查询次数
+
+质心按知识库缓存，文本块数量变化（重建、增量更新）后重新计算。
+"""
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from nonebot.log import logger
+
+from .embeddings import normalize
+from .tracing import run_in_thread
+
+
+def to_l2_distance(distance: float, space: str = "l2") -> float:
+    """
+    将不同距离类型换算到同一尺度（归一化向量的平方 L2 距离，0 ~ 4）
+
+    Args:
+        distance: 向量数据库返回的距离
+        space: 距离类型（l2 / cosine / ip）
+
+    Returns:
+        float: 平方 L2 距离
+    """
+    if space == "l2":
+        return distance
+    # cosine 距离 = 1 - cos，ip 距离 = 1 - 内积（归一化向量即 1 - cos）
+    return 2.0 * distance
+
+
+class CentroidRouter:
+    """基于知识库质心的路由器"""
+
+    def __init__(self, margin: float = 0.15, max_kbs: int = 0):
+        """
+        初始化路由器
+
+        Args:
+            margin: 与最相似知识库的相似度差距超过该值时跳过
+            max_kbs: 最多检索的知识库数量（0 表示不限制）
+        """
+        self.margin = margin
+        self.max_kbs = max_kbs
+
+        # kb_id -> (文本块数量, 质心)
+        self._centroids: Dict[str, Tuple[int, Optional[np.ndarray]]] = {}
+        self._lock = threading.Lock()
+
+    def _load_centroids(self, vector_db, kb_ids: Sequence[str]) -> Dict[str, Optional[np.ndarray]]:
+        """
+        读取质心（文本块数量未变化时使用缓存）
+
+        Args:
+            vector_db: 向量数据库管理器
+            kb_ids: 知识库 ID 列表
+
+        Returns:
+            Dict[str, Optional[np.ndarray]]: kb_id -> 质心（空知识库为 None）
+        """
+        centroids = {}
+
+        for kb_id in kb_ids:
+            count = (vector_db.get_collection_info(kb_id) or {}).get("count", 0)
+
+            with self._lock:
+                cached = self._centroids.get(kb_id)
+            if cached is not None and cached[0] == count:
+                centroids[kb_id] = cached[1]
+                continue
+
+            centroid = vector_db.get_centroid(kb_id) if count else None
+            centroid = np.asarray(centroid, dtype=np.float32) if centroid is not None else None
+
+            with self._lock:
+                self._centroids[kb_id] = (count, centroid)
+            centroids[kb_id] = centroid
+
+        return centroids
+
+    async def route(self, vector_db, kb_ids: List[str], query_embedding: Optional[List[float]]) -> List[str]:
+        """
+        选出需要检索的知识库（按质心相似度从高到低）
+
+        Args:
+            vector_db: 向量数据库管理器
+            kb_ids: 候选知识库 ID 列表
+            query_embedding: 查询向量（None 时不路由）
+
+        Returns:
+            List[str]: 需要检索的知识库 ID 列表
+        """
+        if len(kb_ids) < 2 or query_embedding is None:
+            return kb_ids
+
+        try:
+            centroids = await run_in_thread(self._load_centroids, vector_db, kb_ids)
+        except Exception as e:
+            logger.warning(f"⚠️  知识库路由失败，检索全部知识库: {e}")
+            return kb_ids
+
+        query = normalize(np.asarray(query_embedding, dtype=np.float32))
+
+        similarities = {}
+        for kb_id, centroid in centroids.items():
+            if centroid is None:
+                continue
+            if centroid.shape != query.shape:
+                # 嵌入模型不一致，无法比较，保留该知识库
+                similarities[kb_id] = None
+                continue
+            similarities[kb_id] = float(query @ centroid)
+
+        comparable = [similarity for similarity in similarities.values() if similarity is not None]
+        if not comparable:
+            return [kb_id for kb_id in kb_ids if kb_id in similarities] or kb_ids
+
+        best = max(comparable)
+        selected = [
+            kb_id for kb_id in kb_ids
+            if kb_id in similarities and (similarities[kb_id] is None or similarities[kb_id] >= best - self.margin)
+        ]
+        selected.sort(key=lambda kb_id: -(similarities[kb_id] if similarities[kb_id] is not None else best))
+
+        if self.max_kbs > 0:
+            selected = selected[:self.max_kbs]
+
+        skipped = [kb_id for kb_id in kb_ids if kb_id not in selected]
+        if skipped:
+            logger.debug(f"🧭 知识库路由: 检索 {selected}，跳过 {skipped}")
+
+        return selected
+
+    def invalidate(self, kb_id: Optional[str] = None):
+        """
+        清除质心缓存
+
+        Args:
+            kb_id: 知识库 ID（None 则清除全部）
+        """
+        with self._lock:
+            if kb_id is None:
+                self._centroids.clear()
+            else:
+                self._centroids.pop(kb_id, None)
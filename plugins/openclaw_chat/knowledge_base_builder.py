@@ -10,7 +10,8 @@ import asyncio
 from typing import List, Dict, Optional, Any
 from .wiki_parser import WikiParser
 from .knowledge_base_manager import KnowledgeBaseManager
-from .vector_database_manager import VectorDatabaseManager, DocumentChunk
+from .vector_database_manager import DocumentChunk, get_vector_db_manager
+from .near_dedup import fingerprint_chunks
 from nonebot.log import logger
 
 
@@ -22,7 +23,8 @@ class KnowledgeBaseBuilder:
         kb_dir: str = "data/knowledge_bases",
         wiki_url: str = "https://terraria.wiki.gg/zh/wiki/",
         chunk_size: int = 500,
-        chunk_overlap: int = 50
+        chunk_overlap: int = 50,
+        kb_manager: Optional[KnowledgeBaseManager] = None
     ):
         """
         初始化知识库构建器
@@ -32,6 +34,7 @@ class KnowledgeBaseBuilder:
             wiki_url: Wiki 基础 URL
             chunk_size: 每块大小（字符数）
             chunk_overlap: 块之间重叠字符数
+            kb_manager: 知识库管理器（可选，传入时与调用方共享知识库状态）
         """
         self.kb_dir = kb_dir
         self.wiki_url = wiki_url
@@ -39,8 +42,8 @@ class KnowledgeBaseBuilder:
         self.chunk_overlap = chunk_overlap
 
         # 初始化管理器
-        self.kb_manager = KnowledgeBaseManager(kb_dir=kb_dir)
-        self.vdb_manager = VectorDatabaseManager(kb_dir=kb_dir)
+        self.kb_manager = kb_manager or KnowledgeBaseManager(kb_dir=kb_dir)
+        self.vdb_manager = get_vector_db_manager(kb_dir)
         self.wiki_parser = WikiParser(base_url=wiki_url)
 
         logger.info("✅ 知识库构建器初始化成功")
@@ -114,6 +117,10 @@ class KnowledgeBaseBuilder:
 
                 logger.info(f"✅ 页面解析成功: {page_name}, 块数量: {len(page_chunks)}")
 
+            # 计算近似重复指纹（按配置丢弃近似重复的文本块）
+            chunks = self._dedupe_chunks(chunks)
+            chunk_count = len(chunks)
+
             # 添加到向量数据库
             if chunks:
                 logger.info(f"💾 正在添加 {len(chunks)} 个文本块到向量数据库...")
@@ -148,8 +155,8 @@ class KnowledgeBaseBuilder:
             traceback.print_exc()
             return False
 
+    @staticmethod
     def _extract_chunks(
-        self,
         page_data: Dict[str, Any],
         kb_id: str
     ) -> List[DocumentChunk]:
@@ -186,6 +193,20 @@ class KnowledgeBaseBuilder:
 
         return chunks
 
+    def _dedupe_chunks(self, chunks: List[DocumentChunk]) -> List[DocumentChunk]:
+        """
+        计算文本块的 MinHash 指纹，并按配置丢弃近似重复的文本块
+
+        Args:
+            chunks: 文本块列表
+
+        Returns:
+            List[DocumentChunk]: 保留的文本块
+        """
+        from config import config
+
+        return fingerprint_chunks(chunks, threshold=config.kb_ingest_dedup_threshold)
+
     def _get_default_pages(self) -> List[str]:
         """
         获取默认页面列表
@@ -296,7 +317,7 @@ class KnowledgeBaseBuilder:
                 return False
 
             # 提取文本块
-            chunks = self._extract_chunks(page_data, kb_id)
+            chunks = self._dedupe_chunks(self._extract_chunks(page_data, kb_id))
 
             if not chunks:
                 logger.warning(f"⚠️  页面没有文本块: {page_name}")
@@ -2,9 +2,10 @@
 # -*- coding: utf-8 -*-
 """
 知识库检索管理器
-优化检索结果，实现结果排序和过滤，添加检索缓存
+优化检索结果，实现结果排序、过滤和重排序，添加检索缓存
 """
 
+import asyncio
 import time
 import hashlib
 from typing import List, Dict, Optional, Any, Tuple
@@ -12,6 +13,12 @@ from datetime import datetime, timedelta
 from dataclasses import dataclass, field
 from collections import defaultdict
 from nonebot.log import logger
+from .tracing import run_in_thread
+from .embeddings import HashingEmbeddingProvider
+from .reranker import Reranker
+from .near_dedup import suppress_near_duplicates
+from .kb_router import CentroidRouter, to_l2_distance
+from .metrics import KB_CACHE_HITS, KB_CACHE_MISSES
 
 
 @dataclass
@@ -45,6 +52,17 @@ class SearchContext:
     filters: Optional[Dict[str, Any]] = None  # 过滤条件
     sort_by: str = "score"  # 排序方式（score/relevance/time）
     use_cache: bool = True  # 是否使用缓存
+    kb_ids: Optional[List[str]] = None  # 联合检索的知识库 ID 列表（为空则只检索 kb_id）
+
+    @property
+    def search_kb_ids(self) -> List[str]:
+        """需要检索的知识库 ID 列表"""
+        return list(self.kb_ids) if self.kb_ids else [self.kb_id]
+
+    @property
+    def cache_kb_id(self) -> str:
+        """缓存使用的知识库标识（多个知识库用逗号连接）"""
+        return ",".join(self.search_kb_ids)
 
 
 class KnowledgeBaseRetriever:
@@ -53,7 +71,12 @@ class KnowledgeBaseRetriever:
     def __init__(
         self,
         cache_ttl: int = 300,
-        cache_size: int = 1000
+        cache_size: int = 1000,
+        reranker: Optional[Reranker] = None,
+        rerank_candidates: int = 12,
+        rerank_budget_ms: float = 50,
+        near_duplicate_threshold: float = 0.0,
+        router: Optional[CentroidRouter] = None
     ):
         """
         初始化知识库检索管理器
@@ -61,9 +84,19 @@ class KnowledgeBaseRetriever:
         Args:
             cache_ttl: 缓存过期时间（秒，默认 5 分钟）
             cache_size: 缓存大小（默认 1000）
+            reranker: 重排序器（可选，None 则按向量距离排序）
+            rerank_candidates: 重排前取回的候选数量
+            rerank_budget_ms: 重排时间预算（毫秒，超时则保留已完成部分的排序）
+            near_duplicate_threshold: 近似重复过滤的 Jaccard 阈值（0 表示只去除完全相同的文本）
+            router: 多知识库路由器（可选，None 则联合检索时查询全部知识库）
         """
         self.cache_ttl = cache_ttl
         self.cache_size = cache_size
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.rerank_budget_ms = rerank_budget_ms
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.router = router
 
         # 缓存：key -> SearchCacheItem
         self._cache: Dict[str, SearchCacheItem] = {}
@@ -78,6 +111,14 @@ class KnowledgeBaseRetriever:
             "evictions": 0
         }
 
+        # 重排统计
+        self._rerank_stats = {
+            "count": 0,
+            "partial": 0,
+            "timeouts": 0,
+            "total_ms": 0.0
+        }
+
         logger.info(f"✅ 知识库检索管理器初始化成功（TTL: {cache_ttl}s, Size: {cache_size}）")
 
     def _generate_cache_key(
@@ -128,6 +169,7 @@ class KnowledgeBaseRetriever:
 
         if cache_key not in self._cache:
             self._cache_stats["misses"] += 1
+            KB_CACHE_MISSES.inc()
             return None
 
         cache_item = self._cache[cache_key]
@@ -137,11 +179,13 @@ class KnowledgeBaseRetriever:
             # 移除过期项
             del self._cache[cache_key]
             self._cache_stats["misses"] += 1
+            KB_CACHE_MISSES.inc()
             return None
 
         # 更新访问时间
         self._cache_access_time[cache_key] = time.time()
         self._cache_stats["hits"] += 1
+        KB_CACHE_HITS.inc()
 
         logger.debug(f"✅ 缓存命中: {cache_key[:8]}...")
 
@@ -206,7 +250,8 @@ class KnowledgeBaseRetriever:
     def post_process_results(
         self,
         results: List[Dict[str, Any]],
-        context: SearchContext
+        context: SearchContext,
+        limit: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         后处理检索结果
@@ -214,6 +259,7 @@ class KnowledgeBaseRetriever:
         Args:
             results: 原始检索结果
             context: 检索上下文
+            limit: 返回数量（None 则为 context.top_k，重排前保留更多候选）
 
         Returns:
             List[Dict[str, Any]]: 处理后的结果
@@ -227,13 +273,61 @@ class KnowledgeBaseRetriever:
         # 2. 排序
         sorted_results = self._sort_results(filtered_results, context)
 
-        # 3. 限制数量
-        limited_results = sorted_results[:context.top_k]
+        # 3. 去重（先去重再截断，重复文本不占用名额）
+        deduplicated_results = self._deduplicate_results(sorted_results)
+
+        # 4. 限制数量
+        return deduplicated_results[:limit or context.top_k]
+
+    async def rerank_results(
+        self,
+        query: str,
+        results: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        重排序候选结果（不超过时间预算）
+
+        按批打分，超过预算时已打分的候选按分数排序、其余保持原顺序排在后面；
+        单批推理本身超时则直接返回原顺序。
 
-        # 4. 去重
-        deduplicated_results = self._deduplicate_results(limited_results)
+        Args:
+            query: 查询文本
+            results: 候选结果（按向量距离排序）
 
-        return deduplicated_results
+        Returns:
+            List[Dict[str, Any]]: 重排后的结果
+        """
+        if self.reranker is None or len(results) < 2:
+            return results
+
+        start = time.perf_counter()
+        budget = self.rerank_budget_ms / 1000
+
+        try:
+            scores = await asyncio.wait_for(
+                run_in_thread(self.reranker.score_until, query, results, start + budget),
+                timeout=budget
+            )
+        except asyncio.TimeoutError:
+            self._rerank_stats["timeouts"] += 1
+            logger.warning(f"⚠️  重排超时（>{self.rerank_budget_ms:.0f}ms），使用向量检索顺序")
+            return results
+        except Exception as e:
+            logger.error(f"❌ 重排失败，使用向量检索顺序: {e}")
+            return results
+
+        scored = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        reranked = [results[i] for i in scored] + results[len(scores):]
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._rerank_stats["count"] += 1
+        self._rerank_stats["total_ms"] += elapsed_ms
+        if len(scores) < len(results):
+            self._rerank_stats["partial"] += 1
+
+        logger.debug(f"✅ 重排完成: {len(scores)}/{len(results)} 个候选 ({elapsed_ms:.1f}ms)")
+
+        return reranked
 
     def _filter_results(
         self,
@@ -346,11 +440,11 @@ class KnowledgeBaseRetriever:
         text_length = len(result.get("text", ""))
         length_factor = text_length / 1000.0  # 归一化
 
-        # 关键词匹配因子
-        keywords = query.split()
+        # 关键词匹配因子（中文按单字 + 双字切分）
+        keywords = set(HashingEmbeddingProvider.tokenize(query))
         text = result.get("text", "").lower()
 
-        keyword_matches = sum(1 for keyword in keywords if keyword.lower() in text)
+        keyword_matches = sum(1 for keyword in keywords if keyword in text)
         keyword_factor = 1.0 - (keyword_matches / len(keywords)) if keywords else 0.0
 
         # 综合分数
@@ -382,6 +476,10 @@ class KnowledgeBaseRetriever:
                 seen.add(text)
                 deduplicated.append(result)
 
+        # 近似重复（重叠的相邻文本块、Wiki 模板文字）只保留排在最前面的一个
+        if self.near_duplicate_threshold > 0:
+            deduplicated = suppress_near_duplicates(deduplicated, self.near_duplicate_threshold)
+
         logger.debug(f"✅ 去重结果: {len(results)} -> {len(deduplicated)}")
 
         return deduplicated
@@ -407,39 +505,63 @@ class KnowledgeBaseRetriever:
         if context.use_cache:
             cached_results = self._get_from_cache(
                 query=context.query,
-                kb_id=context.kb_id,
+                kb_id=context.cache_kb_id,
                 top_k=context.top_k,
                 filters=context.filters
             )
 
             if cached_results is not None:
-                logger.info(f"✅ 缓存命中: {context.kb_id}")
+                logger.info(f"✅ 缓存命中: {context.cache_kb_id}")
                 return cached_results
 
         # 执行检索
-        logger.info(f"🔍 检索知识库: {context.kb_id}")
+        logger.info(f"🔍 检索知识库: {context.cache_kb_id}")
 
         # 构建元数据过滤条件
         where = None
         if context.filters:
             where = context.filters
 
-        # 调用向量数据库搜索
-        raw_results = vector_db.search(
-            kb_id=context.kb_id,
-            query=context.query,
-            top_k=context.top_k * 2,  # 获取更多结果，后处理后筛选
-            where=where
-        )
+        # 配置了嵌入后端时，查询嵌入与其他并发查询合并计算（联合检索时各知识库共用）
+        query_embedding = None
+        embedding_batcher = getattr(vector_db, "embedding_batcher", None)
+        if embedding_batcher is not None:
+            query_embedding = await embedding_batcher.embed(context.query)
+
+        # 获取更多结果，后处理（和重排）后筛选
+        fetch_k = context.top_k * 2
+        if self.reranker is not None:
+            fetch_k = max(fetch_k, self.rerank_candidates)
+
+        if context.kb_ids and len(context.kb_ids) > 1:
+            raw_results = await self._federated_search(
+                vector_db, context, fetch_k, where, query_embedding
+            )
+        else:
+            search_kwargs = {"query_embedding": query_embedding} if query_embedding is not None else {}
+
+            # 调用向量数据库搜索（同步查询放到线程池，避免阻塞事件循环）
+            raw_results = await run_in_thread(
+                vector_db.search,
+                kb_id=context.search_kb_ids[0],
+                query=context.query,
+                top_k=fetch_k,
+                where=where,
+                **search_kwargs
+            )
 
         # 后处理
-        processed_results = self.post_process_results(raw_results, context)
+        if self.reranker is not None:
+            candidates = self.post_process_results(raw_results, context, limit=fetch_k)
+            processed_results = (await self.rerank_results(context.query, candidates))[:context.top_k]
+        else:
+            processed_results = self.post_process_results(raw_results, context)
 
         # 添加到缓存
         if context.use_cache:
             self._add_to_cache(
                 query=context.query,
-                kb_id=context.kb_id,
+                kb_id=context.cache_kb_id,
                 results=processed_results,
                 top_k=context.top_k,
                 filters=context.filters
@@ -449,6 +571,62 @@ class KnowledgeBaseRetriever:
 
         return processed_results
 
+    async def _federated_search(
+        self,
+        vector_db,
+        context: SearchContext,
+        fetch_k: int,
+        where: Optional[Dict[str, Any]],
+        query_embedding: Optional[List[float]]
+    ) -> List[Dict[str, Any]]:
+        """
+        联合检索多个知识库（并发查询，距离换算到同一尺度后合并）
+
+        Args:
+            vector_db: 向量数据库管理器
+            context: 检索上下文
+            fetch_k: 每个知识库取回的结果数量
+            where: 元数据过滤条件
+            query_embedding: 查询向量（None 则由各集合自行计算，且不进行路由）
+
+        Returns:
+            List[Dict[str, Any]]: 合并后的结果（按距离升序）
+        """
+        kb_ids = context.search_kb_ids
+        if self.router is not None:
+            kb_ids = await self.router.route(vector_db, kb_ids, query_embedding)
+
+        search_kwargs = {"query_embedding": query_embedding} if query_embedding is not None else {}
+
+        def search_one(kb_id: str) -> List[Dict[str, Any]]:
+            results = vector_db.search(kb_id=kb_id, query=context.query, top_k=fetch_k, where=where, **search_kwargs)
+            space = vector_db.get_distance_space(kb_id) if results else "l2"
+
+            for result in results:
+                result["kb_id"] = kb_id
+                if result.get("score") is not None:
+                    result["score"] = to_l2_distance(result["score"], space)
+
+            return results
+
+        responses = await asyncio.gather(
+            *(run_in_thread(search_one, kb_id) for kb_id in kb_ids),
+            return_exceptions=True
+        )
+
+        merged = []
+        for kb_id, response in zip(kb_ids, responses):
+            if isinstance(response, Exception):
+                logger.warning(f"⚠️  联合检索中知识库查询失败 (kb_id: {kb_id}): {response}")
+                continue
+            merged.extend(response)
+
+        merged.sort(key=lambda result: result["score"] if result.get("score") is not None else float("inf"))
+
+        logger.info(f"🔗 联合检索: {len(kb_ids)}/{len(context.search_kb_ids)} 个知识库，{len(merged)} 个候选")
+
+        return merged
+
     # ========== 缓存管理 ==========
 
     def clear_cache(self, kb_id: Optional[str] = None):
@@ -464,10 +642,10 @@ class KnowledgeBaseRetriever:
             self._cache_access_time.clear()
             logger.info("✅ 清空所有缓存")
         else:
-            # 清空指定知识库的缓存
+            # 清空指定知识库的缓存（包括包含该知识库的联合检索缓存）
             keys_to_remove = [
                 key for key, item in self._cache.items()
-                if item.kb_id == kb_id
+                if kb_id in item.kb_id.split(",")
             ]
 
             for key in keys_to_remove:
@@ -500,6 +678,23 @@ class KnowledgeBaseRetriever:
             "ttl": self.cache_ttl
         }
 
+    def get_rerank_stats(self) -> Dict[str, Any]:
+        """
+        获取重排统计
+
+        Returns:
+            Dict[str, Any]: 重排次数、部分完成次数、超时次数、平均耗时
+        """
+        count = self._rerank_stats["count"]
+
+        return {
+            "reranker": self.reranker.name if self.reranker else None,
+            "count": count,
+            "partial": self._rerank_stats["partial"],
+            "timeouts": self._rerank_stats["timeouts"],
+            "avg_ms": self._rerank_stats["total_ms"] / count if count else 0.0
+        }
+
     def print_cache_stats(self) -> str:
         """
         打印缓存统计
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件循环阻塞监控模块
+同步代码（文件读写、Chroma 查询、大段 HTML 的正则等）在事件循环线程中执行时，
+所有群的消息都会被卡住。监控由两部分组成：
+
+- 心跳：复用运行指标的事件循环延迟采样器（EventLoopLagSampler），监控开启期间采样间隔缩短为
+  心跳间隔，测得的延迟同时写入 openclaw_event_loop_lag 指标，进程内只有一个心跳协程
+- 看门狗线程：心跳超过阈值未更新时，用 sys._current_frames() 采样事件循环线程的调用栈，
+  定位正在阻塞的代码（优先取项目内最深的一帧）
+
+阻塞结束后按「文件:行号」汇总次数和耗时，记录日志，可通过 /loop_monitor 查看和开关。
+"""
+
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from nonebot.log import logger
+
+from .metrics import EVENT_LOOP_BLOCKS, EventLoopLagSampler, get_lag_sampler
+
+
+# 项目根目录（用于缩短路径、判断项目内的代码）
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+UNKNOWN_LOCATION = "未知位置（阻塞结束前未采样到调用栈）"
+
+
+@dataclass
+class BlockingSite:
+    """阻塞位置汇总"""
+
+    location: str  # 文件:行号
+    function: str  # 函数名
+    stack: List[str] = field(default_factory=list)  # 最近一次采样的调用栈（从外到内）
+    count: int = 0  # 阻塞次数
+    total_ms: float = 0.0  # 累计阻塞时长（毫秒）
+    max_ms: float = 0.0  # 最长一次阻塞（毫秒）
+    last_seen: float = 0.0  # 最近一次阻塞的时间戳
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "location": self.location,
+            "function": self.function,
+            "stack": list(self.stack),
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "max_ms": self.max_ms,
+            "last_seen": self.last_seen
+        }
+
+
+def _short_path(filename: str) -> str:
+    """项目内的文件使用相对路径"""
+    try:
+        path = os.path.relpath(filename, PROJECT_ROOT)
+    except ValueError:
+        return filename
+    return filename if path.startswith("..") else path
+
+
+def _is_project_frame(filename: str) -> bool:
+    """是否为项目内（非本模块、非依赖库）的代码"""
+    path = os.path.abspath(filename)
+    return (
+        path.startswith(PROJECT_ROOT + os.sep)
+        and path != os.path.abspath(__file__)
+        and "site-packages" not in path
+    )
+
+
+def summarize_stack(frame, depth: int = 8) -> Tuple[str, str, List[str]]:
+    """
+    从调用栈中找出阻塞位置
+
+    Args:
+        frame: 事件循环线程当前的栈帧
+        depth: 保留的调用栈深度
+
+    Returns:
+        Tuple[str, str, List[str]]: (文件:行号, 函数名, 调用栈)
+    """
+    frames = traceback.extract_stack(frame)
+    if not frames:
+        return UNKNOWN_LOCATION, "", []
+
+    # 优先取项目内最深的一帧（依赖库内部的帧说明不了是谁调用的）
+    culprit = next((item for item in reversed(frames) if _is_project_frame(item.filename)), frames[-1])
+    stack = [f"{_short_path(item.filename)}:{item.lineno} in {item.name}" for item in frames[-depth:]]
+
+    return f"{_short_path(culprit.filename)}:{culprit.lineno}", culprit.name, stack
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """分位数（空列表为 0）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopMonitor:
+    """事件循环阻塞监控"""
+
+    def __init__(
+        self,
+        threshold_ms: float = 100,
+        interval_ms: float = 20,
+        top_n: int = 10,
+        stack_depth: int = 8,
+        window: int = 3000,
+        sampler: Optional[EventLoopLagSampler] = None
+    ):
+        """
+        初始化监控
+
+        Args:
+            threshold_ms: 阻塞阈值（毫秒，调度延迟超过该值时采样调用栈并记录）
+            interval_ms: 心跳间隔（毫秒）
+            top_n: 报告中列出的阻塞位置数量
+            stack_depth: 保留的调用栈深度
+            window: 保留最近多少个延迟样本（用于分位数）
+            sampler: 提供心跳的延迟采样器（默认使用全局采样器）
+        """
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.top_n = top_n
+        self.stack_depth = stack_depth
+
+        self._lags = deque(maxlen=window)
+        self._sites: Dict[str, BlockingSite] = {}
+        self._lock = threading.Lock()
+
+        self._sampler = sampler
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+
+        # 心跳：时间戳和序号（看门狗线程读取）
+        self._beat = 0.0
+        self._beat_seq = 0
+        # 看门狗对当前心跳的采样：(心跳序号, 位置, 函数名, 调用栈)
+        self._pending: Optional[Tuple[int, str, str, List[str]]] = None
+
+        self._stats = {
+            "blocks": 0,
+            "blocked_ms": 0.0,
+            "samples": 0,
+            "started_at": 0.0
+        }
+
+    @property
+    def running(self) -> bool:
+        """是否正在监控"""
+        return self._running
+
+    def start(self) -> None:
+        """在当前事件循环中开始监控（需在事件循环内调用）"""
+        if self.running:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stop_event.clear()
+        self._stats["started_at"] = time.time()
+
+        self._sampler = self._sampler or get_lag_sampler()
+        self._sampler.add_listener(self)
+        self._running = True
+        self._thread = threading.Thread(target=self._watchdog, name="loop-monitor", daemon=True)
+        self._thread.start()
+
+        logger.info(
+            f"✅ 事件循环阻塞监控已开启（阈值 {self.threshold * 1000:.0f}ms，心跳 {self.interval * 1000:.0f}ms）"
+        )
+
+    async def stop(self) -> None:
+        """停止监控"""
+        self._stop_event.set()
+
+        if self._running:
+            await self._sampler.remove_listener(self)
+            self._running = False
+
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+        logger.info("⏹️  事件循环阻塞监控已关闭")
+
+    def on_beat(self, start: float) -> None:
+        """
+        心跳（采样器在每次定时等待前调用）
+
+        Args:
+            start: 本次心跳的时间戳（perf_counter）
+        """
+        with self._lock:
+            self._beat = start
+            self._beat_seq += 1
+
+    def on_lag(self, lag: float) -> None:
+        """
+        记录延迟样本（采样器在定时唤醒后调用，超过阈值时记为一次阻塞）
+
+        Args:
+            lag: 调度延迟（秒）
+        """
+        self._lags.append(lag)
+
+        if lag >= self.threshold:
+            self._record_block(self._beat_seq, lag)
+
+    def _watchdog(self) -> None:
+        """看门狗线程：心跳超时时采样事件循环线程的调用栈"""
+        poll = max(0.005, self.threshold / 4)
+
+        while not self._stop_event.wait(poll):
+            with self._lock:
+                beat, seq = self._beat, self._beat_seq
+                sampled = self._pending is not None and self._pending[0] == seq
+
+            if sampled or time.perf_counter() - beat < self.interval + self.threshold:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            location, function, stack = summarize_stack(frame, self.stack_depth)
+            del frame
+
+            with self._lock:
+                # 采样期间心跳恢复了，说明阻塞已经结束
+                if self._beat_seq == seq:
+                    self._pending = (seq, location, function, stack)
+                    self._stats["samples"] += 1
+
+    def _record_block(self, seq: int, lag: float) -> None:
+        """
+        记录一次阻塞
+
+        Args:
+            seq: 阻塞前的心跳序号
+            lag: 调度延迟（秒）
+        """
+        with self._lock:
+            pending = self._pending if self._pending is not None and self._pending[0] == seq else None
+            self._pending = None
+
+            if pending is None:
+                location, function, stack = UNKNOWN_LOCATION, "", []
+            else:
+                _, location, function, stack = pending
+
+            lag_ms = lag * 1000
+            site = self._sites.get(location)
+            if site is None:
+                site = self._sites[location] = BlockingSite(location=location, function=function)
+
+            site.stack = stack or site.stack
+            site.count += 1
+            site.total_ms += lag_ms
+            site.max_ms = max(site.max_ms, lag_ms)
+            site.last_seen = time.time()
+
+            self._stats["blocks"] += 1
+            self._stats["blocked_ms"] += lag_ms
+
+        EVENT_LOOP_BLOCKS.inc()
+
+        where = f"{location} in {function}" if function else location
+        logger.warning(f"🐢 事件循环被阻塞 {lag_ms:.0f}ms: {where}")
+        if stack:
+            logger.debug("   调用栈:\n   " + "\n   ".join(stack))
+
+    def get_worst_sites(self, limit: Optional[int] = None) -> List[BlockingSite]:
+        """
+        累计阻塞时长最长的位置
+
+        Args:
+            limit: 返回数量（默认 top_n）
+
+        Returns:
+            List[BlockingSite]: 阻塞位置
+        """
+        with self._lock:
+            sites = sorted(self._sites.values(), key=lambda site: site.total_ms, reverse=True)
+        return sites[:limit or self.top_n]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取监控统计
+
+        Returns:
+            Dict[str, Any]: 统计信息
+        """
+        lags = list(self._lags)
+        with self._lock:
+            stats = dict(self._stats)
+
+        return {
+            "running": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "interval_ms": self.interval * 1000,
+            "lag_p50_ms": _percentile(lags, 0.5) * 1000,
+            "lag_p99_ms": _percentile(lags, 0.99) * 1000,
+            "lag_max_ms": max(lags, default=0.0) * 1000,
+            "sites": [site.to_dict() for site in self.get_worst_sites()],
+            **stats
+        }
+
+    def reset(self) -> None:
+        """清空统计"""
+        with self._lock:
+            self._sites.clear()
+            self._lags.clear()
+            self._stats.update({"blocks": 0, "blocked_ms": 0.0, "samples": 0, "started_at": time.time()})
+
+    def format_report(self) -> str:
+        """
+        格式化监控报告
+
+        Returns:
+            str: 报告文本
+        """
+        stats = self.get_stats()
+        lines = [
+            "🐢 事件循环阻塞监控",
+            "=" * 30,
+            f"状态：{'✅ 运行中' if stats['running'] else '❌ 未开启'}",
+            f"阈值：{stats['threshold_ms']:.0f}ms，心跳：{stats['interval_ms']:.0f}ms",
+            f"调度延迟：p50 {stats['lag_p50_ms']:.1f}ms / p99 {stats['lag_p99_ms']:.1f}ms / 最大 {stats['lag_max_ms']:.1f}ms",
+            f"阻塞次数：{stats['blocks']}，累计 {stats['blocked_ms']:.0f}ms"
+        ]
+
+        if stats["sites"]:
+            lines.append("")
+            lines.append("【阻塞最严重的位置】")
+            for index, site in enumerate(stats["sites"], start=1):
+                function = f" in {site['function']}" if site["function"] else ""
+                lines.append(
+                    f"{index}. {site['location']}{function}\n"
+                    f"   {site['count']} 次，累计 {site['total_ms']:.0f}ms，最长 {site['max_ms']:.0f}ms"
+                )
+
+        return "\n".join(lines)
+
+
+# ========== 全局实例 ==========
+
+_loop_monitor: Optional[LoopMonitor] = None
+
+
+def get_loop_monitor() -> LoopMonitor:
+    """
+    获取全局事件循环监控
+
+    Returns:
+        LoopMonitor: 事件循环监控
+    """
+    global _loop_monitor
+
+    if _loop_monitor is None:
+        from config import config
+
+        _loop_monitor = LoopMonitor(
+            threshold_ms=config.loop_monitor_threshold_ms,
+            interval_ms=config.loop_monitor_interval_ms,
+            top_n=config.loop_monitor_top
+        )
+
+    return _loop_monitor
+
+
+async def start_loop_monitor() -> None:
+    """开启全局事件循环监控（NoneBot 启动时调用）"""
+    get_loop_monitor().start()
+
+
+async def stop_loop_monitor() -> None:
+    """关闭全局事件循环监控（NoneBot 关闭时调用）"""
+    if _loop_monitor is not None and _loop_monitor.running:
+        await _loop_monitor.stop()
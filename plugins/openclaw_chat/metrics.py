@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行指标模块
+提供计数器、仪表盘、直方图，并通过 NoneBot 的 HTTP 服务暴露 /metrics（Prometheus 文本格式）
+"""
+
+import abc
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Callable
+from nonebot.log import logger
+
+from .tracing import Histogram, DEFAULT_BUCKETS, render_prometheus as render_stage_histograms
+
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    """格式化 Prometheus 数值"""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    """转义标签值"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: LabelValues, extra: Optional[Dict[str, str]] = None) -> str:
+    """格式化标签，例如 {provider="deepseek",model="deepseek-chat"}"""
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.extend(f'{name}="{_escape_label(value)}"' for name, value in extra.items())
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(abc.ABC):
+    """指标基类"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """
+        初始化指标
+
+        Args:
+            name: 指标名称
+            documentation: 指标说明
+            labelnames: 标签名列表
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        """按标签名顺序取标签值"""
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        """HELP / TYPE 行"""
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """渲染为 Prometheus 文本行"""
+
+
+class Counter(_Metric):
+    """计数器（只增不减）"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        增加计数
+
+        Args:
+            amount: 增量
+            **labels: 标签
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """获取计数"""
+        return self._values.get(self._label_values(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """仪表盘（可增可减）"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        """
+        设置数值
+
+        Args:
+            value: 数值
+            **labels: 标签
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels) -> Optional[float]:
+        """获取数值（未设置则返回 None）"""
+        return self._values.get(self._label_values(labels))
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class LabeledHistogram(_Metric):
+    """带标签的直方图"""
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: tuple = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self._histograms: Dict[LabelValues, Histogram] = {}
+
+    def labels(self, **labels) -> Histogram:
+        """获取指定标签的直方图"""
+        key = self._label_values(labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        记录观测值
+
+        Args:
+            value: 观测值
+            **labels: 标签
+        """
+        self.labels(**labels).observe(value)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, histogram in sorted(self._histograms.items()):
+            cumulative = histogram.cumulative_counts()
+            for bound, count in zip(list(histogram.buckets) + [float("inf")], cumulative):
+                labels = _format_labels(self.labelnames, key, {"le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(histogram.sum)}")
+            lines.append(f"{self.name}_count{labels} {histogram.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        """注册指标（同名指标只注册一次）"""
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """注册计数器"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """注册仪表盘"""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: tuple = DEFAULT_BUCKETS
+    ) -> LabeledHistogram:
+        """注册直方图"""
+        return self._register(LabeledHistogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        添加采集回调（每次渲染前调用，用于刷新仪表盘）
+
+        Args:
+            collector: 采集回调
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        渲染所有指标（包括请求追踪的阶段耗时直方图）
+
+        Returns:
+            str: Prometheus 文本
+        """
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"⚠️  指标采集失败: {e}")
+
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n" + render_stage_histograms()
+
+
+# ========== 全局注册表与指标 ==========
+registry = MetricsRegistry()
+
+MESSAGES_RECEIVED = registry.counter(
+    "openclaw_messages_received_total", "Messages received by handler.", ("handler",)
+)
+TRIGGERS_FIRED = registry.counter(
+    "openclaw_triggers_fired_total", "Intelligent triggers fired by reason (mention or keyword).", ("reason",)
+)
+LLM_CALLS = registry.counter(
+    "openclaw_llm_calls_total", "LLM provider calls.", ("provider", "model", "status")
+)
+LLM_LATENCY = registry.histogram(
+    "openclaw_llm_latency_seconds", "LLM provider call latency in seconds.", ("provider", "model")
+)
+LLM_ERRORS = registry.counter(
+    "openclaw_llm_errors_total", "LLM provider errors by error code.", ("provider", "code")
+)
+LLM_TOKENS = registry.counter(
+    "openclaw_llm_tokens_total", "Tokens reported by LLM providers.", ("provider", "model", "direction")
+)
+KB_CACHE_HITS = registry.counter(
+    "openclaw_kb_cache_hits_total", "Knowledge base retrieval cache hits."
+)
+KB_CACHE_MISSES = registry.counter(
+    "openclaw_kb_cache_misses_total", "Knowledge base retrieval cache misses."
+)
+KB_CACHE_HIT_RATIO = registry.gauge(
+    "openclaw_kb_cache_hit_ratio", "Knowledge base retrieval cache hit ratio."
+)
+FAQ_ANSWERS = registry.counter(
+    "openclaw_faq_answers_total", "Replies served directly from the FAQ index.", ("kb_id",)
+)
+MEMORY_FLUSH_LATENCY = registry.histogram(
+    "openclaw_memory_flush_seconds", "Conversation memory flush-to-disk latency in seconds."
+)
+EVENT_LOOP_LAG = registry.gauge(
+    "openclaw_event_loop_lag_seconds", "Most recent event loop scheduling lag in seconds."
+)
+EVENT_LOOP_LAG_HISTOGRAM = registry.histogram(
+    "openclaw_event_loop_lag_histogram_seconds", "Event loop scheduling lag in seconds.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+EVENT_LOOP_BLOCKS = registry.counter(
+    "openclaw_event_loop_blocks_total", "Event loop stalls longer than the loop monitor threshold."
+)
+
+
+def extract_cached_tokens(usage: Optional[Dict]) -> int:
+    """
+    从供应商 usage 字段中提取提示词缓存命中的 token 数
+
+    兼容：DeepSeek（prompt_cache_hit_tokens）、OpenAI / OhMyGPT（prompt_tokens_details.cached_tokens）、
+    Moonshot（cached_tokens）
+
+    Args:
+        usage: 供应商返回的 usage 字段
+
+    Returns:
+        int: 缓存命中的 token 数（未返回则为 0）
+    """
+    if not usage:
+        return 0
+
+    if usage.get("prompt_cache_hit_tokens"):
+        return int(usage["prompt_cache_hit_tokens"])
+
+    details = usage.get("prompt_tokens_details")
+    if isinstance(details, dict) and details.get("cached_tokens"):
+        return int(details["cached_tokens"])
+
+    if usage.get("cached_tokens"):
+        return int(usage["cached_tokens"])
+
+    return 0
+
+
+def record_llm_call(
+    provider: str,
+    model: str,
+    duration: float,
+    status: str = "ok",
+    error_code: Optional[str] = None,
+    usage: Optional[Dict] = None
+) -> None:
+    """
+    记录一次 LLM 调用
+
+    Args:
+        provider: 供应商
+        model: 模型
+        duration: 耗时（秒）
+        status: 状态（ok/error/timeout）
+        error_code: 错误码（HTTP 状态码或供应商错误码）
+        usage: 供应商返回的 usage 字段
+    """
+    LLM_CALLS.inc(provider=provider, model=model, status=status)
+    LLM_LATENCY.observe(duration, provider=provider, model=model)
+
+    if error_code is not None:
+        LLM_ERRORS.inc(provider=provider, code=str(error_code))
+
+    if usage:
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, provider=provider, model=model, direction="in")
+        if completion_tokens:
+            LLM_TOKENS.inc(completion_tokens, provider=provider, model=model, direction="out")
+        cached_tokens = extract_cached_tokens(usage)
+        if cached_tokens:
+            LLM_TOKENS.inc(cached_tokens, provider=provider, model=model, direction="cached")
+
+
+def _collect_kb_cache_stats() -> None:
+    """采集知识库检索缓存命中率（命中、未命中次数由检索器直接计数）"""
+    from .ai_processor import get_knowledge_base
+
+    _, _, retriever = get_knowledge_base()
+    if retriever is None:
+        return
+
+    KB_CACHE_HIT_RATIO.set(retriever.get_cache_stats()["hit_rate"])
+
+
+registry.add_collector(_collect_kb_cache_stats)
+
+
+def render_metrics() -> str:
+    """渲染所有指标"""
+    return registry.render()
+
+
+# ========== 事件循环延迟采样 ==========
+
+class EventLoopLagSampler:
+    """
+    事件循环延迟采样器（测量定时唤醒的实际延迟）
+
+    进程内唯一的事件循环心跳：除了写入延迟指标，还把每次心跳和测得的延迟通知给监听者
+    （事件循环阻塞监控），监听者要求更短的间隔时按其中最短的间隔采样。
+    """
+
+    def __init__(self, interval: float = 1.0):
+        """
+        初始化采样器
+
+        Args:
+            interval: 采样间隔（秒）
+        """
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._enabled = False
+        self._listeners: List = []
+
+    @property
+    def running(self) -> bool:
+        """是否正在采样"""
+        return self._task is not None and not self._task.done()
+
+    def current_interval(self) -> float:
+        """当前采样间隔（自身间隔与监听者要求的间隔中最短的一个）"""
+        return min([self.interval] + [listener.interval for listener in self._listeners])
+
+    async def _run(self) -> None:
+        """采样循环"""
+        while True:
+            listeners = list(self._listeners)
+            interval = self.current_interval()
+            start = time.perf_counter()
+            for listener in listeners:
+                listener.on_beat(start)
+
+            await asyncio.sleep(interval)
+
+            lag = max(0.0, time.perf_counter() - start - interval)
+            EVENT_LOOP_LAG.set(lag)
+            EVENT_LOOP_LAG_HISTOGRAM.observe(lag)
+            for listener in listeners:
+                listener.on_lag(lag)
+
+    def _restart(self) -> None:
+        """重新开始采样（新的间隔立即生效）"""
+        if self._task is not None:
+            self._task.cancel()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _cancel(self) -> None:
+        """结束采样循环"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def start(self) -> None:
+        """启动采样"""
+        self._enabled = True
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """停止采样（仍有监听者时继续为监听者采样）"""
+        self._enabled = False
+        if not self._listeners:
+            await self._cancel()
+
+    def add_listener(self, listener) -> None:
+        """
+        添加监听者（需在事件循环内调用，未启动时随之启动）
+
+        Args:
+            listener: 监听者，需提供 interval 属性（秒）以及 on_beat(start)、on_lag(lag) 方法
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+        self._restart()
+
+    async def remove_listener(self, listener) -> None:
+        """
+        移除监听者（没有监听者且未单独启动时停止采样）
+
+        Args:
+            listener: 监听者
+        """
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+        if not self._listeners and not self._enabled:
+            await self._cancel()
+
+
+_lag_sampler: Optional[EventLoopLagSampler] = None
+
+
+def get_lag_sampler() -> EventLoopLagSampler:
+    """
+    获取全局事件循环延迟采样器
+
+    Returns:
+        EventLoopLagSampler: 采样器
+    """
+    global _lag_sampler
+
+    if _lag_sampler is None:
+        _lag_sampler = EventLoopLagSampler()
+
+    return _lag_sampler
+
+
+def setup_metrics(path: str = "/metrics", lag_interval: float = 1.0) -> bool:
+    """
+    在 NoneBot 驱动器上挂载 /metrics 路由，并在启动时开始事件循环延迟采样
+
+    Args:
+        path: 路由路径
+        lag_interval: 事件循环延迟采样间隔（秒）
+
+    Returns:
+        bool: 是否挂载成功
+    """
+    from nonebot import get_driver
+
+    try:
+        from nonebot.drivers import ASGIMixin, HTTPServerSetup, URL, Request, Response
+    except ImportError:
+        logger.warning("⚠️  当前 NoneBot 版本不支持注册 HTTP 路由，/metrics 不可用")
+        return False
+
+    driver = get_driver()
+
+    if not isinstance(driver, ASGIMixin):
+        logger.warning(f"⚠️  驱动器 {driver.type} 不支持 HTTP 服务，/metrics 不可用")
+        return False
+
+    async def handle_metrics(request: Request) -> Response:
+        return Response(
+            200,
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+            content=render_metrics()
+        )
+
+    driver.setup_http_server(HTTPServerSetup(
+        path=URL(path),
+        method="GET",
+        name="openclaw_metrics",
+        handle_func=handle_metrics
+    ))
+
+    sampler = get_lag_sampler()
+    sampler.interval = lag_interval
+    driver.on_startup(sampler.start)
+    driver.on_shutdown(sampler.stop)
+
+    logger.info(f"✅ 运行指标已挂载: {path}")
+
+    return True
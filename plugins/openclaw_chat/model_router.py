@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型路由模块
+按请求在已配置的 供应商/模型 之间选择：综合实时 EWMA 延迟、近期错误率、消息长度、回复模式和知识库上下文
+高频的智能触发和简洁回复走快速小模型，@机器人 的长问题和带知识库的问题走大模型
+"""
+
+import re
+import threading
+from collections import deque, Counter as CountDict
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, List, Tuple
+from nonebot.log import logger
+
+from .metrics import registry
+from .provider_pool import ProviderStats, CircuitBreaker
+
+
+# 快速模型名称特征（flash/mini/nano/lite/air 或 7B~9B 小参数量）
+FAST_MODEL_PATTERN = re.compile(r"(flash|mini|nano|lite|air|\b[789]b\b|-[789]b)", re.IGNORECASE)
+
+TIER_FAST = "fast"
+TIER_LARGE = "large"
+
+# 没有延迟样本时的延迟先验（秒）
+DEFAULT_LATENCY_PRIOR = {TIER_FAST: 1.5, TIER_LARGE: 4.0}
+
+# 打分权重
+ERROR_RATE_WEIGHT = 10.0
+TIER_MISMATCH_PENALTY = 3.0
+DEFAULT_MODEL_BONUS = 0.5
+
+
+@dataclass
+class RouteCandidate:
+    """路由候选"""
+    provider: str
+    model: str
+    tier: str
+
+
+@dataclass
+class RouteDecision:
+    """路由结果"""
+    provider: str
+    model: str
+    tier: str
+    wanted_tier: str
+    score: float
+    reason: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return asdict(self)
+
+
+def infer_tier(model_name: str) -> str:
+    """
+    根据模型名称推断档位
+
+    Args:
+        model_name: 模型名称
+
+    Returns:
+        str: fast/large
+    """
+    return TIER_FAST if FAST_MODEL_PATTERN.search(model_name) else TIER_LARGE
+
+
+def parse_candidates(spec: str) -> List[RouteCandidate]:
+    """
+    解析候选配置
+
+    Args:
+        spec: 逗号分隔的 provider:model[:tier]，例如 "zhipu:glm-4-flash:fast,deepseek:deepseek-chat:large"
+
+    Returns:
+        List[RouteCandidate]: 候选列表
+    """
+    candidates = []
+
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+
+        parts = item.split(":")
+        if len(parts) < 2:
+            logger.warning(f"⚠️  忽略无效的路由候选: {item}")
+            continue
+
+        provider = parts[0].strip()
+        # 模型名可能包含冒号（例如 Ollama 的 qwen2:7b），只有最后一段是 fast/large 时才视为档位
+        if len(parts) >= 3 and parts[-1].strip() in (TIER_FAST, TIER_LARGE):
+            model_name = ":".join(parts[1:-1]).strip()
+            tier = parts[-1].strip()
+        else:
+            model_name = ":".join(parts[1:]).strip()
+            tier = infer_tier(model_name)
+
+        candidates.append(RouteCandidate(provider, model_name, tier))
+
+    return candidates
+
+
+class ModelRouter:
+    """延迟与成本感知的模型路由器"""
+
+    def __init__(self, long_message_chars: int = 200, history_size: int = 50):
+        """
+        初始化路由器
+
+        Args:
+            long_message_chars: 超过该长度的消息视为长问题（偏向大模型）
+            history_size: 保留的最近路由记录数
+        """
+        self.long_message_chars = long_message_chars
+        self._stats: Dict[Tuple[str, str], ProviderStats] = {}
+        self._stats_lock = threading.Lock()
+        self._recent = deque(maxlen=history_size)
+        self._decision_counts: CountDict = CountDict()
+        # 已解析的 MODEL_ROUTER_CANDIDATES：(配置原文, 校验后的候选)，配置不变时不再重复解析
+        self._configured: Optional[Tuple[str, List[RouteCandidate]]] = None
+
+    def get_stats(self, provider: str, model_name: str) -> ProviderStats:
+        """获取 供应商/模型 的统计"""
+        key = (provider, model_name)
+        stats = self._stats.get(key)
+        if stats is None:
+            with self._stats_lock:
+                stats = self._stats.setdefault(key, ProviderStats())
+        return stats
+
+    def observe(self, provider: str, model_name: str, latency: float, success: bool) -> None:
+        """
+        记录一次模型调用结果
+
+        Args:
+            provider: 供应商
+            model_name: 模型
+            latency: 耗时（秒）
+            success: 是否成功
+        """
+        self.get_stats(provider, model_name).record(latency, success)
+
+    def get_candidates(self) -> List[RouteCandidate]:
+        """
+        获取候选列表（配置了 MODEL_ROUTER_CANDIDATES 则使用配置，否则为每个已配置 Key 的供应商取默认模型和一个快速模型）
+
+        Returns:
+            List[RouteCandidate]: 候选列表
+        """
+        from config import config
+        from .ai_processor import MODEL_CONFIGS
+
+        if config.model_router_candidates:
+            candidates = self._get_configured_candidates(config.model_router_candidates)
+        else:
+            candidates = []
+            for provider, provider_config in MODEL_CONFIGS.items():
+                # 自动生成时不包含本地模型（需显式配置）
+                if not provider_config["env_key"]:
+                    continue
+
+                default_model = provider_config["default_model"]
+                candidates.append(RouteCandidate(provider, default_model, infer_tier(default_model)))
+
+                fast_model = next((m for m in provider_config["models"] if infer_tier(m) == TIER_FAST), None)
+                if fast_model and fast_model != default_model:
+                    candidates.append(RouteCandidate(provider, fast_model, TIER_FAST))
+
+        usable = []
+        for candidate in candidates:
+            provider_config = MODEL_CONFIGS.get(candidate.provider)
+            if not provider_config:
+                continue
+            if provider_config["env_key"] and not config.get_api_key(candidate.provider):
+                continue
+            usable.append(candidate)
+
+        return usable
+
+    def _get_configured_candidates(self, spec: str) -> List[RouteCandidate]:
+        """
+        解析并校验配置的候选（只在配置变化时解析，不在 MODEL_CONFIGS 中的供应商/模型跳过并告警）
+
+        Args:
+            spec: MODEL_ROUTER_CANDIDATES 配置
+
+        Returns:
+            List[RouteCandidate]: 候选列表
+        """
+        from .ai_processor import MODEL_CONFIGS
+
+        configured = self._configured
+        if configured is not None and configured[0] == spec:
+            return configured[1]
+
+        candidates = []
+        for candidate in parse_candidates(spec):
+            provider_config = MODEL_CONFIGS.get(candidate.provider)
+            if not provider_config:
+                logger.warning(f"⚠️  忽略未知供应商的路由候选: {candidate.provider}:{candidate.model}")
+                continue
+            # Ollama 的模型名可以带标签（qwen2:7b），按去掉标签后的名称校验
+            base_model = candidate.model.split(":", 1)[0]
+            if candidate.model not in provider_config["models"] and base_model not in provider_config["models"]:
+                logger.warning(f"⚠️  忽略未知模型的路由候选: {candidate.provider}:{candidate.model}")
+                continue
+            candidates.append(candidate)
+
+        self._configured = (spec, candidates)
+        return candidates
+
+    def wanted_tier(self, message: str, context: str, reply_mode: str, has_kb: bool) -> Tuple[str, str]:
+        """
+        根据请求特征确定期望档位
+
+        Args:
+            message: 用户消息
+            context: 上下文（qq_group/qq_private/qq_group_intelligent）
+            reply_mode: 实际回复模式
+            has_kb: 是否带知识库上下文
+
+        Returns:
+            Tuple[str, str]: (期望档位, 原因)
+        """
+        if reply_mode == "concise":
+            return TIER_FAST, "concise"
+        if context == "qq_group_intelligent":
+            return TIER_FAST, "intelligent_trigger"
+        if has_kb:
+            return TIER_LARGE, "kb_context"
+        if len(message) >= self.long_message_chars:
+            return TIER_LARGE, "long_message"
+        if reply_mode == "detailed":
+            return TIER_LARGE, "detailed"
+        # 明确 @机器人 或使用 /chat 命令
+        return TIER_LARGE, "mention"
+
+    def score(
+        self,
+        candidate: RouteCandidate,
+        wanted: Optional[str],
+        default: Optional[Tuple[str, str]] = None
+    ) -> float:
+        """
+        计算候选得分（越低越好）：EWMA 延迟 + 错误率惩罚 + 档位不匹配惩罚 - 默认模型加分
+
+        Args:
+            candidate: 候选
+            wanted: 期望档位
+            default: 配置中的默认 (供应商, 模型)
+
+        Returns:
+            float: 得分
+        """
+        stats = self.get_stats(candidate.provider, candidate.model)
+        latency = stats.ewma_latency if stats.ewma_latency is not None else DEFAULT_LATENCY_PRIOR[candidate.tier]
+
+        score = latency + stats.error_rate * ERROR_RATE_WEIGHT
+
+        if wanted is not None and candidate.tier != wanted:
+            score += TIER_MISMATCH_PENALTY
+
+        if default is not None and (candidate.provider, candidate.model) == default:
+            score -= DEFAULT_MODEL_BONUS
+
+        return score
+
+    def route(
+        self,
+        message: str,
+        context: str,
+        reply_mode: str,
+        has_kb: bool = False,
+        default: Optional[Tuple[str, str]] = None
+    ) -> Optional[RouteDecision]:
+        """
+        为一次请求选择模型
+
+        Args:
+            message: 用户消息
+            context: 上下文
+            reply_mode: 实际回复模式
+            has_kb: 是否带知识库上下文
+            default: 配置中的默认 (供应商, 模型)
+
+        Returns:
+            RouteDecision: 路由结果（没有可用候选时返回 None）
+        """
+        from .provider_pool import get_provider_pool
+
+        wanted, reason = self.wanted_tier(message, context, reply_mode, has_kb)
+        pool = get_provider_pool()
+
+        # 排除熔断中的供应商（只读检查，不占用试探名额）
+        candidates = [
+            c for c in self.get_candidates()
+            if pool.get_breaker(c.provider).state != CircuitBreaker.OPEN
+        ]
+
+        if not candidates:
+            return None
+
+        scored = [(self.score(c, wanted, default), c) for c in candidates]
+        best_score, best = min(scored, key=lambda item: item[0])
+
+        decision = RouteDecision(
+            provider=best.provider,
+            model=best.model,
+            tier=best.tier,
+            wanted_tier=wanted,
+            score=round(best_score, 3),
+            reason=reason
+        )
+
+        self._recent.append(decision)
+        self._decision_counts[(best.provider, best.model)] += 1
+        ROUTE_DECISIONS.inc(provider=best.provider, model=best.model, reason=reason)
+
+        logger.info(
+            f"🧭 模型路由: {best.provider}/{best.model} "
+            f"(档位: {best.tier}, 期望: {wanted}, 原因: {reason}, 得分: {decision.score})"
+        )
+
+        return decision
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取路由状态
+
+        Returns:
+            Dict[str, Any]: 候选统计、路由次数、最近路由记录
+        """
+        candidates = []
+        for candidate in self.get_candidates():
+            stats = self.get_stats(candidate.provider, candidate.model)
+            candidates.append({
+                "provider": candidate.provider,
+                "model": candidate.model,
+                "tier": candidate.tier,
+                "ewma_latency": stats.ewma_latency,
+                "error_rate": stats.error_rate,
+                "samples": stats.samples,
+                "routed": self._decision_counts.get((candidate.provider, candidate.model), 0)
+            })
+
+        return {
+            "candidates": candidates,
+            "recent": [d.to_dict() for d in self._recent]
+        }
+
+
+# 全局路由器
+_model_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """
+    获取全局模型路由器
+
+    Returns:
+        ModelRouter: 模型路由器
+    """
+    global _model_router
+
+    if _model_router is None:
+        from config import config
+        _model_router = ModelRouter(long_message_chars=config.model_router_long_message)
+
+    return _model_router
+
+
+# ========== 运行指标 ==========
+ROUTE_DECISIONS = registry.counter(
+    "openclaw_route_decisions_total", "Model router decisions.", ("provider", "model", "reason")
+)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复文本块检测（MinHash + LSH）
+以字符 3-gram 的 Jaccard 相似度判断两个文本块是否近似重复，
+用于构建知识库时丢弃重复的文本块，以及检索时过滤内容重叠的结果
+
+指纹在入库时计算并保存在文本块元数据中（minhash 字段，base64 编码），检索时直接读取。
+"""
+
+import base64
+import re
+import zlib
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from nonebot.log import logger
+
+
+NUM_PERM = 64  # MinHash 排列数（估计误差约 1/sqrt(64) ≈ 0.125）
+SHINGLE_SIZE = 3  # 字符 n-gram 长度
+LSH_BANDS = 16  # LSH 分段数（每段 4 个值）
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240601)
+# 乘数限制在 2^31 以内，保证 a * h（h < 2^32）在 uint64 内不溢出
+_PERM_A = _rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_NORMALIZE_PATTERN = re.compile(r"[\W_]+")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    """
+    生成字符 n-gram（去掉空白和标点，中英文统一处理）
+
+    Args:
+        text: 文本
+        size: n-gram 长度
+
+    Returns:
+        List[str]: n-gram 列表（文本短于 n 时返回整段文本）
+    """
+    normalized = _NORMALIZE_PATTERN.sub("", text.lower())
+    if len(normalized) <= size:
+        return [normalized]
+    return [normalized[i:i + size] for i in range(len(normalized) - size + 1)]
+
+
+def minhash(text: str) -> np.ndarray:
+    """
+    计算 MinHash 签名
+
+    Args:
+        text: 文本
+
+    Returns:
+        np.ndarray: 签名（NUM_PERM 个 uint32）
+    """
+    hashes = np.fromiter(
+        {zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)}, dtype=np.uint64
+    )
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def encode_signature(signature: np.ndarray) -> str:
+    """签名编码为字符串（保存到元数据）"""
+    return base64.b64encode(signature.astype("<u4").tobytes()).decode("ascii")
+
+
+def decode_signature(value: str) -> Optional[np.ndarray]:
+    """从字符串解码签名（格式不符时返回 None）"""
+    try:
+        signature = np.frombuffer(base64.b64decode(value), dtype="<u4")
+    except Exception:
+        return None
+    return signature if len(signature) == NUM_PERM else None
+
+
+def estimate_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """估计两个签名对应文本的 Jaccard 相似度"""
+    return float(np.mean(a == b))
+
+
+class NearDuplicateIndex:
+    """近似重复索引（LSH 分段找候选，再用签名估计 Jaccard 确认）"""
+
+    def __init__(self, threshold: float = 0.8):
+        """
+        初始化
+
+        Args:
+            threshold: Jaccard 阈值（达到即视为重复）
+        """
+        self.threshold = threshold
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[Hashable]] = {}
+
+    def _bands(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        """签名分段"""
+        rows = NUM_PERM // LSH_BANDS
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(LSH_BANDS)]
+
+    def find_duplicate(self, signature: np.ndarray) -> Optional[Hashable]:
+        """
+        查找已收录的近似重复项
+
+        Args:
+            signature: 签名
+
+        Returns:
+            Hashable: 重复项的键（没有则返回 None）
+        """
+        checked = set()
+
+        for band in self._bands(signature):
+            for key in self._buckets.get(band, ()):
+                if key in checked:
+                    continue
+                checked.add(key)
+                if estimate_jaccard(signature, self._signatures[key]) >= self.threshold:
+                    return key
+
+        return None
+
+    def add(self, key: Hashable, signature: np.ndarray) -> Optional[Hashable]:
+        """
+        收录签名（已有近似重复项时不收录）
+
+        Args:
+            key: 键
+            signature: 签名
+
+        Returns:
+            Hashable: 重复项的键（成功收录时返回 None）
+        """
+        duplicate = self.find_duplicate(signature)
+        if duplicate is not None:
+            return duplicate
+
+        self._signatures[key] = signature
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, []).append(key)
+
+        return None
+
+
+def fingerprint_chunks(chunks: List[Any], threshold: float = 0.0) -> List[Any]:
+    """
+    为文本块计算 MinHash 指纹并写入元数据，可选丢弃近似重复的文本块
+
+    Args:
+        chunks: 文本块列表（DocumentChunk）
+        threshold: 入库去重的 Jaccard 阈值（0 表示只计算指纹、不去重）
+
+    Returns:
+        List[Any]: 保留的文本块
+    """
+    index = NearDuplicateIndex(threshold) if threshold > 0 else None
+    kept = []
+
+    for position, chunk in enumerate(chunks):
+        signature = minhash(chunk.text)
+        chunk.metadata = dict(chunk.metadata or {})
+        chunk.metadata["minhash"] = encode_signature(signature)
+
+        if index is not None:
+            duplicate = index.add(position, signature)
+            if duplicate is not None:
+                logger.debug(f"♻️  丢弃近似重复文本块: {chunk.chunk_id} ≈ {chunks[duplicate].chunk_id}")
+                continue
+
+        kept.append(chunk)
+
+    if len(kept) < len(chunks):
+        logger.info(f"♻️  入库去重: {len(chunks)} -> {len(kept)} 个文本块")
+
+    return kept
+
+
+def _result_signature(result: Dict[str, Any]) -> np.ndarray:
+    """读取检索结果中保存的指纹（旧知识库没有指纹时现场计算）"""
+    metadata = result.get("metadata") or {}
+    stored = metadata.get("minhash") or (metadata.get("metadata") or {}).get("minhash")
+
+    if stored:
+        signature = decode_signature(stored)
+        if signature is not None:
+            return signature
+
+    return minhash(result.get("text", ""))
+
+
+def suppress_near_duplicates(results: List[Dict[str, Any]], threshold: float) -> List[Dict[str, Any]]:
+    """
+    过滤近似重复的检索结果（按顺序保留每组中排在最前面的结果）
+
+    Args:
+        results: 检索结果
+        threshold: Jaccard 阈值
+
+    Returns:
+        List[Dict[str, Any]]: 过滤后的结果
+    """
+    index = NearDuplicateIndex(threshold)
+    return [result for position, result in enumerate(results) if index.add(position, _result_signature(result)) is None]
@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NumPy 向量存储
+不依赖 ChromaDB 的轻量向量索引，适合数万个文本块以内的知识库
+
+每个集合对应一个目录：
+- embeddings.npy：归一化后的向量矩阵（float32，读取时内存映射）
+- columns.json：按列保存的 ID、文本、元数据（与向量矩阵按行对应）
+- ivf.npz：IVF 粗量化索引（聚类中心 + 按聚类排序的行号），文本块数量达到阈值时生成
+
+接口与 Chroma 的 Client / Collection 保持一致（get_or_create_collection / add / query ...），
+VectorDatabaseManager 可以按知识库在两种后端之间切换。
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from nonebot.log import logger
+
+from .embeddings import normalize
+
+
+EmbedFunction = Callable[[List[str]], List[List[float]]]
+
+
+def _match_where(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """
+    判断元数据是否满足过滤条件（支持 Chroma 的等值、$eq、$ne、$in、$nin）
+
+    Args:
+        metadata: 元数据
+        where: 过滤条件
+
+    Returns:
+        bool: 是否满足
+    """
+    for key, condition in where.items():
+        value = metadata.get(key)
+
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+
+    return True
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    训练 IVF 聚类中心（球面 k-means，在采样上训练）
+
+    Args:
+        vectors: 归一化后的向量矩阵
+        nlist: 聚类数量
+        iterations: 迭代次数
+        seed: 随机种子
+
+    Returns:
+        np.ndarray: 归一化后的聚类中心（nlist × 维度）
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * 64)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        # 空聚类保留原中心
+        counts = np.bincount(assign, minlength=nlist)
+        sums[counts == 0] = centroids[counts == 0]
+        centroids = normalize(sums)
+
+    return centroids
+
+
+class NumpyCollection:
+    """NumPy 向量集合（暴力检索 + 可选 IVF）"""
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        embedding_function: Optional[EmbedFunction] = None,
+        ivf_threshold: int = 20000,
+        ivf_nprobe: int = 8,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """
+        初始化集合
+
+        Args:
+            directory: 集合目录
+            name: 集合名称
+            embedding_function: 嵌入函数（add 未提供向量或按文本查询时使用）
+            ivf_threshold: 文本块数量达到多少时构建 IVF 索引（0 表示始终暴力检索）
+            ivf_nprobe: IVF 检索时探测的聚类数量
+            metadata: 集合元数据
+        """
+        self.directory = directory
+        self.name = name
+        self.embedding_function = embedding_function
+        self.ivf_threshold = ivf_threshold
+        self.ivf_nprobe = ivf_nprobe
+        self.metadata = metadata or {}
+
+        self.embeddings_file = os.path.join(directory, "embeddings.npy")
+        self.columns_file = os.path.join(directory, "columns.json")
+        self.ivf_file = os.path.join(directory, "ivf.npz")
+
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._id_index: Dict[str, int] = {}
+        self._embeddings: Optional[np.ndarray] = None
+        # IVF 索引：聚类中心、按聚类排序的行号、每个聚类在行号数组中的起止位置
+        self._ivf: Optional[Dict[str, np.ndarray]] = None
+        self._lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # ========== 持久化 ==========
+
+    def _load(self) -> None:
+        """加载集合（向量矩阵内存映射）"""
+        if not os.path.exists(self.columns_file):
+            return
+
+        with open(self.columns_file, "r", encoding="utf-8") as f:
+            columns = json.load(f)
+
+        self.metadata = columns.get("metadata", self.metadata)
+        ids = columns.get("ids", [])
+        embeddings = np.load(self.embeddings_file, mmap_mode="r") if os.path.exists(self.embeddings_file) else None
+
+        rows = min(len(ids), 0 if embeddings is None else embeddings.shape[0])
+        if rows != len(ids):
+            logger.warning(f"⚠️  向量集合文件不完整，只加载前 {rows} 行: {self.name}")
+
+        self._ids = ids[:rows]
+        self._documents = columns.get("documents", [])[:rows]
+        self._metadatas = columns.get("metadatas", [])[:rows]
+        self._id_index = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._embeddings = embeddings[:rows] if embeddings is not None else None
+
+        if os.path.exists(self.ivf_file) and self.ivf_threshold and rows >= self.ivf_threshold:
+            with np.load(self.ivf_file) as ivf:
+                if int(ivf["rows"]) == rows:
+                    self._ivf = {key: ivf[key] for key in ("centroids", "order", "offsets")}
+
+    def _save(self, embeddings: np.ndarray) -> None:
+        """
+        保存集合（先写临时文件再替换，保证读取时文件完整）
+
+        Args:
+            embeddings: 新的向量矩阵
+        """
+        # 释放旧的内存映射，避免替换文件时被占用
+        self._embeddings = None
+
+        tmp_embeddings = f"{self.embeddings_file}.tmp"
+        with open(tmp_embeddings, "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype=np.float32))
+
+        tmp_columns = f"{self.columns_file}.tmp"
+        with open(tmp_columns, "w", encoding="utf-8") as f:
+            json.dump({
+                "metadata": self.metadata,
+                "ids": self._ids,
+                "documents": self._documents,
+                "metadatas": self._metadatas
+            }, f, ensure_ascii=False)
+
+        os.replace(tmp_embeddings, self.embeddings_file)
+        os.replace(tmp_columns, self.columns_file)
+
+        self._embeddings = np.load(self.embeddings_file, mmap_mode="r")
+        self._build_ivf()
+
+    def _build_ivf(self) -> None:
+        """文本块数量达到阈值时重建 IVF 索引"""
+        rows = len(self._ids)
+        self._ivf = None
+
+        if not self.ivf_threshold or rows < self.ivf_threshold:
+            if os.path.exists(self.ivf_file):
+                os.remove(self.ivf_file)
+            return
+
+        nlist = max(1, int(np.sqrt(rows)))
+        centroids = train_ivf(self._embeddings, nlist)
+
+        # 分块计算归属，避免一次性生成 行数 × 聚类数 的矩阵
+        assign = np.empty(rows, dtype=np.int32)
+        for start in range(0, rows, 8192):
+            assign[start:start + 8192] = np.argmax(self._embeddings[start:start + 8192] @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+        self._ivf = {"centroids": centroids, "order": order, "offsets": offsets}
+
+        tmp_ivf = f"{self.ivf_file}.tmp.npz"
+        np.savez(tmp_ivf, rows=np.int64(rows), **self._ivf)
+        os.replace(tmp_ivf, self.ivf_file)
+
+        logger.info(f"✅ IVF 索引构建完成: {self.name} ({rows} 行，{nlist} 个聚类)")
+
+    # ========== 写入 ==========
+
+    def _prepare_embeddings(self, documents: List[str], embeddings: Optional[List[List[float]]]) -> np.ndarray:
+        """准备归一化向量（未提供时调用嵌入函数）"""
+        if embeddings is None:
+            if self.embedding_function is None:
+                raise ValueError(f"集合 {self.name} 未配置嵌入函数，需要提供 embeddings")
+            embeddings = self.embedding_function(documents)
+
+        matrix = normalize(np.asarray(embeddings, dtype=np.float32))
+
+        if self._embeddings is not None and len(self._ids) and matrix.shape[1] != self._embeddings.shape[1]:
+            raise ValueError(f"向量维度不匹配: {matrix.shape[1]} != {self._embeddings.shape[1]}")
+
+        return matrix
+
+    def _current_embeddings(self, dimension: int) -> np.ndarray:
+        """读取当前向量矩阵到内存"""
+        if self._embeddings is None or not len(self._ids):
+            return np.empty((0, dimension), dtype=np.float32)
+        return np.array(self._embeddings)
+
+    def upsert(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        embeddings: Optional[List[List[float]]] = None
+    ) -> None:
+        """
+        写入文本块（已存在的 ID 覆盖，不存在的追加）
+
+        Args:
+            ids: ID 列表
+            documents: 文本列表
+            metadatas: 元数据列表
+            embeddings: 向量列表（可选）
+        """
+        metadatas = metadatas or [{} for _ in ids]
+        matrix = self._prepare_embeddings(documents, embeddings)
+
+        with self._lock:
+            current = self._current_embeddings(matrix.shape[1])
+            appended = []
+
+            for i, chunk_id in enumerate(ids):
+                row = self._id_index.get(chunk_id)
+                if row is None:
+                    self._id_index[chunk_id] = len(self._ids)
+                    self._ids.append(chunk_id)
+                    self._documents.append(documents[i])
+                    self._metadatas.append(metadatas[i])
+                    appended.append(i)
+                elif row >= len(current):
+                    # 同一批次内重复的 ID，以最后一次为准
+                    appended[row - len(current)] = i
+                    self._documents[row] = documents[i]
+                    self._metadatas[row] = metadatas[i]
+                else:
+                    current[row] = matrix[i]
+                    self._documents[row] = documents[i]
+                    self._metadatas[row] = metadatas[i]
+
+            self._save(np.concatenate([current, matrix[appended]]) if appended else current)
+
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+            embeddings: Optional[List[List[float]]] = None) -> None:
+        """添加文本块（与 Chroma 不同，已存在的 ID 直接覆盖）"""
+        self.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def update(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+               embeddings: Optional[List[List[float]]] = None) -> None:
+        """更新文本块（不存在的 ID 忽略）"""
+        keep = [i for i, chunk_id in enumerate(ids) if chunk_id in self._id_index]
+        if not keep:
+            return
+
+        self.upsert(
+            ids=[ids[i] for i in keep],
+            documents=[documents[i] for i in keep],
+            metadatas=[metadatas[i] for i in keep] if metadatas else None,
+            embeddings=[embeddings[i] for i in keep] if embeddings else None
+        )
+
+    def delete(self, ids: List[str]) -> None:
+        """
+        删除文本块
+
+        Args:
+            ids: ID 列表
+        """
+        with self._lock:
+            remove = {self._id_index[chunk_id] for chunk_id in ids if chunk_id in self._id_index}
+            if not remove:
+                return
+
+            keep = [row for row in range(len(self._ids)) if row not in remove]
+            current = np.array(self._embeddings)[keep]
+
+            self._ids = [self._ids[row] for row in keep]
+            self._documents = [self._documents[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._id_index = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+
+            self._save(current)
+
+    # ========== 检索 ==========
+
+    def count(self) -> int:
+        """文本块数量"""
+        return len(self._ids)
+
+    def centroid(self) -> Optional[np.ndarray]:
+        """
+        集合的平均向量（归一化，空集合返回 None）
+
+        Returns:
+            np.ndarray: 平均向量
+        """
+        with self._lock:
+            embeddings = self._embeddings
+            rows = len(self._ids)
+
+        if embeddings is None or not rows:
+            return None
+
+        total = np.zeros(embeddings.shape[1], dtype=np.float64)
+        for start in range(0, rows, 8192):
+            total += embeddings[start:start + 8192].sum(axis=0)
+
+        return normalize(total.astype(np.float32))
+
+    def _candidate_rows(self, query: np.ndarray, top_k: int) -> Optional[np.ndarray]:
+        """IVF 候选行号（未构建索引时返回 None，表示检索全部）"""
+        if self._ivf is None:
+            return None
+
+        centroids, order, offsets = self._ivf["centroids"], self._ivf["order"], self._ivf["offsets"]
+        nprobe = min(self.ivf_nprobe, len(centroids))
+        probes = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([order[offsets[p]:offsets[p + 1]] for p in probes])
+
+        # 候选不足时退回暴力检索
+        if len(candidates) < top_k:
+            return None
+
+        return np.sort(candidates)
+
+    def search_vector(self, query: np.ndarray, top_k: int, where: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        """
+        向量检索
+
+        Args:
+            query: 查询向量
+            top_k: 返回结果数量
+            where: 元数据过滤条件
+
+        Returns:
+            List[tuple]: (行号, 相似度) 列表，按相似度从高到低排列
+        """
+        with self._lock:
+            embeddings = self._embeddings
+            if embeddings is None or not len(self._ids):
+                return []
+
+            query = normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+            rows = self._candidate_rows(query, top_k)
+
+            if where:
+                allowed = np.fromiter(
+                    (_match_where(metadata, where) for metadata in self._metadatas), dtype=bool, count=len(self._ids)
+                )
+                rows = np.flatnonzero(allowed) if rows is None else rows[allowed[rows]]
+
+            scores = embeddings @ query if rows is None else embeddings[rows] @ query
+
+        if not len(scores):
+            return []
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        if rows is not None:
+            return [(int(rows[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def query(
+        self,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings: Optional[List[List[float]]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, List[List[Any]]]:
+        """
+        相似度检索（返回格式与 Chroma 一致，距离为归一化向量的平方 L2 距离）
+
+        Args:
+            query_texts: 查询文本列表
+            query_embeddings: 查询向量列表
+            n_results: 每个查询返回的结果数量
+            where: 元数据过滤条件
+
+        Returns:
+            Dict[str, List[List[Any]]]: ids / documents / metadatas / distances
+        """
+        if query_embeddings is None:
+            if self.embedding_function is None:
+                raise ValueError(f"集合 {self.name} 未配置嵌入函数，需要提供 query_embeddings")
+            query_embeddings = self.embedding_function(query_texts or [])
+
+        results: Dict[str, List[List[Any]]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        for query in query_embeddings:
+            hits = self.search_vector(np.asarray(query, dtype=np.float32), n_results, where)
+            results["ids"].append([self._ids[row] for row, _ in hits])
+            results["documents"].append([self._documents[row] for row, _ in hits])
+            results["metadatas"].append([self._metadatas[row] for row, _ in hits])
+            results["distances"].append([max(0.0, 2.0 - 2.0 * score) for _, score in hits])
+
+        return results
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, List[Any]]:
+        """
+        按 ID 或分页读取文本块（返回格式与 Chroma 一致）
+
+        Args:
+            ids: 文本块 ID 列表（None 表示全部）
+            limit: 最多返回的数量
+            offset: 起始位置
+            include: 需要返回的字段（documents / metadatas / embeddings，默认前两项）
+
+        Returns:
+            Dict[str, List[Any]]: ids / documents / metadatas（/ embeddings）
+        """
+        include = include or ["documents", "metadatas"]
+
+        with self._lock:
+            if ids is None:
+                rows = list(range(len(self._ids)))
+            else:
+                rows = [self._id_index[chunk_id] for chunk_id in ids if chunk_id in self._id_index]
+
+            rows = rows[offset:offset + limit if limit is not None else None]
+
+            results: Dict[str, List[Any]] = {"ids": [self._ids[row] for row in rows]}
+            if "documents" in include:
+                results["documents"] = [self._documents[row] for row in rows]
+            if "metadatas" in include:
+                results["metadatas"] = [self._metadatas[row] for row in rows]
+            if "embeddings" in include:
+                results["embeddings"] = [np.asarray(self._embeddings[row]).tolist() for row in rows]
+
+        return results
+
+
+class NumpyVectorStore:
+    """NumPy 向量存储（接口与 Chroma PersistentClient 一致）"""
+
+    def __init__(
+        self,
+        path: str,
+        embedding_function: Optional[EmbedFunction] = None,
+        ivf_threshold: int = 20000,
+        ivf_nprobe: int = 8
+    ):
+        """
+        初始化向量存储
+
+        Args:
+            path: 存储目录
+            embedding_function: 嵌入函数
+            ivf_threshold: 文本块数量达到多少时构建 IVF 索引（0 表示始终暴力检索）
+            ivf_nprobe: IVF 检索时探测的聚类数量
+        """
+        self.path = path
+        self.embedding_function = embedding_function
+        self.ivf_threshold = ivf_threshold
+        self.ivf_nprobe = ivf_nprobe
+
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+
+    def _collection_dir(self, name: str) -> str:
+        """集合目录"""
+        return os.path.join(self.path, re.sub(r"[^A-Za-z0-9_.-]", "_", name))
+
+    def _open(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> NumpyCollection:
+        """打开集合（同一集合只加载一次）"""
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = NumpyCollection(
+                    directory=self._collection_dir(name),
+                    name=name,
+                    embedding_function=self.embedding_function,
+                    ivf_threshold=self.ivf_threshold,
+                    ivf_nprobe=self.ivf_nprobe,
+                    metadata=metadata
+                )
+                self._collections[name] = collection
+            return collection
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None, **kwargs) -> NumpyCollection:
+        """获取或创建集合"""
+        return self._open(name, metadata)
+
+    def get_collection(self, name: str, **kwargs) -> NumpyCollection:
+        """获取已存在的集合（不存在时抛出 ValueError）"""
+        if name not in self._collections and not os.path.exists(os.path.join(self._collection_dir(name), "columns.json")):
+            raise ValueError(f"集合不存在: {name}")
+        return self._open(name)
+
+    def delete_collection(self, name: str) -> None:
+        """删除集合"""
+        with self._lock:
+            self._collections.pop(name, None)
+
+        directory = self._collection_dir(name)
+        if not os.path.exists(directory):
+            raise ValueError(f"集合不存在: {name}")
+        shutil.rmtree(directory)
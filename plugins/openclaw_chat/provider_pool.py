@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+供应商池模块
+为 MODEL_CONFIGS 中的供应商提供故障转移链、熔断器和对冲请求
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+from nonebot.log import logger
+
+from .metrics import registry
+
+
+class ProviderError(Exception):
+    """供应商调用失败"""
+
+    def __init__(
+        self,
+        provider: str,
+        message: str,
+        status_code: Optional[int] = None,
+        code: Optional[str] = None
+    ):
+        """
+        初始化供应商错误
+
+        Args:
+            provider: 供应商
+            message: 错误信息
+            status_code: HTTP 状态码（超时/连接失败时为 None）
+            code: 供应商错误码或错误类型（timeout/connect_error/1113 等）
+        """
+        super().__init__(message)
+        self.provider = provider
+        self.message = message
+        self.status_code = status_code
+        self.code = code
+
+    @property
+    def insufficient_balance(self) -> bool:
+        """是否为余额不足"""
+        return self.code == "1113" or "余额不足" in self.message
+
+    @property
+    def should_failover(self) -> bool:
+        """
+        是否应该切换到其他供应商
+
+        超时、连接失败、5xx、限流由上游引起；401/402/403 和余额不足只与当前供应商的账号有关。
+        其余 4xx（例如请求格式错误）换供应商也无济于事。
+        """
+        if self.status_code is None:
+            return True
+        if self.status_code >= 500 or self.status_code in (401, 402, 403, 429):
+            return True
+        return self.insufficient_balance
+
+
+class CircuitBreaker:
+    """熔断器（closed → open → half_open → closed）"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            reset_timeout: 熔断后多久允许一次试探请求（秒）
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """
+        是否放行请求（熔断超时后只放行一个试探请求）
+
+        Returns:
+            bool: 是否放行
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+
+            return False
+
+    def record_success(self) -> None:
+        """记录成功（试探成功则恢复）"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """记录失败（达到阈值或试探失败则熔断）"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """释放试探名额（请求被取消、未产生结果时调用）"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class ProviderStats:
+    """供应商延迟与错误率统计"""
+
+    def __init__(self, window: int = 50, alpha: float = 0.3):
+        """
+        初始化统计
+
+        Args:
+            window: 最近样本窗口大小（用于 p95 与错误率）
+            alpha: EWMA 平滑系数
+        """
+        self.alpha = alpha
+        self.ewma_latency: Optional[float] = None
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, success: bool) -> None:
+        """
+        记录一次调用
+
+        Args:
+            latency: 耗时（秒）
+            success: 是否成功
+        """
+        with self._lock:
+            self._outcomes.append(success)
+            if not success:
+                return
+            self._latencies.append(latency)
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+
+    @property
+    def samples(self) -> int:
+        """成功调用的延迟样本数"""
+        return len(self._latencies)
+
+    @property
+    def error_rate(self) -> float:
+        """最近窗口内的错误率"""
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return 1 - sum(self._outcomes) / len(self._outcomes)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        最近窗口内的延迟分位数
+
+        Args:
+            q: 分位（0~1）
+
+        Returns:
+            float: 分位数（无样本返回 None）
+        """
+        with self._lock:
+            if not self._latencies:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+RequestFunc = Callable[[str, str], Awaitable[str]]
+
+
+class ProviderPool:
+    """供应商池（故障转移 + 熔断 + 对冲）"""
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        hedge_enabled: bool = False,
+        hedge_min_samples: int = 10
+    ):
+        """
+        初始化供应商池
+
+        Args:
+            failure_threshold: 熔断阈值（连续失败次数）
+            reset_timeout: 熔断恢复时间（秒）
+            hedge_enabled: 是否启用对冲请求
+            hedge_min_samples: 启用对冲所需的最少延迟样本数
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, ProviderStats] = {}
+
+    def get_breaker(self, provider: str) -> CircuitBreaker:
+        """获取供应商的熔断器"""
+        if provider not in self._breakers:
+            self._breakers[provider] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[provider]
+
+    def get_stats(self, provider: str) -> ProviderStats:
+        """获取供应商的统计"""
+        if provider not in self._stats:
+            self._stats[provider] = ProviderStats()
+        return self._stats[provider]
+
+    def hedge_delay(self, provider: str) -> Optional[float]:
+        """
+        对冲等待时间（供应商的 p95 延迟，样本不足则不对冲）
+
+        Args:
+            provider: 供应商
+
+        Returns:
+            float: 等待时间（秒），None 表示不对冲
+        """
+        if not self.hedge_enabled:
+            return None
+        stats = self.get_stats(provider)
+        if stats.samples < self.hedge_min_samples:
+            return None
+        return stats.percentile(0.95)
+
+    def build_chain(self, primary: str, primary_model: str) -> List[Tuple[str, str]]:
+        """
+        构建故障转移链：首选供应商 + 已配置 API Key 的备用供应商
+
+        Args:
+            primary: 首选供应商
+            primary_model: 首选模型
+
+        Returns:
+            List[Tuple[str, str]]: (供应商, 模型) 列表
+        """
+        from config import config
+        from .ai_processor import MODEL_CONFIGS
+
+        if config.provider_fallback_chain:
+            order = [p.strip() for p in config.provider_fallback_chain.split(",") if p.strip()]
+            explicit = set(order)
+        else:
+            order = list(MODEL_CONFIGS.keys())
+            explicit = set()
+
+        chain = [(primary, primary_model)]
+
+        for provider in order:
+            if provider == primary or provider not in MODEL_CONFIGS:
+                continue
+
+            provider_config = MODEL_CONFIGS[provider]
+            if provider_config["env_key"]:
+                if not config.get_api_key(provider):
+                    continue
+            elif provider not in explicit:
+                # 不需要 Key 的本地供应商（Ollama）只在显式列出时使用
+                continue
+
+            # 备用供应商支持同名模型则沿用，否则使用其默认模型
+            model_name = primary_model if primary_model in provider_config["models"] else provider_config["default_model"]
+            chain.append((provider, model_name))
+
+        return chain
+
+    async def _attempt(self, provider: str, model_name: str, request: RequestFunc) -> str:
+        """
+        调用单个供应商，并更新熔断器与统计
+
+        Args:
+            provider: 供应商
+            model_name: 模型
+            request: 请求函数
+
+        Returns:
+            str: 回复
+        """
+        breaker = self.get_breaker(provider)
+        stats = self.get_stats(provider)
+        start = time.perf_counter()
+
+        try:
+            reply = await request(provider, model_name)
+        except asyncio.CancelledError:
+            # 对冲中被取消的请求不计入失败
+            breaker.release()
+            raise
+        except ProviderError as e:
+            stats.record(time.perf_counter() - start, success=False)
+            if e.should_failover:
+                breaker.record_failure()
+                if breaker.state == CircuitBreaker.OPEN:
+                    logger.warning(f"⚡ 供应商 {provider} 已熔断（{self.reset_timeout}s 后试探恢复）")
+            else:
+                breaker.release()
+            raise
+
+        stats.record(time.perf_counter() - start, success=True)
+        breaker.record_success()
+        return reply
+
+    async def _attempt_with_hedge(
+        self,
+        primary: Tuple[str, str],
+        hedge: Optional[Tuple[str, str]],
+        request: RequestFunc,
+        launched: List[str]
+    ) -> str:
+        """
+        调用供应商；超过 p95 延迟仍未返回时向下一个供应商发送对冲请求
+
+        Args:
+            primary: (供应商, 模型)
+            hedge: 对冲目标 (供应商, 模型)，None 表示不对冲
+            request: 请求函数
+            launched: 实际发出对冲请求时追加对冲目标供应商（供调用方跳过）
+
+        Returns:
+            str: 回复
+        """
+        primary_task = asyncio.ensure_future(self._attempt(primary[0], primary[1], request))
+
+        delay = self.hedge_delay(primary[0]) if hedge else None
+        if delay is None:
+            return await primary_task
+
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            return primary_task.result()
+
+        if not self.get_breaker(hedge[0]).allow_request():
+            return await primary_task
+
+        logger.info(f"🔀 {primary[0]} 超过 p95（{delay:.2f}s）未返回，对冲请求 {hedge[0]}")
+        launched.append(hedge[0])
+        hedge_task = asyncio.ensure_future(self._attempt(hedge[0], hedge[1], request))
+
+        pending = {primary_task, hedge_task}
+        last_error: Optional[BaseException] = None
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise last_error
+
+    async def call(self, primary: str, primary_model: str, request: RequestFunc) -> str:
+        """
+        按故障转移链调用供应商（跳过已熔断的供应商）
+
+        Args:
+            primary: 首选供应商
+            primary_model: 首选模型
+            request: 请求函数 request(provider, model_name) -> 回复（失败时抛出 ProviderError）
+
+        Returns:
+            str: 回复
+
+        Raises:
+            ProviderError: 所有供应商均失败（或遇到不可转移的错误）
+        """
+        chain = self.build_chain(primary, primary_model)
+        last_error: Optional[ProviderError] = None
+        attempted = False
+        index = 0
+
+        while index < len(chain):
+            current = chain[index]
+            index += 1
+
+            if not self.get_breaker(current[0]).allow_request():
+                logger.debug(f"⚡ 供应商 {current[0]} 熔断中，跳过")
+                continue
+
+            attempted = True
+            hedge = chain[index] if index < len(chain) else None
+            launched: List[str] = []
+
+            try:
+                reply = await self._attempt_with_hedge(current, hedge, request, launched)
+                if current[0] != primary or launched:
+                    logger.info(f"🔁 已由备用供应商回复（首选: {primary}）")
+                return reply
+            except ProviderError as e:
+                last_error = e
+                if not e.should_failover:
+                    raise
+
+                logger.warning(f"🔁 供应商 {e.provider} 调用失败（{e.code or e.status_code}），切换到下一个供应商")
+
+                # 对冲目标已经试过，跳过
+                if launched:
+                    index += 1
+
+        if not attempted:
+            # 全部熔断时仍尝试首选供应商，避免直接放弃
+            logger.warning("⚠️  所有供应商均已熔断，仍尝试首选供应商")
+            return await self._attempt(chain[0][0], chain[0][1], request)
+
+        raise last_error
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """
+        获取各供应商状态
+
+        Returns:
+            List[Dict[str, Any]]: 熔断状态、EWMA 延迟、p95、错误率
+        """
+        status = []
+        for provider in sorted(set(self._breakers) | set(self._stats)):
+            breaker = self.get_breaker(provider)
+            stats = self.get_stats(provider)
+            status.append({
+                "provider": provider,
+                "state": breaker.state,
+                "consecutive_failures": breaker.consecutive_failures,
+                "ewma_latency": stats.ewma_latency,
+                "p95_latency": stats.percentile(0.95),
+                "error_rate": stats.error_rate,
+                "samples": stats.samples
+            })
+        return status
+
+
+# 全局供应商池
+_provider_pool: Optional[ProviderPool] = None
+
+
+def get_provider_pool() -> ProviderPool:
+    """
+    获取全局供应商池（首次调用时按配置创建）
+
+    Returns:
+        ProviderPool: 供应商池
+    """
+    global _provider_pool
+
+    if _provider_pool is None:
+        from config import config
+
+        _provider_pool = ProviderPool(
+            failure_threshold=config.provider_breaker_failures,
+            reset_timeout=config.provider_breaker_reset,
+            hedge_enabled=config.provider_hedge_enabled,
+            hedge_min_samples=config.provider_hedge_min_samples
+        )
+
+    return _provider_pool
+
+
+# ========== 运行指标 ==========
+PROVIDER_CIRCUIT_OPEN = registry.gauge(
+    "openclaw_provider_circuit_open", "Whether the provider circuit breaker is open (1) or not (0).", ("provider",)
+)
+PROVIDER_EWMA_LATENCY = registry.gauge(
+    "openclaw_provider_ewma_latency_seconds", "EWMA latency of successful provider calls.", ("provider",)
+)
+
+
+def _collect_provider_status() -> None:
+    """采集供应商状态"""
+    if _provider_pool is None:
+        return
+
+    for item in _provider_pool.get_status():
+        PROVIDER_CIRCUIT_OPEN.set(1 if item["state"] != CircuitBreaker.CLOSED else 0, provider=item["provider"])
+        if item["ewma_latency"] is not None:
+            PROVIDER_EWMA_LATENCY.set(item["ewma_latency"], provider=item["provider"])
+
+
+registry.add_collector(_collect_provider_status)
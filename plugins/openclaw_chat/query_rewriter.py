@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检索查询改写模块
+知识库检索默认只使用最新一条消息，追问（"那它掉落什么？"）检索不到相关内容。
+改写阶段根据最近的对话补全指代和省略的主语：
+
+- heuristic：本地规则，从上一轮用户消息中提取实体，替换代词或补在句首（无额外耗时）
+- llm：调用当前模型改写，超时或失败时退回本地规则
+
+改写结果按会话缓存（会话 ID + 查询 + 上一轮用户消息），同一追问重复出现时不再重复改写。
+"""
+
+import asyncio
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from nonebot.log import logger
+
+
+REWRITE_MODES = ("off", "heuristic", "llm")
+
+LLMRewrite = Callable[[str, List[Dict[str, Any]]], Awaitable[str]]
+
+# 单字代词：排除其他/其它/吉他/利他/排他/他人/他妈等复合词
+_SINGLE_PRONOUN = r"(?<![其吉利排])[它他她](?![妈人])"
+# 指示词后面紧跟名词时是限定语（"这个武器"），只有后面是标点、句尾、疑问词或动词时才是指代
+_DEMONSTRATIVE_END = r"(?=$|[\W_]|怎|如何|为|什么|咋|哪|多少|是|有|在|能|会|要|可|还|也|都|掉|合成|制作|召唤|打|用|好|的|吗|呢|吧|啊|呀)"
+# 指代词（按长度从长到短匹配）
+_PRONOUN_PATTERN = re.compile(
+    r"它们|他们|她们|这个东西|那个东西|这东西|那东西|"
+    r"(?:这个|那个|这些|那些|这种|那种)" + _DEMONSTRATIVE_END + "|"
+    + _SINGLE_PRONOUN + r"|\b(?:it|its|this|that|they|them)\b",
+    re.IGNORECASE
+)
+# 句首的承接词（补全主语时去掉；"那个/那种"等是指代词，不是承接词）
+_LEADING_PATTERN = re.compile(r"^(?:那么|那(?![个些种东])|还有|然后|另外|所以)[，,\s]*")
+# 提取实体时的分隔：标点、疑问词、虚词和常见动作词
+_SPLIT_PATTERN = re.compile(
+    r"[\W_]+|怎么样|怎么|如何|为什么|为啥|什么|哪里|哪儿|哪个|哪些|多少|是不是|可不可以|可以|能不能|"
+    r"有没有|没有|应该|需要|请问|一下|获得|获取|得到|掉落|合成|制作|召唤|击败|打败|使用|出现|"
+    r"属性|效果|作用|位置|几|能|会|要|有|是|在|的|了|吗|呢|吧|啊|呀|和|与|跟|或|还|我|你|" + _SINGLE_PRONOUN + r"|们|这|那|个|打|用|刷|买|卖"
+)
+_QUOTED_PATTERN = re.compile(r"[《「『“\"]([^》」』”\"]{1,30})[》」』”\"]")
+_LATIN_PATTERN = re.compile(r"\b[A-Z][A-Za-z0-9'\-]*(?:\s+(?:(?:of|the|and)\s+)?[A-Z][A-Za-z0-9'\-]*)*")
+_LATIN_STOPWORDS = {"how", "what", "where", "why", "when", "which", "who", "does", "did", "can", "is", "the", "i"}
+
+# 短查询（去掉标点后的字符数）且没有实体时视为省略了主语
+SHORT_QUERY_CHARS = 6
+
+REWRITE_SYSTEM_PROMPT = (
+    "你是知识库检索的查询改写助手。根据对话历史，把用户最新的问题改写成一个独立、完整、"
+    "可以直接用于检索的问题：补全代词和省略的主语，不回答问题，不添加无关内容。"
+    "只输出改写后的问题。"
+)
+
+
+def extract_entity(text: str) -> Optional[str]:
+    """
+    从文本中提取最可能的实体（书名号/引号内的词 > 英文专有名词 > 最长的中文片段）
+
+    Args:
+        text: 文本
+
+    Returns:
+        str: 实体（没有则返回 None）
+    """
+    quoted = _QUOTED_PATTERN.search(text)
+    if quoted:
+        return quoted.group(1).strip()
+
+    for match in _LATIN_PATTERN.finditer(text):
+        words = match.group(0).split()
+        # 去掉句首大写的疑问词
+        while words and words[0].lower() in _LATIN_STOPWORDS:
+            words.pop(0)
+        if words:
+            return " ".join(words)
+
+    segments = [segment for segment in _SPLIT_PATTERN.split(text) if segment and len(segment) >= 2]
+    if not segments:
+        return None
+
+    # 最长的片段，长度相同时取靠前的
+    return max(segments, key=len)
+
+
+def needs_rewrite(query: str) -> bool:
+    """
+    判断查询是否依赖上文（包含指代词、以承接词开头，或过短且没有实体）
+
+    Args:
+        query: 查询文本
+
+    Returns:
+        bool: 是否需要改写
+    """
+    if _PRONOUN_PATTERN.search(query) or _LEADING_PATTERN.match(query):
+        return True
+
+    normalized = re.sub(r"[\W_]+", "", query)
+    return len(normalized) <= SHORT_QUERY_CHARS and extract_entity(query) is None
+
+
+def _previous_user_turns(history: List[Dict[str, Any]], user_id: Optional[str] = None) -> List[str]:
+    """
+    最近的用户消息（从新到旧，群聊中优先同一用户的消息）
+
+    Args:
+        history: 对话历史（从旧到新）
+        user_id: 当前用户 ID（可选）
+
+    Returns:
+        List[str]: 用户消息
+    """
+    turns = [message for message in reversed(history) if message.get("role") == "user"]
+
+    if user_id is not None:
+        own = [
+            message for message in turns
+            if str((message.get("metadata") or {}).get("user_id", user_id)) == str(user_id)
+        ]
+        turns = own or turns
+
+    return [message.get("content", "") for message in turns]
+
+
+def heuristic_rewrite(query: str, history: List[Dict[str, Any]], user_id: Optional[str] = None) -> str:
+    """
+    本地规则改写：从最近的用户消息中取实体，替换代词或补在句首
+
+    Args:
+        query: 查询文本
+        history: 对话历史（从旧到新）
+        user_id: 当前用户 ID（可选）
+
+    Returns:
+        str: 改写后的查询（找不到实体时返回原查询）
+    """
+    if not needs_rewrite(query):
+        return query
+
+    entity = None
+    for turn in _previous_user_turns(history, user_id):
+        entity = extract_entity(turn)
+        if entity:
+            break
+
+    if not entity or entity in query:
+        return query
+
+    stripped = _LEADING_PATTERN.sub("", query)
+    if _PRONOUN_PATTERN.search(stripped):
+        return _PRONOUN_PATTERN.sub(entity, stripped, count=1)
+
+    return entity + stripped
+
+
+def build_rewrite_messages(query: str, history: List[Dict[str, Any]], max_turns: int = 4) -> List[Dict[str, str]]:
+    """
+    构建 LLM 改写的消息列表
+
+    Args:
+        query: 查询文本
+        history: 对话历史（从旧到新）
+        max_turns: 最多带上的历史消息数
+
+    Returns:
+        List[Dict[str, str]]: 消息列表
+    """
+    lines = []
+    for message in history[-max_turns:]:
+        role = "用户" if message.get("role") == "user" else "助手"
+        lines.append(f"{role}：{message.get('content', '')[:200]}")
+
+    return [
+        {"role": "system", "content": REWRITE_SYSTEM_PROMPT},
+        {"role": "user", "content": "对话历史：\n" + "\n".join(lines) + f"\n\n最新问题：{query}"}
+    ]
+
+
+class QueryRewriter:
+    """检索查询改写器（带会话缓存）"""
+
+    def __init__(self, mode: str = "heuristic", cache_size: int = 1024, llm_timeout: float = 0.8):
+        """
+        初始化改写器
+
+        Args:
+            mode: 改写方式（off / heuristic / llm）
+            cache_size: 缓存条目数
+            llm_timeout: LLM 改写超时（秒，超时退回本地规则）
+        """
+        if mode not in REWRITE_MODES:
+            raise ValueError(f"不支持的查询改写方式: {mode}（可选: {', '.join(REWRITE_MODES)}）")
+
+        self.mode = mode
+        self.cache_size = cache_size
+        self.llm_timeout = llm_timeout
+
+        # (会话 ID, 查询, 上一轮用户消息) -> 改写结果
+        self._cache: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "rewrites": 0,
+            "cache_hits": 0,
+            "llm": 0,
+            "llm_failures": 0
+        }
+
+    def _sanitize(self, query: str, rewritten: Optional[str]) -> Optional[str]:
+        """清理 LLM 输出（取第一行，去掉引号；为空或过长时丢弃）"""
+        if not rewritten:
+            return None
+
+        line = next((line.strip() for line in rewritten.strip().splitlines() if line.strip()), "")
+        line = re.sub(r"^(?:改写后的问题|改写|问题)[:：]\s*", "", line).strip("\"'“”「」 ")
+
+        if not line or len(line) > max(100, len(query) * 4):
+            return None
+
+        return line
+
+    async def rewrite(
+        self,
+        session_id: str,
+        query: str,
+        history: List[Dict[str, Any]],
+        user_id: Optional[str] = None,
+        llm: Optional[LLMRewrite] = None
+    ) -> str:
+        """
+        改写检索查询
+
+        Args:
+            session_id: 会话 ID
+            query: 最新消息
+            history: 对话历史（从旧到新）
+            user_id: 当前用户 ID（群聊中优先使用同一用户的上文）
+            llm: LLM 改写函数（llm 模式下使用）
+
+        Returns:
+            str: 改写后的查询（不需要改写时返回原查询）
+        """
+        if self.mode == "off" or not history or not needs_rewrite(query):
+            return query
+
+        previous_turns = _previous_user_turns(history, user_id)
+        key = (session_id, query, previous_turns[0] if previous_turns else "")
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return cached
+
+        rewritten = None
+        if self.mode == "llm" and llm is not None:
+            self._stats["llm"] += 1
+            try:
+                rewritten = self._sanitize(query, await asyncio.wait_for(llm(query, history), timeout=self.llm_timeout))
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️  LLM 查询改写超时（{self.llm_timeout}s），使用本地规则")
+            except Exception as e:
+                logger.warning(f"⚠️  LLM 查询改写失败，使用本地规则: {e}")
+
+            if rewritten is None:
+                self._stats["llm_failures"] += 1
+
+        if rewritten is None:
+            rewritten = heuristic_rewrite(query, history, user_id)
+
+        with self._lock:
+            self._cache[key] = rewritten
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        if rewritten != query:
+            self._stats["rewrites"] += 1
+            logger.info(f"✏️  查询改写: {query} -> {rewritten}")
+
+        return rewritten
+
+    def clear_session(self, session_id: str):
+        """
+        清除会话的改写缓存
+
+        Args:
+            session_id: 会话 ID
+        """
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == session_id]:
+                del self._cache[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取改写统计
+
+        Returns:
+            Dict[str, Any]: 统计信息
+        """
+        with self._lock:
+            return {"mode": self.mode, "cache_size": len(self._cache), **self._stats}
+
+
+# ========== 全局实例 ==========
+
+_query_rewriter: Optional[QueryRewriter] = None
+
+
+def get_query_rewriter() -> QueryRewriter:
+    """
+    获取全局查询改写器
+
+    Returns:
+        QueryRewriter: 查询改写器
+    """
+    global _query_rewriter
+
+    if _query_rewriter is None:
+        from config import config
+
+        mode = config.query_rewrite_mode
+        if mode not in REWRITE_MODES:
+            logger.warning(f"⚠️  不支持的查询改写方式: {mode}，使用 heuristic")
+            mode = "heuristic"
+
+        _query_rewriter = QueryRewriter(
+            mode=mode,
+            cache_size=config.query_rewrite_cache_size,
+            llm_timeout=config.query_rewrite_timeout
+        )
+
+    return _query_rewriter
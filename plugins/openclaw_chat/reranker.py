@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识库检索重排序模块
+对向量检索多取回的候选结果重新排序，提高前几条结果的精度，从而减少发送给大模型的知识库文本块
+
+- lexical：中文友好的词法重排（CJK 单字 + 双字的 BM25，与向量相似度加权融合），无需模型
+- cross_encoder：ONNX Runtime 本地交叉编码器（如 bge-reranker / ms-marco-MiniLM 的 int8 量化模型）
+"""
+
+import abc
+import math
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+import numpy as np
+from nonebot.log import logger
+
+from .embeddings import ONNX_MODEL_FILES, HashingEmbeddingProvider
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+def vector_similarity(result: Dict[str, Any]) -> float:
+    """
+    将向量检索的距离转换为相似度（归一化向量的平方 L2 距离 → 余弦相似度）
+
+    Args:
+        result: 检索结果
+
+    Returns:
+        float: 相似度（-1 ~ 1，无距离时为 0）
+    """
+    distance = result.get("score")
+    if distance is None:
+        return 0.0
+    return 1.0 - float(distance) / 2.0
+
+
+class Reranker(abc.ABC):
+    """重排序器接口"""
+
+    name = "base"
+    batch_size = 0  # 每批打分的候选数（0 表示一次性打分）
+
+    @abc.abstractmethod
+    def score(self, query: str, results: List[Dict[str, Any]]) -> List[float]:
+        """
+        为候选结果打分（同步，调用方负责放到线程池）
+
+        Args:
+            query: 查询文本
+            results: 候选结果
+
+        Returns:
+            List[float]: 相关性分数（越高越相关）
+        """
+
+    def score_until(self, query: str, results: List[Dict[str, Any]], deadline: float) -> List[float]:
+        """
+        分批打分，预计下一批会超过截止时间时不再处理剩余的批次
+
+        Args:
+            query: 查询文本
+            results: 候选结果
+            deadline: 截止时间（time.perf_counter()）
+
+        Returns:
+            List[float]: 已完成打分的前若干个候选的分数
+        """
+        batch_size = self.batch_size or len(results)
+        scores: List[float] = []
+        batch_seconds = 0.0
+
+        for offset in range(0, len(results), batch_size):
+            # 按上一批的耗时预估，来不及完成的批次不再开始
+            if scores and time.perf_counter() + batch_seconds > deadline:
+                break
+            start = time.perf_counter()
+            scores.extend(self.score(query, results[offset:offset + batch_size]))
+            batch_seconds = time.perf_counter() - start
+
+        return scores
+
+
+class LexicalReranker(Reranker):
+    """词法重排（候选集内的 BM25 + 向量相似度）"""
+
+    name = "lexical"
+
+    def __init__(self, weight: float = 0.5, k1: float = 1.2, b: float = 0.75):
+        """
+        初始化
+
+        Args:
+            weight: 词法分数的权重（0 只看向量相似度，1 只看词法匹配）
+            k1: BM25 词频饱和参数
+            b: BM25 长度归一化参数
+        """
+        self.weight = weight
+        self.k1 = k1
+        self.b = b
+
+    def lexical_scores(self, query: str, texts: List[str]) -> List[float]:
+        """
+        计算 BM25 分数（IDF 在候选集内统计）
+
+        Args:
+            query: 查询文本
+            texts: 候选文本
+
+        Returns:
+            List[float]: BM25 分数
+        """
+        query_tokens = set(HashingEmbeddingProvider.tokenize(query))
+        if not query_tokens or not texts:
+            return [0.0] * len(texts)
+
+        documents = [Counter(HashingEmbeddingProvider.tokenize(text)) for text in texts]
+        lengths = [sum(document.values()) for document in documents]
+        avg_length = (sum(lengths) / len(lengths)) or 1.0
+
+        scores = []
+        for document, length in zip(documents, lengths):
+            score = 0.0
+            for token in query_tokens:
+                tf = document.get(token, 0)
+                if not tf:
+                    continue
+                df = sum(1 for other in documents if token in other)
+                idf = math.log(1.0 + (len(documents) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+            scores.append(score)
+
+        return scores
+
+    def score(self, query: str, results: List[Dict[str, Any]]) -> List[float]:
+        """词法分数归一化后与向量相似度加权"""
+        lexical = self.lexical_scores(query, [result.get("text", "") for result in results])
+        top = max(lexical, default=0.0) or 1.0
+
+        return [
+            (1 - self.weight) * vector_similarity(result) + self.weight * lexical_score / top
+            for result, lexical_score in zip(results, lexical)
+        ]
+
+
+class CrossEncoderReranker(Reranker):
+    """ONNX Runtime 交叉编码器（模型在第一次使用时加载）"""
+
+    name = "cross_encoder"
+
+    def __init__(self, model_dir: str, threads: int = 0, max_length: int = 256, batch_size: int = 8):
+        """
+        初始化
+
+        Args:
+            model_dir: 模型目录（包含 *.onnx 和 tokenizer.json）
+            threads: 推理线程数（0 表示自动）
+            max_length: 查询 + 文本的最大 token 数（超出截断）
+            batch_size: 每批推理的候选数（时间预算按批检查）
+        """
+        if not ONNX_AVAILABLE:
+            raise ImportError(
+                "ONNX Runtime 未安装，请安装：pip install onnxruntime tokenizers\n"
+                "或使用 KB_RERANKER=lexical（词法重排）"
+            )
+
+        self.model_dir = model_dir
+        self.threads = threads
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        self._session = None
+        self._tokenizer = None
+        self._input_names: List[str] = []
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        """加载模型和分词器"""
+        with self._lock:
+            if self._session is not None:
+                return
+
+            model_file = next(
+                (os.path.join(self.model_dir, f) for f in ONNX_MODEL_FILES if os.path.exists(os.path.join(self.model_dir, f))),
+                None
+            )
+            if model_file is None:
+                raise FileNotFoundError(f"未找到 ONNX 重排模型文件: {self.model_dir}")
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.inter_op_num_threads = 1
+            if self.threads > 0:
+                options.intra_op_num_threads = self.threads
+
+            session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.enable_padding()
+
+            self._input_names = [model_input.name for model_input in session.get_inputs()]
+            self._tokenizer = tokenizer
+            self._session = session
+
+            logger.info(f"✅ 重排模型已加载: {model_file}")
+
+    def score(self, query: str, results: List[Dict[str, Any]]) -> List[float]:
+        """计算 (查询, 文本) 对的相关性 logit"""
+        if not results:
+            return []
+
+        if self._session is None:
+            self._load()
+
+        encodings = self._tokenizer.encode_batch([(query, result.get("text", "")) for result in results])
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+
+        logits = self._session.run(None, {name: feeds[name] for name in self._input_names if name in feeds})[0]
+        logits = np.asarray(logits, dtype=np.float32).reshape(len(results), -1)
+
+        # 单输出为相关性 logit；二分类输出取 "相关" 与 "不相关" 的差
+        if logits.shape[1] == 1:
+            return logits[:, 0].tolist()
+        return (logits[:, 1] - logits[:, 0]).tolist()
+
+
+def create_reranker(
+    backend: str,
+    model_dir: str = "",
+    threads: int = 0,
+    weight: float = 0.5
+) -> Optional[Reranker]:
+    """
+    按配置创建重排序器
+
+    Args:
+        backend: none / lexical / cross_encoder
+        model_dir: 交叉编码器模型目录
+        threads: 推理线程数
+        weight: 词法重排的词法分数权重
+
+    Returns:
+        Reranker: 重排序器（none 时返回 None）
+    """
+    if backend == "lexical":
+        return LexicalReranker(weight=weight)
+    if backend == "cross_encoder":
+        return CrossEncoderReranker(model_dir=model_dir, threads=threads)
+    return None
+
+
+_reranker: Optional[Reranker] = None
+_reranker_initialized = False
+
+
+def get_reranker() -> Optional[Reranker]:
+    """
+    获取全局重排序器（KB_RERANKER=none 或创建失败时返回 None）
+
+    Returns:
+        Reranker: 重排序器
+    """
+    global _reranker, _reranker_initialized
+
+    if not _reranker_initialized:
+        from config import config
+
+        _reranker_initialized = True
+        try:
+            _reranker = create_reranker(
+                backend=config.kb_reranker,
+                model_dir=config.kb_rerank_model_dir,
+                threads=config.embedding_threads,
+                weight=config.kb_rerank_weight
+            )
+        except Exception as e:
+            logger.error(f"❌ 重排序器初始化失败，不进行重排: {e}")
+            _reranker = None
+
+    return _reranker
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识库检索离线评测模块
+用标注好的「查询 -> 相关文本」集合评估检索质量（recall@k、MRR、nDCG），
+配合 benchmarks/bench_retrieval.py 对比分块大小、top_k、重排等配置。
+
+相关文本按「页面名 + 文本片段」标注，而不是按文本块 ID：
+分块参数变化后文本块 ID 会变，标注仍然有效。
+"""
+
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .vector_database_manager import DocumentChunk
+from .knowledge_base_retriever import SearchContext
+
+
+@dataclass
+class RelevantSpan:
+    """相关文本标注"""
+
+    page: str  # 页面名称
+    contains: str = ""  # 文本块需包含的片段（为空则页面内任意文本块都算相关）
+
+    def matches(self, page_name: str, text: str) -> bool:
+        """
+        判断文本块是否命中该标注
+
+        Args:
+            page_name: 文本块所属页面
+            text: 文本块内容
+
+        Returns:
+            bool: 是否命中
+        """
+        return page_name == self.page and self.contains in text
+
+
+@dataclass
+class EvalQuery:
+    """评测查询"""
+
+    query: str  # 查询文本
+    relevant: List[RelevantSpan] = field(default_factory=list)  # 相关文本标注
+
+    def judge(self, results: List[Dict[str, Any]]) -> List[int]:
+        """
+        判断每个检索结果命中了哪条标注
+
+        同一条标注只在第一次命中时计为相关，避免重叠的文本块重复计分。
+
+        Args:
+            results: 检索结果（按排名）
+
+        Returns:
+            List[int]: 每个结果命中的标注下标（未命中为 -1）
+        """
+        hits = []
+        matched = set()
+
+        for result in results:
+            page_name = result_page_name(result)
+            text = result.get("text", "")
+            hit = -1
+            for index, span in enumerate(self.relevant):
+                if index not in matched and span.matches(page_name, text):
+                    hit = index
+                    matched.add(index)
+                    break
+            hits.append(hit)
+
+        return hits
+
+
+def result_page_name(result: Dict[str, Any]) -> str:
+    """
+    读取检索结果所属页面（知识库构建时文本块元数据嵌套在 metadata.metadata 中）
+
+    Args:
+        result: 检索结果
+
+    Returns:
+        str: 页面名称
+    """
+    metadata = result.get("metadata") or {}
+    nested = metadata.get("metadata")
+    if isinstance(nested, dict) and "page_name" in nested:
+        return nested["page_name"]
+    return metadata.get("page_name", "")
+
+
+# ========== 指标 ==========
+
+def recall_at_k(hits: List[int], total_relevant: int, k: int) -> float:
+    """
+    前 k 个结果命中的标注占全部标注的比例
+
+    Args:
+        hits: 每个结果命中的标注下标（未命中为 -1）
+        total_relevant: 标注数量
+        k: 截断位置
+
+    Returns:
+        float: recall@k
+    """
+    if total_relevant <= 0:
+        return 0.0
+    return sum(1 for hit in hits[:k] if hit >= 0) / total_relevant
+
+
+def reciprocal_rank(hits: List[int]) -> float:
+    """
+    第一个相关结果排名的倒数（没有相关结果为 0）
+
+    Args:
+        hits: 每个结果命中的标注下标（未命中为 -1）
+
+    Returns:
+        float: RR
+    """
+    for rank, hit in enumerate(hits, start=1):
+        if hit >= 0:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(hits: List[int], total_relevant: int, k: int) -> float:
+    """
+    二值相关度的 nDCG@k
+
+    Args:
+        hits: 每个结果命中的标注下标（未命中为 -1）
+        total_relevant: 标注数量
+        k: 截断位置
+
+    Returns:
+        float: nDCG@k
+    """
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(total_relevant, k) + 1))
+    if ideal == 0:
+        return 0.0
+
+    dcg = sum(1.0 / math.log2(rank + 1) for rank, hit in enumerate(hits[:k], start=1) if hit >= 0)
+    return dcg / ideal
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    分位数（最近秩）
+
+    Args:
+        values: 数值列表
+        q: 分位（0~1）
+
+    Returns:
+        float: 分位数（空列表为 0）
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(per_query: List[Dict[str, float]], latencies_ms: List[float]) -> Dict[str, float]:
+    """
+    汇总各查询的指标
+
+    Args:
+        per_query: 每个查询的指标
+        latencies_ms: 每次检索的耗时（毫秒）
+
+    Returns:
+        Dict[str, float]: 平均指标和延迟分位数
+    """
+    summary = {}
+    if per_query:
+        for name in per_query[0]:
+            summary[name] = sum(item[name] for item in per_query) / len(per_query)
+
+    summary["p50_ms"] = percentile(latencies_ms, 0.5)
+    summary["p95_ms"] = percentile(latencies_ms, 0.95)
+    return summary
+
+
+# ========== 评测数据 ==========
+
+def load_fixture(fixture_dir: str) -> Tuple[Dict[str, str], List[EvalQuery]]:
+    """
+    加载离线评测数据（pages/*.html 为保存的页面，queries.json 为标注）
+
+    Args:
+        fixture_dir: 评测数据目录
+
+    Returns:
+        Tuple[Dict[str, str], List[EvalQuery]]: (页面名 -> HTML, 评测查询)
+    """
+    pages_dir = os.path.join(fixture_dir, "pages")
+    pages = {}
+    for filename in sorted(os.listdir(pages_dir)):
+        if filename.endswith(".html"):
+            with open(os.path.join(pages_dir, filename), "r", encoding="utf-8") as f:
+                pages[filename[:-len(".html")]] = f.read()
+
+    with open(os.path.join(fixture_dir, "queries.json"), "r", encoding="utf-8") as f:
+        raw_queries = json.load(f)
+
+    queries = [
+        EvalQuery(
+            query=item["query"],
+            relevant=[RelevantSpan(page=span["page"], contains=span.get("contains", "")) for span in item["relevant"]]
+        )
+        for item in raw_queries
+    ]
+
+    return pages, queries
+
+
+def build_chunks(
+    kb_id: str,
+    pages: Dict[str, str],
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    parser: Optional[Any] = None
+) -> List[DocumentChunk]:
+    """
+    按知识库构建流程解析保存的页面并分块
+
+    Args:
+        kb_id: 知识库 ID
+        pages: 页面名 -> HTML
+        chunk_size: 每块大小（字符数）
+        chunk_overlap: 块之间重叠字符数
+        parser: Wiki 解析器（可选，默认使用 WikiParser）
+
+    Returns:
+        List[DocumentChunk]: 文本块列表
+    """
+    from .wiki_parser import WikiParser
+    from .knowledge_base_builder import KnowledgeBaseBuilder
+
+    parser = parser or WikiParser()
+    chunks = []
+
+    for page_name, html in pages.items():
+        page_data = parser.parse_html(page_name, html, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        chunks.extend(KnowledgeBaseBuilder._extract_chunks(page_data, kb_id))
+
+    return chunks
+
+
+async def evaluate(
+    retriever,
+    vector_db,
+    kb_id: str,
+    queries: List[EvalQuery],
+    top_k: int = 3,
+    repeat: int = 1
+) -> Dict[str, Any]:
+    """
+    运行评测查询并计算指标
+
+    Args:
+        retriever: 知识库检索管理器（KnowledgeBaseRetriever）
+        vector_db: 向量数据库管理器
+        kb_id: 知识库 ID
+        queries: 评测查询
+        top_k: 返回结果数量
+        repeat: 每个查询重复次数（只影响延迟统计）
+
+    Returns:
+        Dict[str, Any]: 汇总指标（summary）和每个查询的结果（queries）
+    """
+    per_query = []
+    details = []
+    latencies_ms = []
+
+    for item in queries:
+        results = []
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            results = await retriever.retrieve(
+                vector_db,
+                SearchContext(query=item.query, kb_id=kb_id, top_k=top_k, use_cache=False)
+            )
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+
+        hits = item.judge(results)
+        metrics = {
+            f"recall@{top_k}": recall_at_k(hits, len(item.relevant), top_k),
+            "mrr": reciprocal_rank(hits),
+            f"ndcg@{top_k}": ndcg_at_k(hits, len(item.relevant), top_k)
+        }
+        per_query.append(metrics)
+        details.append({
+            "query": item.query,
+            "results": [result.get("chunk_id", "") for result in results],
+            **metrics
+        })
+
+    return {"summary": summarize(per_query, latencies_ms), "queries": details}
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求追踪模块
+记录单次消息处理中各阶段的耗时，并汇总为阶段耗时直方图
+支持：上下文传播（contextvars）+ JSONL 追踪文件 + Prometheus 文本格式
+"""
+
+import asyncio
+import bisect
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Callable
+from nonebot.log import logger
+
+
+# 默认直方图桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """累积直方图（Prometheus 风格）"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        初始化直方图
+
+        Args:
+            buckets: 桶上界列表（升序，单位与观测值一致）
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        记录一个观测值
+
+        Args:
+            value: 观测值
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        """观测次数"""
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        """观测值总和"""
+        return self._sum
+
+    def cumulative_counts(self) -> List[int]:
+        """
+        获取累积计数（与 buckets + [+Inf] 一一对应）
+
+        Returns:
+            List[int]: 累积计数
+        """
+        with self._lock:
+            counts = list(self._counts)
+
+        cumulative = []
+        total = 0
+        for c in counts:
+            total += c
+            cumulative.append(total)
+        return cumulative
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        估算分位数（取所在桶的上界）
+
+        Args:
+            q: 分位（0~1）
+
+        Returns:
+            float: 分位数估计值（无数据则返回 None）
+        """
+        if self._count == 0:
+            return None
+
+        target = q * self._count
+        for bound, cumulative in zip(self.buckets, self.cumulative_counts()):
+            if cumulative >= target:
+                return bound
+
+        return float("inf")
+
+
+# ========== 阶段耗时直方图（全局） ==========
+_stage_histograms: Dict[str, Histogram] = {}
+_stage_histograms_lock = threading.Lock()
+
+
+def observe_stage(stage: str, duration: float) -> None:
+    """
+    记录阶段耗时到直方图
+
+    Args:
+        stage: 阶段名称
+        duration: 耗时（秒）
+    """
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        with _stage_histograms_lock:
+            histogram = _stage_histograms.setdefault(stage, Histogram())
+    histogram.observe(duration)
+
+
+def get_stage_histograms() -> Dict[str, Histogram]:
+    """获取所有阶段耗时直方图"""
+    return dict(_stage_histograms)
+
+
+class RequestTrace:
+    """单次请求的耗时追踪"""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        """
+        初始化请求追踪
+
+        Args:
+            name: 请求名称（例如 process_message）
+            attributes: 附加属性（用户、群号等）
+        """
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = attributes or {}
+        self.start_time = time.perf_counter()
+        self.start_timestamp = time.time()
+        self._token = None  # contextvars 令牌（由 start_trace 设置）
+
+        # 阶段记录：按完成顺序保存
+        self.stages: List[Dict[str, Any]] = []
+
+    def record(self, stage: str, duration: float, status: str = "ok") -> None:
+        """
+        记录一个阶段（同时计入阶段耗时直方图）
+
+        Args:
+            stage: 阶段名称
+            duration: 耗时（秒）
+            status: 状态（ok/timeout/error/skipped）
+        """
+        self.stages.append({
+            "stage": stage,
+            "duration_ms": round(duration * 1000, 2),
+            "status": status
+        })
+        observe_stage(stage, duration)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        计时上下文管理器
+
+        Args:
+            stage: 阶段名称
+        """
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, status)
+
+    def get_stage(self, stage: str) -> Optional[Dict[str, Any]]:
+        """获取指定阶段的记录（不存在则返回 None）"""
+        for item in self.stages:
+            if item["stage"] == stage:
+                return item
+        return None
+
+    @property
+    def elapsed(self) -> float:
+        """请求开始至今的耗时（秒）"""
+        return time.perf_counter() - self.start_time
+
+    def summary(self) -> str:
+        """
+        生成耗时摘要
+
+        Returns:
+            str: 例如 "memory_load=12.3ms kb_retrieve=timeout(2000.1ms) total=850.2ms"
+        """
+        parts = []
+        for item in self.stages:
+            if item["status"] == "ok":
+                parts.append(f"{item['stage']}={item['duration_ms']}ms")
+            else:
+                parts.append(f"{item['stage']}={item['status']}({item['duration_ms']}ms)")
+        parts.append(f"total={round(self.elapsed * 1000, 2)}ms")
+        return " ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "timestamp": self.start_timestamp,
+            "attributes": self.attributes,
+            "stages": list(self.stages),
+            "total_ms": round(self.elapsed * 1000, 2)
+        }
+
+    def log_summary(self) -> None:
+        """输出耗时摘要日志"""
+        logger.info(f"⏱️  请求耗时 [{self.trace_id}] {self.name}: {self.summary()}")
+
+
+# ========== 上下文传播 ==========
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("openclaw_current_trace", default=None)
+
+
+def get_current_trace() -> Optional[RequestTrace]:
+    """获取当前上下文中的请求追踪（没有则返回 None）"""
+    return _current_trace.get()
+
+
+def start_trace(name: str, attributes: Optional[Dict[str, Any]] = None) -> RequestTrace:
+    """
+    开始一个请求追踪，并设置为当前上下文的追踪
+
+    Args:
+        name: 请求名称
+        attributes: 附加属性
+
+    Returns:
+        RequestTrace: 请求追踪
+    """
+    trace = RequestTrace(name, attributes)
+    trace._token = _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: RequestTrace) -> None:
+    """
+    结束请求追踪：输出摘要、计入总耗时直方图、导出到追踪文件
+
+    Args:
+        trace: 请求追踪
+    """
+    observe_stage(f"{trace.name}_total", trace.elapsed)
+    trace.log_summary()
+
+    if _exporter is not None:
+        _exporter.export(trace)
+
+    if trace._token is not None:
+        try:
+            _current_trace.reset(trace._token)
+        except ValueError:
+            # 在其他上下文中结束（例如跨任务），直接清空
+            _current_trace.set(None)
+        trace._token = None
+
+
+@contextmanager
+def span(stage: str):
+    """
+    阶段计时：有当前追踪时记录到追踪中，否则只计入阶段耗时直方图
+
+    Args:
+        stage: 阶段名称
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(stage, duration, status)
+        else:
+            observe_stage(stage, duration)
+
+
+async def run_in_thread(func: Callable, *args, **kwargs) -> Any:
+    """
+    在默认线程池中执行同步函数，并携带当前上下文（追踪信息）
+
+    Args:
+        func: 同步函数
+        *args: 位置参数
+        **kwargs: 关键字参数
+
+    Returns:
+        函数返回值
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(ctx.run, func, *args, **kwargs))
+
+
+# ========== 导出 ==========
+
+class JsonlTraceExporter:
+    """JSONL 追踪文件导出器（每行一个请求追踪）"""
+
+    def __init__(self, file_path: str):
+        """
+        初始化导出器
+
+        Args:
+            file_path: 追踪文件路径
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _write(self, line: str) -> None:
+        """写入一行"""
+        try:
+            with self._lock:
+                with open(self.file_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            logger.error(f"❌ 写入追踪文件失败: {e}")
+
+    def export(self, trace: RequestTrace) -> None:
+        """
+        导出一个请求追踪（有事件循环时在线程池中写文件）
+
+        Args:
+            trace: 请求追踪
+        """
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(line)
+            return
+
+        loop.run_in_executor(None, self._write, line)
+
+
+_exporter: Optional[JsonlTraceExporter] = None
+
+
+def init_trace_exporter(file_path: str) -> Optional[JsonlTraceExporter]:
+    """
+    初始化 JSONL 追踪文件导出（file_path 为空则关闭导出）
+
+    Args:
+        file_path: 追踪文件路径
+
+    Returns:
+        JsonlTraceExporter: 导出器（关闭时返回 None）
+    """
+    global _exporter
+
+    if not file_path:
+        _exporter = None
+        return None
+
+    _exporter = JsonlTraceExporter(file_path)
+    logger.info(f"✅ 请求追踪导出已启用: {file_path}")
+
+    return _exporter
+
+
+def _format_float(value: float) -> str:
+    """格式化 Prometheus 数值"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def render_prometheus(metric_name: str = "openclaw_stage_duration_seconds") -> str:
+    """
+    将阶段耗时直方图渲染为 Prometheus 文本格式
+
+    Args:
+        metric_name: 指标名称
+
+    Returns:
+        str: Prometheus 文本
+    """
+    lines = [
+        f"# HELP {metric_name} Duration of message pipeline stages in seconds.",
+        f"# TYPE {metric_name} histogram"
+    ]
+
+    for stage, histogram in sorted(get_stage_histograms().items()):
+        cumulative = histogram.cumulative_counts()
+        for bound, count in zip(list(histogram.buckets) + [float("inf")], cumulative):
+            lines.append(f'{metric_name}_bucket{{stage="{stage}",le="{_format_float(bound)}"}} {count}')
+        lines.append(f'{metric_name}_sum{{stage="{stage}"}} {_format_float(histogram.sum)}')
+        lines.append(f'{metric_name}_count{{stage="{stage}"}} {histogram.count}')
+
+    return "\n".join(lines) + "\n"
+
+
+def print_stage_stats() -> str:
+    """
+    打印阶段耗时统计
+
+    Returns:
+        str: 统计文本
+    """
+    lines = ["⏱️  阶段耗时统计", "=" * 30]
+
+    histograms = get_stage_histograms()
+    if not histograms:
+        lines.append("暂无数据")
+
+    for stage, histogram in sorted(histograms.items()):
+        avg_ms = histogram.sum / histogram.count * 1000 if histogram.count else 0.0
+        p95 = histogram.percentile(0.95)
+        p95_text = f"≤{p95 * 1000:.0f}ms" if p95 not in (None, float("inf")) else "N/A"
+        lines.append(f"{stage}: 次数 {histogram.count}, 平均 {avg_ms:.1f}ms, p95 {p95_text}")
+
+    return "\n".join(lines)
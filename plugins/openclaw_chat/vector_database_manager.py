@@ -2,11 +2,13 @@
 # -*- coding: utf-8 -*-
 """
 向量数据库管理器
-基于 Chroma 实现向量存储和检索
+基于 Chroma 实现向量存储和检索，也可以按知识库改用 NumPy 向量存储
 """
 
 import os
-from typing import List, Dict, Optional, Any, Tuple
+import threading
+import time
+from typing import Callable, List, Dict, Optional, Any, Tuple
 from dataclasses import dataclass
 
 try:
@@ -18,6 +20,37 @@ except ImportError:
 
 from nonebot.log import logger
 
+from .embeddings import ChromaEmbeddingFunction, EmbeddingProvider, EmbeddingBatcher, normalize
+from .numpy_vector_store import NumpyVectorStore
+
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+
+def parse_vector_backends(value: str) -> Dict[str, str]:
+    """
+    解析按知识库指定的向量存储后端
+
+    Args:
+        value: 配置字符串（kb_id:backend，逗号分隔）
+
+    Returns:
+        Dict[str, str]: 知识库 ID → 后端
+    """
+    backends = {}
+
+    for item in value.split(","):
+        kb_id, sep, backend = item.strip().rpartition(":")
+        backend = backend.strip().lower()
+        if not sep or not kb_id.strip():
+            continue
+        if backend not in VECTOR_BACKENDS:
+            logger.warning(f"⚠️  未知的向量存储后端: {item.strip()}")
+            continue
+        backends[kb_id.strip()] = backend
+
+    return backends
+
 
 @dataclass
 class DocumentChunk:
@@ -54,14 +87,35 @@ class DocumentChunk:
 class VectorDatabaseManager:
     """向量数据库管理器"""
 
-    def __init__(self, kb_dir: str = "data/knowledge_bases"):
+    def __init__(
+        self,
+        kb_dir: str = "data/knowledge_bases",
+        embedding_provider: Optional["EmbeddingProvider"] = None,
+        embedding_batcher: Optional["EmbeddingBatcher"] = None,
+        backend: Optional[str] = None,
+        kb_backends: Optional[Dict[str, str]] = None
+    ):
         """
         初始化向量数据库管理器
 
         Args:
             kb_dir: 知识库存储目录
+            embedding_provider: 嵌入后端（可选，None 则使用 Chroma 默认嵌入）
+            embedding_batcher: 查询嵌入批处理器（可选，检索时合并并发查询的嵌入计算）
+            backend: 默认向量存储后端（chroma/numpy，None 则读取配置）
+            kb_backends: 按知识库指定的向量存储后端（None 则读取配置）
         """
-        if not CHROMADB_AVAILABLE:
+        from config import config
+
+        self.backend = (backend or config.vector_store_backend).lower()
+        if self.backend not in VECTOR_BACKENDS:
+            logger.warning(f"⚠️  未知的向量存储后端 {self.backend}，使用 chroma")
+            self.backend = "chroma"
+        self.kb_backends = kb_backends if kb_backends is not None else parse_vector_backends(config.vector_store_backends)
+
+        # 所有知识库都使用 NumPy 存储时不需要 ChromaDB
+        uses_chroma = self.backend == "chroma" or "chroma" in self.kb_backends.values()
+        if uses_chroma and not CHROMADB_AVAILABLE:
             raise ImportError(
                 "ChromaDB 未安装，请安装：pip install chromadb\n"
                 "或安装项目依赖：pip install -r requirements.txt"
@@ -69,15 +123,33 @@ class VectorDatabaseManager:
 
         self.kb_dir = kb_dir
         self.chroma_dir = os.path.join(kb_dir, "chroma_db")
+        self.numpy_dir = os.path.join(kb_dir, "numpy_db")
 
-        # 确保目录存在
-        os.makedirs(self.chroma_dir, exist_ok=True)
+        # 嵌入后端（显式指定模型、批大小和线程数）
+        self.embedding_provider = embedding_provider
+        self.embedding_batcher = embedding_batcher
+        self.embedding_function = ChromaEmbeddingFunction(embedding_provider) if embedding_provider else None
 
         # 初始化 Chroma 客户端
-        self._init_chroma_client()
+        self.client = None
+        if uses_chroma:
+            os.makedirs(self.chroma_dir, exist_ok=True)
+            self._init_chroma_client()
+
+        # NumPy 向量存储（嵌入函数在第一次使用时确定）
+        self.numpy_store = NumpyVectorStore(
+            path=self.numpy_dir,
+            embedding_function=self._embed_with_document_embedder,
+            ivf_threshold=config.vector_store_ivf_threshold,
+            ivf_nprobe=config.vector_store_ivf_nprobe
+        )
 
         # 集合缓存
-        self._collections: Dict[str, "chromadb.Collection"] = {}
+        self._collections: Dict[str, Any] = {}
+
+        # 文档嵌入函数（模型 ID, 嵌入函数, 维度），第一次添加文档时确定
+        self._document_embedder: Optional[Tuple[str, Callable[[List[str]], List[List[float]]], int]] = None
+        self._document_embedder_resolved = False
 
         logger.info("✅ 向量数据库管理器初始化成功")
 
@@ -113,6 +185,30 @@ class VectorDatabaseManager:
         # Chroma 的集合名称要求：只能包含字母、数字、下划线和连字符
         return f"kb_{kb_id.replace('-', '_').replace('.', '_')}"
 
+    def get_backend(self, kb_id: str) -> str:
+        """
+        获取知识库使用的向量存储后端
+
+        Args:
+            kb_id: 知识库 ID
+
+        Returns:
+            str: chroma / numpy
+        """
+        return self.kb_backends.get(kb_id, self.backend)
+
+    def _get_client(self, kb_id: str) -> Any:
+        """获取知识库对应的存储客户端（Chroma PersistentClient 或 NumpyVectorStore）"""
+        if self.get_backend(kb_id) == "numpy":
+            return self.numpy_store
+        return self.client
+
+    def _embedding_kwargs(self) -> Dict[str, Any]:
+        """获取集合的嵌入参数（未配置嵌入后端时使用 Chroma 默认嵌入）"""
+        if self.embedding_function is None:
+            return {}
+        return {"embedding_function": self.embedding_function}
+
     def _get_or_create_collection(self, kb_id: str) -> "chromadb.Collection":
         """
         获取或创建集合
@@ -131,9 +227,10 @@ class VectorDatabaseManager:
         collection_name = self._get_collection_name(kb_id)
 
         try:
-            collection = self.client.get_or_create_collection(
+            collection = self._get_client(kb_id).get_or_create_collection(
                 name=collection_name,
-                metadata={"kb_id": kb_id}
+                metadata={"kb_id": kb_id},
+                **self._embedding_kwargs()
             )
 
             # 缓存集合
@@ -147,6 +244,72 @@ class VectorDatabaseManager:
             logger.error(f"❌ 获取集合失败 {collection_name}: {e}")
             raise
 
+    # ========== 文档嵌入 ==========
+
+    def _resolve_document_embedder(self) -> Optional[Tuple[str, Callable[[List[str]], List[List[float]]], int]]:
+        """
+        确定文档嵌入函数：配置的嵌入后端，或与 Chroma 默认嵌入相同的模型
+
+        Returns:
+            Tuple: (模型 ID, 嵌入函数, 维度)，无法在本地计算时返回 None（交给 Chroma 计算）
+        """
+        if self._document_embedder_resolved:
+            return self._document_embedder
+
+        self._document_embedder_resolved = True
+
+        try:
+            if self.embedding_provider is not None:
+                model_id = self.embedding_provider.model_id
+                embed = self.embedding_provider.embed
+            else:
+                from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+                model_id = "chroma-default-all-MiniLM-L6-v2"
+                embed = DefaultEmbeddingFunction()
+
+            dimension = len(embed(["维度探测"])[0])
+            self._document_embedder = (model_id, embed, dimension)
+
+        except Exception as e:
+            logger.warning(f"⚠️  无法在本地计算文档嵌入，跳过嵌入缓存: {e}")
+            self._document_embedder = None
+
+        return self._document_embedder
+
+    def _embed_with_document_embedder(self, texts: List[str]) -> List[List[float]]:
+        """使用文档嵌入函数计算向量（NumPy 存储自身不带嵌入模型）"""
+        embedder = self._resolve_document_embedder()
+        if embedder is None:
+            raise RuntimeError("NumPy 向量存储需要可用的嵌入后端（EMBEDDING_BACKEND=onnx/hashing，或安装 chromadb）")
+        return embedder[1](texts)
+
+    def _embed_documents(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """
+        计算文档嵌入（已嵌入过的文本直接读取持久化缓存）
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            List[List[float]]: 向量列表（未启用嵌入缓存或无法本地计算时返回 None）
+        """
+        from config import config
+        from .embedding_cache import get_persistent_embedding_cache
+
+        if not config.embedding_cache_dir:
+            return None
+
+        embedder = self._resolve_document_embedder()
+        if embedder is None:
+            return None
+
+        model_id, embed, dimension = embedder
+        cache = get_persistent_embedding_cache(model_id, dimension)
+        if cache is None:
+            return None
+
+        return cache.get_or_embed(texts, embed)
+
     # ========== 向量存储 ==========
 
     def add_documents(
@@ -179,6 +342,10 @@ class VectorDatabaseManager:
             documents = [chunk.text for chunk in chunks]
             metadatas = [chunk.to_dict() for chunk in chunks]
 
+            # 未提供向量时，优先使用嵌入缓存（相同文本不重复嵌入）
+            if not embeddings:
+                embeddings = self._embed_documents(documents)
+
             # 添加文档
             if embeddings:
                 # 使用提供的向量
@@ -234,6 +401,10 @@ class VectorDatabaseManager:
             documents = [chunk.text for chunk in chunks]
             metadatas = [chunk.to_dict() for chunk in chunks]
 
+            # 未提供向量时，优先使用嵌入缓存（相同文本不重复嵌入）
+            if not embeddings:
+                embeddings = self._embed_documents(documents)
+
             # 更新文档
             if embeddings:
                 collection.update(
@@ -298,7 +469,8 @@ class VectorDatabaseManager:
         kb_id: str,
         query: str,
         top_k: int = 3,
-        where: Optional[Dict[str, Any]] = None
+        where: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         相似度搜索
@@ -308,6 +480,7 @@ class VectorDatabaseManager:
             query: 查询文本
             top_k: 返回结果数量
             where: 元数据过滤条件
+            query_embedding: 预先计算的查询向量（可选，提供时不再重复计算嵌入）
 
         Returns:
             List[Dict[str, Any]]: 搜索结果列表
@@ -317,11 +490,18 @@ class VectorDatabaseManager:
             collection = self._get_or_create_collection(kb_id)
 
             # 搜索
-            results = collection.query(
-                query_texts=[query],
-                n_results=top_k,
-                where=where
-            )
+            if query_embedding is not None:
+                results = collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=top_k,
+                    where=where
+                )
+            else:
+                results = collection.query(
+                    query_texts=[query],
+                    n_results=top_k,
+                    where=where
+                )
 
             # 处理结果
             search_results = []
@@ -343,6 +523,91 @@ class VectorDatabaseManager:
             logger.error(f"❌ 搜索失败 (kb_id: {kb_id}): {e}")
             return []
 
+    def iter_chunks(self, kb_id: str, page_size: int = 1000):
+        """
+        分页遍历知识库中的全部文本块
+
+        Args:
+            kb_id: 知识库 ID
+            page_size: 每页数量
+
+        Yields:
+            Dict[str, Any]: 文本块（chunk_id / text / metadata）
+        """
+        collection = self._get_or_create_collection(kb_id)
+
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+
+            for chunk_id, text, metadata in zip(ids, page.get("documents") or [], page.get("metadatas") or []):
+                yield {"chunk_id": chunk_id, "text": text, "metadata": metadata or {}}
+
+            offset += len(ids)
+
+    def get_distance_space(self, kb_id: str) -> str:
+        """
+        获取集合的距离类型（不同集合的距离合并前需要换算到同一尺度）
+
+        Args:
+            kb_id: 知识库 ID
+
+        Returns:
+            str: l2 / cosine / ip
+        """
+        if self.get_backend(kb_id) == "numpy":
+            return "l2"
+
+        try:
+            metadata = self._get_or_create_collection(kb_id).metadata or {}
+            return metadata.get("hnsw:space", "l2")
+        except Exception:
+            return "l2"
+
+    def get_centroid(self, kb_id: str, page_size: int = 5000) -> Optional[List[float]]:
+        """
+        计算集合的平均向量（归一化，用于多知识库检索时的路由）
+
+        Args:
+            kb_id: 知识库 ID
+            page_size: Chroma 分页读取的条数
+
+        Returns:
+            List[float]: 平均向量（空集合或失败时返回 None）
+        """
+        try:
+            collection = self._get_or_create_collection(kb_id)
+
+            if self.get_backend(kb_id) == "numpy":
+                centroid = collection.centroid()
+                return centroid.tolist() if centroid is not None else None
+
+            import numpy as np
+
+            total = None
+            offset = 0
+            while True:
+                page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+                embeddings = page.get("embeddings")
+                if embeddings is None or len(embeddings) == 0:
+                    break
+
+                matrix = normalize(np.asarray(embeddings, dtype=np.float32))
+                total = matrix.sum(axis=0) if total is None else total + matrix.sum(axis=0)
+                offset += len(matrix)
+
+            if total is None:
+                return None
+
+            return normalize(total).tolist()
+
+        except Exception as e:
+            logger.warning(f"⚠️  计算集合平均向量失败 (kb_id: {kb_id}): {e}")
+            return None
+
     # ========== 集合管理 ==========
 
     def delete_collection(self, kb_id: str) -> bool:
@@ -359,7 +624,7 @@ class VectorDatabaseManager:
             collection_name = self._get_collection_name(kb_id)
 
             # 删除集合
-            self.client.delete_collection(name=collection_name)
+            self._get_client(kb_id).delete_collection(name=collection_name)
 
             # 清除缓存
             if kb_id in self._collections:
@@ -385,7 +650,7 @@ class VectorDatabaseManager:
         """
         try:
             collection_name = self._get_collection_name(kb_id)
-            collection = self.client.get_collection(name=collection_name)
+            collection = self._get_client(kb_id).get_collection(name=collection_name)
             return collection is not None
 
         except Exception:
@@ -408,6 +673,7 @@ class VectorDatabaseManager:
             return {
                 "kb_id": kb_id,
                 "collection_name": self._get_collection_name(kb_id),
+                "backend": self.get_backend(kb_id),
                 "count": count
             }
 
@@ -415,6 +681,45 @@ class VectorDatabaseManager:
             logger.error(f"❌ 获取集合信息失败 (kb_id: {kb_id}): {e}")
             return None
 
+    # ========== 预热 ==========
+
+    def warm_up(self, kb_ids: List[str], query: str = "warmup") -> Dict[str, float]:
+        """
+        预热集合：加载集合索引和嵌入模型，并执行一次预热查询
+
+        只预热已存在的集合（不会创建新集合）。
+
+        Args:
+            kb_ids: 知识库 ID 列表
+            query: 预热查询文本
+
+        Returns:
+            Dict[str, float]: 知识库 ID → 预热耗时（秒）
+        """
+        timings = {}
+
+        for kb_id in kb_ids:
+            start = time.perf_counter()
+            collection_name = self._get_collection_name(kb_id)
+
+            try:
+                collection = self._collections.get(kb_id)
+                if collection is None:
+                    collection = self._get_client(kb_id).get_collection(name=collection_name, **self._embedding_kwargs())
+                    self._collections[kb_id] = collection
+
+                # 预热查询会加载 HNSW 索引和嵌入模型（空集合没有可查询的数据）
+                if collection.count() > 0:
+                    collection.query(query_texts=[query], n_results=1)
+
+                timings[kb_id] = time.perf_counter() - start
+                logger.info(f"🔥 集合预热完成: {collection_name} ({timings[kb_id] * 1000:.0f}ms)")
+
+            except Exception as e:
+                logger.warning(f"⚠️  集合预热失败 {collection_name}: {e}")
+
+        return timings
+
     # ========== 批量操作 ==========
 
     def clear_collection(self, kb_id: str) -> bool:
@@ -441,3 +746,37 @@ class VectorDatabaseManager:
         except Exception as e:
             logger.error(f"❌ 清空集合失败 (kb_id: {kb_id}): {e}")
             return False
+
+
+# ========== 全局实例 ==========
+
+# 存储目录 → 向量数据库管理器（同一目录只打开一个 Chroma 客户端）
+_vdb_managers: Dict[str, VectorDatabaseManager] = {}
+_vdb_managers_lock = threading.Lock()
+
+
+def get_vector_db_manager(kb_dir: str = "data/knowledge_bases") -> VectorDatabaseManager:
+    """
+    获取进程内共享的向量数据库管理器
+
+    Args:
+        kb_dir: 知识库存储目录
+
+    Returns:
+        VectorDatabaseManager: 向量数据库管理器
+    """
+    key = os.path.abspath(kb_dir)
+
+    with _vdb_managers_lock:
+        manager = _vdb_managers.get(key)
+        if manager is None:
+            from .embeddings import get_embedding_provider, get_embedding_batcher
+
+            manager = VectorDatabaseManager(
+                kb_dir=kb_dir,
+                embedding_provider=get_embedding_provider(),
+                embedding_batcher=get_embedding_batcher()
+            )
+            _vdb_managers[key] = manager
+
+    return manager
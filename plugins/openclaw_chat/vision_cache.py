@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vision 识别结果缓存模块
+以图片感知哈希（dHash）+ 提示词 + 模型为键缓存识别结果，重复转发的表情包/截图可直接返回缓存描述
+未安装 Pillow 时退化为按图片内容精确匹配
+写入缓存只标记为待保存，由定时任务（和关闭时）在线程池中写盘，不阻塞回复
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+from nonebot.log import logger
+
+from .image_processor import ImageData
+from .tracing import run_in_thread
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# 指纹前缀：感知哈希 / 内容哈希
+DHASH_PREFIX = "d:"
+SHA256_PREFIX = "s:"
+
+
+def compute_dhash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """
+    计算差异哈希（dHash）：缩放为 (hash_size+1) x hash_size 灰度图，比较相邻像素
+
+    Args:
+        image_bytes: 图片字节
+        hash_size: 哈希边长（8 → 64 位）
+
+    Returns:
+        int: 哈希值
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+        pixels = image.tobytes()
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (1 if pixels[offset + col] > pixels[offset + col + 1] else 0)
+
+    return value
+
+
+def compute_fingerprint(image_bytes: bytes) -> str:
+    """
+    计算图片指纹（有 Pillow 时为 dHash，否则为 SHA-256）
+
+    Args:
+        image_bytes: 图片字节
+
+    Returns:
+        str: 指纹（带类型前缀）
+    """
+    if PIL_AVAILABLE:
+        try:
+            return f"{DHASH_PREFIX}{compute_dhash(image_bytes):016x}"
+        except Exception as e:
+            logger.debug(f"计算感知哈希失败，改用内容哈希: {e}")
+
+    return f"{SHA256_PREFIX}{hashlib.sha256(image_bytes).hexdigest()}"
+
+
+def fingerprint_distance(a: str, b: str) -> Optional[int]:
+    """
+    计算两个指纹的距离（dHash 为汉明距离，内容哈希只有相同/不同）
+
+    Args:
+        a: 指纹 A
+        b: 指纹 B
+
+    Returns:
+        int: 距离（类型不同无法比较时返回 None）
+    """
+    if a.startswith(DHASH_PREFIX) and b.startswith(DHASH_PREFIX):
+        return bin(int(a[2:], 16) ^ int(b[2:], 16)).count("1")
+
+    if a.startswith(SHA256_PREFIX) and b.startswith(SHA256_PREFIX):
+        return 0 if a == b else None
+
+    return None
+
+
+async def load_image_bytes(image_data: ImageData) -> Optional[bytes]:
+    """
+    获取图片字节（URL 通过共享下载器获取，本地文件在线程池中读取）
+
+    Args:
+        image_data: 图片数据
+
+    Returns:
+        bytes: 图片字节（获取失败返回 None）
+    """
+    from .http_client import get_image_downloader
+
+    if image_data.url:
+        if image_data.url.startswith("data:"):
+            return base64.b64decode(image_data.url.split(",", 1)[1])
+        if image_data.url.startswith(("http://", "https://")):
+            data, _ = await get_image_downloader().fetch(image_data.url)
+            return data
+
+    if image_data.base64:
+        return base64.b64decode(image_data.base64)
+
+    if image_data.file_path:
+        def read_file():
+            with open(image_data.file_path, "rb") as f:
+                return f.read()
+        return await run_in_thread(read_file)
+
+    return None
+
+
+class VisionResultCache:
+    """Vision 识别结果缓存（近似图片匹配 + TTL + 磁盘持久化）"""
+
+    def __init__(
+        self,
+        cache_file: Optional[str] = None,
+        max_distance: int = 4,
+        ttl: float = 24 * 3600,
+        max_entries: int = 2000,
+        flush_interval: float = 30
+    ):
+        """
+        初始化缓存
+
+        Args:
+            cache_file: 持久化文件路径（None 表示不持久化）
+            max_distance: 视为同一图片的最大汉明距离
+            ttl: 缓存有效期（秒）
+            max_entries: 最大条目数（超出时淘汰最久未使用的条目）
+            flush_interval: 写入后延迟多久保存到磁盘（秒，期间的多次写入合并为一次保存）
+        """
+        self.cache_file = cache_file
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+
+        # 条目 ID → {"key", "fingerprint", "reply", "created_at"}
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+        # 写盘：保存锁保证同一时间只有一个写入者；有未保存的修改时 _dirty 为 True
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Future] = None
+
+        if cache_file:
+            self._load()
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str) -> str:
+        """
+        生成缓存键（供应商 + 模型 + 提示词）
+
+        Args:
+            provider: 供应商
+            model: 模型
+            prompt: 提示词
+
+        Returns:
+            str: 缓存键
+        """
+        return hashlib.sha1(f"{provider}\n{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        """是否已过期"""
+        return now - entry["created_at"] > self.ttl
+
+    def get(self, key: str, fingerprint: str) -> Optional[str]:
+        """
+        查找缓存（同一键下汉明距离最小且不超过阈值的条目）
+
+        Args:
+            key: 缓存键
+            fingerprint: 图片指纹
+
+        Returns:
+            str: 缓存的识别结果（未命中返回 None）
+        """
+        now = time.time()
+        best_id = None
+        best_distance = None
+
+        with self._lock:
+            for entry_id, entry in list(self._entries.items()):
+                if self._is_expired(entry, now):
+                    del self._entries[entry_id]
+                    continue
+
+                if entry["key"] != key:
+                    continue
+
+                distance = fingerprint_distance(fingerprint, entry["fingerprint"])
+                if distance is None or distance > self.max_distance:
+                    continue
+
+                if best_distance is None or distance < best_distance:
+                    best_id, best_distance = entry_id, distance
+                    if distance == 0:
+                        break
+
+            if best_id is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self._stats["hits"] += 1
+            return self._entries[best_id]["reply"]
+
+    def put(self, key: str, fingerprint: str, reply: str) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            fingerprint: 图片指纹
+            reply: 识别结果
+        """
+        entry_id = f"{key}:{fingerprint}"
+
+        with self._lock:
+            self._entries[entry_id] = {
+                "key": key,
+                "fingerprint": fingerprint,
+                "reply": reply,
+                "created_at": time.time()
+            }
+            self._entries.move_to_end(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            self._dirty = True
+
+    def schedule_flush(self) -> None:
+        """
+        在 flush_interval 秒后于线程池中保存（需在事件循环内调用，已有待执行的保存时不重复安排）
+        """
+        if not self.cache_file or self._flush_handle is not None:
+            return
+
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self) -> None:
+        """定时器回调：在线程池中保存"""
+        self._flush_handle = None
+        self._flush_task = asyncio.ensure_future(run_in_thread(self.flush))
+
+    async def aclose(self) -> None:
+        """取消定时保存，等待进行中的保存完成后保存剩余修改（关闭时调用）"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if self._flush_task is not None:
+            try:
+                await self._flush_task
+            except Exception:
+                pass
+            self._flush_task = None
+
+        await run_in_thread(self.flush)
+
+    def flush(self) -> bool:
+        """
+        有未保存的修改时保存到磁盘
+
+        Returns:
+            bool: 是否执行了保存
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            self._dirty = False
+
+        if not self.save():
+            # 保存失败，下次继续尝试
+            with self._lock:
+                self._dirty = True
+            return False
+
+        return True
+
+    def _load(self) -> None:
+        """从磁盘加载（跳过已过期的条目）"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ 加载 Vision 缓存失败: {e}")
+            return
+
+        now = time.time()
+        for entry in entries:
+            if not self._is_expired(entry, now):
+                self._entries[f"{entry['key']}:{entry['fingerprint']}"] = entry
+
+        logger.info(f"✅ 已加载 Vision 缓存: {len(self._entries)} 条")
+
+    def save(self) -> bool:
+        """
+        保存到磁盘（写入唯一的临时文件后原子替换，多个写入者串行执行）
+
+        Returns:
+            bool: 是否保存成功
+        """
+        if not self.cache_file:
+            return False
+
+        directory = os.path.dirname(self.cache_file) or "."
+
+        with self._save_lock:
+            with self._lock:
+                entries: List[Dict[str, Any]] = list(self._entries.values())
+
+            temp_file = None
+            try:
+                os.makedirs(directory, exist_ok=True)
+
+                with tempfile.NamedTemporaryFile(
+                    "w", encoding="utf-8", dir=directory,
+                    prefix=os.path.basename(self.cache_file) + ".", suffix=".tmp", delete=False
+                ) as f:
+                    temp_file = f.name
+                    json.dump(entries, f, ensure_ascii=False)
+                os.replace(temp_file, self.cache_file)
+                return True
+            except Exception as e:
+                logger.error(f"❌ 保存 Vision 缓存失败: {e}")
+                if temp_file and os.path.exists(temp_file):
+                    try:
+                        os.remove(temp_file)
+                    except OSError:
+                        pass
+                return False
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            Dict[str, Any]: 条目数、命中、未命中、命中率
+        """
+        total = self._stats["hits"] + self._stats["misses"]
+        return {
+            "size": len(self._entries),
+            "hits": self._stats["hits"],
+            "misses": self._stats["misses"],
+            "hit_rate": self._stats["hits"] / total if total else 0.0,
+            "perceptual": PIL_AVAILABLE
+        }
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
+_vision_cache: Optional[VisionResultCache] = None
+_vision_cache_lock = threading.Lock()
+
+
+def get_vision_cache() -> Optional[VisionResultCache]:
+    """
+    获取全局 Vision 识别结果缓存（未启用时返回 None）
+
+    第一次调用会同步读取缓存文件，在事件循环中请使用 get_vision_cache_async。
+
+    Returns:
+        VisionResultCache: 缓存
+    """
+    global _vision_cache
+
+    from config import config
+
+    if not config.vision_cache_enabled:
+        return None
+
+    with _vision_cache_lock:
+        if _vision_cache is None:
+            _vision_cache = VisionResultCache(
+                cache_file=config.vision_cache_file or None,
+                max_distance=config.vision_cache_max_distance,
+                ttl=config.vision_cache_ttl_hours * 3600,
+                max_entries=config.vision_cache_max_entries,
+                flush_interval=config.vision_cache_flush_interval
+            )
+
+            if not PIL_AVAILABLE:
+                logger.warning("⚠️  Pillow 未安装，Vision 缓存只匹配完全相同的图片（pip install Pillow 以启用近似匹配）")
+
+    return _vision_cache
+
+
+async def get_vision_cache_async() -> Optional[VisionResultCache]:
+    """
+    获取全局 Vision 识别结果缓存（尚未创建时在线程池中创建并加载缓存文件，不阻塞事件循环）
+
+    Returns:
+        VisionResultCache: 缓存（未启用时返回 None）
+    """
+    if _vision_cache is not None:
+        return _vision_cache
+    return await run_in_thread(get_vision_cache)
+
+
+async def load_vision_cache() -> None:
+    """启动时加载 Vision 识别结果缓存（NoneBot 启动时调用）"""
+    await get_vision_cache_async()
+
+
+async def close_vision_cache() -> None:
+    """保存未写盘的识别结果（NoneBot 关闭时调用）"""
+    if _vision_cache is not None:
+        await _vision_cache.aclose()
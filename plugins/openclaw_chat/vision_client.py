@@ -5,12 +5,21 @@ Vision AI 调用客户端
 调用支持视觉的 AI 模型识别图片
 """
 
+import asyncio
 import httpx
 import base64
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from .image_processor import ImageData, check_vision_support
 from nonebot.log import logger
+from .tracing import span, run_in_thread
+from .http_client import get_http_client, get_image_downloader
+from .vision_cache import get_vision_cache_async, load_image_bytes, compute_fingerprint
+from .image_preprocessor import preprocess_image_async, get_max_edge, sniff_image_format, parse_data_url
+
+
+# 一次请求只接受一张图片的供应商（多图时逐张识别）
+SINGLE_IMAGE_PROVIDERS = {"zhipu"}
 
 
 class VisionAIClient:
@@ -66,21 +75,91 @@ class VisionAIClient:
             logger.warning(f"⚠️  模型 {model} 不支持 Vision 能力")
             return f"抱歉，模型 {model} 不支持图片识别功能。\n\n支持图片识别的模型：\n• GPT-4o / GPT-4o-mini\n• GLM-4V\n• Claude 3 系列\n• Gemini Pro Vision\n• Qwen-VL"
 
+        # 查找识别结果缓存（相同/相似图片 + 相同供应商、模型、提示词）
+        cache = await get_vision_cache_async()
+        cache_key = None
+        fingerprint = None
+        if cache is not None:
+            with span("vision_cache_lookup"):
+                fingerprint = await self._fingerprint(image_data)
+            if fingerprint:
+                cache_key = cache.make_key(self.provider, model, prompt)
+                cached_reply = cache.get(cache_key, fingerprint)
+                if cached_reply is not None:
+                    logger.info(f"⚡ Vision 缓存命中: {cached_reply[:50]}...")
+                    return cached_reply
+
         # 准备图片数据
-        image_url = await self._prepare_image_url(image_data)
+        with span("vision_prepare_image"):
+            image_url = await self._prepare_image_url(image_data)
         if not image_url:
             logger.error("❌ 无法获取图片数据")
             return "抱歉，无法获取图片数据。"
 
         # 调用对应的 API
         try:
-            if self.provider == "anthropic":
-                return await self._call_anthropic(prompt, image_url, model, system_prompt)
-            elif self.provider == "google":
-                return await self._call_google(prompt, image_url, model, system_prompt)
-            else:
-                # OpenAI 兼容 API（包括智谱、硅基流动等）
-                return await self._call_openai_compatible(prompt, image_url, model, system_prompt)
+            with span("vision_call"):
+                reply = await self._call_provider(prompt, [image_url], model, system_prompt)
+
+            # 只缓存成功的识别结果
+            if cache_key and reply and not reply.startswith("抱歉"):
+                cache.put(cache_key, fingerprint, reply)
+                cache.schedule_flush()
+
+            return reply
+
+        except httpx.TimeoutException:
+            logger.error(f"❌ {self.provider} Vision API 超时")
+            return f"抱歉，图片识别超时，请稍后再试。"
+        except Exception as e:
+            logger.error(f"❌ Vision API 调用失败: {e}")
+            return f"抱歉，图片识别失败：{str(e)}"
+
+    async def recognize_images(
+        self,
+        images: List[ImageData],
+        prompt: str = "请描述这些图片",
+        model: str = "gpt-4o-mini",
+        system_prompt: Optional[str] = None
+    ) -> str:
+        """
+        识别多张图片（支持多图的供应商在同一个请求中发送全部图片）
+
+        Args:
+            images: 图片数据列表
+            prompt: 提示词
+            model: 模型名称
+            system_prompt: 系统提示词（可选，用于应用人设）
+
+        Returns:
+            str: AI 的识别结果
+        """
+        if len(images) == 1:
+            return await self.recognize_image(images[0], prompt, model, system_prompt)
+
+        if not check_vision_support(model):
+            return await self.recognize_image(images[0], prompt, model, system_prompt)
+
+        # 不支持多图的供应商：逐张并行识别后合并
+        if self.provider in SINGLE_IMAGE_PROVIDERS:
+            replies = await asyncio.gather(*[
+                self.recognize_image(image, prompt, model, system_prompt) for image in images
+            ])
+            return "\n\n".join(f"图片{index}：{reply}" for index, reply in enumerate(replies, 1))
+
+        # 并行准备所有图片
+        with span("vision_prepare_image"):
+            prepared = await asyncio.gather(*[self._prepare_image_url(image) for image in images])
+        image_urls = [image_url for image_url in prepared if image_url]
+        if not image_urls:
+            logger.error("❌ 无法获取图片数据")
+            return "抱歉，无法获取图片数据。"
+
+        logger.info(f"🖼️  批量识别 {len(image_urls)} 张图片")
+
+        try:
+            with span("vision_call"):
+                return await self._call_provider(prompt, image_urls, model, system_prompt)
 
         except httpx.TimeoutException:
             logger.error(f"❌ {self.provider} Vision API 超时")
@@ -89,9 +168,36 @@ class VisionAIClient:
             logger.error(f"❌ Vision API 调用失败: {e}")
             return f"抱歉，图片识别失败：{str(e)}"
 
+    async def _fingerprint(self, image_data: ImageData) -> Optional[str]:
+        """计算图片指纹（失败时返回 None，不影响识别）"""
+        try:
+            image_bytes = await load_image_bytes(image_data)
+            if not image_bytes:
+                return None
+            return await run_in_thread(compute_fingerprint, image_bytes)
+        except Exception as e:
+            logger.warning(f"⚠️  计算图片指纹失败，跳过 Vision 缓存: {e}")
+            return None
+
     async def _prepare_image_url(self, image_data: ImageData) -> Optional[str]:
         """准备图片 URL（统一格式）"""
 
+        from config import config
+
+        # 预处理：缩小尺寸、重新编码、去除元数据（失败时退回原图）
+        if config.vision_preprocess:
+            try:
+                image_bytes = await load_image_bytes(image_data)
+                if image_bytes:
+                    prepared = await preprocess_image_async(
+                        image_bytes,
+                        max_edge=get_max_edge(self.provider, config.vision_max_edge),
+                        quality=config.vision_jpeg_quality
+                    )
+                    return prepared.to_data_url()
+            except Exception as e:
+                logger.warning(f"⚠️  图片预处理失败，使用原图: {e}")
+
         if image_data.url:
             # 如果是 http/https URL，直接使用
             if image_data.url.startswith(("http://", "https://")):
@@ -101,22 +207,52 @@ class VisionAIClient:
                 return image_data.url
 
         elif image_data.base64:
-            # Base64 格式，添加 data URL 前缀
-            return f"data:image/jpeg;base64,{image_data.base64}"
+            # Base64 格式，按文件头识别真实格式
+            image_bytes = base64.b64decode(image_data.base64)
+            mime_type = sniff_image_format(image_bytes) or "image/jpeg"
+            return f"data:{mime_type};base64,{image_data.base64}"
 
         elif image_data.file_path:
-            # 本地文件，读取并转换为 base64
+            # 本地文件，在线程池中读取并转换为 base64
             try:
-                with open(image_data.file_path, "rb") as f:
-                    image_base64 = base64.b64encode(f.read()).decode('utf-8')
-                    return f"data:image/jpeg;base64,{image_base64}"
+                def read_file():
+                    with open(image_data.file_path, "rb") as f:
+                        return f.read()
+
+                image_bytes = await run_in_thread(read_file)
+                mime_type = sniff_image_format(image_bytes) or "image/jpeg"
+                image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+                return f"data:{mime_type};base64,{image_base64}"
             except Exception as e:
                 logger.error(f"❌ 读取本地图片失败: {e}")
                 return None
 
         return None
 
-    async def _call_openai_compatible(self, prompt: str, image_url: str, model: str, system_prompt: Optional[str] = None) -> str:
+    async def _download_image_base64(self, image_url: str) -> Tuple[str, str]:
+        """下载图片并转换为 Base64（复用共享下载器的缓存）"""
+        image_bytes, content_type = await get_image_downloader().fetch(image_url)
+        mime_type = sniff_image_format(image_bytes) or content_type
+        return mime_type, base64.b64encode(image_bytes).decode('utf-8')
+
+    async def _call_provider(self, prompt: str, image_urls: List[str], model: str, system_prompt: Optional[str] = None) -> str:
+        """按供应商调用对应的 API"""
+        if self.provider == "anthropic":
+            return await self._call_anthropic(prompt, image_urls, model, system_prompt)
+        elif self.provider == "google":
+            return await self._call_google(prompt, image_urls, model, system_prompt)
+        else:
+            # OpenAI 兼容 API（包括智谱、硅基流动等）
+            return await self._call_openai_compatible(prompt, image_urls, model, system_prompt)
+
+    async def _to_base64(self, image_url: str) -> Tuple[str, str]:
+        """获取图片的 MIME 类型和 Base64 数据"""
+        if image_url.startswith("data:"):
+            return parse_data_url(image_url)
+        # 如果是 URL，需要下载（共享下载器，同一 URL 只下载一次）
+        return await self._download_image_base64(image_url)
+
+    async def _call_openai_compatible(self, prompt: str, image_urls: List[str], model: str, system_prompt: Optional[str] = None) -> str:
         """调用 OpenAI 兼容 API"""
 
         headers = {
@@ -134,12 +270,12 @@ class VisionAIClient:
                 "content": system_prompt
             })
 
-        # 添加用户消息（包含图片）
+        # 添加用户消息（包含图片，多张图片放在同一条消息中）
         messages.append({
             "role": "user",
-            "content": [
-                {"type": "text", "text": prompt},
+            "content": [{"type": "text", "text": prompt}] + [
                 {"type": "image_url", "image_url": {"url": image_url}}
+                for image_url in image_urls
             ]
         })
 
@@ -149,21 +285,20 @@ class VisionAIClient:
             "max_tokens": 1000
         }
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(self.base_url, headers=headers, json=data)
-
-            if response.status_code == 200:
-                result = response.json()
-                reply = result["choices"][0]["message"]["content"]
-                logger.info(f"✅ {self.provider} Vision 回复成功: {reply[:50]}...")
-                return reply
-            else:
-                error_data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
-                error_msg = error_data.get("error", {}).get("message", response.text)
-                logger.error(f"❌ {self.provider} Vision API 错误: {response.status_code} - {error_msg}")
-                return f"抱歉，{self.provider} Vision 服务出错（{response.status_code}）"
-
-    async def _call_anthropic(self, prompt: str, image_url: str, model: str, system_prompt: Optional[str] = None) -> str:
+        response = await get_http_client().post(self.base_url, headers=headers, json=data, timeout=30.0)
+
+        if response.status_code == 200:
+            result = response.json()
+            reply = result["choices"][0]["message"]["content"]
+            logger.info(f"✅ {self.provider} Vision 回复成功: {reply[:50]}...")
+            return reply
+        else:
+            error_data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            error_msg = error_data.get("error", {}).get("message", response.text)
+            logger.error(f"❌ {self.provider} Vision API 错误: {response.status_code} - {error_msg}")
+            return f"抱歉，{self.provider} Vision 服务出错（{response.status_code}）"
+
+    async def _call_anthropic(self, prompt: str, image_urls: List[str], model: str, system_prompt: Optional[str] = None) -> str:
         """调用 Anthropic Claude API"""
 
         headers = {
@@ -172,16 +307,8 @@ class VisionAIClient:
             "anthropic-version": "2023-06-01"
         }
 
-        # 提取 base64 数据
-        if image_url.startswith("data:"):
-            image_base64 = image_url.split(",")[1]
-        else:
-            # 如果是 URL，需要下载
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                async with session.get(image_url) as resp:
-                    image_bytes = await resp.read()
-                    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        # 提取 base64 数据（多张图片并行下载）
+        encoded_images = await asyncio.gather(*[self._to_base64(image_url) for image_url in image_urls])
 
         # 构建消息列表
         messages = []
@@ -196,16 +323,16 @@ class VisionAIClient:
         # 添加用户消息（包含图片）
         messages.append({
             "role": "user",
-            "content": [
-                {"type": "text", "text": prompt},
+            "content": [{"type": "text", "text": prompt}] + [
                 {
                     "type": "image",
                     "source": {
                         "type": "base64",
-                        "media_type": "image/jpeg",
+                        "media_type": media_type,
                         "data": image_base64
                     }
                 }
+                for media_type, image_base64 in encoded_images
             ]
         })
 
@@ -215,47 +342,38 @@ class VisionAIClient:
             "messages": messages
         }
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(self.base_url, headers=headers, json=data)
-
-            if response.status_code == 200:
-                result = response.json()
-                reply = result["content"][0]["text"]
-                logger.info(f"✅ Claude Vision 回复成功: {reply[:50]}...")
-                return reply
-            else:
-                error_data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
-                error_msg = error_data.get("error", {}).get("message", response.text)
-                logger.error(f"❌ Claude Vision API 错误: {response.status_code} - {error_msg}")
-                return f"抱歉，Claude Vision 服务出错（{response.status_code}）"
-
-    async def _call_google(self, prompt: str, image_url: str, model: str, system_prompt: Optional[str] = None) -> str:
-        """调用 Google Gemini API"""
+        response = await get_http_client().post(self.base_url, headers=headers, json=data, timeout=30.0)
 
-        # 提取 base64 数据
-        if image_url.startswith("data:"):
-            image_base64 = image_url.split(",")[1]
+        if response.status_code == 200:
+            result = response.json()
+            reply = result["content"][0]["text"]
+            logger.info(f"✅ Claude Vision 回复成功: {reply[:50]}...")
+            return reply
         else:
-            # 如果是 URL，需要下载
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                async with session.get(image_url) as resp:
-                    image_bytes = await resp.read()
-                    image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+            error_data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            error_msg = error_data.get("error", {}).get("message", response.text)
+            logger.error(f"❌ Claude Vision API 错误: {response.status_code} - {error_msg}")
+            return f"抱歉，Claude Vision 服务出错（{response.status_code}）"
+
+    async def _call_google(self, prompt: str, image_urls: List[str], model: str, system_prompt: Optional[str] = None) -> str:
+        """调用 Google Gemini API"""
+
+        # 提取 base64 数据（多张图片并行下载）
+        encoded_images = await asyncio.gather(*[self._to_base64(image_url) for image_url in image_urls])
 
         url = f"{self.base_url}/{model}:generateContent?key={self.api_key}"
 
         # 构建内容
         contents = [
             {
-                "parts": [
-                    {"text": prompt},
+                "parts": [{"text": prompt}] + [
                     {
                         "inline_data": {
-                            "mime_type": "image/jpeg",
+                            "mime_type": media_type,
                             "data": image_base64
                         }
                     }
+                    for media_type, image_base64 in encoded_images
                 ]
             }
         ]
@@ -270,16 +388,41 @@ class VisionAIClient:
 
         data = {"contents": contents}
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=data)
-
-            if response.status_code == 200:
-                result = response.json()
-                reply = result["candidates"][0]["content"]["parts"][0]["text"]
-                logger.info(f"✅ Google Vision 回复成功: {reply[:50]}...")
-                return reply
-            else:
-                error_data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
-                error_msg = error_data.get("error", {}).get("message", response.text)
-                logger.error(f"❌ Google Vision API 错误: {response.status_code} - {error_msg}")
-                return f"抱歉，Google Vision 服务出错（{response.status_code}）"
+        response = await get_http_client().post(url, json=data, timeout=30.0)
+
+        if response.status_code == 200:
+            result = response.json()
+            reply = result["candidates"][0]["content"]["parts"][0]["text"]
+            logger.info(f"✅ Google Vision 回复成功: {reply[:50]}...")
+            return reply
+        else:
+            error_data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            error_msg = error_data.get("error", {}).get("message", response.text)
+            logger.error(f"❌ Google Vision API 错误: {response.status_code} - {error_msg}")
+            return f"抱歉，Google Vision 服务出错（{response.status_code}）"
+
+
+# Vision 客户端注册表：(供应商, API Key, 基础 URL) → 客户端
+_vision_clients: Dict[Tuple[str, str, Optional[str]], VisionAIClient] = {}
+
+
+def get_vision_client(api_key: str, provider: str = "openai", base_url: Optional[str] = None) -> VisionAIClient:
+    """
+    获取 Vision AI 客户端（相同配置复用同一实例，底层共享连接池）
+
+    Args:
+        api_key: API Key
+        provider: 供应商
+        base_url: API 基础 URL（可选）
+
+    Returns:
+        VisionAIClient: Vision AI 客户端
+    """
+    key = (provider, api_key, base_url)
+
+    client = _vision_clients.get(key)
+    if client is None:
+        client = VisionAIClient(api_key=api_key, provider=provider, base_url=base_url)
+        _vision_clients[key] = client
+
+    return client
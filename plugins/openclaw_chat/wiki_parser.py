@@ -417,6 +417,27 @@ class WikiParser:
         if html is None:
             return None
 
+        return self.parse_html(page_name, html)
+
+    def parse_html(
+        self,
+        page_name: str,
+        html: str,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50
+    ) -> Dict[str, Any]:
+        """
+        解析已获取的页面 HTML（离线评测时直接解析保存的页面）
+
+        Args:
+            page_name: 页面名称
+            html: HTML 内容
+            chunk_size: 每块大小（字符数）
+            chunk_overlap: 块之间重叠字符数
+
+        Returns:
+            Dict[str, Any]: 页面解析结果
+        """
         # 提取内容
         title = self.extract_title(html)
         content = self._clean_html(html)
@@ -425,7 +446,7 @@ class WikiParser:
         links = self.extract_links(html)
 
         # 分割文本为块
-        chunks = self.split_into_chunks(content)
+        chunks = self.split_into_chunks(content, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
 
         return {
             "page_name": page_name,
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试公共配置
+插件包在导入时会注册 NoneBot 事件响应器，需要先初始化 NoneBot
+"""
+
+import os
+import sys
+
+import nonebot
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+nonebot.init()
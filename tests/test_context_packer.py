@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提示词上下文打包测试用例
+"""
+
+
+LONG_CHUNK = (
+    "泰拉瑞亚是一款沙盒游戏。"
+    "游戏中有许多首领，每个首领都有不同的掉落物。"
+    "泰拉棱镜是光之女皇的掉落物，掉落概率约为 5%。"
+    "玩家可以在神圣之地召唤光之女皇。"
+    "更多信息请参阅相关页面。"
+)
+
+
+def _result(text, source):
+    """构造检索结果"""
+    return {"text": text, "metadata": {"source": source}, "score": 0.1}
+
+
+class TestTokenEstimate:
+    """测试 Token 估算"""
+
+    def test_cjk_and_ascii(self):
+        """测试中文按字、英文按 4 字符估算"""
+        from plugins.openclaw_chat.context_packer import estimate_tokens
+
+        assert estimate_tokens("泰拉棱镜") == 4
+        assert estimate_tokens("abcdefgh") == 2
+        assert estimate_tokens("") == 0
+
+    def test_truncate(self):
+        """测试按预算截断"""
+        from plugins.openclaw_chat.context_packer import estimate_tokens, truncate_to_tokens
+
+        truncated = truncate_to_tokens("一二三四五六七八九十", 5)
+
+        assert truncated.endswith("…")
+        assert estimate_tokens(truncated) <= 5
+
+
+class TestCompress:
+    """测试文本块压缩"""
+
+    def test_keeps_relevant_sentences(self):
+        """测试只保留与问题相关的句子"""
+        from plugins.openclaw_chat.context_packer import compress_text, estimate_tokens
+
+        compressed = compress_text("泰拉棱镜怎么获得", LONG_CHUNK, 40)
+
+        assert "泰拉棱镜是光之女皇的掉落物" in compressed
+        assert "更多信息请参阅相关页面" not in compressed
+        assert estimate_tokens(compressed) <= 40
+
+    def test_short_text_unchanged(self):
+        """测试预算内的文本不变"""
+        from plugins.openclaw_chat.context_packer import compress_text
+
+        assert compress_text("泰拉棱镜", "泰拉棱镜。", 100) == "泰拉棱镜。"
+
+
+class TestPackKbContext:
+    """测试知识库上下文打包"""
+
+    def test_sources_collapsed(self):
+        """测试相同来源合并为一行"""
+        from plugins.openclaw_chat.context_packer import pack_kb_context
+
+        context = pack_kb_context("泰拉棱镜", [
+            _result("泰拉棱镜是召唤武器。", "https://wiki/泰拉棱镜"),
+            _result("泰拉棱镜由光之女皇掉落。", "https://wiki/泰拉棱镜"),
+            _result("光之女皇在神圣之地出现。", "https://wiki/光之女皇"),
+        ])
+
+        assert context.count("https://wiki/泰拉棱镜") == 1
+        assert "[1][2] https://wiki/泰拉棱镜" in context
+        assert "[3] https://wiki/光之女皇" in context
+
+    def test_budget_respected(self):
+        """测试打包结果不超过预算"""
+        from plugins.openclaw_chat.context_packer import pack_kb_context, estimate_tokens
+
+        results = [_result(LONG_CHUNK * 3, f"https://wiki/{i}") for i in range(3)]
+        context = pack_kb_context("泰拉棱镜", results, max_tokens=200)
+
+        assert estimate_tokens(context) <= 200
+        assert "【3】" in context
+        assert "泰拉棱镜是光之女皇的掉落物" in context
+
+    def test_low_ranked_dropped_when_budget_tiny(self):
+        """测试预算过小时丢弃排名靠后的文本块"""
+        from plugins.openclaw_chat.context_packer import pack_kb_context
+
+        results = [_result(LONG_CHUNK, f"https://wiki/{i}") for i in range(5)]
+        context = pack_kb_context("泰拉棱镜", results, max_tokens=80)
+
+        assert "【1】" in context
+        assert "【5】" not in context
+
+
+class TestHistoryBudget:
+    """测试对话记忆裁剪"""
+
+    def test_oldest_dropped_first(self):
+        """测试从最早的消息开始裁剪，且不以助手消息开头"""
+        from plugins.openclaw_chat.context_packer import fit_history_to_budget
+
+        history = [
+            {"role": "user", "content": "一" * 50},
+            {"role": "assistant", "content": "二" * 50},
+            {"role": "user", "content": "三" * 50},
+            {"role": "assistant", "content": "四" * 50},
+        ]
+
+        kept = fit_history_to_budget(history, max_tokens=200, reserved=["人设" * 40])
+
+        assert kept == history[2:]
+
+    def test_no_budget(self):
+        """测试预算为 0 时不裁剪"""
+        from plugins.openclaw_chat.context_packer import fit_history_to_budget
+
+        history = [{"role": "user", "content": "一" * 5000}]
+
+        assert fit_history_to_budget(history, max_tokens=0) == history
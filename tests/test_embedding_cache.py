@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化嵌入缓存测试用例
+"""
+
+from unittest.mock import MagicMock, patch
+import pytest
+
+
+class CountingEmbedder:
+    """记录调用的嵌入函数"""
+
+    def __init__(self, dimension=4):
+        self.dimension = dimension
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] * self.dimension for text in texts]
+
+
+class TestPersistentEmbeddingCache:
+    """测试持久化嵌入缓存"""
+
+    def test_only_new_texts_embedded(self, tmp_path):
+        """测试只嵌入未缓存的文本，重复文本只嵌入一次"""
+        from plugins.openclaw_chat.embedding_cache import PersistentEmbeddingCache
+
+        cache = PersistentEmbeddingCache(str(tmp_path), "model-a", dimension=4)
+        embed = CountingEmbedder()
+
+        cache.get_or_embed(["页脚模板", "泰拉棱镜"], embed)
+        vectors = cache.get_or_embed(["页脚模板", "天顶剑", "天顶剑"], embed)
+
+        assert embed.calls == [["页脚模板", "泰拉棱镜"], ["天顶剑"]]
+        assert vectors[0] == [4.0] * 4
+        assert vectors[1] == vectors[2] == [3.0] * 4
+        assert len(cache) == 3
+
+    def test_persisted_across_instances(self, tmp_path):
+        """测试重启后（重建知识库时）直接读取缓存"""
+        from plugins.openclaw_chat.embedding_cache import PersistentEmbeddingCache
+
+        PersistentEmbeddingCache(str(tmp_path), "model-a", dimension=4).get_or_embed(["a", "bb"], CountingEmbedder())
+
+        reloaded = PersistentEmbeddingCache(str(tmp_path), "model-a", dimension=4)
+        embed = CountingEmbedder()
+        vectors = reloaded.get_or_embed(["bb", "a"], embed)
+
+        assert embed.calls == []
+        assert vectors == [[2.0] * 4, [1.0] * 4]
+
+    def test_models_isolated(self, tmp_path):
+        """测试不同模型的向量分开保存"""
+        from plugins.openclaw_chat.embedding_cache import PersistentEmbeddingCache
+
+        PersistentEmbeddingCache(str(tmp_path), "model-a", dimension=4).get_or_embed(["a"], CountingEmbedder())
+
+        other = PersistentEmbeddingCache(str(tmp_path), "model-b", dimension=4)
+        embed = CountingEmbedder()
+        other.get_or_embed(["a"], embed)
+
+        assert embed.calls == [["a"]]
+
+    def test_float16_storage(self, tmp_path):
+        """测试 float16 存储体积减半且精度足够"""
+        from plugins.openclaw_chat.embedding_cache import PersistentEmbeddingCache
+
+        cache = PersistentEmbeddingCache(str(tmp_path), "model-a", dimension=4, dtype="float16")
+        cache.put_many(["a"], [[0.1, 0.2, 0.3, 0.4]])
+
+        assert cache.get_stats()["bytes"] == 4 * 2
+        assert cache.get_many(["a"])[0] == pytest.approx([0.1, 0.2, 0.3, 0.4], abs=1e-3)
+
+    def test_partial_write_recovered(self, tmp_path):
+        """测试写入中断（摘要比向量多）时丢弃不完整的行"""
+        from plugins.openclaw_chat.embedding_cache import PersistentEmbeddingCache
+
+        cache = PersistentEmbeddingCache(str(tmp_path), "model-a", dimension=4)
+        cache.put_many(["a", "b"], [[1.0] * 4, [2.0] * 4])
+        with open(cache.keys_file, "ab") as f:
+            f.write(b"\x00" * 32)
+
+        reloaded = PersistentEmbeddingCache(str(tmp_path), "model-a", dimension=4)
+
+        assert len(reloaded) == 2
+        assert reloaded.get_many(["b"])[0] == [2.0] * 4
+
+    def test_dimension_change_resets(self, tmp_path):
+        """测试维度变化时重建缓存"""
+        from plugins.openclaw_chat.embedding_cache import PersistentEmbeddingCache
+
+        PersistentEmbeddingCache(str(tmp_path), "model-a", dimension=4).put_many(["a"], [[1.0] * 4])
+
+        assert len(PersistentEmbeddingCache(str(tmp_path), "model-a", dimension=8)) == 0
+
+
+class TestVectorDatabaseIntegration:
+    """测试向量数据库接入嵌入缓存"""
+
+    def test_add_documents_uses_cache(self, tmp_path):
+        """测试重复添加相同文本块时不再调用嵌入后端"""
+        from plugins.openclaw_chat import vector_database_manager
+        from plugins.openclaw_chat.vector_database_manager import DocumentChunk
+        from plugins.openclaw_chat.embeddings import HashingEmbeddingProvider
+
+        provider = HashingEmbeddingProvider(dimension=16)
+        provider.embed = MagicMock(side_effect=HashingEmbeddingProvider(dimension=16).embed)
+        chunks = [DocumentChunk(chunk_id=f"c{i}", kb_id="game", text=f"文本{i}", source="wiki") for i in range(3)]
+
+        with patch.object(vector_database_manager, "CHROMADB_AVAILABLE", True), \
+                patch.object(vector_database_manager, "chromadb", MagicMock(), create=True), \
+                patch.object(vector_database_manager, "Settings", MagicMock(), create=True), \
+                patch("config.config.embedding_cache_dir", str(tmp_path / "cache")):
+            manager = vector_database_manager.VectorDatabaseManager(kb_dir=str(tmp_path), embedding_provider=provider)
+            manager.add_documents("game", chunks)
+            calls_after_first_build = provider.embed.call_count
+            manager.add_documents("game", chunks)
+
+        collection = manager._collections["game"]
+        assert provider.embed.call_count == calls_after_first_build
+        assert len(collection.add.call_args.kwargs["embeddings"]) == 3
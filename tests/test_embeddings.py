@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+嵌入后端、嵌入缓存与动态批处理测试用例
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+import pytest
+
+
+class CountingProvider:
+    """记录调用的嵌入后端"""
+
+    name = "counting"
+    dimension = 2
+
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class TestHashingEmbedding:
+    """测试特征哈希嵌入"""
+
+    def test_similar_text_closer(self):
+        """测试相关的中文文本相似度更高"""
+        from plugins.openclaw_chat.embeddings import HashingEmbeddingProvider
+
+        provider = HashingEmbeddingProvider(dimension=256)
+        query, related, unrelated = provider.embed([
+            "泰拉棱镜怎么获得",
+            "泰拉棱镜在击败光之女皇后获得",
+            "今天晚饭吃什么",
+        ])
+
+        def dot(a, b):
+            return sum(x * y for x, y in zip(a, b))
+
+        assert dot(query, related) > dot(query, unrelated)
+        assert abs(dot(query, query) - 1.0) < 1e-5
+
+    def test_deterministic(self):
+        """测试同一文本的向量稳定（不依赖进程的哈希种子）"""
+        from plugins.openclaw_chat.embeddings import HashingEmbeddingProvider
+
+        provider = HashingEmbeddingProvider()
+
+        assert provider.embed(["天顶剑"]) == HashingEmbeddingProvider().embed(["天顶剑"])
+
+    def test_normalize(self):
+        """测试归一化：矩阵按行、一维数组按整个向量，零向量保持为零"""
+        import numpy as np
+        from plugins.openclaw_chat.embeddings import normalize
+
+        matrix = normalize(np.array([[3.0, 4.0], [0.0, 0.0]], dtype=np.float32))
+        vector = normalize(np.array([0.0, 2.0], dtype=np.float32))
+
+        assert np.allclose(matrix, [[0.6, 0.8], [0.0, 0.0]])
+        assert np.allclose(vector, [0.0, 1.0])
+
+    def test_provider_requires_embed(self):
+        """测试嵌入后端接口必须实现 embed"""
+        from plugins.openclaw_chat.embeddings import EmbeddingProvider
+
+        class Incomplete(EmbeddingProvider):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+
+class TestCachedEmbedding:
+    """测试嵌入缓存"""
+
+    def test_only_missing_texts_embedded(self):
+        """测试只计算未缓存的文本，批内重复文本只计算一次"""
+        from plugins.openclaw_chat.embeddings import CachedEmbeddingProvider
+
+        inner = CountingProvider()
+        provider = CachedEmbeddingProvider(inner, max_size=10)
+
+        provider.embed(["a", "bb"])
+        vectors = provider.embed(["bb", "ccc", "ccc"])
+
+        assert inner.calls == [["a", "bb"], ["ccc"]]
+        assert vectors == [[2.0, 1.0], [3.0, 1.0], [3.0, 1.0]]
+        assert provider.get_cache_stats()["hits"] == 1
+
+    def test_lru_eviction(self):
+        """测试超过上限时淘汰最久未使用的条目"""
+        from plugins.openclaw_chat.embeddings import CachedEmbeddingProvider
+
+        inner = CountingProvider()
+        provider = CachedEmbeddingProvider(inner, max_size=2)
+
+        provider.embed(["a"])
+        provider.embed(["b"])
+        provider.embed(["a"])
+        provider.embed(["c"])
+        provider.embed(["b"])
+
+        assert inner.calls == [["a"], ["b"], ["c"], ["b"]]
+
+
+class TestEmbeddingBatcher:
+    """测试动态批处理"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_batched(self):
+        """测试并发查询合并为一次推理"""
+        from plugins.openclaw_chat.embeddings import EmbeddingBatcher
+
+        inner = CountingProvider()
+        batcher = EmbeddingBatcher(inner, max_batch_size=32, max_wait=0.01)
+
+        vectors = await asyncio.gather(*[batcher.embed("x" * n) for n in range(1, 6)])
+
+        assert [vector[0] for vector in vectors] == [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert len(inner.calls) == 1
+        assert batcher.get_stats()["avg_batch_size"] == 5
+
+    @pytest.mark.asyncio
+    async def test_full_batch_flushed_immediately(self):
+        """测试攒满一批后立即执行"""
+        from plugins.openclaw_chat.embeddings import EmbeddingBatcher
+
+        inner = CountingProvider()
+        batcher = EmbeddingBatcher(inner, max_batch_size=2, max_wait=10)
+
+        await asyncio.wait_for(asyncio.gather(batcher.embed("a"), batcher.embed("b")), timeout=1)
+
+        assert inner.calls == [["a", "b"]]
+
+    @pytest.mark.asyncio
+    async def test_error_propagates_to_all_waiters(self):
+        """测试推理失败时所有等待者都收到异常"""
+        from plugins.openclaw_chat.embeddings import EmbeddingBatcher
+
+        provider = MagicMock()
+        provider.embed.side_effect = RuntimeError("model crashed")
+        batcher = EmbeddingBatcher(provider, max_wait=0.001)
+
+        results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+
+class TestRetrieverIntegration:
+    """测试检索接入查询嵌入批处理"""
+
+    @pytest.mark.asyncio
+    async def test_retriever_passes_query_embedding(self):
+        """测试配置批处理器时检索使用预先计算的查询向量"""
+        from plugins.openclaw_chat.embeddings import EmbeddingBatcher
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever, SearchContext
+
+        vector_db = MagicMock()
+        vector_db.embedding_batcher = EmbeddingBatcher(CountingProvider(), max_wait=0.001)
+        vector_db.search.return_value = []
+
+        retriever = KnowledgeBaseRetriever()
+        await retriever.retrieve(vector_db, SearchContext(query="天顶剑", kb_id="game", top_k=3, use_cache=False))
+
+        assert vector_db.search.call_args.kwargs["query_embedding"] == [3.0, 1.0]
+
+    def test_chroma_adapter(self):
+        """测试 Chroma 嵌入函数适配"""
+        from plugins.openclaw_chat.embeddings import ChromaEmbeddingFunction
+
+        function = ChromaEmbeddingFunction(CountingProvider())
+
+        assert function(["ab"]) == [[2.0, 1.0]]
+        assert function.name() == "openclaw_counting"
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FAQ 答案索引测试用例
+"""
+
+import pytest
+
+
+CHUNKS = [
+    {"chunk_id": "p_1", "text": "泰拉棱镜第二段。", "metadata": {"metadata": {"page_name": "泰拉棱镜", "chunk_index": 1}}},
+    {"chunk_id": "p_0", "text": "泰拉棱镜是一种召唤武器，由光之女皇掉落。", "metadata": {"metadata": {"page_name": "泰拉棱镜", "chunk_index": 0}}},
+    {"chunk_id": "q_0", "text": "生命水晶可以提升最大生命值。", "metadata": {"metadata": {"page_name": "生命水晶", "chunk_index": 0}}},
+]
+
+
+def _session(question, answer, timestamp):
+    """构造一轮对话"""
+    return [
+        {"role": "user", "content": question, "timestamp": timestamp},
+        {"role": "assistant", "content": answer, "timestamp": timestamp + 1},
+    ]
+
+
+class TestCandidates:
+    """测试候选问答对生成"""
+
+    def test_from_chunks_uses_first_chunk(self):
+        """测试每个页面取首个文本块作为答案"""
+        from plugins.openclaw_chat.faq_index import candidates_from_chunks
+
+        entries = {entry.question: entry for entry in candidates_from_chunks("game", CHUNKS)}
+
+        assert set(entries) == {"泰拉棱镜是什么", "生命水晶是什么"}
+        assert entries["泰拉棱镜是什么"].answer.startswith("泰拉棱镜是一种召唤武器")
+        assert entries["泰拉棱镜是什么"].source == "kb"
+
+    def test_mine_frequent_questions(self):
+        """测试近似重复的问题合并计数，取最近一次的回复"""
+        from plugins.openclaw_chat.faq_index import mine_frequent_questions
+
+        sessions = [
+            _session("天顶剑怎么合成？", "旧答案", 1) + _session("天顶剑怎么合成", "新答案", 10),
+            _session("天顶剑怎么合成啊？", "中间的答案", 5) + _session("今天天气不错", "是的", 6),
+            _session("生命水晶在哪里？", "地下", 7),
+        ]
+
+        entries = mine_frequent_questions("game", sessions, min_count=3)
+
+        assert len(entries) == 1
+        assert entries[0].frequency == 3
+        assert entries[0].answer == "新答案"
+        assert entries[0].source == "log"
+
+
+class TestFAQIndex:
+    """测试 FAQ 索引"""
+
+    def test_only_approved_entries_match(self, tmp_path):
+        """测试只有审核通过的问答对会命中"""
+        from plugins.openclaw_chat.faq_index import FAQIndex, candidates_from_chunks
+
+        index = FAQIndex(str(tmp_path), threshold=0.9)
+        index.merge("game", candidates_from_chunks("game", CHUNKS))
+        query = index.provider.embed(["泰拉棱镜是什么？"])[0]
+
+        assert index.match_embedding(["game"], query) is None
+
+        faq_id = index.list_entries("game")[0].faq_id
+        entry = index.find(faq_id)
+        index.update_entry(faq_id, status="approved")
+
+        hit = index.match_embedding(["game"], index.provider.embed([entry.question + "？"])[0])
+        assert hit is not None and hit[0].faq_id == faq_id
+        assert index.match_embedding(["game"], index.provider.embed(["天顶剑怎么合成"])[0]) is None
+
+    def test_persisted_and_manual_answer_kept(self, tmp_path):
+        """测试索引持久化，管理员编辑的答案在刷新时保留"""
+        from plugins.openclaw_chat.faq_index import FAQIndex, candidates_from_chunks, make_faq_id
+
+        index = FAQIndex(str(tmp_path))
+        index.merge("game", candidates_from_chunks("game", CHUNKS))
+        faq_id = make_faq_id("game", "泰拉棱镜是什么")
+        index.update_entry(faq_id, answer="人工编写的答案")
+
+        reopened = FAQIndex(str(tmp_path))
+        stats = reopened.merge("game", candidates_from_chunks("game", CHUNKS))
+
+        assert reopened.find(faq_id).answer == "人工编写的答案"
+        assert reopened.find(faq_id).status == "approved"
+        assert stats["added"] == 0
+
+    def test_changed_answer_needs_review(self, tmp_path):
+        """测试刷新后答案变化的问答对重新待审核"""
+        from plugins.openclaw_chat.faq_index import FAQIndex, FAQEntry, make_faq_id
+
+        index = FAQIndex(str(tmp_path))
+        faq_id = make_faq_id("game", "天顶剑怎么合成")
+        index.merge("game", [FAQEntry(faq_id=faq_id, kb_id="game", question="天顶剑怎么合成", answer="旧", source="log")], auto_approve=True)
+        assert index.find(faq_id).status == "approved"
+
+        index.merge("game", [FAQEntry(faq_id=faq_id, kb_id="game", question="天顶剑怎么合成", answer="新", source="log")])
+
+        assert index.find(faq_id).status == "pending"
+        assert index.find(faq_id).answer == "新"
+
+    @pytest.mark.asyncio
+    async def test_match_counts_hits(self, tmp_path):
+        """测试命中时累计命中次数"""
+        from plugins.openclaw_chat.faq_index import FAQIndex, FAQEntry, make_faq_id
+
+        index = FAQIndex(str(tmp_path))
+        faq_id = make_faq_id("game", "天顶剑怎么合成")
+        index.merge("game", [FAQEntry(faq_id=faq_id, kb_id="game", question="天顶剑怎么合成", answer="答案")], auto_approve=True)
+
+        hit = await index.match(["game", "other"], "天顶剑怎么合成？")
+
+        assert hit[0].answer == "答案"
+        assert index.find(faq_id).hits == 1
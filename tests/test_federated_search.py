@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多知识库联合检索测试用例
+"""
+
+import pytest
+
+
+class FakeBatcher:
+    """固定返回查询向量的嵌入批处理器"""
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+
+    async def embed(self, text):
+        return self.embedding
+
+
+class FakeVectorDB:
+    """按知识库返回预设结果的向量数据库"""
+
+    def __init__(self, results, spaces=None, centroids=None, query_embedding=None):
+        self.results = results
+        self.spaces = spaces or {}
+        self.centroids = centroids or {}
+        self.embedding_batcher = FakeBatcher(query_embedding) if query_embedding else None
+        self.searched = []
+        self.centroid_calls = 0
+
+    def search(self, kb_id, query, top_k=3, where=None, query_embedding=None):
+        self.searched.append(kb_id)
+        return [dict(result) for result in self.results.get(kb_id, [])][:top_k]
+
+    def get_distance_space(self, kb_id):
+        return self.spaces.get(kb_id, "l2")
+
+    def get_collection_info(self, kb_id):
+        return {"count": len(self.results.get(kb_id, []))}
+
+    def get_centroid(self, kb_id):
+        self.centroid_calls += 1
+        return self.centroids.get(kb_id)
+
+
+class TestDistanceNormalization:
+    """测试距离换算"""
+
+    def test_spaces(self):
+        """测试 cosine / ip 距离换算为平方 L2 距离"""
+        from plugins.openclaw_chat.kb_router import to_l2_distance
+
+        assert to_l2_distance(0.5, "l2") == 0.5
+        assert to_l2_distance(0.25, "cosine") == 0.5
+        assert to_l2_distance(0.25, "ip") == 0.5
+
+
+class TestCentroidRouter:
+    """测试质心路由"""
+
+    @pytest.mark.asyncio
+    async def test_skips_far_kb(self):
+        """测试跳过质心与查询相差较远的知识库，并按相似度排序"""
+        from plugins.openclaw_chat.kb_router import CentroidRouter
+
+        vector_db = FakeVectorDB(
+            results={"game": [{}], "faq": [{}], "cooking": [{}]},
+            centroids={"game": [1.0, 0.0], "faq": [0.95, 0.31], "cooking": [0.0, 1.0]}
+        )
+        router = CentroidRouter(margin=0.15)
+
+        selected = await router.route(vector_db, ["cooking", "faq", "game"], [1.0, 0.0])
+
+        assert selected == ["game", "faq"]
+
+    @pytest.mark.asyncio
+    async def test_centroid_cached_until_count_changes(self):
+        """测试质心缓存，文本块数量变化后重新计算"""
+        from plugins.openclaw_chat.kb_router import CentroidRouter
+
+        vector_db = FakeVectorDB(
+            results={"game": [{}], "faq": [{}]},
+            centroids={"game": [1.0, 0.0], "faq": [0.0, 1.0]}
+        )
+        router = CentroidRouter(margin=1.0, max_kbs=1)
+
+        assert await router.route(vector_db, ["faq", "game"], [1.0, 0.0]) == ["game"]
+        await router.route(vector_db, ["faq", "game"], [1.0, 0.0])
+        assert vector_db.centroid_calls == 2
+
+        vector_db.results["faq"].append({})
+        await router.route(vector_db, ["faq", "game"], [1.0, 0.0])
+        assert vector_db.centroid_calls == 3
+
+    @pytest.mark.asyncio
+    async def test_no_embedding_keeps_all(self):
+        """测试没有查询向量时不路由"""
+        from plugins.openclaw_chat.kb_router import CentroidRouter
+
+        assert await CentroidRouter().route(FakeVectorDB({}), ["a", "b"], None) == ["a", "b"]
+
+
+class TestFederatedRetrieve:
+    """测试联合检索"""
+
+    def _vector_db(self, **kwargs):
+        """构造两个知识库（faq 使用 cosine 距离）"""
+        return FakeVectorDB(
+            results={
+                "game": [
+                    {"chunk_id": "g1", "text": "天顶剑", "metadata": {}, "score": 0.3},
+                    {"chunk_id": "g2", "text": "泰拉棱镜", "metadata": {}, "score": 0.9},
+                ],
+                "faq": [
+                    {"chunk_id": "f1", "text": "如何获得天顶剑", "metadata": {}, "score": 0.2},
+                ],
+            },
+            spaces={"faq": "cosine"},
+            **kwargs
+        )
+
+    @pytest.mark.asyncio
+    async def test_merge_by_normalized_distance(self):
+        """测试各知识库结果换算距离后合并排序，并标记来源知识库"""
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever, SearchContext
+
+        vector_db = self._vector_db()
+        context = SearchContext(query="天顶剑", kb_id="game", kb_ids=["game", "faq"], top_k=3)
+
+        results = await KnowledgeBaseRetriever().retrieve(vector_db, context)
+
+        assert [result["chunk_id"] for result in results] == ["g1", "f1", "g2"]
+        assert results[1]["score"] == pytest.approx(0.4)
+        assert results[1]["kb_id"] == "faq"
+        assert sorted(vector_db.searched) == ["faq", "game"]
+
+    @pytest.mark.asyncio
+    async def test_router_limits_searched_kbs(self):
+        """测试路由器跳过的知识库不会被查询"""
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever, SearchContext
+        from plugins.openclaw_chat.kb_router import CentroidRouter
+
+        vector_db = self._vector_db(
+            centroids={"game": [1.0, 0.0], "faq": [0.0, 1.0]},
+            query_embedding=[1.0, 0.0]
+        )
+        context = SearchContext(query="天顶剑", kb_id="game", kb_ids=["game", "faq"], top_k=3)
+
+        results = await KnowledgeBaseRetriever(router=CentroidRouter(margin=0.15)).retrieve(vector_db, context)
+
+        assert vector_db.searched == ["game"]
+        assert {result["kb_id"] for result in results} == {"game"}
+
+    @pytest.mark.asyncio
+    async def test_clear_cache_covers_federated_entries(self):
+        """测试清空单个知识库的缓存时，包含它的联合检索缓存一并清除"""
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever, SearchContext
+
+        retriever = KnowledgeBaseRetriever()
+        context = SearchContext(query="天顶剑", kb_id="game", kb_ids=["game", "faq"], top_k=3)
+        await retriever.retrieve(self._vector_db(), context)
+        assert retriever.get_cache_stats()["size"] == 1
+
+        retriever.clear_cache("game")
+
+        assert retriever.get_cache_stats()["size"] == 0
+
+
+class TestNumpyCentroid:
+    """测试 NumPy 集合质心"""
+
+    def test_centroid_normalized(self, tmp_path):
+        """测试质心为归一化的平均向量"""
+        import numpy as np
+        from plugins.openclaw_chat.numpy_vector_store import NumpyVectorStore
+
+        collection = NumpyVectorStore(str(tmp_path)).get_or_create_collection("kb_game")
+        assert collection.centroid() is None
+
+        collection.add(ids=["a", "b"], documents=["甲", "乙"], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+
+        assert np.allclose(collection.centroid(), [np.sqrt(0.5), np.sqrt(0.5)])
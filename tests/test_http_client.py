@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享 HTTP 客户端与图片下载器测试用例
+"""
+
+import asyncio
+import httpx
+import pytest
+
+
+def _install_mock_client(handler):
+    """将共享客户端替换为使用 MockTransport 的客户端"""
+    from plugins.openclaw_chat import http_client
+
+    http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    http_client._client_loop = asyncio.get_running_loop()
+
+
+class TestSharedClient:
+    """测试共享客户端"""
+
+    @pytest.mark.asyncio
+    async def test_client_is_reused(self):
+        """测试同一事件循环内复用同一个客户端"""
+        from plugins.openclaw_chat.http_client import get_http_client, close_http_client
+
+        client_a = get_http_client()
+        client_b = get_http_client()
+
+        assert client_a is client_b
+
+        await close_http_client()
+        assert get_http_client() is not client_a
+        await close_http_client()
+
+
+class TestImageDownloader:
+    """测试图片下载器"""
+
+    @pytest.mark.asyncio
+    async def test_same_url_fetched_once(self):
+        """测试同一 URL 只下载一次"""
+        from plugins.openclaw_chat.http_client import ImageDownloader, close_http_client
+
+        requests = []
+
+        def handler(request):
+            requests.append(str(request.url))
+            return httpx.Response(200, content=b"image-bytes", headers={"content-type": "image/png"})
+
+        _install_mock_client(handler)
+        downloader = ImageDownloader(max_bytes=1024)
+
+        data, content_type = await downloader.fetch("https://example.com/a.png")
+        data_again, _ = await downloader.fetch("https://example.com/a.png")
+
+        assert data == data_again == b"image-bytes"
+        assert content_type == "image/png"
+        assert len(requests) == 1
+        assert downloader.get_cache_stats()["hits"] == 1
+
+        await close_http_client()
+
+    @pytest.mark.asyncio
+    async def test_content_addressed_storage(self):
+        """测试不同 URL 指向相同内容时只保存一份"""
+        from plugins.openclaw_chat.http_client import ImageDownloader, close_http_client
+
+        _install_mock_client(lambda request: httpx.Response(200, content=b"same"))
+        downloader = ImageDownloader(max_bytes=1024)
+
+        await downloader.fetch("https://example.com/1.jpg")
+        await downloader.fetch("https://example.com/2.jpg")
+
+        stats = downloader.get_cache_stats()
+        assert stats["entries"] == 1
+        assert stats["bytes"] == 4
+
+        await close_http_client()
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的内容"""
+        from plugins.openclaw_chat.http_client import ImageDownloader, close_http_client
+
+        _install_mock_client(lambda request: httpx.Response(200, content=request.url.path.encode() * 10))
+        downloader = ImageDownloader(max_bytes=50)
+
+        await downloader.fetch("https://example.com/a")  # 20 bytes
+        await downloader.fetch("https://example.com/b")  # 20 bytes
+        await downloader.fetch("https://example.com/a")  # a 变为最近使用
+        await downloader.fetch("https://example.com/c")  # 淘汰 b
+
+        assert downloader._get_cached("https://example.com/a") is not None
+        assert downloader._get_cached("https://example.com/b") is None
+        assert downloader.get_cache_stats()["bytes"] <= 50
+
+        await close_http_client()
+
+    @pytest.mark.asyncio
+    async def test_http_error_raises(self):
+        """测试下载失败时抛出异常且不缓存"""
+        from plugins.openclaw_chat.http_client import ImageDownloader, close_http_client
+
+        _install_mock_client(lambda request: httpx.Response(404))
+        downloader = ImageDownloader()
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await downloader.fetch("https://example.com/missing.jpg")
+
+        assert downloader.get_cache_stats()["entries"] == 0
+
+        await close_http_client()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_deduped(self):
+        """测试并发请求同一 URL 只下载一次"""
+        from plugins.openclaw_chat.http_client import ImageDownloader, close_http_client
+
+        requests = []
+
+        async def handler(request):
+            requests.append(str(request.url))
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, content=b"image-bytes")
+
+        _install_mock_client(handler)
+        downloader = ImageDownloader(max_bytes=1024)
+
+        results = await asyncio.gather(*[downloader.fetch("https://example.com/a.jpg") for _ in range(5)])
+
+        assert all(data == b"image-bytes" for data, _ in results)
+        assert len(requests) == 1
+        assert downloader.get_cache_stats()["joined"] == 4
+
+        await close_http_client()
+
+    @pytest.mark.asyncio
+    async def test_oversized_image_aborted(self):
+        """测试超过大小上限的图片中止下载且不缓存"""
+        from plugins.openclaw_chat.http_client import ImageDownloader, ImageTooLargeError, close_http_client
+
+        async def stream_chunks():
+            for _ in range(100):
+                yield b"x" * 1024
+
+        _install_mock_client(lambda request: httpx.Response(200, content=stream_chunks()))
+        downloader = ImageDownloader(max_image_bytes=4 * 1024)
+
+        with pytest.raises(ImageTooLargeError):
+            await downloader.fetch("https://example.com/huge.jpg")
+
+        stats = downloader.get_cache_stats()
+        assert stats["too_large"] == 1
+        assert stats["entries"] == 0
+
+        await close_http_client()
+
+    @pytest.mark.asyncio
+    async def test_declared_length_rejected(self):
+        """测试 Content-Length 超限时不读取响应体"""
+        from plugins.openclaw_chat.http_client import ImageDownloader, ImageTooLargeError, close_http_client
+
+        _install_mock_client(lambda request: httpx.Response(
+            200, content=b"x" * 100, headers={"content-length": str(50 * 1024 * 1024)}
+        ))
+        downloader = ImageDownloader(max_image_bytes=1024)
+
+        with pytest.raises(ImageTooLargeError):
+            await downloader.fetch("https://example.com/huge.jpg")
+
+        await close_http_client()
+
+
+class TestVisionClientRegistry:
+    """测试 Vision 客户端注册表"""
+
+    def test_same_config_returns_same_client(self):
+        """测试相同配置复用同一客户端"""
+        from plugins.openclaw_chat.vision_client import get_vision_client
+
+        client_a = get_vision_client("key", "siliconflow")
+        client_b = get_vision_client("key", "siliconflow")
+        client_c = get_vision_client("key", "zhipu")
+
+        assert client_a is client_b
+        assert client_a is not client_c
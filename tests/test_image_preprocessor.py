@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片预处理测试用例
+"""
+
+import base64
+import io
+from unittest.mock import patch
+import pytest
+
+
+def _render(size, image_format="JPEG", mode="RGB", **save_kwargs):
+    """生成测试图片（带噪点，避免被压缩得过小）"""
+    from PIL import Image
+
+    image = Image.effect_noise(size, 60).convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **save_kwargs)
+    return buffer.getvalue()
+
+
+class TestSniffFormat:
+    """测试格式识别"""
+
+    def test_magic_numbers(self):
+        """测试根据文件头识别格式"""
+        from plugins.openclaw_chat.image_preprocessor import sniff_image_format
+
+        assert sniff_image_format(b"\xff\xd8\xff\xe0rest") == "image/jpeg"
+        assert sniff_image_format(b"\x89PNG\r\n\x1a\nrest") == "image/png"
+        assert sniff_image_format(b"GIF89a-rest") == "image/gif"
+        assert sniff_image_format(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+        assert sniff_image_format(b"not-an-image") is None
+
+    def test_parse_data_url(self):
+        """测试解析 data URL"""
+        from plugins.openclaw_chat.image_preprocessor import parse_data_url
+
+        assert parse_data_url("data:image/png;base64,AAAA") == ("image/png", "AAAA")
+
+
+class TestPreprocessImage:
+    """测试图片预处理（需要 Pillow）"""
+
+    def test_large_image_downscaled(self):
+        """测试超过最长边的图片被等比缩小并重新编码"""
+        pytest.importorskip("PIL")
+        from plugins.openclaw_chat.image_preprocessor import preprocess_image
+
+        data = _render((3000, 1500), quality=98)
+        prepared = preprocess_image(data, max_edge=1000)
+
+        assert prepared.reencoded
+        assert (prepared.width, prepared.height) == (1000, 500)
+        assert prepared.mime_type == "image/jpeg"
+        assert len(prepared.data) < len(data)
+
+    def test_exif_stripped(self):
+        """测试重新编码后不保留 EXIF"""
+        pytest.importorskip("PIL")
+        from PIL import Image
+        from plugins.openclaw_chat.image_preprocessor import preprocess_image
+
+        exif = Image.Exif()
+        exif[0x010F] = "SecretCamera"
+        data = _render((1200, 800), quality=98, exif=exif)
+
+        prepared = preprocess_image(data, max_edge=600)
+
+        with Image.open(io.BytesIO(prepared.data)) as image:
+            assert 0x010F not in image.getexif()
+
+    @pytest.mark.parametrize("size, image_format, mode, quality", [
+        ((100, 100), "JPEG", "RGB", 75),  # 小 JPEG，尺寸合适
+        ((300, 300), "JPEG", "RGB", 30),  # 重新编码后更大
+        ((300, 300), "PNG", "1", None),  # 重新编码为 JPEG 后更大的黑白 PNG
+    ])
+    def test_metadata_never_survives(self, size, image_format, mode, quality):
+        """测试不缩放、不重新编码的路径也不保留 EXIF/ICC/XMP"""
+        pytest.importorskip("PIL")
+        from PIL import Image, ImageCms
+        from plugins.openclaw_chat.image_preprocessor import preprocess_image
+
+        exif = Image.Exif()
+        exif[0x010F] = "SecretCamera"
+        icc = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+        save_kwargs = {"exif": exif, "icc_profile": icc}
+        if quality:
+            save_kwargs.update(quality=quality, xmp=b"<x:xmpmeta>secret</x:xmpmeta>")
+        data = _render(size, image_format=image_format, mode=mode, **save_kwargs)
+
+        prepared = preprocess_image(data, max_edge=1000, quality=95)
+
+        assert b"SecretCamera" not in prepared.data
+        assert b"secret" not in prepared.data
+        with Image.open(io.BytesIO(prepared.data)) as image:
+            assert not image.getexif()
+            assert "icc_profile" not in image.info
+            assert "xmp" not in image.info
+
+    def test_small_jpeg_untouched(self):
+        """测试小 JPEG 不重新编码"""
+        pytest.importorskip("PIL")
+        from plugins.openclaw_chat.image_preprocessor import preprocess_image
+
+        data = _render((100, 100))
+        prepared = preprocess_image(data, max_edge=1000)
+
+        assert not prepared.reencoded
+        assert prepared.data == data
+
+    def test_transparent_png_kept_as_png(self):
+        """测试带透明通道的图片保持 PNG"""
+        pytest.importorskip("PIL")
+        from plugins.openclaw_chat.image_preprocessor import preprocess_image
+
+        data = _render((800, 800), image_format="PNG", mode="RGBA")
+        prepared = preprocess_image(data, max_edge=200)
+
+        assert prepared.mime_type == "image/png"
+        assert prepared.width == 200
+
+    def test_invalid_data_returns_original(self):
+        """测试无法解析的数据原样返回"""
+        from plugins.openclaw_chat.image_preprocessor import preprocess_image
+
+        prepared = preprocess_image(b"not-an-image")
+
+        assert prepared.data == b"not-an-image"
+        assert not prepared.reencoded
+
+
+class TestVisionClientPreprocess:
+    """测试 Vision 客户端接入预处理"""
+
+    @pytest.mark.asyncio
+    async def test_prepare_uses_real_mime_type(self):
+        """测试 Base64 图片使用真实格式而非固定的 image/jpeg"""
+        from plugins.openclaw_chat.vision_client import VisionAIClient
+        from plugins.openclaw_chat.image_processor import ImageData
+
+        client = VisionAIClient(api_key="test_key", provider="openai")
+        image = ImageData(base64=base64.b64encode(b"\x89PNG\r\n\x1a\nfake").decode())
+
+        with patch("config.config.vision_preprocess", False):
+            image_url = await client._prepare_image_url(image)
+
+        assert image_url.startswith("data:image/png;base64,")
+
+    @pytest.mark.asyncio
+    async def test_prepare_downscales_for_provider(self):
+        """测试按供应商的最长边缩小图片"""
+        pytest.importorskip("PIL")
+        from PIL import Image
+        from plugins.openclaw_chat.vision_client import VisionAIClient
+        from plugins.openclaw_chat.image_processor import ImageData
+        from plugins.openclaw_chat.image_preprocessor import parse_data_url
+
+        client = VisionAIClient(api_key="test_key", provider="anthropic")
+        image = ImageData(base64=base64.b64encode(_render((3200, 2400), quality=98)).decode())
+
+        with patch("config.config.vision_preprocess", True), patch("config.config.vision_max_edge", 0):
+            image_url = await client._prepare_image_url(image)
+
+        mime_type, payload = parse_data_url(image_url)
+        with Image.open(io.BytesIO(base64.b64decode(payload))) as prepared:
+            assert max(prepared.size) == 1568
+        assert mime_type == "image/jpeg"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("source", ["base64", "file_path"])
+    async def test_create_vision_message_preprocesses(self, tmp_path, source):
+        """测试 create_vision_message 与 Vision 客户端一样缩小图片并去除元数据"""
+        pytest.importorskip("PIL")
+        from PIL import Image
+        from plugins.openclaw_chat.image_processor import ImageData, create_vision_message
+        from plugins.openclaw_chat.image_preprocessor import parse_data_url
+
+        exif = Image.Exif()
+        exif[0x010F] = "SecretCamera"
+        data = _render((3200, 2400), quality=98, exif=exif)
+        if source == "base64":
+            image = ImageData(base64=base64.b64encode(data).decode())
+        else:
+            image_file = tmp_path / "photo.jpg"
+            image_file.write_bytes(data)
+            image = ImageData(file_path=str(image_file))
+
+        with patch("config.config.vision_preprocess", True), \
+                patch("config.config.vision_provider", "openai"), patch("config.config.vision_max_edge", 0):
+            message = await create_vision_message("描述图片", image)
+
+        mime_type, payload = parse_data_url(message["content"][1]["image_url"]["url"])
+        prepared_bytes = base64.b64decode(payload)
+        assert mime_type == "image/jpeg"
+        assert len(prepared_bytes) < len(data)
+        with Image.open(io.BytesIO(prepared_bytes)) as prepared:
+            assert max(prepared.size) == 2048
+            assert not prepared.getexif()
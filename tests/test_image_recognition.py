@@ -103,6 +103,20 @@ class TestImageProcessor:
         assert check_vision_support("gpt-3.5-turbo") is False
         assert check_vision_support("glm-4") is False
 
+    @pytest.mark.asyncio
+    async def test_create_vision_message_from_file(self, tmp_path):
+        """测试本地文件构建 Vision 消息时按文件头识别格式"""
+        from plugins.openclaw_chat.image_processor import ImageData, create_vision_message
+        
+        image_file = tmp_path / "image.bin"
+        image_file.write_bytes(b"\x89PNG\r\n\x1a\nrest")
+        
+        message = await create_vision_message("描述图片", ImageData(file_path=str(image_file)))
+        
+        assert message["role"] == "user"
+        assert message["content"][0] == {"type": "text", "text": "描述图片"}
+        assert message["content"][1]["image_url"]["url"].startswith("data:image/png;base64,")
+
 
 # ========== 测试 VisionAI Client ==========
 
@@ -112,11 +126,14 @@ class TestVisionAIClient:
     @pytest.mark.asyncio
     async def test_recognize_image_with_url(self):
         """测试识别 URL 图片"""
+        from plugins.openclaw_chat import vision_client
         from plugins.openclaw_chat.vision_client import VisionAIClient
         from plugins.openclaw_chat.image_processor import ImageData
+        from config import config
         
-        # 模拟 API 响应
-        with patch('httpx.AsyncClient') as mock_client:
+        # 模拟 API 响应（不预处理，URL 直接传给模型，不下载图片）
+        with patch.object(vision_client, 'get_http_client') as mock_client, \
+                patch.object(config, 'vision_preprocess', False):
             # 模拟响应
             mock_response = Mock()
             mock_response.status_code = 200
@@ -128,9 +145,6 @@ class TestVisionAIClient:
                 }]
             })
             
-            # 模拟异步上下文管理器
-            mock_client.return_value.__aenter__ = AsyncMock(return_value=mock_client.return_value)
-            mock_client.return_value.__aexit__ = AsyncMock(return_value=None)
             mock_client.return_value.post = AsyncMock(return_value=mock_response)
             
             # 创建客户端
@@ -147,7 +161,9 @@ class TestVisionAIClient:
             )
             
             # 验证
-            assert "风景照片" in result or result  # 只要有返回就通过
+            assert result == "这是一张美丽的风景照片"
+            sent = mock_client.return_value.post.call_args.kwargs["json"]
+            assert sent["messages"][0]["content"][1]["image_url"]["url"] == "https://example.com/image.jpg"
     
     @pytest.mark.asyncio
     async def test_recognize_image_unsupported_model(self):
@@ -172,6 +188,95 @@ class TestVisionAIClient:
         assert "不支持图片识别" in result
 
 
+
+# ========== 测试多图识别 ==========
+
+class TestMultiImage:
+    """测试多图提取与批量识别"""
+    
+    @pytest.mark.asyncio
+    async def test_extract_all_images_in_parallel(self):
+        """测试提取全部图片，并行通过 get_image 解析本地文件"""
+        from plugins.openclaw_chat.image_processor import extract_images_from_message
+        
+        active = 0
+        peak = 0
+        
+        async def call_api(api, file):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return {"url": f"https://example.com/{file}"}
+        
+        bot = Mock()
+        bot.call_api = call_api
+        event = Mock()
+        event.get_message = Mock(return_value=[
+            Mock(type="text", data={"text": "看看这些"}),
+            Mock(type="image", data={"file": "a.image"}),
+            Mock(type="image", data={"url": "https://example.com/b.jpg"}),
+            Mock(type="image", data={"file": "c.image"}),
+        ])
+        
+        images = await extract_images_from_message(bot, event)
+        
+        assert [image.url for image in images] == [
+            "https://example.com/a.image",
+            "https://example.com/b.jpg",
+            "https://example.com/c.image",
+        ]
+        assert peak == 2
+    
+    @pytest.mark.asyncio
+    async def test_extract_respects_max_images(self):
+        """测试每条消息的图片数上限"""
+        from plugins.openclaw_chat.image_processor import extract_images_from_message
+        
+        event = Mock()
+        event.get_message = Mock(return_value=[
+            Mock(type="image", data={"url": f"https://example.com/{i}.jpg"}) for i in range(6)
+        ])
+        
+        images = await extract_images_from_message(Mock(), event, max_images=2)
+        
+        assert len(images) == 2
+    
+    @pytest.mark.asyncio
+    async def test_batched_request_carries_all_images(self):
+        """测试多张图片在同一个请求中发送"""
+        from plugins.openclaw_chat.vision_client import VisionAIClient
+        from plugins.openclaw_chat.image_processor import ImageData
+        
+        client = VisionAIClient(api_key="test_key", provider="siliconflow")
+        call_api = AsyncMock(return_value="两张截图")
+        images = [
+            ImageData(base64=base64.b64encode(b"\x89PNG\r\n\x1a\none").decode()),
+            ImageData(base64=base64.b64encode(b"\x89PNG\r\n\x1a\ntwo").decode()),
+        ]
+        
+        with patch.object(client, "_call_openai_compatible", call_api):
+            reply = await client.recognize_images(images, prompt="请描述", model="Qwen/Qwen2-VL-7B-Instruct")
+        
+        assert reply == "两张截图"
+        assert call_api.call_count == 1
+        assert len(call_api.call_args.args[1]) == 2
+    
+    @pytest.mark.asyncio
+    async def test_single_image_provider_falls_back(self):
+        """测试不支持多图的供应商逐张识别后合并"""
+        from plugins.openclaw_chat.vision_client import VisionAIClient
+        from plugins.openclaw_chat.image_processor import ImageData
+        
+        client = VisionAIClient(api_key="test_key", provider="zhipu")
+        images = [ImageData(url="https://example.com/1.jpg"), ImageData(url="https://example.com/2.jpg")]
+        
+        with patch.object(client, "recognize_image", AsyncMock(side_effect=["猫", "狗"])):
+            reply = await client.recognize_images(images, prompt="请描述", model="glm-4v")
+        
+        assert reply == "图片1：猫\n\n图片2：狗"
+
 # ========== 集成测试 ==========
 
 class TestIntegration:
@@ -198,8 +303,12 @@ class TestIntegration:
         assert image_data is not None
         assert image_data.url == "https://example.com/test.jpg"
         
-        # 2. 模拟 Vision AI 识别
-        with patch('httpx.AsyncClient') as mock_client:
+        # 2. 模拟 Vision AI 识别（不预处理，URL 直接传给模型，不下载图片）
+        from plugins.openclaw_chat import vision_client
+        from config import config
+        
+        with patch.object(vision_client, 'get_http_client') as mock_client, \
+                patch.object(config, 'vision_preprocess', False):
             mock_response = Mock()
             mock_response.status_code = 200
             mock_response.json = Mock(return_value={
@@ -210,8 +319,6 @@ class TestIntegration:
                 }]
             })
             
-            mock_client.return_value.__aenter__ = AsyncMock(return_value=mock_client.return_value)
-            mock_client.return_value.__aexit__ = AsyncMock(return_value=None)
             mock_client.return_value.post = AsyncMock(return_value=mock_response)
             
             client = VisionAIClient(api_key="test_key", provider="openai")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片临时文件存储测试用例
+"""
+
+import asyncio
+import os
+import time
+import httpx
+import pytest
+
+
+class TestImageFileStore:
+    """测试内容寻址的图片存储"""
+
+    def test_content_addressed(self, tmp_path):
+        """测试相同内容只保存一份，不同内容不会互相覆盖"""
+        from plugins.openclaw_chat.image_store import ImageFileStore
+
+        store = ImageFileStore(directory=str(tmp_path))
+
+        path_a = store.save(b"\x89PNG\r\n\x1a\nimage-a")
+        path_a_again = store.save(b"\x89PNG\r\n\x1a\nimage-a")
+        path_b = store.save(b"\xff\xd8\xffimage-b")
+
+        assert path_a == path_a_again
+        assert path_a != path_b
+        assert path_a.endswith(".png")
+        assert path_b.endswith(".jpg")
+        assert store.get_stats()["files"] == 2
+
+    def test_cleanup_expired(self, tmp_path):
+        """测试清理过期文件"""
+        from plugins.openclaw_chat.image_store import ImageFileStore
+
+        store = ImageFileStore(directory=str(tmp_path), ttl=60)
+        old_path = store.save(b"old")
+        new_path = store.save(b"new")
+        stale = time.time() - 120
+        os.utime(old_path, (stale, stale))
+
+        assert store.cleanup() == 1
+        assert not os.path.exists(old_path)
+        assert os.path.exists(new_path)
+
+    def test_cleanup_lru_over_budget(self, tmp_path):
+        """测试超出大小上限时删除最久未使用的文件"""
+        from plugins.openclaw_chat.image_store import ImageFileStore
+
+        store = ImageFileStore(directory=str(tmp_path), max_bytes=25)
+        paths = []
+        for index, content in enumerate([b"a" * 10, b"b" * 10, b"c" * 10]):
+            path = store.save(content)
+            os.utime(path, (time.time() - 30 + index, time.time() - 30 + index))
+            paths.append(path)
+
+        store.cleanup()
+
+        assert not os.path.exists(paths[0])
+        assert os.path.exists(paths[1]) and os.path.exists(paths[2])
+
+
+class TestDownloadImage:
+    """测试异步下载图片"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_downloads_do_not_overwrite(self, tmp_path):
+        """测试同一秒内并发下载不同图片不会互相覆盖"""
+        from plugins.openclaw_chat import http_client
+        from plugins.openclaw_chat.image_processor import download_image
+
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=request.url.path.encode())
+        ))
+        http_client._client_loop = asyncio.get_running_loop()
+
+        paths = await asyncio.gather(
+            download_image("https://example.com/one", save_dir=str(tmp_path)),
+            download_image("https://example.com/two", save_dir=str(tmp_path))
+        )
+
+        assert paths[0] != paths[1]
+        with open(paths[0], "rb") as f:
+            assert f.read() == b"/one"
+
+        await http_client.close_http_client()
+
+    @pytest.mark.asyncio
+    async def test_get_base64_from_url_is_async(self):
+        """测试 URL 转 Base64 不再使用同步请求"""
+        from plugins.openclaw_chat import http_client
+        from plugins.openclaw_chat.image_processor import get_base64_from_url
+
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=b"\x89PNG\r\n\x1a\nb64", headers={"content-type": "image/jpeg"})
+        ))
+        http_client._client_loop = asyncio.get_running_loop()
+
+        data_url = await get_base64_from_url("https://example.com/b64.png")
+
+        assert data_url.startswith("data:image/png;base64,")
+
+        await http_client.close_http_client()
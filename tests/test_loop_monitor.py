@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件循环阻塞监控测试用例
+"""
+
+import asyncio
+import sys
+import time
+import pytest
+
+
+def _blocking_io(seconds):
+    """模拟事件循环中的同步阻塞调用"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestSummarizeStack:
+    """测试调用栈定位"""
+
+    def test_prefers_project_frame(self):
+        """测试阻塞位置取项目内最深的一帧"""
+        from plugins.openclaw_chat.loop_monitor import summarize_stack
+
+        location, function, stack = summarize_stack(sys._getframe(), depth=3)
+
+        assert location.startswith("tests/test_loop_monitor.py:")
+        assert function == "test_prefers_project_frame"
+        assert len(stack) <= 3
+
+
+class TestLoopMonitor:
+    """测试事件循环阻塞监控"""
+
+    @pytest.mark.asyncio
+    async def test_records_blocking_site(self):
+        """测试阻塞超过阈值时记录阻塞的函数和行号"""
+        from plugins.openclaw_chat.loop_monitor import LoopMonitor
+
+        monitor = LoopMonitor(threshold_ms=50, interval_ms=5)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            _blocking_io(0.3)
+            await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+        sites = monitor.get_worst_sites()
+        stats = monitor.get_stats()
+
+        assert stats["blocks"] >= 1
+        assert stats["lag_max_ms"] >= 250
+        assert sites[0].function == "_blocking_io"
+        assert sites[0].location.startswith("tests/test_loop_monitor.py:")
+        assert any("test_records_blocking_site" in line for line in sites[0].stack)
+        assert not monitor.running
+
+    @pytest.mark.asyncio
+    async def test_no_blocks_when_idle(self):
+        """测试没有阻塞时不记录"""
+        from plugins.openclaw_chat.loop_monitor import LoopMonitor
+
+        monitor = LoopMonitor(threshold_ms=200, interval_ms=5)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+        assert monitor.get_stats()["blocks"] == 0
+        assert "阻塞次数：0" in monitor.format_report()
+
+    @pytest.mark.asyncio
+    async def test_restart_and_reset(self):
+        """测试关闭后可以重新开启，重置清空统计"""
+        from plugins.openclaw_chat.loop_monitor import LoopMonitor
+
+        monitor = LoopMonitor(threshold_ms=30, interval_ms=5)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        _blocking_io(0.1)
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+
+        monitor.start()
+        assert monitor.running
+        await monitor.stop()
+
+        assert monitor.get_stats()["blocks"] >= 1
+        monitor.reset()
+        assert monitor.get_stats()["blocks"] == 0
+        assert monitor.get_worst_sites() == []
+
+    @pytest.mark.asyncio
+    async def test_shares_lag_sampler(self):
+        """测试监控复用延迟采样器的心跳：延迟样本同时写入延迟直方图，关闭后采样器随之停止"""
+        from plugins.openclaw_chat.loop_monitor import LoopMonitor
+        from plugins.openclaw_chat.metrics import EventLoopLagSampler, EVENT_LOOP_LAG_HISTOGRAM
+
+        sampler = EventLoopLagSampler(interval=1.0)
+        monitor = LoopMonitor(threshold_ms=200, interval_ms=5, sampler=sampler)
+        observed = EVENT_LOOP_LAG_HISTOGRAM.labels().count
+
+        monitor.start()
+        assert sampler.running
+        assert sampler.current_interval() == pytest.approx(0.005)
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+        assert not sampler.running
+        samples = len(monitor._lags)
+        assert samples >= 5
+        assert EVENT_LOOP_LAG_HISTOGRAM.labels().count - observed >= samples
+
+    @pytest.mark.asyncio
+    async def test_sampler_keeps_running_after_monitor_stops(self):
+        """测试采样器单独启动时，监控关闭后继续按自身间隔采样"""
+        from plugins.openclaw_chat.loop_monitor import LoopMonitor
+        from plugins.openclaw_chat.metrics import EventLoopLagSampler
+
+        sampler = EventLoopLagSampler(interval=0.5)
+        sampler.start()
+        monitor = LoopMonitor(threshold_ms=200, interval_ms=5, sampler=sampler)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+
+        assert sampler.running
+        assert sampler.current_interval() == 0.5
+        await sampler.stop()
+        assert not sampler.running
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行指标单元测试
+"""
+
+import asyncio
+import pytest
+
+
+class TestMetricTypes:
+    """指标类型测试"""
+
+    def test_counter_with_labels(self):
+        """测试带标签的计数器"""
+        from plugins.openclaw_chat.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        counter = registry.counter("test_requests_total", "Test requests.", ("handler",))
+        counter.inc(handler="chat")
+        counter.inc(2, handler="chat")
+        counter.inc(handler="cmd")
+
+        assert counter.get(handler="chat") == 3
+        assert counter.get(handler="cmd") == 1
+
+        text = registry.render()
+        assert "# TYPE test_requests_total counter" in text
+        assert 'test_requests_total{handler="chat"} 3' in text
+
+    def test_gauge_and_collector(self):
+        """测试仪表盘与采集回调"""
+        from plugins.openclaw_chat.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        gauge = registry.gauge("test_ratio", "Test ratio.")
+        registry.add_collector(lambda: gauge.set(0.5))
+
+        text = registry.render()
+        assert "test_ratio 0.5" in text
+
+    def test_collector_error_does_not_break_render(self):
+        """测试采集回调失败不影响渲染"""
+        from plugins.openclaw_chat.metrics import MetricsRegistry
+
+        def broken():
+            raise RuntimeError("boom")
+
+        registry = MetricsRegistry()
+        registry.counter("test_ok_total", "Test.").inc()
+        registry.add_collector(broken)
+
+        assert "test_ok_total 1" in registry.render()
+
+    def test_labeled_histogram(self):
+        """测试带标签的直方图"""
+        from plugins.openclaw_chat.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        histogram = registry.histogram("test_latency_seconds", "Test.", ("provider",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, provider="a")
+        histogram.observe(0.5, provider="a")
+
+        text = registry.render()
+        assert 'test_latency_seconds_bucket{provider="a",le="0.1"} 1' in text
+        assert 'test_latency_seconds_bucket{provider="a",le="+Inf"} 2' in text
+        assert 'test_latency_seconds_count{provider="a"} 2' in text
+
+    def test_metric_base_is_abstract(self):
+        """测试指标基类不能直接实例化"""
+        from plugins.openclaw_chat.metrics import _Metric
+
+        with pytest.raises(TypeError):
+            _Metric("test_base", "Test.")
+
+
+class TestLlmMetrics:
+    """LLM 调用指标测试"""
+
+    def test_record_llm_call_tokens_and_errors(self):
+        """测试记录 token 数和错误码"""
+        from plugins.openclaw_chat.metrics import record_llm_call, LLM_TOKENS, LLM_ERRORS, LLM_CALLS
+
+        before_in = LLM_TOKENS.get(provider="p_test", model="m", direction="in")
+        record_llm_call("p_test", "m", 0.2, usage={"prompt_tokens": 10, "completion_tokens": 5})
+        record_llm_call("p_test", "m", 0.1, status="error", error_code=429)
+
+        assert LLM_TOKENS.get(provider="p_test", model="m", direction="in") == before_in + 10
+        assert LLM_TOKENS.get(provider="p_test", model="m", direction="out") >= 5
+        assert LLM_ERRORS.get(provider="p_test", code="429") >= 1
+        assert LLM_CALLS.get(provider="p_test", model="m", status="error") >= 1
+
+    def test_render_includes_stage_histograms(self):
+        """测试渲染结果包含阶段耗时直方图"""
+        from plugins.openclaw_chat.metrics import render_metrics
+        from plugins.openclaw_chat.tracing import observe_stage
+
+        observe_stage("metrics_test_stage", 0.01)
+
+        text = render_metrics()
+        assert "openclaw_llm_calls_total" in text
+        assert 'openclaw_stage_duration_seconds_count{stage="metrics_test_stage"}' in text
+
+    def test_triggers_not_labelled_by_group(self):
+        """测试智能触发按原因计数，不暴露群号"""
+        from plugins.openclaw_chat.metrics import TRIGGERS_FIRED, render_metrics
+
+        TRIGGERS_FIRED.inc(reason="keyword")
+
+        text = render_metrics()
+        assert TRIGGERS_FIRED.labelnames == ("reason",)
+        assert 'openclaw_triggers_fired_total{reason="keyword"}' in text
+        assert "group_id" not in text
+
+    def test_kb_cache_counters(self):
+        """测试知识库缓存命中、未命中导出为计数器"""
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever
+        from plugins.openclaw_chat.metrics import KB_CACHE_HITS, KB_CACHE_MISSES, render_metrics
+
+        hits, misses = KB_CACHE_HITS.get(), KB_CACHE_MISSES.get()
+        retriever = KnowledgeBaseRetriever()
+        assert retriever._get_from_cache(query="天顶剑", kb_id="game", top_k=3) is None
+        retriever._add_to_cache(query="天顶剑", kb_id="game", results=[], top_k=3)
+        retriever._get_from_cache(query="天顶剑", kb_id="game", top_k=3)
+
+        assert KB_CACHE_MISSES.get() == misses + 1
+        assert KB_CACHE_HITS.get() == hits + 1
+        text = render_metrics()
+        assert "# TYPE openclaw_kb_cache_hits_total counter" in text
+        assert "# TYPE openclaw_kb_cache_misses_total counter" in text
+
+
+class TestEventLoopLag:
+    """事件循环延迟采样测试"""
+
+    @pytest.mark.asyncio
+    async def test_sampler_records_lag(self):
+        """测试采样器记录延迟"""
+        from plugins.openclaw_chat.metrics import EventLoopLagSampler, EVENT_LOOP_LAG
+
+        sampler = EventLoopLagSampler(interval=0.01)
+        sampler.start()
+        await asyncio.sleep(0.05)
+        await sampler.stop()
+
+        assert EVENT_LOOP_LAG.get() is not None
+        assert EVENT_LOOP_LAG.get() >= 0
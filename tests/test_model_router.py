@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型路由测试用例
+"""
+
+from unittest.mock import patch
+import pytest
+
+
+def _router_with_candidates(candidates):
+    """创建使用固定候选的路由器"""
+    from plugins.openclaw_chat.model_router import ModelRouter
+
+    router = ModelRouter(long_message_chars=50)
+    patcher = patch.object(router, "get_candidates", return_value=candidates)
+    patcher.start()
+    return router, patcher
+
+
+class TestCandidates:
+    """测试候选解析"""
+
+    def test_infer_tier(self):
+        """测试根据模型名推断档位"""
+        from plugins.openclaw_chat.model_router import infer_tier
+
+        assert infer_tier("glm-4-flash") == "fast"
+        assert infer_tier("gpt-4o-mini") == "fast"
+        assert infer_tier("Qwen/Qwen2.5-7B-Instruct") == "fast"
+        assert infer_tier("Qwen/Qwen2.5-72B-Instruct") == "large"
+        assert infer_tier("deepseek-chat") == "large"
+
+    def test_parse_candidates(self):
+        """测试解析 provider:model[:tier]"""
+        from plugins.openclaw_chat.model_router import parse_candidates
+
+        candidates = parse_candidates("zhipu:glm-4-flash, deepseek:deepseek-chat:fast, ollama:qwen2:7b, broken")
+
+        assert [(c.provider, c.model, c.tier) for c in candidates] == [
+            ("zhipu", "glm-4-flash", "fast"),
+            ("deepseek", "deepseek-chat", "fast"),
+            ("ollama", "qwen2:7b", "fast"),
+        ]
+
+    def test_configured_candidates_validated_and_cached(self):
+        """测试配置的候选只解析一次，未知供应商/模型被跳过"""
+        from plugins.openclaw_chat import model_router
+        from config import config
+
+        router = model_router.ModelRouter()
+        spec = "ollama:qwen2:7b, ollama:no-such-model, nosuch:model-x"
+
+        with patch.object(config, "model_router_candidates", spec), \
+                patch.object(model_router, "parse_candidates", wraps=model_router.parse_candidates) as parse:
+            first = router.get_candidates()
+            second = router.get_candidates()
+
+        assert [(c.provider, c.model) for c in first] == [("ollama", "qwen2:7b")]
+        assert second == first
+        assert parse.call_count == 1
+
+
+class TestRouting:
+    """测试路由决策"""
+
+    def test_intelligent_trigger_prefers_fast(self):
+        """测试智能触发走快速模型"""
+        from plugins.openclaw_chat.model_router import RouteCandidate
+
+        router, patcher = _router_with_candidates([
+            RouteCandidate("deepseek", "deepseek-chat", "large"),
+            RouteCandidate("zhipu", "glm-4-flash", "fast"),
+        ])
+        try:
+            decision = router.route("这个怎么弄？", "qq_group_intelligent", "normal")
+        finally:
+            patcher.stop()
+
+        assert (decision.provider, decision.model) == ("zhipu", "glm-4-flash")
+        assert decision.reason == "intelligent_trigger"
+
+    def test_mention_with_kb_prefers_large(self):
+        """测试带知识库上下文的 @ 消息走大模型"""
+        from plugins.openclaw_chat.model_router import RouteCandidate
+
+        router, patcher = _router_with_candidates([
+            RouteCandidate("deepseek", "deepseek-chat", "large"),
+            RouteCandidate("zhipu", "glm-4-flash", "fast"),
+        ])
+        try:
+            decision = router.route("这个装备怎么获得", "qq_group", "normal", has_kb=True)
+        finally:
+            patcher.stop()
+
+        assert decision.provider == "deepseek"
+        assert decision.reason == "kb_context"
+
+    def test_error_rate_steers_away(self):
+        """测试错误率高的模型被避开"""
+        from plugins.openclaw_chat.model_router import RouteCandidate
+
+        router, patcher = _router_with_candidates([
+            RouteCandidate("zhipu", "glm-4-flash", "fast"),
+            RouteCandidate("siliconflow", "Qwen/Qwen2.5-7B-Instruct", "fast"),
+        ])
+        for _ in range(5):
+            router.observe("zhipu", "glm-4-flash", 0.5, success=False)
+        router.observe("siliconflow", "Qwen/Qwen2.5-7B-Instruct", 1.0, success=True)
+
+        try:
+            decision = router.route("在吗", "qq_group", "concise")
+        finally:
+            patcher.stop()
+
+        assert decision.provider == "siliconflow"
+
+    def test_lower_latency_wins_within_tier(self):
+        """测试同档位下 EWMA 延迟低的模型胜出，并记录到状态中"""
+        from plugins.openclaw_chat.model_router import RouteCandidate
+
+        router, patcher = _router_with_candidates([
+            RouteCandidate("deepseek", "deepseek-chat", "large"),
+            RouteCandidate("moonshot", "moonshot-v1-8k", "large"),
+        ])
+        router.observe("deepseek", "deepseek-chat", 6.0, success=True)
+        router.observe("moonshot", "moonshot-v1-8k", 2.0, success=True)
+
+        try:
+            decision = router.route("x" * 80, "qq_private", "normal")
+            status = router.get_status()
+        finally:
+            patcher.stop()
+
+        assert decision.provider == "moonshot"
+        assert decision.reason == "long_message"
+        assert status["recent"][-1]["provider"] == "moonshot"
+
+    def test_no_candidates_returns_none(self):
+        """测试没有候选时返回 None"""
+        router, patcher = _router_with_candidates([])
+        try:
+            assert router.route("你好", "qq_private", "normal") is None
+        finally:
+            patcher.stop()
+
+
+class TestProcessMessageRouting:
+    """测试 process_message_with_ai 接入路由"""
+
+    @pytest.mark.asyncio
+    async def test_routed_model_is_used(self):
+        """测试路由结果替换默认模型"""
+        from unittest.mock import AsyncMock
+        from plugins.openclaw_chat import ai_processor
+        from plugins.openclaw_chat.model_router import RouteDecision
+        from config import config
+
+        decision = RouteDecision("zhipu", "glm-4-flash", "fast", "fast", 1.0, "intelligent_trigger")
+        call_llm = AsyncMock(return_value="路由后的回复")
+
+        async def no_history(session_id, cfg):
+            return []
+
+        async def no_kb(message, group_id, cfg, **kwargs):
+            return None
+
+        with patch.object(ai_processor, "_load_conversation_history", no_history), \
+                patch.object(ai_processor, "_retrieve_kb_context", no_kb), \
+                patch.object(ai_processor, "_call_openai_compatible", call_llm), \
+                patch.object(ai_processor.get_model_router(), "route", return_value=decision), \
+                patch.object(config, "memory_enabled", False), \
+                patch.object(config, "model_router_enabled", True):
+            reply = await ai_processor.process_message_with_ai(
+                message="有人知道这个吗",
+                user_id="10001",
+                context="qq_private",
+                model="deepseek",
+                api_key="test"
+            )
+
+        assert reply == "路由后的回复"
+        args = call_llm.call_args.args
+        assert args[4] is ai_processor.MODEL_CONFIGS["zhipu"]
+        assert args[5] == "glm-4-flash"
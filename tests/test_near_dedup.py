@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复文本块检测测试用例
+"""
+
+ORIGINAL = "泰拉棱镜是一种召唤武器，可以在击败光之女皇后获得，掉落概率约为 5%。"
+NEAR_DUPLICATE = "泰拉棱镜是一种召唤武器，可以在击败光之女皇后获得，掉落概率约为 10%。"
+DIFFERENT = "生命水晶可以在地下洞穴中找到，使用后提升最大生命值。"
+
+
+class TestMinHash:
+    """测试 MinHash 签名"""
+
+    def test_jaccard_estimate(self):
+        """测试近似重复文本的估计相似度高，无关文本低"""
+        from plugins.openclaw_chat.near_dedup import minhash, estimate_jaccard
+
+        assert estimate_jaccard(minhash(ORIGINAL), minhash(NEAR_DUPLICATE)) >= 0.8
+        assert estimate_jaccard(minhash(ORIGINAL), minhash(DIFFERENT)) < 0.2
+
+    def test_ignores_whitespace_and_punctuation(self):
+        """测试空白和标点不影响签名"""
+        from plugins.openclaw_chat.near_dedup import minhash
+
+        assert (minhash("泰拉棱镜，召唤武器。") == minhash("泰拉棱镜 召唤武器")).all()
+
+    def test_signature_round_trip(self):
+        """测试签名编码后可以还原"""
+        from plugins.openclaw_chat.near_dedup import minhash, encode_signature, decode_signature
+
+        signature = minhash(ORIGINAL)
+
+        assert (decode_signature(encode_signature(signature)) == signature).all()
+        assert decode_signature("broken") is None
+
+
+class TestIngestion:
+    """测试入库指纹与去重"""
+
+    def _chunks(self):
+        """构造文本块"""
+        from plugins.openclaw_chat.vector_database_manager import DocumentChunk
+
+        return [
+            DocumentChunk(chunk_id="a", kb_id="game", text=ORIGINAL, source="wiki", metadata={"page_name": "泰拉棱镜"}),
+            DocumentChunk(chunk_id="b", kb_id="game", text=NEAR_DUPLICATE, source="wiki"),
+            DocumentChunk(chunk_id="c", kb_id="game", text=DIFFERENT, source="wiki"),
+        ]
+
+    def test_fingerprint_only(self):
+        """测试阈值为 0 时只写入指纹、不丢弃"""
+        from plugins.openclaw_chat.near_dedup import fingerprint_chunks
+
+        kept = fingerprint_chunks(self._chunks())
+
+        assert [chunk.chunk_id for chunk in kept] == ["a", "b", "c"]
+        assert all(chunk.metadata["minhash"] for chunk in kept)
+        assert kept[0].metadata["page_name"] == "泰拉棱镜"
+
+    def test_drop_near_duplicates(self):
+        """测试丢弃近似重复的文本块"""
+        from plugins.openclaw_chat.near_dedup import fingerprint_chunks
+
+        kept = fingerprint_chunks(self._chunks(), threshold=0.8)
+
+        assert [chunk.chunk_id for chunk in kept] == ["a", "c"]
+
+
+class TestRetrieval:
+    """测试检索时过滤近似重复结果"""
+
+    def test_suppress_uses_stored_fingerprint(self):
+        """测试优先使用入库时保存的指纹"""
+        from plugins.openclaw_chat.near_dedup import suppress_near_duplicates, minhash, encode_signature
+
+        results = [
+            {"chunk_id": "a", "text": "甲", "metadata": {"metadata": {"minhash": encode_signature(minhash(ORIGINAL))}}},
+            {"chunk_id": "b", "text": "乙", "metadata": {"metadata": {"minhash": encode_signature(minhash(NEAR_DUPLICATE))}}},
+            {"chunk_id": "c", "text": DIFFERENT, "metadata": {}},
+        ]
+
+        assert [result["chunk_id"] for result in suppress_near_duplicates(results, 0.8)] == ["a", "c"]
+
+    def test_retriever_frees_top_k_slot(self):
+        """测试近似重复结果不占用 top_k 名额"""
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever, SearchContext
+
+        results = [
+            {"chunk_id": "a", "text": ORIGINAL, "metadata": {}, "score": 0.1},
+            {"chunk_id": "b", "text": NEAR_DUPLICATE, "metadata": {}, "score": 0.2},
+            {"chunk_id": "c", "text": DIFFERENT, "metadata": {}, "score": 0.3},
+        ]
+        context = SearchContext(query="泰拉棱镜", kb_id="game", top_k=2)
+
+        processed = KnowledgeBaseRetriever(near_duplicate_threshold=0.8).post_process_results(results, context)
+        unfiltered = KnowledgeBaseRetriever().post_process_results(results, context)
+
+        assert [result["chunk_id"] for result in processed] == ["a", "c"]
+        assert [result["chunk_id"] for result in unfiltered] == ["a", "b"]
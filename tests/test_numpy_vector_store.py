@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NumPy 向量存储测试用例
+"""
+
+from unittest.mock import patch
+import numpy as np
+import pytest
+
+
+def _clustered_vectors(n, dimension=32, clusters=20, seed=0):
+    """生成带聚类结构的向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    labels = rng.integers(0, clusters, size=n)
+    return (centers[labels] + 0.3 * rng.normal(size=(n, dimension))).astype(np.float32)
+
+
+class TestNumpyCollection:
+    """测试 NumPy 向量集合"""
+
+    def test_query_nearest(self, tmp_path):
+        """测试按相似度返回最近的文本块（返回格式与 Chroma 一致）"""
+        from plugins.openclaw_chat.numpy_vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(str(tmp_path))
+        collection = store.get_or_create_collection("kb_game")
+        collection.add(
+            ids=["a", "b", "c"],
+            documents=["天顶剑", "泰拉棱镜", "生命水晶"],
+            metadatas=[{"source": "wiki"}, {"source": "wiki"}, {"source": "faq"}],
+            embeddings=[[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]]
+        )
+
+        results = collection.query(query_embeddings=[[0.9, 0.1]], n_results=2)
+
+        assert results["ids"] == [["a", "c"]]
+        assert results["documents"][0][0] == "天顶剑"
+        assert results["distances"][0][0] < results["distances"][0][1]
+
+    def test_where_filter(self, tmp_path):
+        """测试元数据过滤"""
+        from plugins.openclaw_chat.numpy_vector_store import NumpyVectorStore
+
+        collection = NumpyVectorStore(str(tmp_path)).get_or_create_collection("kb_game")
+        collection.add(
+            ids=["a", "b"],
+            documents=["天顶剑", "生命水晶"],
+            metadatas=[{"source": "wiki"}, {"source": "faq"}],
+            embeddings=[[1.0, 0.0], [0.8, 0.2]]
+        )
+
+        results = collection.query(query_embeddings=[[1.0, 0.0]], n_results=2, where={"source": {"$in": ["faq"]}})
+
+        assert results["ids"] == [["b"]]
+
+    def test_update_delete_and_reload(self, tmp_path):
+        """测试更新、删除后重新打开仍然一致"""
+        from plugins.openclaw_chat.numpy_vector_store import NumpyVectorStore
+
+        collection = NumpyVectorStore(str(tmp_path)).get_or_create_collection("kb_game")
+        collection.add(ids=["a", "b", "c"], documents=["1", "2", "3"], embeddings=[[1, 0], [0, 1], [1, 1]])
+        collection.update(ids=["a", "missing"], documents=["1 新", "x"], embeddings=[[0, 1], [1, 0]])
+        collection.delete(ids=["b"])
+
+        reloaded = NumpyVectorStore(str(tmp_path)).get_collection("kb_game")
+        results = reloaded.query(query_embeddings=[[0, 1]], n_results=1)
+
+        assert reloaded.count() == 2
+        assert results["ids"] == [["a"]]
+        assert results["documents"] == [["1 新"]]
+
+    def test_embedding_function_used(self, tmp_path):
+        """测试未提供向量时使用嵌入函数"""
+        from plugins.openclaw_chat.numpy_vector_store import NumpyVectorStore
+        from plugins.openclaw_chat.embeddings import HashingEmbeddingProvider
+
+        provider = HashingEmbeddingProvider(dimension=256)
+        collection = NumpyVectorStore(str(tmp_path), embedding_function=provider.embed).get_or_create_collection("kb")
+        collection.add(ids=["a", "b"], documents=["泰拉棱镜在击败光之女皇后获得", "今天晚饭吃什么"])
+
+        assert collection.query(query_texts=["泰拉棱镜怎么获得"], n_results=1)["ids"] == [["a"]]
+
+    def test_missing_collection(self, tmp_path):
+        """测试获取不存在的集合抛出异常"""
+        from plugins.openclaw_chat.numpy_vector_store import NumpyVectorStore
+
+        with pytest.raises(ValueError):
+            NumpyVectorStore(str(tmp_path)).get_collection("kb_missing")
+
+
+class TestIVF:
+    """测试 IVF 粗量化索引"""
+
+    def test_ivf_recall(self, tmp_path):
+        """测试 IVF 检索召回率接近暴力检索"""
+        from plugins.openclaw_chat.numpy_vector_store import NumpyCollection
+
+        vectors = _clustered_vectors(3000)
+        ids = [str(i) for i in range(len(vectors))]
+
+        exact = NumpyCollection(str(tmp_path / "exact"), "exact", ivf_threshold=0)
+        ivf = NumpyCollection(str(tmp_path / "ivf"), "ivf", ivf_threshold=1000, ivf_nprobe=8)
+        for collection in (exact, ivf):
+            collection.add(ids=ids, documents=ids, embeddings=vectors.tolist())
+
+        assert ivf._ivf is not None
+        queries = _clustered_vectors(50, seed=1)
+        recall = np.mean([
+            len({row for row, _ in exact.search_vector(q, 10)} & {row for row, _ in ivf.search_vector(q, 10)}) / 10
+            for q in queries
+        ])
+
+        assert recall >= 0.9
+
+    def test_ivf_persisted(self, tmp_path):
+        """测试重新打开时直接加载 IVF 索引"""
+        from plugins.openclaw_chat.numpy_vector_store import NumpyCollection
+
+        vectors = _clustered_vectors(500)
+        ids = [str(i) for i in range(len(vectors))]
+        NumpyCollection(str(tmp_path), "kb", ivf_threshold=100).add(ids=ids, documents=ids, embeddings=vectors.tolist())
+
+        with patch("plugins.openclaw_chat.numpy_vector_store.train_ivf") as train:
+            reloaded = NumpyCollection(str(tmp_path), "kb", ivf_threshold=100)
+
+        train.assert_not_called()
+        assert reloaded._ivf is not None
+
+
+class TestVectorDatabaseBackend:
+    """测试按知识库选择向量存储后端"""
+
+    def test_parse_backends(self):
+        """测试解析按知识库指定的后端"""
+        from plugins.openclaw_chat.vector_database_manager import parse_vector_backends
+
+        assert parse_vector_backends("game:numpy, tech:chroma, bad:faiss, ") == {"game": "numpy", "tech": "chroma"}
+
+    def test_numpy_backend_without_chromadb(self, tmp_path):
+        """测试全部使用 NumPy 后端时不需要 chromadb"""
+        from plugins.openclaw_chat import vector_database_manager
+        from plugins.openclaw_chat.vector_database_manager import DocumentChunk
+        from plugins.openclaw_chat.embeddings import HashingEmbeddingProvider
+
+        chunks = [
+            DocumentChunk(chunk_id="c1", kb_id="game", text="泰拉棱镜在击败光之女皇后获得", source="wiki"),
+            DocumentChunk(chunk_id="c2", kb_id="game", text="生命水晶在地下洞穴中找到", source="wiki"),
+        ]
+
+        with patch.object(vector_database_manager, "CHROMADB_AVAILABLE", False), \
+                patch("config.config.embedding_cache_dir", ""):
+            manager = vector_database_manager.VectorDatabaseManager(
+                kb_dir=str(tmp_path),
+                embedding_provider=HashingEmbeddingProvider(dimension=256),
+                backend="numpy",
+                kb_backends={}
+            )
+            assert manager.add_documents("game", chunks)
+            results = manager.search("game", "泰拉棱镜怎么获得", top_k=1)
+
+        assert manager.client is None
+        assert results[0]["chunk_id"] == "c1"
+        assert manager.get_collection_info("game")["backend"] == "numpy"
+
+    def test_chroma_required_for_chroma_kb(self, tmp_path):
+        """测试仍有知识库使用 Chroma 时缺少 chromadb 报错"""
+        from plugins.openclaw_chat import vector_database_manager
+
+        with patch.object(vector_database_manager, "CHROMADB_AVAILABLE", False):
+            with pytest.raises(ImportError):
+                vector_database_manager.VectorDatabaseManager(
+                    kb_dir=str(tmp_path), backend="numpy", kb_backends={"tech": "chroma"}
+                )
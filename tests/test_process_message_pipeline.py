@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+消息处理流水线测试用例
+测试记忆加载、知识库检索的并发执行与超时降级
+"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+import pytest
+
+
+class TestRunStage:
+    """测试带超时的处理阶段"""
+
+    @pytest.mark.asyncio
+    async def test_stage_ok(self):
+        """测试阶段正常完成"""
+        from plugins.openclaw_chat.ai_processor import _run_stage
+        from plugins.openclaw_chat.tracing import RequestTrace
+
+        async def stage():
+            return "结果"
+
+        trace = RequestTrace("test")
+        result = await _run_stage(trace, "demo", stage(), timeout=1.0)
+
+        assert result == "结果"
+        assert trace.get_stage("demo")["status"] == "ok"
+
+    @pytest.mark.asyncio
+    async def test_stage_timeout_degrades(self):
+        """测试阶段超时后降级为默认值"""
+        from plugins.openclaw_chat.ai_processor import _run_stage
+        from plugins.openclaw_chat.tracing import RequestTrace
+
+        async def slow_stage():
+            await asyncio.sleep(1.0)
+            return "太慢了"
+
+        trace = RequestTrace("test")
+        result = await _run_stage(trace, "kb_retrieve", slow_stage(), timeout=0.05, default=None)
+
+        assert result is None
+        assert trace.get_stage("kb_retrieve")["status"] == "timeout"
+
+    @pytest.mark.asyncio
+    async def test_stage_error_degrades(self):
+        """测试阶段异常后降级为默认值"""
+        from plugins.openclaw_chat.ai_processor import _run_stage
+        from plugins.openclaw_chat.tracing import RequestTrace
+
+        async def broken_stage():
+            raise ValueError("坏了")
+
+        trace = RequestTrace("test")
+        result = await _run_stage(trace, "memory_load", broken_stage(), timeout=1.0, default=[])
+
+        assert result == []
+        assert trace.get_stage("memory_load")["status"] == "error"
+
+
+class TestProcessMessagePipeline:
+    """测试 process_message_with_ai 的并发前置阶段"""
+
+    @pytest.mark.asyncio
+    async def test_memory_and_kb_run_concurrently(self):
+        """测试记忆加载与知识库检索并发执行，慢速知识库降级为无上下文"""
+        from plugins.openclaw_chat import ai_processor
+        from config import config
+
+        async def slow_memory(session_id, cfg):
+            await asyncio.sleep(0.2)
+            return [{"role": "user", "content": "之前的问题"}]
+
+        async def slow_kb(message, group_id, cfg, **kwargs):
+            await asyncio.sleep(1.0)
+            return "知识库内容"
+
+        call_llm = AsyncMock(return_value="星野的回复")
+
+        with patch.object(ai_processor, "_load_conversation_history", slow_memory), \
+                patch.object(ai_processor, "_retrieve_kb_context", slow_kb), \
+                patch.object(ai_processor, "_call_openai_compatible", call_llm), \
+                patch.object(config, "memory_enabled", False), \
+                patch.object(config, "kb_retrieve_timeout", 0.3):
+            start = time.perf_counter()
+            reply = await ai_processor.process_message_with_ai(
+                message="你好",
+                user_id="10001",
+                context="qq_private",
+                model="deepseek",
+                api_key="test"
+            )
+            elapsed = time.perf_counter() - start
+
+        assert reply == "星野的回复"
+        # 并发执行：总耗时约等于较慢阶段的超时时间，而不是两者之和
+        assert elapsed < 0.5
+
+        kwargs = call_llm.call_args.kwargs
+        assert kwargs["conversation_history"] == [{"role": "user", "content": "之前的问题"}]
+        assert kwargs["kb_context"] is None
+        assert kwargs["system_prompt"]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提示词前缀缓存测试用例
+测试人设提示词在不同用户之间逐字节一致，以及缓存命中 token 的统计
+"""
+
+
+class TestStablePrefix:
+    """测试可缓存的提示词前缀"""
+
+    def test_persona_identical_across_users(self):
+        """测试不同用户/群的消息列表前缀逐字节一致"""
+        from plugins.openclaw_chat.ai_processor import (
+            _get_persona_prompt, _build_environment_prompt, _build_chat_messages
+        )
+
+        history = [{"role": "user", "content": "你好"}, {"role": "assistant", "content": "主人好~"}]
+
+        messages_a = _build_chat_messages(
+            "问题 A", _get_persona_prompt("normal"), history,
+            environment_prompt=_build_environment_prompt("10001", "qq_group", "20001")
+        )
+        messages_b = _build_chat_messages(
+            "问题 B", _get_persona_prompt("normal"), history,
+            environment_prompt=_build_environment_prompt("10002", "qq_private", None)
+        )
+
+        assert messages_a[:3] == messages_b[:3]
+        assert messages_a[0]["content"].encode("utf-8") == messages_b[0]["content"].encode("utf-8")
+
+        # 环境说明位于用户消息之前
+        assert messages_a[-2]["role"] == "system"
+        assert "10001" in messages_a[-2]["content"]
+        assert "20001" in messages_a[-2]["content"]
+        assert messages_a[-1] == {"role": "user", "content": "问题 A"}
+
+    def test_persona_has_no_user_fields(self):
+        """测试人设提示词不包含用户信息，并按回复模式缓存"""
+        from plugins.openclaw_chat.ai_processor import _get_persona_prompt
+
+        normal = _get_persona_prompt("normal")
+        concise = _get_persona_prompt("concise")
+
+        assert "用户 ID" not in normal
+        assert "用户 ID" not in concise
+        assert normal != concise
+        assert _get_persona_prompt("normal") is normal
+
+    def test_full_prompt_keeps_persona_prefix(self):
+        """测试完整系统提示词（Vision 使用）以人设为前缀"""
+        from plugins.openclaw_chat.ai_processor import _build_system_prompt, _get_persona_prompt
+
+        prompt = _build_system_prompt("10001", "qq_group", "20001", "concise")
+
+        assert prompt.startswith(_get_persona_prompt("concise"))
+        assert "- 群号: 20001" in prompt
+
+
+class TestCachedTokens:
+    """测试缓存命中 token 统计"""
+
+    def test_extract_cached_tokens(self):
+        """测试兼容各供应商的 usage 字段"""
+        from plugins.openclaw_chat.metrics import extract_cached_tokens
+
+        assert extract_cached_tokens({"prompt_tokens": 100, "prompt_cache_hit_tokens": 64}) == 64
+        assert extract_cached_tokens({"prompt_tokens_details": {"cached_tokens": 32}}) == 32
+        assert extract_cached_tokens({"cached_tokens": 16}) == 16
+        assert extract_cached_tokens({"prompt_tokens": 100}) == 0
+        assert extract_cached_tokens(None) == 0
+
+    def test_record_cached_tokens(self):
+        """测试缓存命中 token 计入指标"""
+        from plugins.openclaw_chat.metrics import record_llm_call, LLM_TOKENS
+
+        before = LLM_TOKENS.get(provider="cache_test", model="m", direction="cached")
+        record_llm_call("cache_test", "m", 0.1, usage={"prompt_tokens": 100, "prompt_cache_hit_tokens": 80})
+
+        assert LLM_TOKENS.get(provider="cache_test", model="m", direction="cached") == before + 80
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+供应商池测试用例
+测试熔断器、故障转移链和对冲请求
+"""
+
+import asyncio
+from unittest.mock import patch
+import pytest
+
+
+class TestCircuitBreaker:
+    """测试熔断器"""
+
+    def test_opens_after_threshold(self):
+        """测试连续失败达到阈值后熔断"""
+        from plugins.openclaw_chat.provider_pool import CircuitBreaker
+
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        assert breaker.allow_request()
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+    def test_half_open_single_probe(self):
+        """测试熔断超时后只放行一个试探请求"""
+        from plugins.openclaw_chat.provider_pool import CircuitBreaker
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        assert breaker.allow_request()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow_request()
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow_request()
+
+    def test_failed_probe_reopens(self):
+        """测试试探失败后重新熔断"""
+        from plugins.openclaw_chat.provider_pool import CircuitBreaker
+
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0)
+        for _ in range(3):
+            breaker.record_failure()
+
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+
+class TestProviderError:
+    """测试供应商错误分类"""
+
+    def test_should_failover(self):
+        """测试哪些错误需要切换供应商"""
+        from plugins.openclaw_chat.provider_pool import ProviderError
+
+        assert ProviderError("a", "timeout", code="timeout").should_failover
+        assert ProviderError("a", "bad gateway", status_code=502).should_failover
+        assert ProviderError("a", "rate limited", status_code=429).should_failover
+        assert ProviderError("a", "余额不足", status_code=400, code="1113").should_failover
+        assert not ProviderError("a", "bad request", status_code=400).should_failover
+
+
+class TestProviderPool:
+    """测试故障转移与对冲"""
+
+    @pytest.mark.asyncio
+    async def test_failover_to_next_provider(self):
+        """测试首选供应商 5xx 后切换到下一个供应商"""
+        from plugins.openclaw_chat.provider_pool import ProviderPool, ProviderError
+
+        pool = ProviderPool(failure_threshold=1)
+        calls = []
+
+        async def request(provider, model_name):
+            calls.append(provider)
+            if provider == "a":
+                raise ProviderError("a", "server error", status_code=503)
+            return f"{provider}:{model_name}"
+
+        with patch.object(pool, "build_chain", return_value=[("a", "m1"), ("b", "m2")]):
+            reply = await pool.call("a", "m1", request)
+
+            assert reply == "b:m2"
+            assert calls == ["a", "b"]
+
+            # 熔断后直接跳过 a
+            calls.clear()
+            reply = await pool.call("a", "m1", request)
+            assert calls == ["b"]
+
+    @pytest.mark.asyncio
+    async def test_non_failover_error_raises(self):
+        """测试不可转移的错误直接抛出"""
+        from plugins.openclaw_chat.provider_pool import ProviderPool, ProviderError
+
+        pool = ProviderPool()
+
+        async def request(provider, model_name):
+            raise ProviderError(provider, "bad request", status_code=400)
+
+        with patch.object(pool, "build_chain", return_value=[("a", "m1"), ("b", "m2")]):
+            with pytest.raises(ProviderError) as exc_info:
+                await pool.call("a", "m1", request)
+
+        assert exc_info.value.provider == "a"
+
+    @pytest.mark.asyncio
+    async def test_hedged_request_after_p95(self):
+        """测试首选供应商超过 p95 未返回时发出对冲请求"""
+        from plugins.openclaw_chat.provider_pool import ProviderPool
+
+        pool = ProviderPool(hedge_enabled=True, hedge_min_samples=3)
+        for _ in range(5):
+            pool.get_stats("a").record(0.02, success=True)
+
+        async def request(provider, model_name):
+            if provider == "a":
+                await asyncio.sleep(1.0)
+                return "slow"
+            return "fast"
+
+        with patch.object(pool, "build_chain", return_value=[("a", "m1"), ("b", "m2")]):
+            loop = asyncio.get_event_loop()
+            start = loop.time()
+            reply = await pool.call("a", "m1", request)
+            elapsed = loop.time() - start
+
+        assert reply == "fast"
+        assert elapsed < 0.5
+
+    @pytest.mark.asyncio
+    async def test_build_chain_only_uses_configured_keys(self):
+        """测试故障转移链只包含已配置 API Key 的供应商"""
+        from plugins.openclaw_chat.provider_pool import ProviderPool
+        from config import config
+
+        pool = ProviderPool()
+
+        def fake_get_api_key(provider):
+            return "key" if provider == "siliconflow" else ""
+
+        with patch.object(config, "provider_fallback_chain", ""), \
+                patch.object(type(config), "get_api_key", lambda self, provider: fake_get_api_key(provider)):
+            chain = pool.build_chain("deepseek", "deepseek-chat")
+
+        assert chain[0] == ("deepseek", "deepseek-chat")
+        assert [provider for provider, _ in chain[1:]] == ["siliconflow"]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检索查询改写测试用例
+"""
+
+import asyncio
+import pytest
+
+
+HISTORY = [
+    {"role": "user", "content": "泰拉棱镜怎么获得？", "metadata": {"user_id": "1001"}},
+    {"role": "assistant", "content": "击败光之女皇后有概率掉落。", "metadata": {}},
+]
+
+
+class TestHeuristic:
+    """测试本地规则改写"""
+
+    def test_extract_entity(self):
+        """测试从问题中提取实体"""
+        from plugins.openclaw_chat.query_rewriter import extract_entity
+
+        assert extract_entity("泰拉棱镜怎么获得？") == "泰拉棱镜"
+        assert extract_entity("光之女皇在哪里召唤") == "光之女皇"
+        assert extract_entity("《泰拉瑞亚》好玩吗") == "泰拉瑞亚"
+        assert extract_entity("What does Empress of Light drop") == "Empress of Light"
+
+    def test_needs_rewrite(self):
+        """测试识别依赖上文的追问"""
+        from plugins.openclaw_chat.query_rewriter import needs_rewrite
+
+        assert needs_rewrite("那它掉落什么？")
+        assert needs_rewrite("怎么合成")
+        assert not needs_rewrite("天顶剑怎么合成")
+
+    def test_pronoun_replaced(self):
+        """测试代词替换为上一轮的实体"""
+        from plugins.openclaw_chat.query_rewriter import heuristic_rewrite
+
+        assert heuristic_rewrite("那它掉落什么？", HISTORY) == "泰拉棱镜掉落什么？"
+        assert heuristic_rewrite("怎么合成", HISTORY) == "泰拉棱镜怎么合成"
+
+    def test_compound_words_not_pronouns(self):
+        """测试其他/吉他/他妈等复合词和"这个 + 名词"不被当作代词"""
+        from plugins.openclaw_chat.query_rewriter import heuristic_rewrite, needs_rewrite
+
+        history = [{"role": "user", "content": "史莱姆王怎么召唤"}]
+
+        for query in ("其他boss呢", "吉他在哪买", "他妈的太难了", "这个武器怎么合成", "其它的呢"):
+            assert not needs_rewrite(query), query
+            assert heuristic_rewrite(query, history) == query
+
+        # 承接词开头时补全主语，但不拆开"其他"
+        assert heuristic_rewrite("还有其他的吗", history) == "史莱姆王其他的吗"
+
+    def test_demonstrative_pronouns(self):
+        """测试单独使用的这个/那种仍视为指代"""
+        from plugins.openclaw_chat.query_rewriter import heuristic_rewrite
+
+        history = [{"role": "user", "content": "史莱姆王怎么召唤"}]
+
+        assert heuristic_rewrite("这个怎么打", history) == "史莱姆王怎么打"
+        assert heuristic_rewrite("那种怎么刷", history) == "史莱姆王怎么刷"
+        assert heuristic_rewrite("他在哪", history) == "史莱姆王在哪"
+
+    def test_standalone_unchanged(self):
+        """测试完整的问题不改写"""
+        from plugins.openclaw_chat.query_rewriter import heuristic_rewrite
+
+        assert heuristic_rewrite("天顶剑怎么合成", HISTORY) == "天顶剑怎么合成"
+
+    def test_group_prefers_same_user(self):
+        """测试群聊中优先使用同一用户的上文"""
+        from plugins.openclaw_chat.query_rewriter import heuristic_rewrite
+
+        history = HISTORY + [{"role": "user", "content": "生命水晶在哪里", "metadata": {"user_id": "2002"}}]
+
+        assert heuristic_rewrite("它掉落什么", history, user_id="1001") == "泰拉棱镜掉落什么"
+        assert heuristic_rewrite("它掉落什么", history, user_id="2002") == "生命水晶掉落什么"
+
+
+class TestQueryRewriter:
+    """测试改写器"""
+
+    @pytest.mark.asyncio
+    async def test_cached_per_session(self):
+        """测试改写结果按会话缓存"""
+        from plugins.openclaw_chat.query_rewriter import QueryRewriter
+
+        calls = []
+
+        async def llm(query, history):
+            calls.append(query)
+            return "改写后的问题：泰拉棱镜的掉落物是什么？"
+
+        rewriter = QueryRewriter(mode="llm")
+
+        first = await rewriter.rewrite("group_1", "那它掉落什么？", HISTORY, llm=llm)
+        second = await rewriter.rewrite("group_1", "那它掉落什么？", HISTORY, llm=llm)
+        await rewriter.rewrite("group_2", "那它掉落什么？", HISTORY, llm=llm)
+
+        assert first == second == "泰拉棱镜的掉落物是什么？"
+        assert len(calls) == 2
+        assert rewriter.get_stats()["cache_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_llm_timeout_falls_back(self):
+        """测试 LLM 超时退回本地规则"""
+        from plugins.openclaw_chat.query_rewriter import QueryRewriter
+
+        async def slow_llm(query, history):
+            await asyncio.sleep(1.0)
+            return "太慢了"
+
+        rewriter = QueryRewriter(mode="llm", llm_timeout=0.05)
+
+        assert await rewriter.rewrite("group_1", "那它掉落什么？", HISTORY, llm=slow_llm) == "泰拉棱镜掉落什么？"
+        assert rewriter.get_stats()["llm_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_off_mode(self):
+        """测试关闭改写"""
+        from plugins.openclaw_chat.query_rewriter import QueryRewriter
+
+        rewriter = QueryRewriter(mode="off")
+
+        assert await rewriter.rewrite("group_1", "那它掉落什么？", HISTORY) == "那它掉落什么？"
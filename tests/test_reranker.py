@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识库检索重排序测试用例
+"""
+
+import time
+from unittest.mock import MagicMock
+import pytest
+
+
+def _result(chunk_id, text, score):
+    """构造检索结果"""
+    return {"chunk_id": chunk_id, "text": text, "metadata": {}, "score": score}
+
+
+class SlowReranker:
+    """每批耗时固定的重排序器"""
+
+    name = "slow"
+
+    def __init__(self, batch_size, delay):
+        self.batch_size = batch_size
+        self.delay = delay
+
+    def score(self, query, results):
+        time.sleep(self.delay)
+        return [float(len(result["text"])) for result in results]
+
+    def score_until(self, query, results, deadline):
+        from plugins.openclaw_chat.reranker import Reranker
+        return Reranker.score_until(self, query, results, deadline)
+
+
+class TestLexicalReranker:
+    """测试词法重排"""
+
+    def test_cjk_overlap_promoted(self):
+        """测试中文关键词匹配的结果被提前"""
+        from plugins.openclaw_chat.reranker import LexicalReranker
+
+        results = [
+            _result("a", "世纪之花在困难模式的地下丛林出现", 0.50),
+            _result("b", "泰拉棱镜在击败光之女皇后掉落", 0.55),
+            _result("c", "今天晚饭吃什么", 0.60),
+        ]
+
+        scores = LexicalReranker(weight=0.7).score("泰拉棱镜怎么获得", results)
+
+        assert scores.index(max(scores)) == 1
+
+    def test_weight_zero_keeps_vector_order(self):
+        """测试词法权重为 0 时只看向量相似度"""
+        from plugins.openclaw_chat.reranker import LexicalReranker
+
+        results = [_result("a", "泰拉棱镜", 0.8), _result("b", "天顶剑", 0.2)]
+        scores = LexicalReranker(weight=0.0).score("泰拉棱镜", results)
+
+        assert scores[1] > scores[0]
+
+
+class TestRetrieverRerank:
+    """测试检索接入重排"""
+
+    @pytest.mark.asyncio
+    async def test_rerank_over_fetched_candidates(self):
+        """测试多取回候选并重排后截断到 top_k"""
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever, SearchContext
+        from plugins.openclaw_chat.reranker import LexicalReranker
+
+        vector_db = MagicMock()
+        vector_db.embedding_batcher = None
+        vector_db.search.return_value = [
+            _result("a", "今天晚饭吃什么", 0.40),
+            _result("b", "世纪之花在地下丛林出现", 0.45),
+            _result("c", "泰拉棱镜在击败光之女皇后掉落", 0.50),
+        ]
+
+        retriever = KnowledgeBaseRetriever(reranker=LexicalReranker(weight=0.8), rerank_candidates=10)
+        results = await retriever.retrieve(vector_db, SearchContext(query="泰拉棱镜", kb_id="game", top_k=1, use_cache=False))
+
+        assert vector_db.search.call_args.kwargs["top_k"] == 10
+        assert [result["chunk_id"] for result in results] == ["c"]
+        assert retriever.get_rerank_stats()["count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_budget_keeps_partial_order(self):
+        """测试预计超过时间预算时不再开始下一批，已打分的候选重排、其余保持原顺序"""
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever
+
+        results = [_result(str(i), "x" * (i % 4 + 1), 0.1 * i) for i in range(8)]
+        retriever = KnowledgeBaseRetriever(reranker=SlowReranker(batch_size=2, delay=0.05), rerank_budget_ms=180)
+
+        reranked = await retriever.rerank_results("q", results)
+
+        assert reranked[-2:] == results[6:]
+        assert reranked[0]["text"] == "xxxx"
+        assert retriever.get_rerank_stats()["partial"] == 1
+
+    @pytest.mark.asyncio
+    async def test_timeout_falls_back_to_vector_order(self):
+        """测试单批推理超过预算时直接返回原顺序"""
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever
+
+        results = [_result("a", "x", 0.1), _result("b", "xx", 0.2)]
+        retriever = KnowledgeBaseRetriever(reranker=SlowReranker(batch_size=0, delay=0.2), rerank_budget_ms=20)
+
+        start = time.perf_counter()
+        reranked = await retriever.rerank_results("q", results)
+
+        assert time.perf_counter() - start < 0.15
+        assert reranked == results
+        assert retriever.get_rerank_stats()["timeouts"] == 1
+
+    def test_dedupe_before_limit(self):
+        """测试先去重再截断，重复文本不占用名额"""
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever, SearchContext
+
+        results = [_result("a", "相同", 0.1), _result("b", "相同", 0.2), _result("c", "不同", 0.3)]
+        processed = KnowledgeBaseRetriever().post_process_results(results, SearchContext(query="q", kb_id="game", top_k=2))
+
+        assert [result["chunk_id"] for result in processed] == ["a", "c"]
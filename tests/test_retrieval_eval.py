@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识库检索离线评测测试用例
+"""
+
+import os
+import pytest
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures", "terraria_wiki")
+
+
+class TestMetrics:
+    """测试评测指标"""
+
+    def test_recall_and_rr(self):
+        """测试 recall@k 和 RR"""
+        from plugins.openclaw_chat.retrieval_eval import recall_at_k, reciprocal_rank
+
+        hits = [-1, 0, -1, 1]
+
+        assert recall_at_k(hits, 2, 2) == 0.5
+        assert recall_at_k(hits, 2, 4) == 1.0
+        assert reciprocal_rank(hits) == 0.5
+        assert reciprocal_rank([-1, -1]) == 0.0
+
+    def test_ndcg(self):
+        """测试 nDCG：理想排序为 1，相关结果靠后时降低"""
+        from plugins.openclaw_chat.retrieval_eval import ndcg_at_k
+
+        assert ndcg_at_k([0, 1, -1], 2, 3) == pytest.approx(1.0)
+        assert 0 < ndcg_at_k([-1, 0, 1], 2, 3) < 1
+        assert ndcg_at_k([-1, -1], 1, 2) == 0.0
+
+    def test_judge_counts_each_span_once(self):
+        """测试同一条标注只计一次，页面不同不算命中"""
+        from plugins.openclaw_chat.retrieval_eval import EvalQuery, RelevantSpan
+
+        query = EvalQuery(query="泰拉棱镜", relevant=[RelevantSpan(page="泰拉棱镜", contains="召唤")])
+        results = [
+            {"text": "召唤武器", "metadata": {"metadata": {"page_name": "光之女皇"}}},
+            {"text": "召唤武器", "metadata": {"metadata": {"page_name": "泰拉棱镜"}}},
+            {"text": "召唤武器，重叠部分", "metadata": {"page_name": "泰拉棱镜"}},
+        ]
+
+        assert query.judge(results) == [-1, 0, -1]
+
+
+class TestFixture:
+    """测试离线评测数据"""
+
+    @pytest.mark.parametrize("chunk_size", [200, 500, 1000])
+    def test_annotations_exist_in_chunks(self, chunk_size):
+        """测试每条标注在不同分块大小下都能在页面的文本块中找到"""
+        from plugins.openclaw_chat.retrieval_eval import load_fixture, build_chunks
+
+        pages, queries = load_fixture(FIXTURE_DIR)
+        chunks = build_chunks("eval", pages, chunk_size=chunk_size)
+
+        assert queries
+        for query in queries:
+            for span in query.relevant:
+                assert span.contains, f"{query.query}: 标注需要指定段落"
+                assert any(
+                    span.matches(chunk.metadata["page_name"], chunk.text) for chunk in chunks
+                ), f"{query.query}: {span}"
+
+    def test_pages_split_into_multiple_chunks(self):
+        """测试保存的页面足够大：每个页面都会分成多个块，且块数随分块大小变化"""
+        from collections import Counter
+        from plugins.openclaw_chat.retrieval_eval import load_fixture, build_chunks
+
+        pages, _ = load_fixture(FIXTURE_DIR)
+        small = Counter(chunk.metadata["page_name"] for chunk in build_chunks("eval", pages, chunk_size=500))
+        large = Counter(chunk.metadata["page_name"] for chunk in build_chunks("eval", pages, chunk_size=1000))
+
+        assert max(len(html.encode("utf-8")) for html in pages.values()) > 100 * 1024
+        for page_name in pages:
+            assert large[page_name] > 1, page_name
+            assert small[page_name] > large[page_name], page_name
+
+    @pytest.mark.asyncio
+    async def test_evaluate(self, tmp_path):
+        """测试在本地知识库上运行评测"""
+        from plugins.openclaw_chat.embeddings import HashingEmbeddingProvider
+        from plugins.openclaw_chat.vector_database_manager import VectorDatabaseManager
+        from plugins.openclaw_chat.knowledge_base_retriever import KnowledgeBaseRetriever
+        from plugins.openclaw_chat.retrieval_eval import load_fixture, build_chunks, evaluate
+
+        pages, queries = load_fixture(FIXTURE_DIR)
+        vector_db = VectorDatabaseManager(
+            kb_dir=str(tmp_path), embedding_provider=HashingEmbeddingProvider(), backend="numpy", kb_backends={}
+        )
+        vector_db.add_documents("eval", build_chunks("eval", pages))
+
+        result = await evaluate(KnowledgeBaseRetriever(), vector_db, "eval", queries, top_k=3)
+        summary = result["summary"]
+
+        assert len(result["queries"]) == len(queries)
+        assert 0 < summary["recall@3"] <= 1
+        assert 0 < summary["mrr"] <= 1
+        assert summary["p95_ms"] >= summary["p50_ms"] > 0
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求追踪模块测试用例
+测试阶段计时、上下文传播、直方图与导出
+"""
+
+import json
+import pytest
+
+
+class TestHistogram:
+    """测试直方图"""
+
+    def test_observe_and_percentile(self):
+        """测试观测值与分位数估算"""
+        from plugins.openclaw_chat.tracing import Histogram
+
+        histogram = Histogram(buckets=(0.1, 0.5, 1.0))
+        for value in [0.05, 0.05, 0.2, 0.3, 2.0]:
+            histogram.observe(value)
+
+        assert histogram.count == 5
+        assert histogram.cumulative_counts() == [2, 4, 4, 5]
+        assert histogram.percentile(0.5) == 0.5
+        assert histogram.percentile(0.99) == float("inf")
+
+    def test_empty_percentile(self):
+        """测试空直方图"""
+        from plugins.openclaw_chat.tracing import Histogram
+
+        assert Histogram().percentile(0.95) is None
+
+
+class TestSpan:
+    """测试阶段计时与上下文传播"""
+
+    def test_span_records_into_current_trace(self):
+        """测试 span 记录到当前追踪"""
+        from plugins.openclaw_chat.tracing import start_trace, finish_trace, span, get_current_trace
+
+        trace = start_trace("test_request")
+        with span("stage_a"):
+            pass
+
+        assert get_current_trace() is trace
+        assert trace.get_stage("stage_a")["status"] == "ok"
+
+        finish_trace(trace)
+        assert get_current_trace() is None
+
+    def test_span_records_error(self):
+        """测试 span 记录异常状态"""
+        from plugins.openclaw_chat.tracing import start_trace, finish_trace, span
+
+        trace = start_trace("test_request")
+        with pytest.raises(ValueError):
+            with span("broken"):
+                raise ValueError("坏了")
+        finish_trace(trace)
+
+        assert trace.get_stage("broken")["status"] == "error"
+
+    @pytest.mark.asyncio
+    async def test_run_in_thread_propagates_trace(self):
+        """测试线程池中执行的函数仍能记录到当前追踪"""
+        from plugins.openclaw_chat.tracing import start_trace, finish_trace, span, run_in_thread
+
+        def blocking_work(x):
+            with span("thread_stage"):
+                return x * 2
+
+        trace = start_trace("test_request")
+        result = await run_in_thread(blocking_work, 21)
+        finish_trace(trace)
+
+        assert result == 42
+        assert trace.get_stage("thread_stage") is not None
+
+
+class TestExport:
+    """测试导出"""
+
+    def test_jsonl_export(self, tmp_path):
+        """测试 JSONL 追踪文件导出"""
+        from plugins.openclaw_chat import tracing
+
+        trace_file = tmp_path / "traces.jsonl"
+        tracing.init_trace_exporter(str(trace_file))
+        try:
+            trace = tracing.start_trace("export_test", {"user_id": "10001"})
+            with tracing.span("stage_a"):
+                pass
+            tracing.finish_trace(trace)
+        finally:
+            tracing.init_trace_exporter("")
+
+        lines = trace_file.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 1
+        data = json.loads(lines[0])
+        assert data["name"] == "export_test"
+        assert data["attributes"]["user_id"] == "10001"
+        assert data["stages"][0]["stage"] == "stage_a"
+
+    def test_render_prometheus(self):
+        """测试 Prometheus 文本格式"""
+        from plugins.openclaw_chat.tracing import observe_stage, render_prometheus
+
+        observe_stage("prom_test_stage", 0.02)
+        text = render_prometheus()
+
+        assert "# TYPE openclaw_stage_duration_seconds histogram" in text
+        assert 'openclaw_stage_duration_seconds_bucket{stage="prom_test_stage",le="+Inf"}' in text
+        assert 'openclaw_stage_duration_seconds_count{stage="prom_test_stage"}' in text
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享向量数据库与启动预热测试用例
+（使用模拟的 Chroma 客户端，不需要安装 chromadb）
+"""
+
+from unittest.mock import MagicMock, patch
+import pytest
+
+
+def _patch_chroma():
+    """模拟 chromadb 模块"""
+    from plugins.openclaw_chat import vector_database_manager
+
+    chromadb = MagicMock()
+    return chromadb, [
+        patch.object(vector_database_manager, "CHROMADB_AVAILABLE", True),
+        patch.object(vector_database_manager, "chromadb", chromadb, create=True),
+        patch.object(vector_database_manager, "Settings", MagicMock(), create=True),
+    ]
+
+
+class TestSharedVectorDatabase:
+    """测试进程内共享的向量数据库"""
+
+    def test_same_dir_opens_one_client(self, tmp_path):
+        """测试同一目录只打开一个 Chroma 客户端"""
+        from plugins.openclaw_chat import vector_database_manager
+
+        chromadb, patches = _patch_chroma()
+        for p in patches:
+            p.start()
+        try:
+            manager_a = vector_database_manager.get_vector_db_manager(str(tmp_path))
+            manager_b = vector_database_manager.get_vector_db_manager(str(tmp_path / "."))
+            manager_c = vector_database_manager.get_vector_db_manager(str(tmp_path / "other"))
+        finally:
+            for p in patches:
+                p.stop()
+            vector_database_manager._vdb_managers.clear()
+
+        assert manager_a is manager_b
+        assert manager_a is not manager_c
+        assert chromadb.PersistentClient.call_count == 2
+
+    def test_warm_up_loads_existing_collections(self, tmp_path):
+        """测试预热只加载已存在的集合并执行预热查询"""
+        from plugins.openclaw_chat import vector_database_manager
+
+        chromadb, patches = _patch_chroma()
+        collection = MagicMock()
+        collection.count.return_value = 10
+
+        def get_collection(name):
+            if name == "kb_game_terraria":
+                return collection
+            raise ValueError(f"Collection {name} does not exist")
+
+        chromadb.PersistentClient.return_value.get_collection.side_effect = get_collection
+
+        for p in patches:
+            p.start()
+        try:
+            manager = vector_database_manager.VectorDatabaseManager(kb_dir=str(tmp_path))
+            timings = manager.warm_up(["game_terraria", "missing"])
+        finally:
+            for p in patches:
+                p.stop()
+
+        assert list(timings) == ["game_terraria"]
+        assert collection.query.call_count == 1
+        assert manager._collections["game_terraria"] is collection
+        chromadb.PersistentClient.return_value.get_or_create_collection.assert_not_called()
+
+
+class TestStartupWarmUp:
+    """测试驱动器启动时预热知识库"""
+
+    @pytest.mark.asyncio
+    async def test_warm_up_ready_knowledge_bases(self):
+        """测试只预热就绪的知识库"""
+        from plugins.openclaw_chat import ai_processor
+        from plugins.openclaw_chat.knowledge_base_manager import KnowledgeBaseInfo
+
+        kb_manager = MagicMock()
+        kb_manager.list_knowledge_bases.return_value = [
+            KnowledgeBaseInfo(kb_id="ready_kb", kb_name="A", kb_type="game", source="",
+                              created_at="", updated_at="", status="ready"),
+            KnowledgeBaseInfo(kb_id="building_kb", kb_name="B", kb_type="game", source="",
+                              created_at="", updated_at="", status="building"),
+        ]
+        vdb_manager = MagicMock()
+        vdb_manager.warm_up.return_value = {"ready_kb": 0.1}
+
+        with patch("config.config.knowledge_base_enabled", True), \
+                patch.object(ai_processor, "KNOWLEDGE_BASE_AVAILABLE", True), \
+                patch.object(ai_processor, "_kb_manager", kb_manager), \
+                patch.object(ai_processor, "_vdb_manager", vdb_manager):
+            await ai_processor.warm_up_knowledge_base()
+
+        vdb_manager.warm_up.assert_called_once_with(["ready_kb"])
+
+    @pytest.mark.asyncio
+    async def test_disabled_knowledge_base_skipped(self):
+        """测试未启用知识库时不初始化"""
+        from plugins.openclaw_chat import ai_processor
+
+        with patch("config.config.knowledge_base_enabled", False), \
+                patch.object(ai_processor, "init_knowledge_base") as init:
+            await ai_processor.warm_up_knowledge_base()
+
+        init.assert_not_called()
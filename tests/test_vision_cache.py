@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vision 识别结果缓存测试用例
+"""
+
+import base64
+import os
+import time
+from unittest.mock import AsyncMock, patch
+import pytest
+
+
+class TestFingerprint:
+    """测试图片指纹"""
+
+    def test_dhash_distance(self):
+        """测试感知哈希的汉明距离"""
+        from plugins.openclaw_chat.vision_cache import fingerprint_distance
+
+        assert fingerprint_distance("d:00000000000000ff", "d:00000000000000ff") == 0
+        assert fingerprint_distance("d:00000000000000ff", "d:00000000000000fe") == 1
+        assert fingerprint_distance("d:0000000000000000", "d:ffffffffffffffff") == 64
+
+    def test_content_hash_exact_only(self):
+        """测试内容哈希只有相同/不同"""
+        from plugins.openclaw_chat.vision_cache import fingerprint_distance
+
+        assert fingerprint_distance("s:abc", "s:abc") == 0
+        assert fingerprint_distance("s:abc", "s:abd") is None
+        assert fingerprint_distance("s:abc", "d:00000000000000ff") is None
+
+    def test_compute_fingerprint_fallback(self):
+        """测试无法解析的图片退化为内容哈希"""
+        from plugins.openclaw_chat.vision_cache import compute_fingerprint
+
+        fingerprint = compute_fingerprint(b"not-an-image")
+
+        assert fingerprint.startswith("s:")
+        assert fingerprint == compute_fingerprint(b"not-an-image")
+
+    def test_dhash_similar_images(self):
+        """测试相似图片的 dHash 距离很小（需要 Pillow）"""
+        pytest.importorskip("PIL")
+        import io
+        from PIL import Image
+        from plugins.openclaw_chat.vision_cache import compute_fingerprint, fingerprint_distance
+
+        def render(size, quality):
+            image = Image.new("RGB", size)
+            for x in range(size[0]):
+                for y in range(size[1]):
+                    image.putpixel((x, y), (x * 255 // size[0], y * 255 // size[1], 128))
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality)
+            return buffer.getvalue()
+
+        original = compute_fingerprint(render((64, 64), 95))
+        recompressed = compute_fingerprint(render((48, 48), 60))
+
+        assert fingerprint_distance(original, recompressed) <= 4
+
+
+class TestVisionResultCache:
+    """测试识别结果缓存"""
+
+    def test_near_duplicate_hit(self):
+        """测试汉明距离在阈值内命中"""
+        from plugins.openclaw_chat.vision_cache import VisionResultCache
+
+        cache = VisionResultCache(max_distance=2)
+        key = cache.make_key("siliconflow", "Qwen/Qwen2-VL-7B-Instruct", "请描述这张图片")
+        cache.put(key, "d:00000000000000ff", "一只猫")
+
+        assert cache.get(key, "d:00000000000000fc") == "一只猫"
+        assert cache.get(key, "d:0000000000000000") is None
+
+    def test_key_includes_prompt_and_model(self):
+        """测试提示词或模型不同时不命中"""
+        from plugins.openclaw_chat.vision_cache import VisionResultCache
+
+        cache = VisionResultCache()
+        key = cache.make_key("openai", "gpt-4o-mini", "请描述这张图片")
+        cache.put(key, "d:00000000000000ff", "一只猫")
+
+        assert cache.get(cache.make_key("openai", "gpt-4o", "请描述这张图片"), "d:00000000000000ff") is None
+        assert cache.get(cache.make_key("openai", "gpt-4o-mini", "这是什么"), "d:00000000000000ff") is None
+
+    def test_ttl_expiry(self):
+        """测试过期条目不再命中"""
+        from plugins.openclaw_chat.vision_cache import VisionResultCache
+
+        cache = VisionResultCache(ttl=60)
+        cache.put("k", "s:abc", "旧结果")
+        cache._entries["k:s:abc"]["created_at"] = time.time() - 120
+
+        assert cache.get("k", "s:abc") is None
+        assert cache.get_cache_stats()["size"] == 0
+
+    def test_persistence(self, tmp_path):
+        """测试保存到磁盘后重新加载"""
+        from plugins.openclaw_chat.vision_cache import VisionResultCache
+
+        cache_file = str(tmp_path / "vision_cache.json")
+        cache = VisionResultCache(cache_file=cache_file)
+        cache.put("k", "d:00000000000000ff", "一只猫")
+        cache.save()
+
+        reloaded = VisionResultCache(cache_file=cache_file)
+        assert reloaded.get("k", "d:00000000000000ff") == "一只猫"
+
+    def test_concurrent_save(self, tmp_path):
+        """测试多个线程同时保存不会出错，也不留下临时文件"""
+        import json
+        import threading
+        from plugins.openclaw_chat.vision_cache import VisionResultCache
+
+        cache_file = str(tmp_path / "vision_cache.json")
+        cache = VisionResultCache(cache_file=cache_file)
+        for index in range(50):
+            cache.put("k", f"s:{index}", f"回复{index}")
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.save())) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [True] * 16
+        with open(cache_file, encoding="utf-8") as f:
+            assert len(json.load(f)) == 50
+        assert os.listdir(tmp_path) == ["vision_cache.json"]
+
+    @pytest.mark.asyncio
+    async def test_deferred_flush(self, tmp_path):
+        """测试写入后延迟保存，多次写入合并为一次，关闭时保存剩余修改"""
+        import asyncio
+        from plugins.openclaw_chat.vision_cache import VisionResultCache
+
+        cache_file = str(tmp_path / "vision_cache.json")
+        cache = VisionResultCache(cache_file=cache_file, flush_interval=0.05)
+        cache.put("k", "s:1", "一")
+        cache.schedule_flush()
+        cache.put("k", "s:2", "二")
+        cache.schedule_flush()
+
+        assert not os.path.exists(cache_file)
+        await asyncio.sleep(0.2)
+        assert VisionResultCache(cache_file=cache_file).get_cache_stats()["size"] == 2
+        assert cache.flush() is False
+
+        cache.put("k", "s:3", "三")
+        cache.schedule_flush()
+        await cache.aclose()
+        assert VisionResultCache(cache_file=cache_file).get("k", "s:3") == "三"
+
+    def test_max_entries(self):
+        """测试超过最大条目数时淘汰最久未使用的条目"""
+        from plugins.openclaw_chat.vision_cache import VisionResultCache
+
+        cache = VisionResultCache(max_entries=2)
+        cache.put("k", "s:1", "一")
+        cache.put("k", "s:2", "二")
+        cache.get("k", "s:1")
+        cache.put("k", "s:3", "三")
+
+        assert cache.get("k", "s:1") == "一"
+        assert cache.get("k", "s:2") is None
+
+
+class TestGlobalVisionCache:
+    """测试全局缓存的创建"""
+
+    @pytest.mark.asyncio
+    async def test_async_getter_loads_in_thread(self, tmp_path, monkeypatch):
+        """测试第一次获取缓存时在线程池中读取缓存文件，不阻塞事件循环"""
+        import threading
+        from plugins.openclaw_chat import vision_cache
+        from plugins.openclaw_chat.vision_cache import VisionResultCache, get_vision_cache_async
+
+        cache_file = str(tmp_path / "vision_cache.json")
+        saved = VisionResultCache(cache_file=cache_file)
+        saved.put("key", "d:00000000000000ff", "一张截图")
+        saved.save()
+
+        loader_threads = []
+        original_load = VisionResultCache._load
+
+        def recording_load(self):
+            loader_threads.append(threading.get_ident())
+            original_load(self)
+
+        monkeypatch.setattr(vision_cache, "_vision_cache", None)
+        monkeypatch.setattr(VisionResultCache, "_load", recording_load)
+        with patch("config.config.vision_cache_enabled", True), patch("config.config.vision_cache_file", cache_file):
+            cache = await get_vision_cache_async()
+            assert await get_vision_cache_async() is cache
+
+        assert loader_threads and loader_threads[0] != threading.get_ident()
+        assert cache.get("key", "d:00000000000000ff") == "一张截图"
+
+
+class TestVisionClientCache:
+    """测试 Vision 客户端接入缓存"""
+
+    @pytest.mark.asyncio
+    async def test_repost_served_from_cache(self):
+        """测试重复图片直接返回缓存结果，不再调用 API"""
+        from plugins.openclaw_chat import vision_client
+        from plugins.openclaw_chat.vision_cache import VisionResultCache
+        from plugins.openclaw_chat.image_processor import ImageData
+
+        cache = VisionResultCache()
+        client = vision_client.VisionAIClient(api_key="test_key", provider="siliconflow")
+        call_api = AsyncMock(return_value="这是一张表情包")
+        image = ImageData(base64=base64.b64encode(b"meme-bytes").decode())
+
+        with patch.object(vision_client, "get_vision_cache_async", AsyncMock(return_value=cache)), \
+                patch.object(client, "_call_openai_compatible", call_api):
+            first = await client.recognize_image(image, prompt="请描述", model="Qwen/Qwen2-VL-7B-Instruct")
+            second = await client.recognize_image(image, prompt="请描述", model="Qwen/Qwen2-VL-7B-Instruct")
+
+        assert first == second == "这是一张表情包"
+        assert call_api.call_count == 1
+        assert cache.get_cache_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_error_reply_not_cached(self):
+        """测试失败的识别结果不缓存"""
+        from plugins.openclaw_chat import vision_client
+        from plugins.openclaw_chat.vision_cache import VisionResultCache
+        from plugins.openclaw_chat.image_processor import ImageData
+
+        cache = VisionResultCache()
+        client = vision_client.VisionAIClient(api_key="test_key", provider="siliconflow")
+        call_api = AsyncMock(return_value="抱歉，siliconflow Vision 服务出错（500）")
+        image = ImageData(base64=base64.b64encode(b"meme-bytes").decode())
+
+        with patch.object(vision_client, "get_vision_cache_async", AsyncMock(return_value=cache)), \
+                patch.object(client, "_call_openai_compatible", call_api):
+            await client.recognize_image(image, prompt="请描述", model="Qwen/Qwen2-VL-7B-Instruct")
+
+        assert cache.get_cache_stats()["size"] == 0